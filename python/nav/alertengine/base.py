@@ -22,21 +22,22 @@
 import gc
 import logging
 from datetime import datetime, timedelta
-from functools import lru_cache
+from functools import lru_cache, partial
 
 from django.db import transaction, reset_queries
 
 from nav.models.profiles import (
-    Account,
     AccountAlertQueue,
     AlertSender,
     AlertSubscription,
     AlertAddress,
-    FilterGroup,
     AlertPreference,
     TimePeriod,
 )
 from nav.models.event import AlertQueue
+from nav.alertengine.filters import FilterEvaluator, SNAPSHOT_RELATIONS
+from nav.alertengine.subscriptions import get_subscription_index
+from nav.alertengine.dispatch import dispatch
 
 
 _logger = logging.getLogger(__name__)
@@ -45,7 +46,6 @@ _logger = logging.getLogger(__name__)
 DISPATCHED_NOW = object()
 DISPATCHED_DAILY = object()
 DISPATCHED_WEEKLY = object()
-DISPATCH_FAILED = object()
 DISPATCH_IGNORED = object()
 
 WEEKEND_DAYS = (6, 7)
@@ -71,7 +71,9 @@ def check_alerts(debug=False):
     now = datetime.now()
 
     # Get all alerts that aren't in alert queue due to subscription
-    new_alerts = AlertQueue.objects.filter(queued_alerts__isnull=True)
+    new_alerts = AlertQueue.objects.filter(queued_alerts__isnull=True).select_related(
+        *SNAPSHOT_RELATIONS
+    )
     num_new_alerts = len(new_alerts)
 
     initial_alerts = AlertQueue.objects.values_list('id', flat=True)
@@ -82,7 +84,9 @@ def check_alerts(debug=False):
         handle_new_alerts(new_alerts)
 
     # Get all queued alerts.
-    queued_alerts = AccountAlertQueue.objects.all()
+    queued_alerts = AccountAlertQueue.objects.select_related(
+        'subscription__alert_address'
+    )
 
     _logger.debug('Checking %d queued alerts', len(queued_alerts))
 
@@ -164,81 +168,60 @@ def check_alerts(debug=False):
 def handle_new_alerts(new_alerts):
     """Handles new alerts on the queue"""
     _logger = logging.getLogger('nav.alertengine.handle_new_alerts')
-    accounts = []
-
-    def subscription_sort_key(subscription):
-        """Return a key to sort alertsubscriptions in a prioritized order."""
-        sort_order = [
-            AlertSubscription.NOW,
-            AlertSubscription.NEXT,
-            AlertSubscription.DAILY,
-            AlertSubscription.WEEKLY,
-        ]
-        try:
-            return sort_order.index(subscription.type)
-        except ValueError:
-            return subscription.type
-
-    # Build datastructure that contains accounts and corresponding
-    # filter_group_contents so that we don't redo db queries to much
-    for account in Account.objects.filter(
-        alert_preference__active_profile__isnull=False
-    ):
-        profile = account.get_active_profile()
-        time_period = profile.get_active_timeperiod() if profile else None
-
-        if not time_period:
-            continue
-
-        current_alertsubscriptions = sorted(
-            time_period.alert_subscriptions.all(), key=subscription_sort_key
-        )
-
-        tmp = []
-        for alertsubscription in current_alertsubscriptions:
-            tmp.append(
-                (
-                    alertsubscription,
-                    alertsubscription.filter_group.filter_group_contents.all(),
-                )
-            )
-
-        if tmp:
-            permissions = []
-            for filtergroup in FilterGroup.objects.filter(
-                group_permissions__accounts__in=[account]
-            ):
-                permissions.append(filtergroup.filter_group_contents.all())
-
-            accounts.append((account, tmp, permissions))
-            del permissions
 
-        del tmp
-        del current_alertsubscriptions
-        del account
+    # The index holds accounts and corresponding filter_group_contents so that
+    # we don't redo db queries to much
+    index = get_subscription_index()
+    accounts = index.get_active_subscriptions()
 
     # Remember which alerts are sent where to avoid duplicates
     dupemap = set()
 
+    # Filters are compiled once and evaluated in memory for every alert
+    evaluator = FilterEvaluator()
+    check_alert = partial(check_alert_against_filtergroupcontents, evaluator=evaluator)
+
+    # Only filters that could possibly match an alert need to be checked
+    candidates = {
+        alert.id: index.get_candidate_filters(evaluator.get_snapshot(alert))
+        for alert in new_alerts
+    }
+    skipped = 0
+
     # Check all acounts against all their active subscriptions
     for account, alertsubscriptions, permissions in accounts:
         _logger.debug("Checking new alerts for account '%s'", account)
 
         for alert in new_alerts:
+            candidate_subscriptions = [
+                (subscription, contents)
+                for subscription, contents, triggers in alertsubscriptions
+                if triggers is None or not triggers.isdisjoint(candidates[alert.id])
+            ]
+            skipped += len(alertsubscriptions) - len(candidate_subscriptions)
             _check_match_and_permission(
                 account,
                 alert,
-                alertsubscriptions,
+                candidate_subscriptions,
                 dupemap,
                 _logger,
-                check_alert_against_filtergroupcontents,
+                check_alert,
                 permissions,
             )
             del alert
         del account
         del permissions
 
+    _logger.debug('%d alert subscription checks skipped by index', skipped)
+    _logger.debug(
+        '%d filter checks evaluated in memory, %d using SQL',
+        evaluator.compiled_checks,
+        evaluator.sql_checks,
+    )
+
     del new_alerts
+    del evaluator
+    del candidates
     gc.collect()
 
 
@@ -357,24 +340,41 @@ def handle_queued_alerts(queued_alerts, now=None):
     num_resolved_alerts_ignored = 0
     num_failed_sends = 0
 
+    # Notifications that are due are dispatched concurrently, once all queued
+    # alerts have been considered
+    due = []
     for queued_alert in queued_alerts:  # type: AccountAlertQueue
         result = process_single_queued_notification(queued_alert, now=now)
 
-        # The result value is processed purely for statistics and record keeping
-        if result == DISPATCH_FAILED:
-            num_failed_sends += 1
-        elif result == DISPATCH_IGNORED:
+        if result == DISPATCH_IGNORED:
             num_resolved_alerts_ignored += 1
         elif result in (DISPATCHED_NOW, DISPATCHED_WEEKLY, DISPATCHED_DAILY):
-            num_sent_alerts += 1
+            due.append((queued_alert.id, queued_alert, result))
+
+        del queued_alert
 
+    if due:
+        _logger.debug('Dispatching %d due notifications', len(due))
+        sent = dispatch([queued_alert for _id, queued_alert, _result in due])
+    else:
+        sent = {}
+
+    for queued_alert_id, queued_alert, result in due:
+        # The result value is processed purely for statistics and record keeping
+        if queued_alert_id not in sent:
+            # deferred, will be retried on the next run
+            continue
+        if not sent[queued_alert_id]:
+            num_failed_sends += 1
+            continue
+
+        num_sent_alerts += 1
         if result == DISPATCHED_DAILY:
             accounts_sent_daily.add(queued_alert.account)
         elif result == DISPATCHED_WEEKLY:
             accounts_sent_weekly.add(queued_alert.account)
 
-        del queued_alert
-
+    del due
     del queued_alerts
 
     return (
@@ -387,10 +387,17 @@ def handle_queued_alerts(queued_alerts, now=None):
 
 
 def process_single_queued_notification(queued_alert, now):
-    """Processes and, if deemed necessary, dispatches a queued notification.
+    """Processes a queued notification and decides whether it should be
+    dispatched now.
+
+    The actual dispatch is left to the caller, as notifications are dispatched
+    concurrently by nav.alertengine.dispatch.
 
     :type queued_alert: AccountAlertQueue
     :type now: datetime
+    :returns: DISPATCHED_NOW, DISPATCHED_DAILY or DISPATCHED_WEEKLY if the
+              notification is due for dispatch, DISPATCH_IGNORED if it was
+              removed from the queue, or None if it should stay queued.
     """
     _logger = logging.getLogger("nav.alertengine.process_single_queued_notification")
 
@@ -458,15 +465,12 @@ def process_single_queued_notification(queued_alert, now):
             queued_alert.delete()
             return DISPATCH_IGNORED
 
-        if queued_alert.send():
-            if weekly:
-                return DISPATCHED_WEEKLY
-            elif daily:
-                return DISPATCHED_DAILY
-            else:
-                return DISPATCHED_NOW
+        if weekly:
+            return DISPATCHED_WEEKLY
+        elif daily:
+            return DISPATCHED_DAILY
         else:
-            return DISPATCH_FAILED
+            return DISPATCHED_NOW
 
 
 def _verify_daily_dispatch(queued_alert, now, _logger=_logger):
@@ -598,8 +602,16 @@ def alert_should_be_ignored(queued_alert, subscription, now):
 
 
 @lru_cache
-def check_alert_against_filtergroupcontents(alert, filtergroupcontents, atype):
-    """Checks a given alert against an array of filtergroupcontents"""
+def check_alert_against_filtergroupcontents(
+    alert, filtergroupcontents, atype, evaluator=None
+):
+    """Checks a given alert against an array of filtergroupcontents.
+
+    If an evaluator is given, filters are verified using it rather than by
+    querying the database directly.
+
+    :type evaluator: nav.alertengine.filters.FilterEvaluator
+    """
 
     _logger = logging.getLogger(
         'nav.alertengine.check_alert_against_filtergroupcontents'
@@ -609,6 +621,11 @@ def check_alert_against_filtergroupcontents(alert, filtergroupcontents, atype):
         _logger.debug("Emtpy filtergroup")
         return False
 
+    if evaluator:
+        verify = evaluator.verify
+    else:
+        verify = _verify_filter
+
     # Allways assume that the match will fail
     matches = False
 
@@ -617,7 +634,7 @@ def check_alert_against_filtergroupcontents(alert, filtergroupcontents, atype):
 
         # If we have not matched the message see if we can match it
         if not matches and content.include:
-            matches = content.filter.verify(alert) == content.positive
+            matches = verify(content.filter, alert) == content.positive
 
             if matches:
                 _logger.debug(
@@ -629,7 +646,7 @@ def check_alert_against_filtergroupcontents(alert, filtergroupcontents, atype):
 
         # If the alert has been matched try excluding it
         elif matches and not content.include:
-            matches = content.filter.verify(alert) != content.positive
+            matches = verify(content.filter, alert) != content.positive
 
             # Log that we excluded the alert
             if not matches:
@@ -651,6 +668,10 @@ def check_alert_against_filtergroupcontents(alert, filtergroupcontents, atype):
     return matches
 
 
+def _verify_filter(filtr, alert):
+    return filtr.verify(alert)
+
+
 def clear_blacklisted_status_of_alert_senders():
     blacklisted_alert_senders = AlertSender.objects.exclude(
         blacklisted_reason__isnull=True
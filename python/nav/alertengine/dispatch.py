@@ -0,0 +1,366 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License version 3 as published by the Free
+# Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Concurrent dispatch of queued alert notifications.
+
+Notifications that are due for dispatch are grouped into channels, one for
+each alert sender (e-mail, SMS, Slack...), so that a slow or failing medium
+does not hold up notifications sent through the others. Each channel is
+drained by a limited number of worker threads, and may be rate limited,
+through these options in the sender's section of ``alertengine.conf``:
+
+concurrency
+  The maximum number of notifications to send through this channel at the same
+  time.
+
+rate
+  The maximum number of notifications to send per second through this channel.
+  0 means unlimited.
+
+The total number of worker threads is limited by the ``dispatch_workers``
+option in the ``main`` section.
+
+Each worker thread keeps its dispatcher connections (such as SMTP sessions or
+HTTP connections) open until its channel has been drained. When a notification
+cannot be sent due to a temporary failure, the channel backs off for an
+exponentially increasing period, leaving any remaining notifications for that
+channel in their queues. Channels whose sender has been blacklisted are not
+dispatched to at all.
+
+"""
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from django.db import connection
+
+from nav.config import getconfig
+from nav.metrics.carbon import send_metrics
+from nav.metrics.templates import metric_prefix_for_alertengine_dispatcher
+from nav.models.profiles import AlertSender
+
+_logger = logging.getLogger(__name__)
+
+CONFIG_FILE = 'alertengine.conf'
+DEFAULT_WORKERS = 8
+DEFAULT_CONCURRENCY = 2
+DEFAULT_RATE = 0
+BACKOFF_BASE = 10  # seconds
+BACKOFF_MAX = 600  # seconds
+
+# Channels are kept between runs to remember their backoff state
+_channels = {}
+
+
+class Channel(object):
+    """Dispatch state for a single alert sender"""
+
+    def __init__(self, sender, concurrency=DEFAULT_CONCURRENCY, rate=0):
+        self.sender = sender
+        self.name = sender.name
+        self.concurrency = max(1, concurrency)
+        self.limiter = RateLimiter(rate) if rate > 0 else None
+        self.queue = deque()
+        self.blacklisted = False
+        self.failures = 0
+        self.backoff_until = 0
+        self.stats = DispatchStats()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<Channel {}>'.format(self.name)
+
+    def is_backing_off(self):
+        """Returns True if the channel is currently backing off"""
+        return time.time() < self.backoff_until
+
+    def register_success(self):
+        """Resets the backoff state after a successful dispatch"""
+        with self._lock:
+            self.failures = 0
+            self.backoff_until = 0
+
+    def register_failure(self):
+        """Starts or extends a backoff period after a temporary failure"""
+        with self._lock:
+            self.failures += 1
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1))
+            self.backoff_until = time.time() + delay
+        _logger.warning(
+            "%s: temporary dispatch failure #%d, backing off for %d seconds",
+            self.name,
+            self.failures,
+            delay,
+        )
+
+    def next_item(self):
+        """Pops the next queued item, or returns None if the queue is empty"""
+        with self._lock:
+            return self.queue.popleft() if self.queue else None
+
+    def defer_remaining(self):
+        """Leaves all remaining items in their account queues"""
+        with self._lock:
+            self.stats.add_deferred(len(self.queue))
+            self.queue.clear()
+
+
+class RateLimiter(object):
+    """A thread safe limiter that spaces out events to a maximum rate"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until another event is allowed by the rate limit"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class DispatchStats(object):
+    """Per-run dispatch statistics for a channel"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.deferred = 0
+        self.latency = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, sent, latency):
+        with self._lock:
+            if sent:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self.latency += latency
+
+    def add_deferred(self, count=1):
+        with self._lock:
+            self.deferred += count
+
+    def get_metrics(self, prefix, elapsed, timestamp):
+        """Returns a list of Graphite metrics for these stats"""
+        attempts = self.sent + self.failed
+        latency = self.latency / attempts if attempts else 0
+        throughput = self.sent / elapsed if elapsed else 0
+        return [
+            ('{}.sent'.format(prefix), (timestamp, self.sent)),
+            ('{}.failed'.format(prefix), (timestamp, self.failed)),
+            ('{}.deferred'.format(prefix), (timestamp, self.deferred)),
+            ('{}.latency'.format(prefix), (timestamp, latency)),
+            ('{}.throughput'.format(prefix), (timestamp, throughput)),
+        ]
+
+
+def dispatch(queued_alerts, config=None):
+    """Sends a list of queued notifications, concurrently for each alert sender.
+
+    :param queued_alerts: A list of AccountAlertQueue objects that are due for
+                          dispatch.
+    :param config: A parsed alertengine.conf. Read from file if omitted.
+    :returns: A dict mapping the id of each queued alert that was attempted to
+              a boolean telling whether it was sent. Notifications that were
+              deferred due to backoff or blacklisting are left out.
+    """
+    if config is None:
+        config = getconfig(CONFIG_FILE)
+    channels = _get_channels(queued_alerts, config)
+    active = [c for c in channels if c.queue]
+    results = {}
+
+    start = time.time()
+    if active:
+        workers = _get_int(config.get('main', {}), 'dispatch_workers', DEFAULT_WORKERS)
+        drainers = _interleave_drainers(active)
+        with ThreadPoolExecutor(
+            max_workers=max(len(active), min(workers, len(drainers))),
+            thread_name_prefix='dispatch',
+        ) as executor:
+            for _ in executor.map(lambda channel: _drain(channel, results), drainers):
+                pass
+
+    _report(channels, time.time() - start)
+    return results
+
+
+def _get_channels(queued_alerts, config):
+    """Groups queued alerts into channels by alert sender. Channels that are
+    blacklisted or backing off are returned with an empty queue.
+    """
+    grouped = defaultdict(list)
+    for queued_alert in queued_alerts:
+        grouped[queued_alert.subscription.alert_address.type_id].append(queued_alert)
+
+    senders = AlertSender.objects.in_bulk(list(grouped))
+    channels = []
+    for sender_id, items in grouped.items():
+        sender = senders.get(sender_id)
+        if not sender:
+            # AccountAlertQueue.send() reports the inconsistency for us
+            sender = AlertSender(id=sender_id, name=str(sender_id), handler='')
+        channel = _get_channel(sender, config)
+        channel.stats = DispatchStats()
+        channel.blacklisted = bool(sender.blacklisted_reason)
+        if channel.blacklisted or channel.is_backing_off():
+            _logger.info(
+                "%s: %s, deferring %d notifications",
+                channel.name,
+                "blacklisted" if channel.blacklisted else "backing off",
+                len(items),
+            )
+            channel.stats.add_deferred(len(items))
+        else:
+            channel.queue = deque(items)
+        channels.append(channel)
+    return channels
+
+
+def _get_channel(sender, config):
+    """Returns the channel of a sender, reusing its backoff state from earlier
+    runs.
+    """
+    options = config.get(sender.handler.lower(), {})
+    channel = Channel(
+        sender,
+        concurrency=_get_int(options, 'concurrency', DEFAULT_CONCURRENCY),
+        rate=_get_float(options, 'rate', DEFAULT_RATE),
+    )
+    previous = _channels.get(sender.id)
+    if previous:
+        channel.failures = previous.failures
+        channel.backoff_until = previous.backoff_until
+    _channels[sender.id] = channel
+    return channel
+
+
+def _interleave_drainers(channels):
+    """Returns a list of channels to start draining, such that every channel
+    gets its first drainer before any channel gets its second.
+    """
+    drainers = []
+    for round_ in range(max(c.concurrency for c in channels)):
+        drainers.extend(
+            c for c in channels if round_ < min(c.concurrency, len(c.queue))
+        )
+    return drainers
+
+
+def _drain(channel, results):
+    """Sends notifications from a channel until it is empty, backing off or
+    blacklisted. Runs in a worker thread.
+    """
+    try:
+        while not channel.blacklisted and not channel.is_backing_off():
+            queued_alert = channel.next_item()
+            if queued_alert is None:
+                break
+            if channel.limiter:
+                channel.limiter.wait()
+            # the id is reset if the notification is removed from its queue
+            queued_alert_id = queued_alert.id
+            results[queued_alert_id] = _send(channel, queued_alert)
+        else:
+            channel.defer_remaining()
+    finally:
+        _close_dispatcher(channel)
+        connection.close()
+
+
+def _send(channel, queued_alert):
+    queued_alert_id = queued_alert.id
+    start = time.time()
+    try:
+        sent = queued_alert.send()
+    except Exception:  # pylint: disable=broad-except
+        _logger.exception(
+            "%s: unhandled error while sending queued alert %s",
+            channel.name,
+            queued_alert_id,
+        )
+        sent = False
+    channel.stats.add(sent, time.time() - start)
+
+    if sent:
+        channel.register_success()
+    elif _is_blacklisted(queued_alert):
+        _logger.warning("%s: sender was blacklisted, stopping dispatch", channel.name)
+        channel.blacklisted = True
+    elif queued_alert.pk is not None:
+        # Fatal errors remove the notification from its queue, while temporary
+        # failures leave it there to be retried later
+        channel.register_failure()
+    return sent
+
+
+def _is_blacklisted(queued_alert):
+    try:
+        return bool(queued_alert.subscription.alert_address.type.blacklisted_reason)
+    except Exception:  # pylint: disable=broad-except
+        return False
+
+
+def _close_dispatcher(channel):
+    if not channel.sender.handler:
+        return
+    try:
+        channel.sender.get_dispatcher().close()
+    except Exception:  # pylint: disable=broad-except
+        _logger.debug("%s: could not close dispatcher", channel.name, exc_info=True)
+
+
+def _report(channels, elapsed):
+    timestamp = time.time()
+    metrics = []
+    for channel in channels:
+        stats = channel.stats
+        _logger.info(
+            "%s: sent %d, failed %d, deferred %d notifications in %.2f seconds",
+            channel.name,
+            stats.sent,
+            stats.failed,
+            stats.deferred,
+            elapsed,
+        )
+        prefix = metric_prefix_for_alertengine_dispatcher(channel.name)
+        metrics.extend(stats.get_metrics(prefix, elapsed, timestamp))
+    try:
+        send_metrics(metrics)
+    except Exception:  # pylint: disable=broad-except
+        _logger.exception("could not send dispatch metrics")
+
+
+def _get_int(options, name, default):
+    try:
+        return int(options.get(name, default))
+    except ValueError:
+        _logger.warning("invalid value for %s: %r", name, options.get(name))
+        return default
+
+
+def _get_float(options, name, default):
+    try:
+        return float(options.get(name, default))
+    except ValueError:
+        _logger.warning("invalid value for %s: %r", name, options.get(name))
+        return default
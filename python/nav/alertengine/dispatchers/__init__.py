@@ -22,6 +22,10 @@ a new subclass of ``dispatcher'' overriding send with the following:
 address - the alertaddress object that is "sending" the alert
   alert - the alertqueue object that we want to send out an notification about
 
+Dispatchers are shared between the threads that send alerts concurrently. A
+dispatcher that keeps connections open between alerts should keep them per
+thread, and close them when `close()` is called.
+
 The address to send to is `address.address`. To get the message we want to send
 simply call `alert.messages.get(language=language, type='your_message_type')`
 
@@ -56,6 +60,12 @@ class Dispatcher(object):
         """
         raise NotImplementedError
 
+    def close(self):
+        """Closes any connections kept open by the current thread for sending
+        several alerts.
+        """
+        pass
+
     def get_message(self, alert, language, message_type):
         """Gets the message to be sent"""
         try:
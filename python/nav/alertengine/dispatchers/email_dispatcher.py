@@ -18,8 +18,9 @@
 
 import logging
 from smtplib import SMTPException, SMTPRecipientsRefused
+import threading
 
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
 
 from nav.alertengine.dispatchers import (
     Dispatcher,
@@ -34,6 +35,10 @@ _logger = logging.getLogger('nav.alertengine.dispatchers.email')
 class Email(Dispatcher):
     """E-Mail dispatcher"""
 
+    def __init__(self, *args, **kwargs):
+        super(Email, self).__init__(*args, **kwargs)
+        self._local = threading.local()
+
     def send(self, address, alert, language='en'):
         message = self.get_message(alert, language, 'email')
 
@@ -56,7 +61,11 @@ class Email(Dispatcher):
         try:
             if not address.DEBUG_MODE:
                 email = EmailMessage(
-                    subject=subject, body=message, to=[address.address], headers=headers
+                    subject=subject,
+                    body=message,
+                    to=[address.address],
+                    headers=headers,
+                    connection=self._get_connection(),
                 )
                 email.send(fail_silently=False)
             else:
@@ -67,6 +76,8 @@ class Email(Dispatcher):
                 )
 
         except SMTPException as err:
+            # The SMTP session may be unusable after an error
+            self.close()
             msg = 'Could not send email: %s" ' % err
             if isinstance(err, SMTPRecipientsRefused) or (
                 hasattr(err, "smtp_code") and str(err.smtp_code).startswith('5')
@@ -76,6 +87,24 @@ class Email(Dispatcher):
             # Reraise as DispatcherException so that we can catch it further up
             raise DispatcherException(msg)
 
+    def _get_connection(self):
+        """Returns this thread's SMTP connection, opening it if necessary"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = get_connection(fail_silently=False)
+            connection.open()
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            try:
+                connection.close()
+            except SMTPException:
+                pass
+
     @staticmethod
     def is_valid_address(address):
         return is_valid_email(address)
@@ -17,17 +17,19 @@
 """A sender for slack messages"""
 
 import json
+import threading
 import time
 
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError
+import requests
 
 from nav.alertengine.dispatchers import Dispatcher, DispatcherException
 
 HTTP_TOO_MANY_REQUESTS = 429
 FAILURE_BACKOFF = 25  # seconds
+DEFAULT_TIMEOUT = 10  # seconds
+FALSE_VALUES = ('false', 'no', 'off', '0')
 
 
 class Slack(Dispatcher):
@@ -42,7 +44,10 @@ class Slack(Dispatcher):
         self.username = self.config.get('username')
         self.channel = self.config.get('channel')
         self.emoji = self.config.get('emoji')
-        self.verify = self.config.get('verify', True)
+        verify = str(self.config.get('verify', True)).lower()
+        self.verify = verify not in FALSE_VALUES
+        self.timeout = float(self.config.get('timeout', DEFAULT_TIMEOUT))
+        self._local = threading.local()
 
     def send(self, address, alert, language='en'):
         """Send a message to Slack"""
@@ -60,28 +65,52 @@ class Slack(Dispatcher):
         payload = json.dumps(params)
         if isinstance(payload, str):
             payload = payload.encode("utf-8")
-        request = Request(
-            address.address, payload, {'Content-Type': 'application/json'}
-        )
 
         try:
-            urlopen(request)
-        except HTTPError as error:
-            if error.code == HTTP_TOO_MANY_REQUESTS:
-                self._register_failure_for(address.address)
-                raise DispatcherException(
-                    "Slack complained there were too many requests; need to back off"
-                )
-            else:
-                raise
+            response = self._get_session().post(
+                address.address,
+                data=payload,
+                headers={'Content-Type': 'application/json'},
+                verify=self.verify,
+                timeout=self.timeout,
+            )
+        except requests.Timeout as error:
+            self._register_failure_for(address.address)
+            raise DispatcherException(
+                "Slack did not respond in time; need to back off: %s" % error
+            )
+        if response.status_code == HTTP_TOO_MANY_REQUESTS:
+            self._register_failure_for(address.address)
+            raise DispatcherException(
+                "Slack complained there were too many requests; need to back off"
+            )
+        response.raise_for_status()
+
+    def _get_session(self):
+        """Returns this thread's HTTP session, which keeps connections to the
+        webhook endpoints alive between alerts.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def close(self):
+        session = getattr(self._local, 'session', None)
+        self._local.session = None
+        if session is not None:
+            session.close()
 
     def _register_failure_for(self, address):
-        """Register address as an endpoint failing with TOO MANY REQUESTS errors"""
+        """Register address as an endpoint failing with TOO MANY REQUESTS errors
+        or timeouts
+        """
         self._failures[address] = time.time()
 
     def _is_still_backing_off_for(self, address):
         """Returns True if FAILURE_BACKOFF seconds still haven't passed since the
-        endpoint at address last returned a TOO MANY REQUESTS error.
+        endpoint at address last returned a TOO MANY REQUESTS error or timed
+        out.
         """
         time_passed = time.time() - self._failures.get(address, 0)
         return time_passed < FAILURE_BACKOFF
@@ -0,0 +1,502 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License version 3 as published by the Free
+# Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""In-memory evaluation of alert profile filters.
+
+:py:meth:`nav.models.profiles.Filter.verify` evaluates a filter by running an
+SQL query against the alert queue, which is expensive when every new alert must
+be checked against every filter of every subscription.
+
+This module compiles each filter once into a Python predicate, which is then
+evaluated against a snapshot of the alert's attributes. Only match fields that
+relate to an alert through single-valued relations (netbox, category, room,
+location, organization, type, vendor, event type, alert type and the alert
+itself) can be compiled, as can only operators whose SQL semantics can be
+faithfully reproduced. Any filter containing an expression that cannot be
+compiled is evaluated using its SQL query instead.
+
+"""
+import logging
+import re
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from IPy import IP
+
+from nav.models.event import AlertQueue
+from nav.models.manage import Location
+from nav.models.profiles import MatchField, Operator
+
+_logger = logging.getLogger(__name__)
+
+# Relations that should be selected along with new alerts to be able to build
+# snapshots without further database queries
+SNAPSHOT_RELATIONS = ('netbox__room', 'netbox__type', 'alert_type')
+
+_STRING_TYPES = ('CharField', 'TextField')
+_NUMBER_TYPES = (
+    'AutoField',
+    'BigAutoField',
+    'BigIntegerField',
+    'IntegerField',
+    'PositiveIntegerField',
+    'PositiveSmallIntegerField',
+    'SmallIntegerField',
+)
+_ORDERING_TESTS = {
+    Operator.GREATER: lambda value, other: value > other,
+    Operator.GREATER_EQ: lambda value, other: value >= other,
+    Operator.LESS: lambda value, other: value < other,
+    Operator.LESS_EQ: lambda value, other: value <= other,
+}
+
+
+class UncompilableFilter(Exception):
+    """Raised when a filter cannot be evaluated in memory"""
+
+
+class FilterEvaluator(object):
+    """Evaluates alert profile filters against alerts.
+
+    Each filter is compiled at most once per evaluator instance, and each alert
+    is only snapshotted once, so an evaluator should live for the duration of
+    a single alertengine run.
+
+    """
+
+    def __init__(self):
+        self._predicates = {}
+        self._snapshots = {}
+        self.compiled_checks = 0
+        self.sql_checks = 0
+
+    def verify(self, filtr, alert):
+        """Returns True if alert matches filtr.
+
+        :type filtr: nav.models.profiles.Filter
+        :type alert: nav.models.event.AlertQueue
+        """
+        if filtr.id not in self._predicates:
+            self._predicates[filtr.id] = self._compile(filtr)
+        predicate = self._predicates[filtr.id]
+
+        if predicate is None:
+            self.sql_checks += 1
+            return filtr.verify(alert)
+
+        self.compiled_checks += 1
+        matches = predicate(self.get_snapshot(alert))
+        _logger.debug(
+            'alert %d: %s filter %d',
+            alert.id,
+            'matches' if matches else 'did not match',
+            filtr.id,
+        )
+        return matches
+
+    @staticmethod
+    def _compile(filtr):
+        try:
+            return compile_filter(filtr)
+        except UncompilableFilter as error:
+            _logger.debug("filter %d will be evaluated using SQL: %s", filtr.id, error)
+            return None
+
+    def get_snapshot(self, alert):
+        """Returns a cached AlertSnapshot of alert"""
+        if alert.id not in self._snapshots:
+            self._snapshots[alert.id] = AlertSnapshot(alert)
+        return self._snapshots[alert.id]
+
+
+class AlertSnapshot(object):
+    """A cache of the match field values of a single alert"""
+
+    def __init__(self, alert):
+        self.alert = alert
+        self._values = {}
+
+    def get(self, value_id):
+        """Returns the value of the match field identified by value_id"""
+        if value_id not in self._values:
+            self._values[value_id] = _get_value(self.alert, value_id)
+        return self._values[value_id]
+
+
+def compile_filter(filtr):
+    """Compiles filtr into a predicate that takes an AlertSnapshot argument.
+
+    :raises UncompilableFilter: if any expression cannot be compiled
+    """
+    tests = [_compile_expression(expr) for expr in get_effective_expressions(filtr)]
+
+    def _predicate(snapshot):
+        return all(test(snapshot) for test in tests)
+
+    return _predicate
+
+
+def get_effective_expressions(filtr):
+    """Returns the expressions of filtr that take effect when it is verified.
+
+    Expressions are combined in the same way as Filter.verify() combines them
+    into an ORM query, including the fact that later expressions replace
+    earlier ones using the same ORM lookup.
+
+    :raises UncompilableFilter: if an expression cannot be mapped to a lookup
+    """
+    expressions = {}
+    for index, expression in enumerate(filtr.expressions.select_related('match_field')):
+        key = _get_expression_key(expression)
+        expressions[key if key else index] = expression
+    return list(expressions.values())
+
+
+def get_constraints(filtr):
+    """Returns a dict of simple conditions an alert must satisfy to be able to
+    match filtr.
+
+    Keys are match field value ids, values are either a frozenset of allowed
+    values or, for numeric ordering comparisons, a (lowest, highest) tuple of
+    inclusive bounds, where a None bound is open. Expressions that do not
+    translate into such conditions are ignored, so the result is a necessary,
+    but not a sufficient, condition for a match.
+    """
+    constraints = {}
+    try:
+        expressions = get_effective_expressions(filtr)
+    except UncompilableFilter:
+        return constraints
+
+    for expression in expressions:
+        try:
+            constraint = _get_constraint(expression)
+        except UncompilableFilter:
+            continue
+        if constraint:
+            value_id, allowed = constraint
+            constraints[value_id] = _intersect(constraints.get(value_id), allowed)
+    return constraints
+
+
+def _get_constraint(expression):
+    match_field = expression.match_field
+    value_id = match_field.value_id
+    operator = expression.operator
+    value = expression.value
+    if match_field.data_type == MatchField.IP:
+        return None
+    if match_field.name == 'Location':
+        return value_id, frozenset(_get_location_ids(value))
+
+    field = _get_target_field(value_id)
+    if operator == Operator.EQUALS:
+        return value_id, frozenset([_to_python(field, value)])
+    if operator == Operator.IN:
+        return value_id, frozenset(_to_python(field, v) for v in value.split('|'))
+    if operator in _ORDERING_TESTS and field.get_internal_type() in _NUMBER_TYPES:
+        bound = _to_python(field, value)
+        if operator == Operator.GREATER:
+            return value_id, (bound + 1, None)
+        if operator == Operator.GREATER_EQ:
+            return value_id, (bound, None)
+        if operator == Operator.LESS:
+            return value_id, (None, bound - 1)
+        return value_id, (None, bound)
+    return None
+
+
+def _intersect(first, second):
+    """Intersects two constraints on the same match field"""
+    if first is None:
+        return second
+    if isinstance(first, frozenset) and isinstance(second, frozenset):
+        return first & second
+    if isinstance(first, frozenset):
+        return frozenset(v for v in first if _within(v, second))
+    if isinstance(second, frozenset):
+        return frozenset(v for v in second if _within(v, first))
+    lowest = [b for b in (first[0], second[0]) if b is not None]
+    highest = [b for b in (first[1], second[1]) if b is not None]
+    return (
+        max(lowest) if lowest else None,
+        min(highest) if highest else None,
+    )
+
+
+def _within(value, bounds):
+    lowest, highest = bounds
+    return (lowest is None or value >= lowest) and (highest is None or value <= highest)
+
+
+def _get_expression_key(expression):
+    """Returns the ORM lookup Filter.verify() would translate expression into,
+    as a (method, lookup) tuple, or None if it would be a raw SQL clause.
+    """
+    match_field = expression.match_field
+    if match_field.data_type == MatchField.IP:
+        return None
+    if match_field.name == 'Location':
+        return 'filter', "{}__in".format(MatchField.FOREIGN_MAP[MatchField.LOCATION])
+    if expression.operator == Operator.WILDCARD:
+        return None
+
+    lookup = match_field.get_lookup_mapping()
+    if lookup is None:
+        raise UncompilableFilter("unsupported match field %s" % match_field.value_id)
+    lookup += Operator.OPERATOR_MAPPING[expression.operator]
+    if expression.operator == Operator.NOT_EQUAL:
+        return 'exclude', lookup
+    return 'filter', lookup
+
+
+def _compile_expression(expression):
+    """Compiles a single expression into a function that takes an
+    AlertSnapshot argument.
+    """
+    match_field = expression.match_field
+    value_id = match_field.value_id
+    field = _get_target_field(value_id)
+    operator = expression.operator
+    value = expression.value
+
+    if match_field.data_type == MatchField.IP:
+        return _compile_ip_test(value_id, operator, value)
+
+    if match_field.name == 'Location':
+        return _compile_location_test(value_id, value)
+
+    internal_type = field.get_internal_type()
+    if internal_type not in _STRING_TYPES + _NUMBER_TYPES:
+        raise UncompilableFilter("%s is a %s" % (value_id, internal_type))
+
+    if operator == Operator.WILDCARD:
+        if internal_type not in _STRING_TYPES:
+            raise UncompilableFilter("wildcard match on non-string %s" % value_id)
+        return _compile_wildcard_test(value_id, value, re.IGNORECASE)
+
+    if operator == Operator.NOT_EQUAL:
+        other = _to_python(field, value)
+        return _make_test(value_id, lambda actual: actual != other, default=True)
+
+    return _compile_plain_test(value_id, field, internal_type, operator, value)
+
+
+def _compile_plain_test(value_id, field, internal_type, operator, value):
+    if operator == Operator.EQUALS:
+        other = _to_python(field, value)
+        return _make_test(value_id, lambda actual: actual == other)
+
+    if operator == Operator.IN:
+        others = {_to_python(field, v) for v in value.split('|')}
+        return _make_test(value_id, lambda actual: actual in others)
+
+    if operator in _ORDERING_TESTS:
+        if internal_type not in _NUMBER_TYPES:
+            # string ordering depends on the database collation
+            raise UncompilableFilter("ordering comparison on string %s" % value_id)
+        other = _to_python(field, value)
+        compare = _ORDERING_TESTS[operator]
+        return _make_test(value_id, lambda actual: compare(actual, other))
+
+    if operator in (Operator.STARTSWITH, Operator.ENDSWITH, Operator.CONTAINS):
+        other = value.upper()
+        if operator == Operator.STARTSWITH:
+            return _make_test(
+                value_id, lambda actual: str(actual).upper().startswith(other)
+            )
+        if operator == Operator.ENDSWITH:
+            return _make_test(
+                value_id, lambda actual: str(actual).upper().endswith(other)
+            )
+        return _make_test(value_id, lambda actual: other in str(actual).upper())
+
+    if operator == Operator.REGEXP:
+        raise _uncompilable_regexp(value)
+
+    raise UncompilableFilter("unsupported operator %s" % operator)
+
+
+def _compile_location_test(value_id, value):
+    location_ids = _get_location_ids(value)
+    return _make_test(value_id, lambda actual: actual in location_ids)
+
+
+def _get_location_ids(value):
+    """Returns the ids of the locations listed in value and all their
+    descendants
+    """
+    locations = Location.objects.filter(pk__in=value.split('|'))
+    return {
+        descendant.pk
+        for location in locations
+        for descendant in location.get_descendants(include_self=True)
+    }
+
+
+def _compile_wildcard_test(value_id, pattern, flags=0):
+    regexp = _like_to_regexp(pattern, flags)
+    return _make_test(value_id, lambda actual: bool(regexp.match(str(actual))))
+
+
+def _compile_ip_test(value_id, operator, value):
+    """Compiles a test of an IP address field, mimicking the PostgreSQL inet
+    operators used by Filter.verify()
+    """
+    try:
+        if operator in (Operator.EQUALS, Operator.NOT_EQUAL):
+            other = IP(value)
+        elif operator in (Operator.IN, Operator.CONTAINS):
+            others = [IP(v, make_net=True) for v in value.split('|')]
+    except ValueError as error:
+        raise UncompilableFilter("invalid IP value %r: %s" % (value, error))
+
+    if operator == Operator.EQUALS:
+        return _make_ip_test(value_id, lambda actual: actual == other)
+    if operator == Operator.NOT_EQUAL:
+        return _make_ip_test(value_id, lambda actual: actual != other)
+    if operator == Operator.IN:
+        return _make_ip_test(
+            value_id, lambda actual: any(_ip_within(actual, net) for net in others)
+        )
+    if operator == Operator.CONTAINS:
+        return _make_ip_test(
+            value_id, lambda actual: any(_ip_within(net, actual) for net in others)
+        )
+    if operator == Operator.WILDCARD:
+        regexp = _like_to_regexp(value)
+        return _make_test(value_id, lambda actual: bool(regexp.match(_host(actual))))
+    if operator == Operator.REGEXP:
+        raise _uncompilable_regexp(value)
+
+    raise UncompilableFilter("unsupported IP operator %s" % operator)
+
+
+def _make_test(value_id, test, default=False):
+    """Makes a test of the value_id field of an AlertSnapshot. NULL values
+    never match, unless default says otherwise.
+    """
+
+    def _test(snapshot):
+        actual = snapshot.get(value_id)
+        if actual is None:
+            return default
+        return test(actual)
+
+    return _test
+
+
+def _make_ip_test(value_id, test):
+    def _test(actual):
+        return test(IP(actual))
+
+    return _make_test(value_id, _test)
+
+
+def _ip_within(address, network):
+    return address.version() == network.version() and address in network
+
+
+def _host(address):
+    return str(address).split('/')[0]
+
+
+def _to_python(field, value):
+    try:
+        return field.to_python(value)
+    except ValidationError as error:
+        raise UncompilableFilter(
+            "cannot convert %r for %s: %s" % (value, field.name, error)
+        )
+
+
+def _uncompilable_regexp(pattern):
+    # PostgreSQL's advanced regular expressions differ from Python's in ways
+    # that would silently change what a filter matches, e.g. [[:digit:]] is a
+    # character class in PostgreSQL, but a set of brackets and colons in Python
+    return UncompilableFilter("regexp %r must be evaluated by PostgreSQL" % pattern)
+
+
+def _like_to_regexp(pattern, flags=0):
+    """Translates an SQL LIKE pattern into an anchored regular expression"""
+    regexp = []
+    chars = iter(pattern)
+    for char in chars:
+        if char == '\\':
+            regexp.append(re.escape(next(chars, '\\')))
+        elif char == '%':
+            regexp.append('.*')
+        elif char == '_':
+            regexp.append('.')
+        else:
+            regexp.append(re.escape(char))
+    return re.compile(''.join(regexp) + r'\Z', flags | re.DOTALL)
+
+
+#
+# Resolving match field values from alerts
+#
+
+
+def _get_path(value_id):
+    """Returns the list of model fields leading from an alert to the model
+    that contains the value_id field.
+
+    :raises UncompilableFilter: if the path includes multi-valued relations
+    """
+    table = value_id.split('.')[0]
+    path = MatchField.FOREIGN_MAP.get(table)
+    if path is None or value_id not in MatchField.VALUE_MAP:
+        raise UncompilableFilter("unsupported match field %s" % value_id)
+
+    fields = []
+    model = AlertQueue
+    for name in path.split('__') if path else []:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise UncompilableFilter("%s cannot be resolved" % path)
+        if not (field.many_to_one or field.one_to_one) or not field.concrete:
+            raise UncompilableFilter("%s is a multi-valued relation" % path)
+        fields.append(field)
+        model = field.related_model
+    return fields, model
+
+
+def _get_target_field(value_id):
+    _fields, model = _get_path(value_id)
+    field = model._meta.get_field(MatchField.VALUE_MAP[value_id])
+    if field.is_relation:
+        field = field.target_field
+    return field
+
+
+def _get_value(alert, value_id):
+    """Returns the value of the value_id match field for an alert, following
+    the same relations as the ORM would.
+    """
+    fields, model = _get_path(value_id)
+    attname = MatchField.VALUE_MAP[value_id]
+
+    if fields and attname == model._meta.pk.attname:
+        # the foreign key column already holds the value we are looking for
+        *fields, last = fields
+        attname = last.attname
+
+    obj = alert
+    for field in fields:
+        obj = getattr(obj, field.name)
+        if obj is None:
+            return None
+    return getattr(obj, attname)
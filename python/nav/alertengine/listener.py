@@ -0,0 +1,108 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License version 3 as published by the Free
+# Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Waits for new alerts to be posted to the alert queue.
+
+The NAV schema includes a trigger that notifies `new_alert` whenever alerts are
+inserted into `alertq`. Alertengine listens for this notification on its
+PostgreSQL connection, so that it can process new alerts as soon as they have
+been posted, rather than waiting for its next scheduled queue check.
+
+"""
+import errno
+import logging
+import select
+import time
+
+from django.db import connection
+from psycopg2 import OperationalError
+
+_logger = logging.getLogger(__name__)
+
+NEW_ALERT_CHANNEL = 'new_alert'
+DEFAULT_DEBOUNCE = 0.5  # seconds
+
+
+class AlertQueueListener(object):
+    """Listens for new alert notifications from PostgreSQL"""
+
+    def __init__(self, debounce=DEFAULT_DEBOUNCE):
+        self.debounce = debounce
+        self._listening_on = None
+
+    def listen(self):
+        """Ensures that we subscribe to new alert notifications on the current
+        PostgreSQL connection.
+        """
+        if connection.connection and connection.connection is self._listening_on:
+            return
+        _logger.debug("registering alert queue listener with PostgreSQL")
+        with connection.cursor() as cursor:
+            cursor.execute('LISTEN %s' % NEW_ALERT_CHANNEL)
+        self._listening_on = connection.connection
+
+    def wait(self, timeout):
+        """Waits up to timeout seconds for new alerts to be posted.
+
+        Once a notification arrives, waits a further `debounce` seconds for
+        more notifications, so that a storm of new alerts is processed in one
+        go.
+
+        :returns: True if new alerts were posted, False if the wait timed out.
+        """
+        self.listen()
+        conn = connection.connection
+        if self._receive(conn, 0):
+            # alerts were posted while the previous queue check was running
+            return True
+
+        if not self._receive(conn, timeout):
+            return False
+
+        deadline = time.time() + self.debounce
+        while time.time() < deadline:
+            self._receive(conn, deadline - time.time())
+        return True
+
+    def _receive(self, conn, timeout):
+        """Waits up to timeout seconds for notifications on conn, and returns
+        the number of new alert notifications received.
+        """
+        if conn is not self._listening_on:
+            # the connection was lost, the next queue check will reconnect
+            time.sleep(max(timeout, 0))
+            return 0
+
+        if not conn.notifies:
+            try:
+                select.select([conn], [], [], max(timeout, 0))
+            except OSError as err:
+                if err.args[0] != errno.EINTR:
+                    raise
+            try:
+                conn.poll()
+            except OperationalError:
+                _logger.warning("lost connection while waiting for new alerts")
+                connection.connection = None
+                self._listening_on = None
+                return 0
+
+        count = sum(
+            1 for notify in conn.notifies if notify.channel == NEW_ALERT_CHANNEL
+        )
+        del conn.notifies[:]
+        if count:
+            _logger.debug("got %d new alert notification(s) from database", count)
+        return count
@@ -0,0 +1,292 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License version 3 as published by the Free
+# Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""An index of alert subscriptions, keyed by simple alert attributes.
+
+Checking every new alert against every subscription of every account is
+expensive, even though most alerts are only interesting to a handful of
+subscriptions. The :py:class:`SubscriptionIndex` maps cheap discriminators,
+such as an alert's event type, alert type, category, location or severity, to
+the filters that could possibly match an alert, and thereby to the
+subscriptions that need to be checked.
+
+Building the index requires a fair amount of database queries, so it is only
+rebuilt when the alert profile configuration has changed.
+
+"""
+from collections import defaultdict, namedtuple
+import logging
+
+from django.db import connection
+
+from nav.alertengine.filters import get_constraints
+from nav.models.manage import Location
+from nav.models.profiles import (
+    Account,
+    AccountGroup,
+    AlertPreference,
+    AlertProfile,
+    AlertSubscription,
+    Expression,
+    Filter,
+    FilterGroup,
+    FilterGroupContent,
+    MatchField,
+    TimePeriod,
+)
+
+_logger = logging.getLogger(__name__)
+
+# Match fields that are preferred as index keys, in order of preference
+DISCRIMINATORS = (
+    'eventtype.eventtypeid',
+    'alerttype.alerttype',
+    'cat.catid',
+    'location.locationid',
+)
+
+_index = None
+_fingerprint = None
+
+AccountSubscriptions = namedtuple(
+    'AccountSubscriptions', 'account profile time_periods subscriptions permissions'
+)
+Subscription = namedtuple('Subscription', 'subscription contents triggers')
+
+
+def get_subscription_index():
+    """Returns an up-to-date SubscriptionIndex, rebuilding it only if the alert
+    profile configuration has changed since it was last built.
+    """
+    global _index, _fingerprint
+    fingerprint = get_configuration_fingerprint()
+    if _index is None or fingerprint != _fingerprint:
+        _logger.debug("alert profile configuration changed, rebuilding index")
+        _index = SubscriptionIndex.build()
+        _fingerprint = fingerprint
+    return _index
+
+
+def get_configuration_fingerprint():
+    """Returns a value that changes whenever any of the tables that make up the
+    alert profile configuration are modified.
+
+    Any insert or update of a row assigns it a new transaction id (xmin), while
+    deletes change the number of rows, so the row count and the newest
+    transaction id of each table is sufficient to detect changes.
+    """
+    tables = [model._meta.db_table for model in _get_configuration_models()]
+    query = " UNION ALL ".join(
+        "SELECT '{0}', COUNT(*), MAX(xmin::text::bigint) FROM {0}".format(table)
+        for table in tables
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        return tuple(sorted(cursor.fetchall()))
+
+
+def _get_configuration_models():
+    return (
+        AlertPreference,
+        AlertProfile,
+        TimePeriod,
+        AlertSubscription,
+        FilterGroup,
+        FilterGroupContent,
+        Filter,
+        Expression,
+        MatchField,
+        Location,
+        FilterGroup.group_permissions.through,
+        AccountGroup.accounts.through,
+    )
+
+
+def subscription_sort_key(subscription):
+    """Return a key to sort alertsubscriptions in a prioritized order."""
+    sort_order = [
+        AlertSubscription.NOW,
+        AlertSubscription.NEXT,
+        AlertSubscription.DAILY,
+        AlertSubscription.WEEKLY,
+    ]
+    try:
+        return sort_order.index(subscription.type)
+    except ValueError:
+        return subscription.type
+
+
+class SubscriptionIndex(object):
+    """Maps alert attributes to the subscriptions that could match them"""
+
+    def __init__(self):
+        self.accounts = []
+        self._dimensions = set()
+        self._filters_by_value = defaultdict(set)
+        self._filters_by_range = []
+        self._unindexed_filters = set()
+        self._indexed_filters = set()
+
+    @classmethod
+    def build(cls):
+        """Builds an index of all subscriptions of accounts with an active alert
+        profile.
+        """
+        index = cls()
+        contents_cache = {}
+
+        def _get_contents(filter_group):
+            if filter_group.id not in contents_cache:
+                contents = tuple(
+                    filter_group.filter_group_contents.select_related('filter')
+                )
+                for content in contents:
+                    index.add_filter(content.filter)
+                contents_cache[filter_group.id] = contents
+            return contents_cache[filter_group.id]
+
+        accounts = Account.objects.filter(
+            alert_preference__active_profile__isnull=False
+        ).select_related('alert_preference__active_profile')
+        for account in accounts:
+            profile = account.get_active_profile()
+            time_periods = list(profile.time_periods.all())
+
+            subscriptions = {}
+            for time_period in time_periods:
+                alertsubscriptions = sorted(
+                    time_period.alert_subscriptions.select_related('filter_group'),
+                    key=subscription_sort_key,
+                )
+                subscriptions[time_period.id] = [
+                    Subscription(
+                        subscription,
+                        _get_contents(subscription.filter_group),
+                        get_triggers(_get_contents(subscription.filter_group)),
+                    )
+                    for subscription in alertsubscriptions
+                ]
+            if not any(subscriptions.values()):
+                continue
+
+            permissions = tuple(
+                _get_contents(filter_group)
+                for filter_group in FilterGroup.objects.filter(
+                    group_permissions__accounts__in=[account]
+                )
+            )
+            index.accounts.append(
+                AccountSubscriptions(
+                    account, profile, time_periods, subscriptions, permissions
+                )
+            )
+
+        _logger.info(
+            "indexed %d accounts with subscriptions, %d of %d filters are "
+            "indexed by alert attributes",
+            len(index.accounts),
+            len(index._indexed_filters),
+            len(index._indexed_filters) + len(index._unindexed_filters),
+        )
+        return index
+
+    def add_filter(self, filtr):
+        """Indexes filtr by the most discriminating of its constraints"""
+        if filtr.id in self._indexed_filters or filtr.id in self._unindexed_filters:
+            return
+
+        constraints = get_constraints(filtr)
+        value_sets = {
+            value_id: allowed
+            for value_id, allowed in constraints.items()
+            if isinstance(allowed, frozenset)
+        }
+        preferred = [v for v in DISCRIMINATORS if v in value_sets]
+        others = sorted(
+            (v for v in value_sets if v not in DISCRIMINATORS),
+            key=lambda v: len(value_sets[v]),
+        )
+        ranges = [v for v in constraints if v not in value_sets]
+
+        if preferred or others:
+            value_id = (preferred + others)[0]
+            self._dimensions.add(value_id)
+            for value in value_sets[value_id]:
+                self._filters_by_value[(value_id, value)].add(filtr.id)
+        elif ranges:
+            value_id = ranges[0]
+            lowest, highest = constraints[value_id]
+            self._filters_by_range.append((value_id, lowest, highest, filtr.id))
+        else:
+            self._unindexed_filters.add(filtr.id)
+            return
+        self._indexed_filters.add(filtr.id)
+
+    def get_candidate_filters(self, snapshot):
+        """Returns the ids of all filters that could match the alert of
+        snapshot.
+
+        :type snapshot: nav.alertengine.filters.AlertSnapshot
+        """
+        candidates = set(self._unindexed_filters)
+        for value_id in self._dimensions:
+            key = (value_id, snapshot.get(value_id))
+            candidates.update(self._filters_by_value.get(key, ()))
+        for value_id, lowest, highest, filter_id in self._filters_by_range:
+            value = snapshot.get(value_id)
+            if (
+                value is not None
+                and (lowest is None or value >= lowest)
+                and (highest is None or value <= highest)
+            ):
+                candidates.add(filter_id)
+        return candidates
+
+    def get_active_subscriptions(self, now=None):
+        """Returns a list of (account, subscriptions, permissions) tuples for
+        the currently active time period of each indexed account.
+        """
+        result = []
+        for entry in self.accounts:
+            time_period = entry.profile.get_active_timeperiod(
+                timeperiods=entry.time_periods, now=now
+            )
+            if time_period and entry.subscriptions.get(time_period.id):
+                result.append(
+                    (
+                        entry.account,
+                        entry.subscriptions[time_period.id],
+                        entry.permissions,
+                    )
+                )
+        return result
+
+
+def get_triggers(contents):
+    """Returns the ids of the filters that can cause an alert to match a filter
+    group with the given contents, or None if the group may match alerts that
+    do not match any of its filters.
+
+    Only inclusive contents can make a filter group match. Negated inclusive
+    contents match anything their filter does not match, so they cannot be
+    narrowed down.
+    """
+    triggers = set()
+    for content in contents:
+        if content.include:
+            if not content.positive:
+                return None
+            triggers.add(content.filter_id)
+    return frozenset(triggers)
@@ -18,8 +18,9 @@
 """
 The NAV Alert Engine daemon (alertengine)
 
-This background process polls the alert queue for new alerts from the
-eventengine and sends put alerts to users based on user defined profiles.
+This background process waits for new alerts from the eventengine to be posted
+to the alert queue and sends put alerts to users based on user defined
+profiles.
 """
 
 
@@ -51,6 +52,7 @@ import nav.db
 # These have to be imported after the envrionment is setup
 from django.db import DatabaseError, connection
 from nav.alertengine.base import check_alerts, clear_blacklisted_status_of_alert_senders
+from nav.alertengine.listener import AlertQueueListener
 from nav.config import NAV_CONFIG
 
 #
@@ -74,6 +76,7 @@ def main():
     defaults = {
         'username': nav.config.NAV_CONFIG['NAV_USER'],
         'delay': '30',
+        'debounce': '0.5',
         'mailwarnlevel': 'ERROR',
         'mailserver': 'localhost',
         'mailaddr': nav.config.NAV_CONFIG['ADMIN_MAIL'],
@@ -86,6 +89,7 @@ def main():
     # Set variables based on config
     username = config['main']['username']
     delay = int(config['main']['delay'])
+    debounce = float(config['main']['debounce'])
     mailwarnlevel = config['main']['mailwarnlevel']
     if mailwarnlevel.isdigit():
         mailwarnlevel = int(mailwarnlevel)
@@ -140,6 +144,7 @@ def main():
     signal.signal(signal.SIGINT, signalhandler)
 
     clear_blacklisted_status_of_alert_senders()
+    listener = AlertQueueListener(debounce=debounce)
 
     # Loop forever
     _logger.info('Starting alertengine loop.')
@@ -172,9 +177,14 @@ def main():
         if args.test:
             break
         else:
-            # Sleep a bit before the next run
-            _logger.debug('Sleeping for %d seconds.', delay)
-            time.sleep(delay)
+            # Sleep until new alerts are posted, or at most delay seconds, as
+            # daily, weekly and time period dispatches are due without notice
+            _logger.debug('Waiting up to %d seconds for new alerts.', delay)
+            try:
+                listener.wait(delay)
+            except DatabaseError as err:
+                _logger.error('Database error while waiting for alerts: %s', err)
+                time.sleep(delay)
 
     # Exit nicely
     sys.exit(0)
@@ -189,9 +199,9 @@ def parse_args():
     """Parses command line arguments using argparse"""
     parser = argparse.ArgumentParser(
         description="The NAV Alert Engine daemon",
-        epilog="This background process polls the alert queue for new alerts "
-        "from the event engine and sends notifications to users based "
-        "on user defined profiles.",
+        epilog="This background process waits for new alerts from the event "
+        "engine to be posted to the alert queue and sends notifications to "
+        "users based on user defined profiles.",
     )
     parser.add_argument(
         "-t",
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- testargs: -h -*-
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Refreshes NAV's local index of Graphite metric names"""
+
+import argparse
+import logging
+import sys
+
+from nav.logs import init_generic_logging
+from nav.metrics.errors import GraphiteUnreachableError
+from nav.metrics.index import get_index_filename, refresh_index
+
+_logger = logging.getLogger('nav.navmetricindex')
+LOGFILE = 'navmetricindex.log'
+
+
+def main():
+    """Main program"""
+    args = make_argparser().parse_args()
+    init_generic_logging(logfile=LOGFILE, stderr=False, read_config=True)
+    filename = args.file or get_index_filename()
+    try:
+        count = refresh_index(filename)
+    except GraphiteUnreachableError as error:
+        _logger.error("Could not get metric names from graphite-web: %s", error)
+        sys.exit(1)
+    except OSError as error:
+        _logger.error("Could not write metric index %s: %s", filename, error)
+        sys.exit(1)
+    _logger.info("Indexed %d metric names in %s", count, filename)
+
+
+def make_argparser():
+    """Makes this program's argument parser"""
+    parser = argparse.ArgumentParser(
+        description="Downloads the names of all metrics from graphite-web, "
+        "and stores them in NAV's local metric name index"
+    )
+    parser.add_argument(
+        "-f",
+        "--file",
+        help="write the index to FILE instead of the configured location",
+    )
+    return parser
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,7 @@
 """The NAV SMS daemon"""
 
 import argparse
+from datetime import datetime
 import logging
 import logging.handlers
 import os
@@ -34,6 +35,11 @@ import nav.config
 import nav.daemon
 import nav.logs
 import nav.smsd.navdbqueue
+from nav.metrics.carbon import send_metrics
+from nav.metrics.templates import (
+    metric_prefix_for_smsd,
+    metric_prefix_for_smsd_dispatcher,
+)
 from nav.smsd.dispatcher import DispatcherError, PermanentDispatcherError
 from nav.config import getconfig, NAV_CONFIG
 from nav.bootstrap import bootstrap_django
@@ -225,50 +231,62 @@ def main():
     while True:
         _logger.debug("Starting loop.")
 
-        # Queue: Get users with unsent messages
-        users = queue.getusers('N')
-
-        _logger.info("Found %d user(s) with unsent messages.", len(users))
-
-        # Loop over cell numbers
-        for user in users:
-            # Queue: Get unsent messages for a user ordered by severity desc
-            msgs = queue.getusermsgs(user, 'N')
-            _logger.info("Found %d unsent message(s) for %s.", len(msgs), user)
-
-            # Dispatcher: Format and send SMS
-            try:
-                (sms, sent, ignored, smsid) = dh.sendsms(user, msgs)
-            except PermanentDispatcherError as error:
-                _logger.critical("Sending failed permanently. Exiting. (%s)", error)
-                sys.exit(1)
-            except DispatcherError as error:
-                try:
-                    # Dispatching failed. Backing off.
-                    backoff(delay, error, retryvars)
-
-                    break  # End this run
-                except:
-                    _logger.exception("")
-                    raise
-            except Exception as error:
-                _logger.exception("Unknown exception: %s", error)
-
+        # Queue: Get unsent messages for all users, ordered by severity desc
+        usermsgs, queued = queue.getallusermsgs('N')
+
+        _logger.info("Found %d user(s) with unsent messages.", len(usermsgs))
+
+        # Dispatcher: Format and send SMS to all users concurrently
+        results = dh.sendmany(usermsgs)
+
+        statuses = []
+        errors = []
+        latencies = []
+        permanent_error = None
+        now = datetime.now()
+        for user, result in results.items():
+            if isinstance(result, PermanentDispatcherError):
+                permanent_error = result
+                errors.append(result)
+                continue
+            if isinstance(result, DispatcherError):
+                _logger.warning("Failed to send SMS to %s. (%s)", user, result)
+                errors.append(result)
+                continue
+
+            (sms, sent, ignored, smsid) = result
             _logger.info("SMS sent to %s.", user)
-
-            if failed:
-                resetdelay()
-                failed = 0
-                _logger.debug("Resetting delay and number of failed runs.")
-
-            for msgid in sent:
-                queue.setsentstatus(msgid, 'Y', smsid)
-            for msgid in ignored:
-                queue.setsentstatus(msgid, 'I', smsid)
+            statuses.extend((msgid, 'Y', smsid) for msgid in sent)
+            statuses.extend((msgid, 'I', smsid) for msgid in ignored)
+            latencies.extend((now - queued[msgid]).total_seconds() for msgid in sent)
             _logger.info(
                 "%d messages were sent and %d ignored.", len(sent), len(ignored)
             )
 
+        # Queue: Mark all sent and ignored messages in one go
+        queue.setsentstatuses(statuses)
+        report_metrics(dh, len(results) - len(errors), len(errors), latencies)
+
+        # Only exit once the messages that were sent have been marked as such,
+        # or they would be sent again after a restart
+        if permanent_error:
+            _logger.critical(
+                "Sending failed permanently. Exiting. (%s)", permanent_error
+            )
+            sys.exit(1)
+
+        if errors and len(errors) == len(results):
+            try:
+                # Dispatching failed for everyone. Backing off.
+                backoff(delay, errors[0], retryvars)
+            except:
+                _logger.exception("")
+                raise
+        elif results and failed:
+            resetdelay()
+            failed = 0
+            _logger.debug("Resetting delay and number of failed runs.")
+
         # Sleep a bit before the next run
         _logger.debug("Sleeping for %d seconds.", delay)
         time.sleep(delay)
@@ -372,6 +390,47 @@ def increasedelay(seconds, delayfactor, maxdelay):
         setdelay(maxdelay)
 
 
+def report_metrics(dh, sent, failed, latencies):
+    """Sends delivery statistics for the last run to Graphite.
+
+    :param dh: The DispatcherHandler used to send SMS in the last run.
+    :param sent: The number of users an SMS was sent to.
+    :param failed: The number of users an SMS could not be sent to.
+    :param latencies: The number of seconds each sent message spent in the
+                      queue before it was sent.
+
+    """
+    timestamp = time.time()
+    prefix = metric_prefix_for_smsd()
+    metrics = [
+        (prefix + '.sent', (timestamp, sent)),
+        (prefix + '.failed', (timestamp, failed)),
+    ]
+    if latencies:
+        metrics.extend(
+            [
+                (
+                    prefix + '.latency.avg',
+                    (timestamp, sum(latencies) / len(latencies)),
+                ),
+                (prefix + '.latency.max', (timestamp, max(latencies))),
+            ]
+        )
+    for name, (dsent, dfailed, dtime) in dh.pop_stats().items():
+        dprefix = metric_prefix_for_smsd_dispatcher(name)
+        metrics.extend(
+            [
+                (dprefix + '.sent', (timestamp, dsent)),
+                (dprefix + '.failed', (timestamp, dfailed)),
+                (dprefix + '.time', (timestamp, dtime)),
+            ]
+        )
+    try:
+        send_metrics(metrics)
+    except Exception:  # pylint: disable=broad-except
+        _logger.exception("Could not send smsd metrics")
+
+
 def backoff(seconds, error, retryvars):
     """Delay next loop if dispatching SMS fails."""
 
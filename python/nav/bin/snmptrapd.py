@@ -31,10 +31,12 @@ from functools import reduce
 from nav import daemon
 from nav.config import NAV_CONFIG, NAVConfigParser
 import nav.buildconf
+from nav.snmptrapd.agentcache import get_agent_cache, DEFAULT_MAX_AGE
 from nav.snmptrapd.plugin import load_handler_modules, ModuleLoadError
+from nav.snmptrapd.pool import TrapHandlerPool, DEFAULT_WORKERS, DEFAULT_QUEUE_SIZE
 from nav.snmptrapd.trap import SNMPTrap
 from nav.util import is_valid_ip, address_to_string
-from nav.db import getConnection
+from nav.db import getConnection, use_thread_local_connections
 from nav.bootstrap import bootstrap_django
 import nav.logs
 
@@ -70,6 +72,10 @@ def main():
     global config
     config = SnmptrapdConfig()
 
+    get_agent_cache().max_age = config.getint(
+        'snmptrapd', 'agent_cache_max_age', fallback=DEFAULT_MAX_AGE
+    )
+
     # Create parser and define options
     opts = parse_args()
 
@@ -114,6 +120,17 @@ def main():
         _logger.error("Could not load handlermodules %s" % why)
         sys.exit(1)
 
+    # Traps are handled by a pool of worker threads, each running its own
+    # database transactions
+    use_thread_local_connections()
+    pool = TrapHandlerPool(
+        trap_handler,
+        workers=config.getint('snmptrapd', 'workers', fallback=DEFAULT_WORKERS),
+        queue_size=config.getint(
+            'snmptrapd', 'queue_size', fallback=DEFAULT_QUEUE_SIZE
+        ),
+    )
+
     addresses_text = ", ".join(address_to_string(*addr) for addr in opts.address)
     if not opts.foreground:
         # Daemonize and listen for traps
@@ -141,22 +158,28 @@ def main():
         signal.signal(signal.SIGTERM, signal_handler)
 
         _logger.info("Snmptrapd started, listening on %s", addresses_text)
+        pool.start()
         try:
-            server.listen(opts.community, trap_handler)
+            server.listen(opts.community, pool.submit)
         except SystemExit:
             raise
         except Exception as why:
             _logger.critical("Fatal exception ocurred", exc_info=True)
+        finally:
+            pool.stop()
 
     else:
         daemon.writepidfile(pidfile)
         # Start listening and exit cleanly if interrupted.
         try:
             _logger.info("Listening on %s", addresses_text)
-            server.listen(opts.community, trap_handler)
+            pool.start()
+            server.listen(opts.community, pool.submit)
         except KeyboardInterrupt as why:
             _logger.error("Received keyboard interrupt, exiting.")
             server.close()
+        finally:
+            pool.stop()
 
 
 def parse_args():
@@ -200,11 +223,13 @@ def trap_handler(trap):
     """Handles a trap.
 
     :type trap: SNMPTrap
+    :returns: The number of handler modules that failed to handle the trap.
 
     """
     _traplogger.debug("%s", trap)
     connection = getConnection('default')
     handled_by = []
+    errors = 0
 
     for mod in handlermodules:
         _logger.debug("Offering trap (%s) to %s", id(trap), mod)
@@ -225,12 +250,14 @@ def trap_handler(trap):
                 mod.__name__,
                 why,
             )
+            errors += 1
         # Assuming that the handler used the same connection as this
         # function, we rollback any uncommitted changes.  This is to
         # avoid idling in transactions.
         connection.rollback()
 
     _log_trap_handle_result(handled_by, trap)
+    return errors
 
 
 def _log_trap_handle_result(handled_by, trap):
@@ -2,12 +2,16 @@
 # -*- testargs: hour -*-
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
+import time
 
 from nav.bootstrap import bootstrap_django
 
 bootstrap_django(__file__)
 
+from django.db import connection
+
 from nav.logs import init_generic_logging
 from nav.web.sortedstats import TIMEFRAMES
 from nav.web.sortedstats.views import collect_result
@@ -15,28 +19,62 @@ from nav.web.sortedstats.config import SortedStatsConfig
 from nav.daemon import justme, writepidfile, DaemonError
 
 LOGFILE = "sortedstats_cacher.log"
+DEFAULT_WORKERS = 4
 _logger = logging.getLogger('nav.sortedstats_cacher')
 
 
 def main():
     init_generic_logging(logfile=LOGFILE, stderr=False, read_config=True)
-    timeframe = get_parser().parse_args().timeframe
+    args = get_parser().parse_args()
+    timeframe = args.timeframe
     pidfile = f"sortedstats_cacher_{timeframe}.pid"
     exit_if_running(pidfile)
     writepidfile(pidfile)
     config = SortedStatsConfig()
-    run(timeframe, config)
+    run(timeframe, config, args.workers)
 
 
-def run(timeframe, config):
+def run(timeframe, config, workers=DEFAULT_WORKERS):
+    """Collects the results of all reports of a timeframe concurrently, caching
+    each result as soon as it is collected.
+    """
     _logger.info("Running for timeframe %s", timeframe)
+    started = time.time()
     reports = config.get_reports(timeframe)
-    for report_name, report in reports.items():
-        _logger.info(f"Collecting results for report {report_name}")
-        try:
-            collect_result(report['view'], report['timeframe'], report['rows'])
-        except (PermissionError, ValueError, KeyError) as error:
-            _logger.error(f"Error collecting results for report {report_name}: {error}")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(collect_report, report_name, report): report_name
+            for report_name, report in reports.items()
+        }
+        for future in as_completed(futures):
+            report_name = futures[future]
+            try:
+                result = future.result()
+            except (PermissionError, ValueError, KeyError) as error:
+                _logger.error(
+                    f"Error collecting results for report {report_name}: {error}"
+                )
+            else:
+                _logger.info(
+                    f"Collected results for report {report_name} in "
+                    f"{result.collect_duration:.2f} seconds"
+                )
+    _logger.info(
+        "Collected %d reports for timeframe %s in %.2f seconds",
+        len(reports),
+        timeframe,
+        time.time() - started,
+    )
+
+
+def collect_report(report_name, report):
+    """Collects and caches the result of a single report"""
+    _logger.debug(f"Collecting results for report {report_name}")
+    try:
+        return collect_result(report['view'], report['timeframe'], report['rows'])
+    finally:
+        # each thread has its own database connection
+        connection.close()
 
 
 def get_parser():
@@ -47,6 +85,14 @@ def get_parser():
         help='The timeframe to collect stats for',
         choices=timeframe_choices,
     )
+    parser.add_argument(
+        '-j',
+        '--workers',
+        type=int,
+        default=DEFAULT_WORKERS,
+        help='The maximum number of reports to collect concurrently '
+        '(default: %(default)s)',
+    )
     return parser
 
 
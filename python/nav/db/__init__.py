@@ -22,6 +22,7 @@ from functools import wraps
 import logging
 import os
 import sys
+import threading
 import time
 
 import psycopg2
@@ -32,6 +33,9 @@ from nav import config
 
 _logger = logging.getLogger('nav.db')
 _connection_cache = nav.ObjectCache()
+_thread_caches = None
+_other_caches = []
+_other_caches_lock = threading.Lock()
 driver = psycopg2
 
 
@@ -163,12 +167,13 @@ def getConnection(scriptName, database='nav'):
         scriptName, database
     )
     cache_key = (dbname, user)
+    connection_cache = _get_connection_cache()
 
     # First, invalidate any dead connections.  Return a connection
     # object from the cache if one exists, open a new one if not.
-    _connection_cache.invalidate()
+    connection_cache.invalidate()
     try:
-        connection = _connection_cache[cache_key].object
+        connection = connection_cache[cache_key].object
     except KeyError:
         connection = psycopg2.connect(
             get_connection_string((dbhost, port, dbname, user, password))
@@ -183,23 +188,54 @@ def getConnection(scriptName, database='nav'):
         connection.set_isolation_level(1)
         connection.set_client_encoding('utf8')
         conn_object = ConnectionObject(connection, cache_key)
-        _connection_cache.cache(conn_object)
+        connection_cache.cache(conn_object)
 
     return connection
 
 
+def use_thread_local_connections():
+    """Makes getConnection() return connections that are private to the calling
+    thread, for any thread other than the main thread.
+
+    By default, all threads share the same cached connections, and thereby also
+    the same transactions. Multi-threaded programs whose threads run their own
+    transactions through getConnection() should call this before starting any
+    threads.
+    """
+    global _thread_caches
+    if _thread_caches is None:
+        _thread_caches = threading.local()
+
+
+def _get_connection_cache():
+    """Returns the connection cache to use in the calling thread"""
+    if _thread_caches is None or threading.current_thread() is threading.main_thread():
+        return _connection_cache
+    cache = getattr(_thread_caches, 'cache', None)
+    if cache is None:
+        cache = _thread_caches.cache = nav.ObjectCache()
+        with _other_caches_lock:
+            _other_caches.append(cache)
+    return cache
+
+
 def closeConnections():
     """Close all cached database connections"""
-    for connection in _connection_cache.values():
-        try:
-            connection.object.close()
-        except psycopg2.InterfaceError:
-            pass
+    with _other_caches_lock:
+        caches = [_connection_cache] + _other_caches
+    for cache in caches:
+        for connection in list(cache.values()):
+            try:
+                connection.object.close()
+            except psycopg2.InterfaceError:
+                pass
 
 
 def commit_all_connections():
-    """Attempts to commit the current transactions on all cached connections"""
-    conns = (v.object for v in _connection_cache.values())
+    """Attempts to commit the current transactions on all cached connections
+    of the calling thread
+    """
+    conns = (v.object for v in _get_connection_cache().values())
     for conn in conns:
         conn.commit()
 
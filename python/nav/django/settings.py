@@ -165,7 +165,8 @@ SHORT_DATETIME_FORMAT = '%s %s' % (DATE_FORMAT, SHORT_TIME_FORMAT)
 TIME_ZONE = NAV_CONFIG.get('TIME_ZONE', 'Europe/Oslo')
 DOMAIN_SUFFIX = NAV_CONFIG.get('DOMAIN_SUFFIX', None)
 
-# Cache backend. Used for report subsystem in NAV 3.5 and sorted statistics.
+# Cache backend. Used for report subsystem in NAV 3.5, sorted statistics and
+# metric queries to Graphite.
 # FIXME: Make this configurable in nav.conf (or possibly webfront.conf)
 CACHES = {
     'default': {
@@ -178,6 +179,16 @@ CACHES = {
         'LOCATION': '/tmp/nav_cache',
         'TIMEOUT': '900',
     },
+    # Every distinct metric query gets its own entry, so these are kept apart
+    # from the other caches, which would otherwise be culled along with them
+    'metrics': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/tmp/nav_metrics_cache',
+        'TIMEOUT': '60',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
 }
 
 SECRET_KEY = NAV_CONFIG.get('SECRET_KEY', 'Very bad default value!')
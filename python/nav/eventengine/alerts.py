@@ -20,7 +20,7 @@ import os
 from pprint import pformat
 import re
 
-from django.template import loader
+from django.template import engines, loader
 
 from nav.models.event import AlertQueue as Alert, EventQueue as Event, AlertType
 from nav.models.event import AlertHistory
@@ -186,6 +186,7 @@ class AlertGenerator(dict):
         history = self.make_alert_history()
         if history:
             history.save()
+            unresolved.refresh(history)
             self._post_alert_messages(history)
         return history
 
@@ -253,6 +254,79 @@ def ensure_alert_templates_are_available():
             config['DIRS'] += (ALERT_TEMPLATE_DIR,)
 
 
+class TemplateRegistry(object):
+    """An index of the alert message templates available in a directory, and a
+    cache of their compiled forms.
+
+    Directory listings and compiled templates are kept until the modification
+    time of the listed directory or the template file changes.
+
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._indexes = {}
+        self._templates = {}
+
+    def get_list_of_templates_for(self, event_type, alert_type="default"):
+        """Returns a list of TemplateDetails objects for the available alert
+        message templates for the given event_type and alert_type.
+
+        """
+        return list(self._get_index(event_type).get(alert_type, ()))
+
+    def _get_index(self, event_type):
+        if not self.directory:
+            return {}
+        directory = os.path.join(self.directory, event_type)
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            return {}
+
+        cached = self._indexes.get(event_type)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        index = {}
+        for name in os.listdir(directory):
+            match = TEMPLATE_PATTERN.search(name)
+            if match:
+                details = TemplateDetails(
+                    os.path.join(event_type, name),
+                    match.group('msgtype'),
+                    match.group('language') or DEFAULT_LANGUAGE,
+                )
+                index.setdefault(match.group('alert_type'), []).append(details)
+        self._indexes[event_type] = (mtime, index)
+        return index
+
+    def get_template(self, name):
+        """Returns a compiled template for the named template file"""
+        path = os.path.join(self.directory, name) if self.directory else None
+        try:
+            mtime = os.stat(path).st_mtime if path else None
+        except OSError:
+            mtime = None
+        ensure_alert_templates_are_available()
+        if mtime is None:
+            # not one of ours, let Django search its template directories
+            return loader.get_template(name)
+
+        cached = self._templates.get(name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        _template_logger.debug("compiling alert message template %s", path)
+        with open(path, encoding="utf-8") as source:
+            template = engines['django'].from_string(source.read())
+        self._templates[name] = (mtime, template)
+        return template
+
+
+_registry = TemplateRegistry(ALERT_TEMPLATE_DIR)
+
+
 def render_templates(alert):
     """Renders and returns message template based on the parameters of `alert`.
 
@@ -260,7 +334,6 @@ def render_templates(alert):
     :return: A list of (TemplateDetails, <rendered_unicode>) tuples
 
     """
-    ensure_alert_templates_are_available()
     templates = get_list_of_templates_for(
         alert.event_type.id, alert.alert_type
     ) or get_list_of_templates_for(alert.event_type.id)
@@ -276,12 +349,12 @@ def render_templates(alert):
     return [_render_template(template, alert) for template in templates]
 
 
-def _render_template(details, alert):
-    template = loader.get_template(details.name)
+def _render_template(details, alert, registry=None):
+    template = (registry or _registry).get_template(details.name)
     context = dict(alert)
     context.update(vars(alert))
     context.update(dict(msgtype=details.msgtype, language=details.language))
-    context.update(dict(context_dump=pformat(context)))
+    context.update(dict(context_dump=_ContextDump(dict(context))))
 
     _template_logger.debug(
         "rendering alert template with context:\n%s", context['context_dump']
@@ -291,32 +364,25 @@ def _render_template(details, alert):
     return details, output
 
 
+class _ContextDump(object):
+    """A pretty-printed dump of a template context, which is only built if
+    and when it is actually used in a template or log message.
+
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+    def __str__(self):
+        return pformat(self.context)
+
+
 def get_list_of_templates_for(event_type, alert_type="default"):
     """Returns a list of TemplateDetails objects for the available alert
     message templates for the given event_type and alert_type.
 
     """
-
-    def _matcher(name):
-        match = TEMPLATE_PATTERN.search(name)
-        if match and match.group('alert_type') == alert_type:
-            return match
-
-    directory = os.path.join(ALERT_TEMPLATE_DIR, event_type)
-    if os.path.isdir(directory):
-        matches = [
-            (_matcher(name), os.path.join(event_type, name))
-            for name in os.listdir(directory)
-        ]
-    else:
-        matches = []
-    return [
-        TemplateDetails(
-            name, match.group('msgtype'), match.group('language') or DEFAULT_LANGUAGE
-        )
-        for match, name in matches
-        if match
-    ]
+    return _registry.get_list_of_templates_for(event_type, alert_type)
 
 
 # pylint sucks on namedtuples
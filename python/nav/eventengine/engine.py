@@ -16,10 +16,13 @@
 """The actual "engine" part of the NAV eventEngine
 
 Will check the eventq ever so often, but will also react to notifications from
-PostgreSQL. To add notification of new events posted to eventq, the following
-SQL is needed::
+PostgreSQL. The NAV schema includes a trigger that notifies `new_event` with the
+id of every event inserted into eventq, which lets the engine ignore
+notifications about events it has already seen.
 
-    CREATE RULE eventq_notify AS ON INSERT TO eventq DO ALSO NOTIFY new_event;
+Events are loaded from the queue in bounded batches, in order of increasing id,
+and each batch is committed separately. Events held for later processing by
+plugins are kept in memory and are not re-read from the queue.
 
 """
 import logging
@@ -37,6 +40,7 @@ from nav.eventengine.plugin import EventHandler
 from nav.eventengine.alerts import AlertGenerator
 from nav.eventengine.config import EVENTENGINE_CONF
 from nav.eventengine import unresolved
+from nav.eventengine import topology
 from nav.eventengine.severity import SeverityRules
 from nav.models.event import EventQueue as Event
 import nav.db
@@ -87,12 +91,19 @@ class EventEngine(object):
     # too often, since we rely on PostgreSQL notification when new events are
     # inserted into the queue.
     CHECK_INTERVAL = 30
+    # interval for full reloads of unresolved alert states from the database.
+    # eventengine maintains its map of unresolved alerts as it processes
+    # events, this only picks up changes made by other parties.
+    UNRESOLVED_REFRESH_INTERVAL = 60
+    # max number of events to load and process in a single transaction
+    BATCH_SIZE = 500
     PLUGIN_TASKS_PRIORITY = 1
     _logger = logging.getLogger(__name__)
 
     def __init__(self, target="eventEngine", config=EVENTENGINE_CONF):
         self._scheduler = sched.scheduler(time.time, self._notifysleep)
         self._unfinished = set()
+        self._last_event_id = 0
         self.target = target
         self.config = config
         self.handlers = EventHandler.load_and_find_subclasses()
@@ -124,19 +135,45 @@ class EventEngine(object):
                 self._listen()
                 return
             if conn.notifies:
-                self._logger.debug("got event notification from database")
-                self._schedule_next_queuecheck()
+                self._handle_notifications(conn.notifies)
                 del conn.notifies[:]
         else:
             self._logger.debug("regular sleep for %ss", delay)
             time.sleep(delay)
 
+    def _handle_notifications(self, notifies):
+        events = [n for n in notifies if n.channel == 'new_event']
+        if len(events) < len(notifies):
+            self._logger.debug("got topology change notification from database")
+            topology.invalidate_vlan_graphs()
+        if events:
+            self._logger.debug(
+                "got %d event notification(s) from database", len(events)
+            )
+            if self._refers_to_unseen_events(events):
+                self._schedule_next_queuecheck()
+
+    def _refers_to_unseen_events(self, notifies):
+        """Returns True if any of the notifications in notifies may refer to an
+        event that hasn't been loaded from the queue yet.
+        """
+        for notify in notifies:
+            try:
+                event_id = int(notify.payload)
+            except ValueError:
+                # notification without an event id, we cannot tell
+                return True
+            if event_id > self._last_event_id:
+                return True
+        return False
+
     def start(self):
         "Starts the event engine"
         self._logger.info("--- starting event engine ---")
         self._load_severity_rules()
         self._start_export_script()
         self._listen()
+        self._update_unresolved_and_reschedule()
         self._load_new_events_and_reschedule()
         self._scheduler.run()
         self._logger.debug("scheduler exited")
@@ -161,15 +198,31 @@ class EventEngine(object):
     @retry_on_db_loss()
     @transaction.atomic()
     def _listen():
-        """Ensures that we subscribe to new_event notifications on our
-        PostgreSQL connection.
+        """Ensures that we subscribe to new_event and topology change
+        notifications on our PostgreSQL connection.
 
         """
         _logger.debug("registering event listener with PostgreSQL")
         cursor = connection.cursor()
         cursor.execute('LISTEN new_event')
+        cursor.execute('LISTEN %s' % topology.TOPOLOGY_CHANGED_CHANNEL)
+
+    @swallow_unhandled_exceptions
+    @retry_on_db_loss()
+    def _update_unresolved(self):
+        unresolved.update()
+
+    def _update_unresolved_and_reschedule(self):
+        self._update_unresolved()
+        self._scheduler.enter(
+            self.UNRESOLVED_REFRESH_INTERVAL,
+            0,
+            self._update_unresolved_and_reschedule,
+            (),
+        )
 
     def _load_new_events_and_reschedule(self):
+        self.load_missed_events()
         self.load_new_events()
         self._schedule_next_queuecheck(
             self.CHECK_INTERVAL, action=self._load_new_events_and_reschedule
@@ -182,33 +235,83 @@ class EventEngine(object):
         self._scheduler.enter(delay, 0, action, ())
 
     @swallow_unhandled_exceptions
-    @transaction.atomic()
     def load_new_events(self):
-        "Loads and processes new events on the queue, if any"
+        "Loads and processes new events on the queue, if any, in batches"
         self._logger.debug("checking for new events on queue")
-        events = Event.objects.filter(target=self.target).order_by('id')
-        if events:
-            old_events = [event for event in events if event.id in self._unfinished]
-            new_events = [event for event in events if event.id not in self._unfinished]
-            self._logger.info(
-                "found %d new and %d old events in queue db",
-                len(new_events),
-                len(old_events),
+        while True:
+            events = self._get_event_batch(
+                Event.objects.filter(target=self.target, id__gt=self._last_event_id)
             )
-            for event in new_events:
-                unresolved.update()
-                try:
-                    self.handle_event(event)
-                except Exception:
-                    self._logger.exception(
-                        "Unhandled exception while " "handling %s, deleting event",
-                        event,
-                    )
-                    if event.id:
-                        event.delete()
+            if events:
+                self._last_event_id = events[-1].id
+                self._handle_event_batch(events)
+            if len(events) < self.BATCH_SIZE:
+                break
 
         self._log_task_queue()
 
+    @swallow_unhandled_exceptions
+    def load_missed_events(self):
+        """Loads and processes events that have ids lower than the highest id
+        seen so far, but which are neither processed nor held for later
+        processing.
+
+        This may happen when events are committed to the queue out of id
+        order by concurrent transactions.
+        """
+        self._forget_disposed_events()
+        events = self._get_event_batch(
+            Event.objects.filter(
+                target=self.target, id__lte=self._last_event_id
+            ).exclude(id__in=self._unfinished)
+        )
+        if events:
+            self._logger.info("found %d missed events in queue db", len(events))
+            self._handle_event_batch(events)
+
+    def _forget_disposed_events(self):
+        """Removes ids of held events that have since been disposed of by their
+        plugins from the set of unfinished events.
+        """
+        if self._unfinished:
+            self._unfinished.intersection_update(
+                Event.objects.filter(id__in=self._unfinished).values_list(
+                    'id', flat=True
+                )
+            )
+
+    def _get_event_batch(self, queryset):
+        return list(queryset.order_by('id')[: self.BATCH_SIZE])
+
+    @transaction.atomic()
+    def _handle_event_batch(self, events):
+        """Handles a batch of events inside a single transaction"""
+        self._logger.info(
+            "handling %d events from queue db (%d held for later processing)",
+            len(events),
+            len(self._unfinished),
+        )
+        start = time.time()
+        for event in events:
+            try:
+                self.handle_event(event)
+            except Exception:
+                self._logger.exception(
+                    "Unhandled exception while " "handling %s, deleting event",
+                    event,
+                )
+                # changes to alert states may have been rolled back
+                unresolved.update()
+                if event.id:
+                    event.delete()
+        elapsed = time.time() - start
+        self._logger.info(
+            "handled %d events in %.3fs (%.1f events/s)",
+            len(events),
+            elapsed,
+            len(events) / elapsed if elapsed else float(len(events)),
+        )
+
     def _log_task_queue(self):
         _logger = logging.getLogger(__name__ + '.queue')
         _logger.debug("about to log task queue: %d", len(self._scheduler.queue))
@@ -218,7 +321,11 @@ class EventEngine(object):
         modified_queue = [
             e
             for e in self._scheduler.queue
-            if e.action != self._load_new_events_and_reschedule
+            if e.action
+            not in (
+                self._load_new_events_and_reschedule,
+                self._update_unresolved_and_reschedule,
+            )
         ]
         if modified_queue:
             logtime = time.time()
@@ -256,10 +363,7 @@ class EventEngine(object):
         """Returns True if the event's associated netbox is currently on
         maintenance.
         """
-        return (
-            event.netbox
-            and event.netbox.get_unresolved_alerts('maintenanceState').count() > 0
-        )
+        return bool(event.netbox_id) and unresolved.is_on_maintenance(event.netbox_id)
 
     @transaction.atomic()
     def handle_event(self, event):
@@ -18,6 +18,8 @@
 import os
 import logging
 
+from nav.eventengine import unresolved
+
 
 class UnsupportedEvent(ValueError):
     "Event of unsupported type was passed to a handler"
@@ -76,7 +78,7 @@ class EventHandler(object):
     def _box_is_on_maintenance(self):
         """Returns True if the target netbox is currently on maintenance"""
 
-        return self.event.netbox.get_unresolved_alerts('maintenanceState').count() > 0
+        return unresolved.is_on_maintenance(self.event.netbox_id)
 
 
 def _load_all_modules_in_package(package_name):
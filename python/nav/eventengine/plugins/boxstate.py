@@ -16,6 +16,7 @@
 """"boxState event plugin"""
 from nav.eventengine.alerts import AlertGenerator
 from nav.eventengine.plugins import delayedstate
+from nav.eventengine.topology import forget_reachability
 from nav.models.manage import Netbox
 
 
@@ -40,6 +41,8 @@ class BoxStateHandler(delayedstate.DelayedStateHandler):
 
     def _set_internal_state(self, state):
         netbox = self.get_target()
+        if (netbox.up == Netbox.UP_UP) != (state == Netbox.UP_UP):
+            forget_reachability()
         netbox.up = state
         Netbox.objects.filter(id=netbox.id).update(up=state)
 
@@ -16,7 +16,10 @@
 """"Superclass for plugins that use delayed handling of state events"""
 from nav.eventengine import unresolved
 
-from nav.eventengine.topology import netbox_appears_reachable
+from nav.eventengine.topology import (
+    netbox_appears_reachable_among,
+    forget_reachability,
+)
 from nav.models.manage import Netbox
 from nav.eventengine.plugin import EventHandler
 
@@ -222,12 +225,24 @@ class DelayedStateHandler(EventHandler):
 
     def _verify_shadow(self):
         netbox = self.event.netbox
-        netbox.up = (
-            Netbox.UP_DOWN if netbox_appears_reachable(netbox) else Netbox.UP_SHADOW
-        )
+        was_up = netbox.up == Netbox.UP_UP
+        reachable = netbox_appears_reachable_among(netbox, self._get_waiting_netboxes())
+        netbox.up = Netbox.UP_DOWN if reachable else Netbox.UP_SHADOW
         Netbox.objects.filter(id=netbox.id).update(up=netbox.up)
+        if was_up:
+            forget_reachability()
         return netbox.up == Netbox.UP_SHADOW
 
+    def _get_waiting_netboxes(self):
+        """Returns the netboxes targeted by all plugin instances of this type
+        that are currently waiting for resolve events.
+        """
+        return [
+            target
+            for plugin_type, target in self.__waiting_for_resolve
+            if plugin_type is type(self) and isinstance(target, Netbox)
+        ]
+
     def schedule(self, delay, action, args=()):
         "Schedules a callback and makes a note of it in a class variable"
         self.task = self.engine.schedule(delay, action, args=args)
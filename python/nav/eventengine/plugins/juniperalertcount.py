@@ -70,6 +70,7 @@ class JuniperAlertCountHandler(EventHandler):
 
             unresolved_alert.end_time = event.time
             unresolved_alert.save()
+            unresolved.refresh(unresolved_alert)
 
         alert.post()
         event.delete()
@@ -13,10 +13,17 @@
 # details.  You should have received a copy of the GNU General Public License
 # along with NAV. If not, see <http://www.gnu.org/licenses/>.
 #
-"""Topology evaluation functions for event processing"""
+"""Topology evaluation functions for event processing
+
+VLAN topology graphs are cached between reachability checks, since hundreds of
+boxes on the same VLAN may go down at the same time (e.g. during a building
+outage). The cache is invalidated when navtopology notifies that it has
+updated the topology, or when its entries expire.
+"""
 import logging
 import socket
 import datetime
+import time
 
 import networkx
 from networkx.exception import NetworkXException
@@ -24,6 +31,13 @@ from nav.models.manage import SwPortVlan, Netbox, Prefix, Arp, Cam
 
 _logger = logging.getLogger(__name__)
 
+# The PostgreSQL notification channel used by navtopology to signal updates
+TOPOLOGY_CHANGED_CHANNEL = 'topology_changed'
+# Max number of seconds to keep a cached VLAN graph
+VLAN_GRAPH_CACHE_TTL = 900
+_vlan_graph_cache = {}
+_reachability_verdicts = {}
+
 
 def netbox_appears_reachable(netbox):
     """Returns True if netbox appears to be reachable through the known
@@ -40,6 +54,123 @@ def netbox_appears_reachable(netbox):
     return bool(target_path and nav_path)
 
 
+def netbox_appears_reachable_among(netbox, pending):
+    """Returns True if netbox appears to be reachable through the known
+    topology.
+
+    The reachability of all the pending netboxes is decided in the same pass,
+    and cached until :py:func:`forget_reachability` is called, so that
+    subsequent calls for any of them are answered without a new topology
+    traversal.
+
+    :param pending: Netboxes whose reachability is likely to be asked for
+                    shortly.
+    """
+    if netbox not in _reachability_verdicts:
+        _reachability_verdicts.clear()
+        _reachability_verdicts.update(
+            netboxes_appear_reachable(set(pending) | {netbox})
+        )
+    return _reachability_verdicts[netbox]
+
+
+def forget_reachability():
+    """Forgets all cached reachability verdicts.
+
+    Should be called whenever the up state of any netbox changes.
+    """
+    _reachability_verdicts.clear()
+
+
+def netboxes_appear_reachable(netboxes):
+    """Decides whether each of a list of netboxes appears to be reachable
+    through the known topology.
+
+    Netboxes are grouped by VLAN and router, and the reachability of every
+    netbox in a group is decided from a single traversal of the VLAN graph.
+
+    :returns: A dict mapping each netbox to a boolean value.
+
+    """
+    result = {}
+    groups = {}
+    for netbox in netboxes:
+        prefix = netbox.get_prefix()
+        router_ports = prefix.get_router_ports() if prefix else None
+        if not router_ports:
+            # insufficient information, let get_path_to_netbox() log why
+            result[netbox] = netbox_appears_reachable(netbox)
+            continue
+        router = router_ports[0].interface.netbox
+        groups.setdefault((prefix.vlan, router), []).append(netbox)
+
+    nav_paths = {}
+    for (vlan, router), members in groups.items():
+        paths = get_paths_to_netboxes(vlan, router, members)
+        for netbox in members:
+            nav = NAVServer.make_for(netbox.ip)
+            if nav and nav.ip not in nav_paths:
+                nav_paths[nav.ip] = get_path_to_netbox(nav)
+            nav_path = nav_paths[nav.ip] if nav else True
+            result[netbox] = bool(paths[netbox] and nav_path)
+    return result
+
+
+def get_paths_to_netboxes(vlan, router, netboxes):
+    """Decides whether a likely path exists from each of a list of netboxes to
+    their common router on vlan, using a single traversal of the VLAN graph.
+
+    The semantics for each netbox are the same as for
+    :py:func:`get_path_to_netbox`, except that the returned values are only
+    meaningful as booleans.
+
+    :returns: A dict mapping each netbox to a boolean value.
+
+    """
+    graph = get_graph_for_vlan(vlan)
+    result = {}
+    connected = (
+        networkx.node_connected_component(graph, router) if router in graph else set()
+    )
+    for netbox in netboxes:
+        if netbox not in connected:
+            _logger.warning(
+                "cannot find a path between %s and %s on VLAN %s",
+                netbox,
+                router,
+                vlan,
+            )
+            result[netbox] = True
+
+    neighbors = {
+        netbox: set(graph.neighbors(netbox)) for netbox in netboxes if netbox in graph
+    }
+    strip_down_nodes_from_graph(graph)
+    if router not in graph:
+        if router.up == router.UP_UP:
+            _logger.warning(
+                "topology problem: router %s is up, but not in VLAN graph for "
+                "%s. Defaulting to 'reachable' status.",
+                router,
+                vlan,
+            )
+        reachable = set()
+    else:
+        reachable = networkx.node_connected_component(graph, router)
+
+    for netbox in netboxes:
+        if netbox in result:
+            continue
+        if router not in graph:
+            result[netbox] = router.up == router.UP_UP
+        else:
+            result[netbox] = netbox in reachable or bool(
+                neighbors.get(netbox, set()) & reachable
+            )
+        _logger.debug("%s reachable through %s: %s", netbox, router, result[netbox])
+    return result
+
+
 def get_path_to_netbox(netbox):
     """Returns a likely path from netbox to its apparent gateway/router.
 
@@ -122,12 +253,48 @@ def _path_exists(graph, source, target):
 
 
 def get_graph_for_vlan(vlan):
-    """Builds a simple topology graph of the active netboxes in vlan.
+    """Returns a topology graph of the netboxes in vlan.
+
+    The graph is served from a cache if possible. The returned graph is a copy
+    that can be freely modified, and the up states of its netboxes are current.
+
+    :returns: A networkx.MultiGraph object.
+
+    """
+    key = getattr(vlan, 'pk', vlan)
+    cached = _vlan_graph_cache.get(key)
+    if cached and time.time() - cached[0] < VLAN_GRAPH_CACHE_TTL:
+        graph = cached[1]
+    else:
+        graph = build_graph_for_vlan(vlan)
+        _vlan_graph_cache[key] = (time.time(), graph)
+
+    graph = graph.copy()
+    _update_netbox_states(graph)
+    return graph
+
+
+def invalidate_vlan_graphs():
+    """Empties the VLAN graph cache, and forgets any reachability verdicts
+    based on the cached graphs.
+    """
+    _logger.debug("invalidating %d cached VLAN graphs", len(_vlan_graph_cache))
+    _vlan_graph_cache.clear()
+    forget_reachability()
+
+
+def _update_netbox_states(graph):
+    """Refreshes the up states of all netboxes in graph from the database"""
+    nodes = {node.pk: node for node in graph.nodes()}
+    states = Netbox.objects.filter(pk__in=nodes).values_list('pk', 'up')
+    for pk, state in states:
+        nodes[pk].up = state
+
 
-    Any netbox that seems to be down at the moment will not be included in
-    the graph.
+def build_graph_for_vlan(vlan):
+    """Builds a simple topology graph of the netboxes in vlan.
 
-    :returns: A networkx.Graph object.
+    :returns: A networkx.MultiGraph object.
 
     """
     swpvlan = SwPortVlan.objects.filter(vlan=vlan).select_related(
@@ -13,7 +13,19 @@
 # details.  You should have received a copy of the GNU General Public License
 # along with NAV. If not, see <http://www.gnu.org/licenses/>.
 #
-"""Loading and caching of unresolved alert states from the database"""
+"""Loading and caching of unresolved alert states from the database.
+
+The map of unresolved alert states is loaded in full from the database at
+startup, and is subsequently maintained incrementally as eventengine itself
+opens and resolves alert states (see :py:func:`refresh`). Alert states may
+also be resolved by other parties (e.g. by a user through the web UI), so the
+full map should be periodically reconciled with the database by calling
+:py:func:`update`.
+
+A secondary index of the subjects that are currently on maintenance (i.e. have
+unresolved maintenanceState alerts) is maintained alongside the map, so that
+maintenance checks can be answered without querying the database.
+"""
 
 import logging
 
@@ -22,6 +34,9 @@ from nav.models.fields import INFINITY
 
 _logger = logging.getLogger(__name__)
 _unresolved_alerts_map = {}
+# maps netbox ids to the set of subids that have unresolved maintenanceState alerts
+_maintenance_index = {}
+MAINTENANCE_STATE = 'maintenanceState'
 
 
 def get_map():
@@ -33,9 +48,68 @@ def update():
     """Updates the map of unresolved alerts from the database"""
     # yes mr. pylint, we use global state, this module acts as a singleton
     # pylint: disable=W0603
-    global _unresolved_alerts_map
+    global _unresolved_alerts_map, _maintenance_index
     unresolved = AlertHistory.objects.filter(end_time__gte=INFINITY)
     _unresolved_alerts_map = dict((alert.get_key(), alert) for alert in unresolved)
+    _maintenance_index = {}
+    for key in _unresolved_alerts_map:
+        _index_maintenance(key)
+    _logger.debug(
+        "loaded %d unresolved alerts, %d netboxes on maintenance",
+        len(_unresolved_alerts_map),
+        len(_maintenance_index),
+    )
+
+
+def refresh(alert):
+    """Updates the map in place to reflect the current state of a single
+    AlertHistory entry.
+
+    This should be called every time an AlertHistory entry is saved by
+    eventengine, to avoid having to reload the entire map from the database.
+
+    :type alert: nav.models.event.AlertHistory
+    """
+    key = alert.get_key()
+    if alert.is_open():
+        _unresolved_alerts_map[key] = alert
+        _index_maintenance(key)
+    else:
+        existing = _unresolved_alerts_map.get(key)
+        if existing is not None and existing.id == alert.id:
+            del _unresolved_alerts_map[key]
+            _unindex_maintenance(key)
+
+
+def _index_maintenance(key):
+    netbox_id, subid, event_type_id = key
+    if event_type_id == MAINTENANCE_STATE:
+        _maintenance_index.setdefault(netbox_id, set()).add(subid)
+
+
+def _unindex_maintenance(key):
+    netbox_id, subid, event_type_id = key
+    if event_type_id == MAINTENANCE_STATE and netbox_id in _maintenance_index:
+        subids = _maintenance_index[netbox_id]
+        subids.discard(subid)
+        if not subids:
+            del _maintenance_index[netbox_id]
+
+
+def is_on_maintenance(netbox_id, subid=None):
+    """Verifies whether a netbox, or one of its services, appears to be on
+    maintenance.
+
+    :param netbox_id: A netbox primary key.
+    :param subid: If None, the netbox is considered to be on maintenance if it
+                  or any of its services are on maintenance. Otherwise, only
+                  a maintenance state for this specific subid (e.g. a service
+                  id) is considered.
+    """
+    subids = _maintenance_index.get(netbox_id)
+    if not subids:
+        return False
+    return subid is None or str(subid) in subids
 
 
 def refers_to_unresolved_alert(event):
@@ -34,6 +34,8 @@ class IpdevpollConfig(NAVConfigParser):
 [ipdevpoll]
 logfile = ipdevpolld.log
 max_concurrent_jobs = 500
+metric_flush_interval = 500
+metric_flush_size = 64
 
 [netbox_filters]
 groups_included=
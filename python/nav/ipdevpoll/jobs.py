@@ -29,7 +29,7 @@ from twisted.internet.error import TimeoutError
 from nav.ipdevpoll import ContextLogger
 from nav.ipdevpoll.snmp import snmpprotocol, AgentProxy
 from nav.ipdevpoll.snmp.common import SnmpError
-from nav.metrics.carbon import send_metrics
+from nav.ipdevpoll.metricbuffer import buffer_metrics
 from nav.metrics.templates import metric_prefix_for_ipdevpoll_job
 from nav.models import manage
 from nav.util import splitby
@@ -568,7 +568,7 @@ class JobHandler(object):
             prefix = metric_prefix_for_ipdevpoll_job(self.netbox.sysname, self.name)
             runtime_path = prefix + ".runtime"
             runtime = (runtime_path, (timestamp, duration_in_seconds))
-            send_metrics([runtime])
+            buffer_metrics([runtime])
 
         _log_to_graphite()
         try:
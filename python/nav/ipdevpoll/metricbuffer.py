@@ -0,0 +1,137 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""A per-process buffer of metrics destined for Carbon.
+
+Instead of having every job send its own burst of packets to Carbon, the
+metrics of all jobs running in an ipdevpoll process are collected in a single
+buffer, which is flushed at regular intervals, or as soon as it has grown
+large enough. Metrics are formatted as soon as they are added, and if the
+same path is given several values for the same timestamp before the buffer
+is flushed, only the last value is sent.
+"""
+
+import logging
+
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+
+from nav.ipdevpoll.config import ipdevpoll_conf
+from nav.metrics.carbon import metric_to_line, send_lines
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 500  # milliseconds
+DEFAULT_FLUSH_SIZE = 64  # kilobytes
+
+
+class MetricBuffer(object):
+    """Collects metric lines from all jobs and sends them to Carbon in bulk"""
+
+    def __init__(self, flush_interval=DEFAULT_FLUSH_INTERVAL, flush_size=None):
+        """
+        :param flush_interval: How often (in milliseconds) to flush the buffer.
+                               If 0, metrics are sent as soon as they are added.
+        :param flush_size: The number of bytes that will cause the buffer to be
+                           flushed immediately.
+        """
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size or DEFAULT_FLUSH_SIZE * 1024
+        self.size = 0
+        self.sent = 0
+        self.deduplicated = 0
+        self._lines = {}
+        self.loop = LoopingCall(self.flush)
+        self._shutdown_trigger = None
+
+    def add(self, metric_tuples):
+        """Adds a list of metric tuples to the buffer.
+
+        :param metric_tuples: A list of metric tuples in the form
+                              [(path, (timestamp, value)), ...]
+        """
+        for path, (timestamp, value) in metric_tuples:
+            line = metric_to_line(path, timestamp, value)
+            key = (path, int(timestamp))
+            previous = self._lines.get(key)
+            if previous is not None:
+                self.size -= len(previous)
+                self.deduplicated += 1
+            self._lines[key] = line
+            self.size += len(line)
+            if self.size >= self.flush_size:
+                self.flush()
+
+        if not self.flush_interval:
+            self.flush()
+        elif self._lines:
+            self.start()
+
+    def start(self):
+        """Starts the buffer flushing task if it isn't running already"""
+        if not self.loop.running:
+            self.loop.start(self.flush_interval / 1000.0, now=False)
+        if self._shutdown_trigger is None:
+            self._shutdown_trigger = reactor.addSystemEventTrigger(
+                "before", "shutdown", self.flush
+            )
+
+    def flush(self):
+        """Sends all buffered metrics to the Carbon backend"""
+        if not self._lines:
+            return
+        lines = list(self._lines.values())
+        self._lines = {}
+        self.size = 0
+        self.sent += len(lines)
+        _logger.debug("flushing %d metrics to graphite", len(lines))
+        send_lines(lines)
+
+
+def get_flush_interval(config=None):
+    """Returns the configured metric flush interval, in milliseconds"""
+    config = config or ipdevpoll_conf
+    return config.getint(
+        'ipdevpoll', 'metric_flush_interval', fallback=DEFAULT_FLUSH_INTERVAL
+    )
+
+
+def get_flush_size(config=None):
+    """Returns the configured metric flush size, in bytes"""
+    config = config or ipdevpoll_conf
+    return 1024 * config.getint(
+        'ipdevpoll', 'metric_flush_size', fallback=DEFAULT_FLUSH_SIZE
+    )
+
+
+_BUFFER = None
+
+
+def get_metric_buffer():
+    """Returns the metric buffer of this process"""
+    global _BUFFER  # pylint: disable=global-statement
+    if _BUFFER is None:
+        _BUFFER = MetricBuffer(get_flush_interval(), get_flush_size())
+    return _BUFFER
+
+
+def buffer_metrics(metric_tuples):
+    """Adds a list of metric tuples to the metric buffer of this process, to be
+    sent to Carbon along with the metrics of other jobs.
+
+    :param metric_tuples: A list of metric tuples in the form
+                          [(path, (timestamp, value)), ...]
+    """
+    get_metric_buffer().add(metric_tuples)
@@ -23,7 +23,7 @@ from pprint import pformat
 from twisted.internet import defer
 
 from nav.ipdevpoll import Plugin
-from nav.metrics.carbon import send_metrics
+from nav.ipdevpoll.metricbuffer import buffer_metrics
 from nav.metrics.templates import metric_path_for_multicast_usage
 from nav.mibs.statistics_mib import StatisticsMib
 from nav.enterprise.ids import VENDOR_ID_HEWLETT_PACKARD
@@ -53,7 +53,7 @@ class StatMulticast(Plugin):
             self._logger.debug("%r", counts)
             metrics = self._make_metrics_from_counts(counts, timestamp)
             if metrics:
-                send_metrics(metrics)
+                buffer_metrics(metrics)
 
     @staticmethod
     def _count_ports_by_group(report):
@@ -21,8 +21,9 @@ import logging
 from twisted.internet import defer
 from nav.ipdevpoll import Plugin
 from nav.ipdevpoll import db
-from nav.metrics.carbon import send_metrics
-from nav.metrics.templates import metric_path_for_interface
+from nav.ipdevpoll.metricbuffer import buffer_metrics
+from nav.metrics.names import escape_metric_name
+from nav.metrics.templates import metric_prefix_for_interface
 from nav.mibs import reduce_index
 from nav.mibs.if_mib import IfMib
 from nav.mibs.ip_mib import IpMib
@@ -66,6 +67,9 @@ IP_COUNTERS = (
 
 USED_COUNTERS = NON_HC_COUNTERS + HC_COUNTERS + OTHER_COUNTERS
 LOGGED_COUNTERS = USED_COUNTERS + IP_COUNTERS
+COUNTER_SUFFIXES = {
+    counter: "." + escape_metric_name(counter) for counter in LOGGED_COUNTERS
+}
 
 
 class StatPorts(Plugin):
@@ -86,7 +90,7 @@ class StatPorts(Plugin):
         tuples = list(self._make_metrics(stats, netboxes=netboxes, timestamp=timestamp))
         if tuples:
             self._logger.debug("Counters collected")
-            send_metrics(tuples)
+            buffer_metrics(tuples)
 
     @defer.inlineCallbacks
     def _get_stats(self):
@@ -113,17 +117,17 @@ class StatPorts(Plugin):
 
         for row in stats.values():
             hc_counters = use_hc_counters(row) or hc_counters
+            ifname = row['ifName'] or row['ifDescr']
+            # duplicate metrics for all involved netboxes
+            prefixes = [
+                metric_prefix_for_interface(netbox, ifname) for netbox in netboxes
+            ]
             for key in LOGGED_COUNTERS:
-                if key not in row:
-                    continue
-                value = row[key]
+                value = row.get(key)
                 if value is not None:
-                    for netbox in netboxes:
-                        # duplicate metrics for all involved netboxes
-                        path = metric_path_for_interface(
-                            netbox, row['ifName'] or row['ifDescr'], key
-                        )
-                        yield (path, (timestamp, value))
+                    suffix = COUNTER_SUFFIXES[key]
+                    for prefix in prefixes:
+                        yield (prefix + suffix, (timestamp, value))
 
         if stats:
             if hc_counters:
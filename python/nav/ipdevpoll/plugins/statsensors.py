@@ -24,8 +24,9 @@ from nav.Snmp import safestring
 from nav.ipdevpoll import Plugin
 from nav.ipdevpoll import db
 from nav.ipdevpoll.db import run_in_thread
-from nav.metrics.carbon import send_metrics
-from nav.metrics.templates import metric_path_for_sensor
+from nav.ipdevpoll.metricbuffer import buffer_metrics
+from nav.metrics.names import escape_metric_name
+from nav.metrics.templates import metric_prefix_for_sensors
 from nav.models.manage import Sensor
 
 # Ask for no more than this number of values in a single SNMP GET operation
@@ -78,6 +79,7 @@ class StatSensors(Plugin):
     def _response_to_metrics(self, result, sensors, netboxes):
         metrics = []
         timestamp = time.time()
+        prefixes = [metric_prefix_for_sensors(netbox) for netbox in netboxes]
         data = (
             (sensors[oid], value) for oid, value in result.items() if oid in sensors
         )
@@ -92,10 +94,10 @@ class StatSensors(Plugin):
                     pass
 
             value = convert_to_precision(value, sensor)
-            for netbox in netboxes:
-                path = metric_path_for_sensor(netbox, sensor['internal_name'])
-                metrics.append((path, (timestamp, value)))
-        send_metrics(metrics)
+            suffix = "." + escape_metric_name(sensor['internal_name'])
+            for prefix in prefixes:
+                metrics.append((prefix + suffix, (timestamp, value)))
+        buffer_metrics(metrics)
         return metrics
 
 
@@ -22,7 +22,7 @@ from twisted.internet.error import TimeoutError
 
 from nav.ipdevpoll import Plugin
 from nav.ipdevpoll import db
-from nav.metrics.carbon import send_metrics
+from nav.ipdevpoll.metricbuffer import buffer_metrics
 from nav.metrics.templates import (
     metric_path_for_bandwith,
     metric_path_for_bandwith_peak,
@@ -85,7 +85,7 @@ class StatSystem(Plugin):
 
         metrics = bandwidth + cpu + sysuptime + memory + power
         if metrics:
-            send_metrics(metrics)
+            buffer_metrics(metrics)
 
     @defer.inlineCallbacks
     def _collect_bandwidth(self, netboxes):
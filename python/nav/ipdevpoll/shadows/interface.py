@@ -22,6 +22,7 @@ from itertools import groupby
 from django.db.models import Q
 from django.db import transaction
 
+from nav.metrics.templates import forget_metric_prefix_for_interface
 from nav.models import manage
 from nav.models.event import EventQueue as Event, EventQueueVar as EventVar
 from nav.models.event import AlertHistory
@@ -382,6 +383,7 @@ class Interface(Shadow):
     def set_existing_model(self, django_object):
         super(Interface, self).set_existing_model(django_object)
         self._verify_operstatus_change(django_object)
+        self._forget_renamed_metric_prefix(django_object)
 
     def _verify_operstatus_change(self, stored):
         if self.ifoperstatus and self.ifoperstatus != stored.ifoperstatus:
@@ -389,6 +391,16 @@ class Interface(Shadow):
         else:
             self.ifoperstatus_change = None
 
+    def _forget_renamed_metric_prefix(self, stored):
+        """Drops the cached metric prefix of a renamed interface.
+
+        This only frees memory early: the cache is keyed by interface name, so
+        a stale prefix is never returned for the new name, and would
+        eventually be evicted anyway.
+        """
+        if self.ifname and stored.ifname and self.ifname != stored.ifname:
+            forget_metric_prefix_for_interface(stored.netbox.sysname, stored.ifname)
+
     def prepare(self, containers):
         self._strip_null_bytes(containers)
         self._set_netbox_if_unset(containers)
@@ -22,11 +22,21 @@ Syslog messages will be read from the configured file, parsed and
 inserted into structured NAV database tables.  Messages that cannot be
 parsed as Cisco syslog messages are ignored.
 
-The syslog file is truncated upon the exit of this program.  If you
-wish to keep a copy of the syslog messages on file, you should
+By default, the syslog file is truncated upon the exit of this program.
+If you wish to keep a copy of the syslog messages on file, you should
 configure your syslog daemon to log the messages to two separate
 files, one of which this program will have exclusive access to.
 
+Alternatively, logengine can be configured to follow the syslog file
+(see the mode option in logger.conf). In this mode, the file is never
+truncated. Instead, each run continues reading where the previous run
+left off, and the file should be rotated by other means, such as
+logrotate.
+
+Parsed messages are inserted into the database in large batches. Large
+backlogs of log lines can be parsed in several processes (see the processes
+option in logger.conf).
+
 """
 
 # The structure of this code was a mess translated more or less
@@ -34,33 +44,46 @@ files, one of which this program will have exclusive access to.
 # to make it more maintainable.  Feel free to refactor it further,
 # where it makes sense.
 
-# BUGS: This program has one glaring problem: All the log lines are
-# read into memory, and the logfile is subsequently truncated.  If
-# the program crashes before the lines are inserted into the
-# database, all the read log lines are lost.
-
-# TODO: Possible future enhancement is the ability to tail a log file
-# continually, instead of reading and truncating as a cron job.
+# BUGS: In truncate mode, all the log lines are read into memory, and
+# the logfile is subsequently truncated.  If the program crashes
+# before the lines are inserted into the database, all the read log
+# lines are lost. Use follow mode to avoid this.
 
 
 import re
+import csv
 import fcntl
+import glob
+import io
+import os
 import sys
 import errno
 import atexit
 import logging
+import time
 from configparser import ConfigParser
 import datetime
 import optparse
+from operator import itemgetter
+
+from psycopg2.extras import execute_values
 
 import nav
 import nav.logs
 from nav import db
 from nav import daemon
+from nav import logpartitions
+from nav.syslogparser import SyslogParser, ParserPool
 from nav.config import find_config_file
+from nav.metrics.carbon import send_metrics
+from nav.metrics.templates import metric_prefix_for_logengine
 
 
 PID_FILE = 'logengine.pid'
+MODE_TRUNCATE = 'truncate'
+MODE_FOLLOW = 'follow'
+DEFAULT_BATCH_SIZE = 5000
+PARALLEL_MIN_BACKLOG = 16 * 1024 * 1024  # bytes
 _logger = logging.getLogger("nav.logengine")
 
 
@@ -100,154 +123,83 @@ def get_exception_dicts(config):
     return exceptionorigin, exceptiontype, exceptiontypeorigin
 
 
-_typical_match_re = re.compile(
-    r"""
-    ^
-    (?P<servmonth>\w+) \s+ (?P<servday>\d+) \s+      # server month and date
-    (?P<servhour>\d+) \: (?P<servmin>\d+) : \d+ \W+  # server hour/min/second
-    (?P<origin>\S+)                                  # origin
-    \W+ (?:(\d{4}) | .*?) \s+ \W*                    # year/msg counter/garbage
-    (?P<month>\w+) \s+ (?P<day>\d+) \s+              # origin month and date
-    ((?P<year>\d{4}) \s+ )?                          # origin year, if present
-    (?P<hour>\d+) : (?P<min>\d+) : (?P<second>\d+)   # origin hour/minute/second
-    .* %                                             # eat chars until % appears
-    (?P<type>[^:]+) :                                # message type
-    \s* (?P<description>.*)                          # message (lstripped)
-    $
-    """,
-    re.VERBOSE,
-)
-
-# Matches log lines where there is no timestamp from the origin
-_not_so_typical_match_re = re.compile(
-    r"""
-    ^
-    (?P<month>\w+) \s+ (?P<day>\d+) \s+              # server month and date
-    ((?P<year>\d{4}) \s+ )?                          # server year, if present
-    (?P<hour>\d+) : (?P<min>\d+) : (?P<second>\d+)   # server time
-    \s*
-    (?P<origin>\S+)                                  # origin
-    .* %                                             # eat chars until % appears
-    (?P<type>[a-zA-Z0-9\-_]+) :                      # message type
-    \s* (?P<description>.*)                          # message (lstripped)
-    $
-    """,
-    re.VERBOSE,
-)
-
-_type_match_re = re.compile(r"\w+-\d+-?\S*:")
-
-
 def create_message(line, database=None):
+    """Parses a line of cisco log text.
 
-    typicalmatch = _typical_match_re.search(line)
-    match = typicalmatch or _not_so_typical_match_re.search(line)
-
-    if match:
-        origin = match.group('origin')
-        month = find_month(match.group('month'))
-        if 'year' in match.groupdict() and match.group('year'):
-            year = int(match.group('year'))
-        else:
-            year = find_year(month)
-        day = int(match.group('day'))
-        hour = int(match.group('hour'))
-        minute = int(match.group('min'))
-        second = int(match.group('second'))
-        msgtype = match.group('type')
-        description = match.group('description')
-
-        try:
-            timestamp = datetime.datetime(year, month, day, hour, minute, second)
-            return Message(timestamp, origin, msgtype, description)
-        except (ValueError, TypeError):
-            _logger.debug("syslog line parse error: %s", line, exc_info=True)
-
-    # if this message shows sign of cisco format, put it in the error log
-    typematch = _type_match_re.search(line)
-    if typematch and database:
+    :param database: If given, a cursor used to put lines that look like, but
+                     cannot be parsed as, cisco log messages in the error log.
+    :returns: A ParsedMessage, or None if the line could not be parsed.
+    """
+    message = SyslogParser().parse(line)
+    if message is False and database:
         database.execute("INSERT INTO errorerror (message) " "VALUES (%s)", (line,))
+    return message or None
 
 
-class Message(object):
-    prioritymatch_re = re.compile(r"^(.*)-(\d*)-(.*)$")
-    categorymatch_re = re.compile(r"\W(gw|sw|gsw|fw|ts)\W")
-
-    def __init__(self, time, origin, msgtype, description):
-        self.time = time
-        self.origin = origin
-        self.category = self.find_category(origin)
-        self.type = msgtype
-        self.description = description
-        (self.facility, self.priorityid, self.mnemonic) = self.find_priority(msgtype)
-        if not self.facility:
-            raise ValueError("cannot parse message type: %s" % msgtype)
-
-    def find_priority(self, msgtype):
-        prioritymatch = self.prioritymatch_re.search(msgtype)
-        if prioritymatch:
-            return (
-                prioritymatch.group(1),
-                int(prioritymatch.group(2)),
-                prioritymatch.group(3),
-            )
-        else:
-            return None, None, None
-
-    def find_category(self, origin):
-        categorymatch = self.categorymatch_re.search(origin)
-        if categorymatch:
-            return categorymatch.group(1)
-        else:
-            return "rest"
+def delete_old_messages(config):
+    """Delete old messages from db, according to config settings."""
+    _logger.debug("Deleting old messages from db")
 
+    conn = db.getConnection('logger', 'logger')
+    manager = get_partition_manager(config, conn.cursor())
 
-def find_year(mnd):
-    now = datetime.datetime.now()
-    if mnd == 12 and now.month == 1:
-        return now.year - 1
+    if manager.is_partitioned():
+        dropped = manager.expire()
+        _logger.debug("Dropped %d expired partitions", len(dropped))
     else:
-        return now.year
-
-
-def find_month(textual):
-    months = [
-        "jan",
-        "feb",
-        "mar",
-        "apr",
-        "may",
-        "jun",
-        "jul",
-        "aug",
-        "sep",
-        "oct",
-        "nov",
-        "dec",
-    ]
-    try:
-        return months.index(textual.lower()) + 1
-    except ValueError:
-        pass
+        manager.delete_expired_rows()
 
+    conn.commit()
 
-def delete_old_messages(config):
-    """Delete old messages from db, according to config settings."""
-    _logger.debug("Deleting old messages from db")
 
-    conn = db.getConnection('logger', 'logger')
-    cursor = conn.cursor()
-
-    for priority in range(0, 8):
-        if config.get("deletepriority", str(priority)):
-            days = config.getint("deletepriority", str(priority))
-            cursor.execute(
-                "DELETE FROM log_message WHERE newpriority=%s "
-                "AND time < now() - interval %s",
-                (priority, '%d days' % days),
+def ensure_partitions(config, connection):
+    """Makes sure log_message has partitions ready for the messages to come.
+
+    Failure is not fatal, as messages that fall outside of all partitions are
+    stored in the default partition until their partition can be created.
+    """
+    manager = get_partition_manager(config, connection.cursor())
+    try:
+        if manager.is_partitioned():
+            manager.ensure_partitions()
+        connection.commit()
+    except db.driver.Error:
+        _logger.exception("Could not create log_message partitions")
+        connection.rollback()
+
+
+def get_partition_manager(config, cursor):
+    """Returns a LogPartitionManager configured from logger.conf"""
+    interval = logpartitions.DEFAULT_INTERVAL
+    if config.has_option("partitions", "interval"):
+        interval = config.get("partitions", "interval").strip().lower()
+        if interval not in logpartitions.INTERVALS:
+            _logger.warning(
+                "invalid partition interval %r, using %s",
+                interval,
+                logpartitions.DEFAULT_INTERVAL,
             )
+            interval = logpartitions.DEFAULT_INTERVAL
+    premake = logpartitions.DEFAULT_PREMAKE
+    if config.has_option("partitions", "premake"):
+        premake = config.getint("partitions", "premake")
 
-    conn.commit()
+    return logpartitions.LogPartitionManager(
+        cursor, get_retention(config), interval=interval, premake=premake
+    )
+
+
+def get_retention(config):
+    """Returns a dict mapping priorities to the number of days to keep
+    messages of that priority.
+    """
+    retention = {}
+    for priority in logpartitions.PRIORITIES:
+        if config.has_option("deletepriority", str(priority)):
+            value = config.get("deletepriority", str(priority)).strip()
+            if value:
+                retention[priority] = int(value)
+    return retention
 
 
 def verify_singleton(quiet=False):
@@ -347,6 +299,209 @@ def read_log_lines(config):
             yield line
 
 
+class LogFileFollower(object):
+    """Reads the lines added to a log file since the previous read.
+
+    The read position is identified by the inode number of the file and a
+    byte offset into it. If the file has been rotated since the previous read,
+    the remaining lines of the rotated file are read first, if the rotated
+    file can be found next to the original file. If the file has been
+    truncated, it is read from the beginning.
+
+    Only complete lines are read. An incomplete last line is left for the
+    next read.
+    """
+
+    def __init__(self, filename, charset, position=None):
+        """
+        :param position: An (inode, offset) tuple telling where the previous
+                         read ended, or None to read from the beginning.
+        """
+        self.filename = filename
+        self.charset = charset
+        self.position = position
+
+    def get_backlog(self):
+        """Returns the number of bytes that have not yet been read from the
+        current log file.
+        """
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return 0
+        inode, offset = self.position or (stat.st_ino, 0)
+        return stat.st_size - offset if inode == stat.st_ino else stat.st_size
+
+    def read_lines(self):
+        """Reads and yields new lines from the log file.
+
+        Each line is yielded along with the position of the end of the line,
+        which can be passed on to a later LogFileFollower to continue reading
+        from the following line.
+        """
+        try:
+            stat = os.stat(self.filename)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                _logger.exception("Couldn't open logfile %s", self.filename)
+            return
+
+        offset = 0
+        if self.position:
+            inode, offset = self.position
+            if inode != stat.st_ino:
+                rotated = self._find_rotated_file(inode)
+                if rotated:
+                    _logger.info("%s was rotated, finishing %s", self.filename, rotated)
+                    yield from self._read_file(rotated, offset)
+                else:
+                    _logger.warning(
+                        "%s was rotated, could not find the rotated file to "
+                        "finish reading it",
+                        self.filename,
+                    )
+                offset = 0
+            elif stat.st_size < offset:
+                _logger.info("%s was truncated, reading from start", self.filename)
+                offset = 0
+
+        yield from self._read_file(self.filename, offset)
+
+    def _find_rotated_file(self, inode):
+        for candidate in sorted(glob.glob(self.filename + '[.-]*')):
+            try:
+                if os.stat(candidate).st_ino == inode:
+                    return candidate
+            except OSError:
+                continue
+
+    def _read_file(self, filename, offset):
+        with open(filename, 'rb') as logfile:
+            inode = os.fstat(logfile.fileno()).st_ino
+            logfile.seek(offset)
+            for raw_line in logfile:
+                if not raw_line.endswith(b'\n'):
+                    break
+                offset += len(raw_line)
+                self.position = (inode, offset)
+                yield raw_line.decode(self.charset, 'replace'), self.position
+
+
+def get_file_position(cursor, filename):
+    """Returns the (inode, offset) tuple telling where logengine stopped
+    reading filename in follow mode, or None if it hasn't read it before.
+    """
+    cursor.execute(
+        "SELECT inode, position FROM log_file_position WHERE filename = %s",
+        (filename,),
+    )
+    row = cursor.fetchone()
+    return tuple(row) if row else None
+
+
+def set_file_position(cursor, filename, position):
+    """Stores where logengine stopped reading filename in follow mode"""
+    inode, offset = position
+    cursor.execute(
+        "INSERT INTO log_file_position (filename, inode, position, updated) "
+        "VALUES (%s, %s, %s, now()) "
+        "ON CONFLICT (filename) DO UPDATE "
+        "SET inode = EXCLUDED.inode, position = EXCLUDED.position, "
+        "    updated = EXCLUDED.updated",
+        (filename, inode, offset),
+    )
+
+
+class MessageBatch(object):
+    """Collects parsed log messages and inserts them into the database in
+    batches.
+    """
+
+    def __init__(
+        self,
+        database,
+        categories,
+        origins,
+        types,
+        exceptionorigin,
+        exceptiontype,
+        exceptiontypeorigin,
+        batch_size=DEFAULT_BATCH_SIZE,
+    ):
+        self.database = database
+        self.caches = (categories, origins, types)
+        self.exceptions = (exceptionorigin, exceptiontype, exceptiontypeorigin)
+        self.batch_size = batch_size
+        self.rows = []
+        self.errors = []
+        self.lines = 0
+        self.inserted = 0
+        self.newest = None
+        self.parser = SyslogParser()
+
+    def is_full(self):
+        return len(self.rows) + len(self.errors) >= self.batch_size
+
+    def add(self, line):
+        """Parses a line of cisco log text and adds it to the batch"""
+        self.add_parsed(line, self.parser.parse_safely(line))
+
+    def add_parsed(self, line, message):
+        """Adds a line of cisco log text that has already been parsed by a
+        SyslogParser to the batch.
+        """
+        self.lines += 1
+        if message is False:
+            # this line shows sign of cisco format, put it in the error log
+            self.errors.append(line)
+            return
+        if not message:
+            return
+
+        try:
+            row = prepare_message(
+                message, self.database, *(self.caches + self.exceptions)
+            )
+        except db.driver.Error:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            _logger.exception("Unhandled exception during message insert: %s", line)
+            return
+        self.rows.append(row)
+        if self.newest is None or message.time > self.newest:
+            self.newest = message.time
+
+    def flush(self):
+        """Inserts the collected messages into the database"""
+        if self.rows:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+            writer.writerows(
+                (str(timestamp), origin, priority, msgtype, description)
+                for timestamp, origin, priority, msgtype, description in self.rows
+            )
+            buffer.seek(0)
+            self.database.copy_expert(
+                "COPY log_message (time, origin, newpriority, type, message) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            self.inserted += len(self.rows)
+        if self.errors:
+            execute_values(
+                self.database,
+                "INSERT INTO errorerror (message) VALUES %s",
+                [(line,) for line in self.errors],
+            )
+        _logger.debug(
+            "inserted %d messages and %d unparseable lines",
+            len(self.rows),
+            len(self.errors),
+        )
+        self.rows = []
+        self.errors = []
+
+
 # pylint: disable=W0703
 def parse_and_insert(
     line,
@@ -393,6 +548,41 @@ def insert_message(
     exceptiontype,
     exceptiontypeorigin,
 ):
+    (timestamp, originid, priorityid, typeid, description) = prepare_message(
+        message,
+        database,
+        categories,
+        origins,
+        types,
+        exceptionorigin,
+        exceptiontype,
+        exceptiontypeorigin,
+    )
+
+    # insert message into database
+    database.execute(
+        "INSERT INTO log_message (time, origin, "
+        "newpriority, type, message) "
+        "VALUES (%s, %s, %s, %s, %s)",
+        (str(timestamp), originid, priorityid, typeid, description),
+    )
+
+
+def prepare_message(
+    message,
+    database,
+    categories,
+    origins,
+    types,
+    exceptionorigin,
+    exceptiontype,
+    exceptiontypeorigin,
+):
+    """Prepares a message for insertion into the log_message table, adding its
+    origin and type to the database if they are new.
+
+    :returns: A (time, origin, newpriority, type, message) tuple.
+    """
     # check origin (host)
     if message.origin not in origins:
         if message.category not in categories:
@@ -408,33 +598,28 @@ def insert_message(
     typeid = types[message.facility][message.mnemonic]
 
     # overload priority if exceptions are set
+    priorityid = message.priorityid
     m_type = message.type.lower()
     origin = message.origin.lower()
     if m_type in exceptiontypeorigin and origin in exceptiontypeorigin[m_type]:
         try:
-            message.priorityid = int(exceptiontypeorigin[m_type][origin])
+            priorityid = int(exceptiontypeorigin[m_type][origin])
         except ValueError:
             pass
 
     elif origin in exceptionorigin:
         try:
-            message.priorityid = int(exceptionorigin[origin])
+            priorityid = int(exceptionorigin[origin])
         except ValueError:
             pass
 
     elif m_type in exceptiontype:
         try:
-            message.priorityid = int(exceptiontype[m_type])
+            priorityid = int(exceptiontype[m_type])
         except ValueError:
             pass
 
-    # insert message into database
-    database.execute(
-        "INSERT INTO log_message (time, origin, "
-        "newpriority, type, message) "
-        "VALUES (%s, %s, %s, %s, %s)",
-        (str(message.time), originid, message.priorityid, typeid, message.description),
-    )
+    return (message.time, originid, priorityid, typeid, message.description)
 
 
 def add_category(category, categories, database):
@@ -474,6 +659,7 @@ def logengine(config, options):
     verify_singleton(options.quiet)
 
     connection = db.getConnection('logger', 'logger')
+    ensure_partitions(config, connection)
     database = connection.cursor()
 
     # initial setup of dictionaries
@@ -485,23 +671,161 @@ def logengine(config, options):
     # parse priorityexceptions
     (exceptionorigin, exceptiontype, exceptiontypeorigin) = get_exception_dicts(config)
 
+    batch = MessageBatch(
+        database,
+        categories,
+        origins,
+        types,
+        exceptionorigin,
+        exceptiontype,
+        exceptiontypeorigin,
+        batch_size=get_batch_size(config),
+    )
+
     # add new records
     _logger.debug("Reading new log entries")
-    my_parse_and_insert = swallow_all_but_db_exceptions(parse_and_insert)
-    for line in read_log_lines(config):
-        my_parse_and_insert(
-            line,
-            database,
-            categories,
-            origins,
-            types,
-            exceptionorigin,
-            exceptiontype,
-            exceptiontypeorigin,
-        )
+    start = time.time()
+    if get_mode(config) == MODE_FOLLOW:
+        backlog = follow_log_file(config, connection, batch)
+    else:
+        backlog = None
+        processes = get_parser_processes(config, _get_file_size(config))
+        lines = read_log_lines(config)
+        for line, message in parse_lines(batch.parser, lines, processes):
+            batch.add_parsed(line, message)
+            if batch.is_full():
+                batch.flush()
+        batch.flush()
 
     # Make sure it all sticks
     connection.commit()
+    report_ingestion(batch, time.time() - start, backlog)
+
+
+def follow_log_file(config, connection, batch):
+    """Reads and inserts the lines added to the watched cisco log file since
+    the previous run, committing each batch along with the read position.
+
+    :returns: The number of bytes that had not been read when this run started.
+    """
+    filename = config.get("paths", "syslog")
+    if config.has_option("paths", "charset"):
+        charset = config.get("paths", "charset")
+    else:
+        charset = "ISO-8859-1"
+
+    database = batch.database
+    follower = LogFileFollower(filename, charset, get_file_position(database, filename))
+    backlog = follower.get_backlog()
+    processes = get_parser_processes(config, backlog)
+    position = None
+    items = follower.read_lines()
+    for (line, position), message in parse_lines(
+        batch.parser, items, processes, line_of=itemgetter(0)
+    ):
+        batch.add_parsed(line, message)
+        if batch.is_full():
+            batch.flush()
+            set_file_position(database, filename, position)
+            connection.commit()
+
+    batch.flush()
+    if position:
+        set_file_position(database, filename, position)
+    connection.commit()
+    return backlog
+
+
+def parse_lines(parser, items, processes=1, line_of=None):
+    """Parses the lines of a sequence of items, in a pool of worker processes
+    if more than one process is requested.
+
+    :param parser: The SyslogParser to use when parsing in this process.
+    :param items: An iterable of lines, or of items that contain lines.
+    :param line_of: A function to get the line of an item, if the items
+                    aren't lines themselves.
+    :returns: A generator of (item, parse result) tuples.
+    """
+    if processes > 1:
+        _logger.debug("parsing log lines in %d processes", processes)
+        with ParserPool(processes) as pool:
+            yield from pool.parse(items, line_of)
+    else:
+        for item in items:
+            yield item, parser.parse_safely(line_of(item) if line_of else item)
+
+
+def get_parser_processes(config, backlog):
+    """Returns the number of processes to parse a backlog of log lines in.
+
+    Large backlogs are parsed in the configured number of processes, while
+    the normal trickle of new lines is parsed in-process.
+
+    :param backlog: The size of the backlog, in bytes.
+    """
+    if config.has_option("start", "processes"):
+        processes = max(1, config.getint("start", "processes"))
+    else:
+        processes = 1
+    if processes > 1 and (backlog or 0) >= PARALLEL_MIN_BACKLOG:
+        return processes
+    return 1
+
+
+def _get_file_size(config):
+    try:
+        return os.path.getsize(config.get("paths", "syslog"))
+    except OSError:
+        return 0
+
+
+def report_ingestion(batch, elapsed, backlog=None):
+    """Logs and sends ingestion statistics to Graphite"""
+    rate = batch.lines / elapsed if elapsed > 0 else 0
+    lag = (
+        (datetime.datetime.now() - batch.newest).total_seconds() if batch.newest else 0
+    )
+    _logger.info(
+        "read %d lines, inserted %d messages in %.1f seconds (%.0f lines/s), "
+        "lag %.0f seconds",
+        batch.lines,
+        batch.inserted,
+        elapsed,
+        rate,
+        lag,
+    )
+
+    timestamp = time.time()
+    prefix = metric_prefix_for_logengine()
+    metrics = [
+        (prefix + '.lines', (timestamp, batch.lines)),
+        (prefix + '.inserted', (timestamp, batch.inserted)),
+        (prefix + '.rate', (timestamp, rate)),
+        (prefix + '.lag', (timestamp, lag)),
+    ]
+    if backlog is not None:
+        metrics.append((prefix + '.backlog', (timestamp, backlog)))
+    try:
+        send_metrics(metrics)
+    except Exception:  # pylint: disable=broad-except
+        _logger.exception("Could not send logengine metrics")
+
+
+def get_mode(config):
+    """Returns the configured ingestion mode"""
+    if config.has_option("start", "mode"):
+        mode = config.get("start", "mode").strip().lower()
+        if mode in (MODE_TRUNCATE, MODE_FOLLOW):
+            return mode
+        _logger.warning("invalid logengine mode %r, using %s", mode, MODE_TRUNCATE)
+    return MODE_TRUNCATE
+
+
+def get_batch_size(config):
+    """Returns the configured number of messages to insert at a time"""
+    if config.has_option("start", "batchsize"):
+        return max(1, config.getint("start", "batchsize"))
+    return DEFAULT_BATCH_SIZE
 
 
 def swallow_all_but_db_exceptions(func):
@@ -0,0 +1,356 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Management of the time partitions of the logger.log_message table.
+
+log_message is partitioned by the time of each message, into partitions of a
+day or a week each. Each time partition is further partitioned into one
+sub-partition per group of priorities that share the same retention period.
+Messages are expired by detaching and dropping whole sub-partitions once the
+newest message they could hold is older than their retention period. Messages
+without a priority are kept in a sub-partition of their own, which never
+expires, but which is dropped along with its time partition once it is empty
+and everything else in the time partition has expired.
+
+Partitions that are not sub-partitioned by priority, such as the legacy
+partition holding all messages logged before log_message was partitioned, are
+expired the old-fashioned way, by deleting rows, until they can be dropped in
+their entirety.
+
+"""
+from collections import defaultdict, namedtuple
+import datetime
+import logging
+import re
+
+_logger = logging.getLogger(__name__)
+
+SCHEMA = 'logger'
+TABLE = 'log_message'
+DEFAULT_PARTITION = 'log_message_default'
+
+INTERVAL_DAY = 'day'
+INTERVAL_WEEK = 'week'
+INTERVALS = {
+    INTERVAL_DAY: datetime.timedelta(days=1),
+    INTERVAL_WEEK: datetime.timedelta(weeks=1),
+}
+DEFAULT_INTERVAL = INTERVAL_WEEK
+DEFAULT_PREMAKE = 2
+PRIORITIES = range(8)
+
+TimePartition = namedtuple('TimePartition', 'name start end subpartitioned')
+PriorityPartition = namedtuple('PriorityPartition', 'name priorities')
+
+_RANGE_BOUND_RE = re.compile(r"FROM \((?P<start>[^)]+)\) TO \((?P<end>[^)]+)\)")
+_LIST_BOUND_RE = re.compile(r"IN \((?P<values>[^)]*)\)")
+
+
+class LogPartitionManager(object):
+    """Creates and expires the partitions of the log_message table"""
+
+    def __init__(
+        self, cursor, retention, interval=DEFAULT_INTERVAL, premake=DEFAULT_PREMAKE
+    ):
+        """
+        :param cursor: A database cursor.
+        :param retention: A dict mapping priorities to the number of days to
+                          keep messages of that priority. Messages of
+                          priorities not in the dict are kept forever.
+        :param interval: The length of new time partitions, either 'day' or
+                         'week'.
+        :param premake: The number of future time partitions to keep ready.
+        """
+        if interval not in INTERVALS:
+            raise ValueError("invalid partition interval: %r" % interval)
+        self.cursor = cursor
+        self.retention = retention
+        self.interval = interval
+        self.premake = max(0, premake)
+
+    def is_partitioned(self):
+        """Returns True if log_message is a partitioned table"""
+        self.cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON (c.oid = pt.partrelid) "
+            "JOIN pg_namespace n ON (n.oid = c.relnamespace) "
+            "WHERE n.nspname = %s AND c.relname = %s",
+            (SCHEMA, TABLE),
+        )
+        return bool(self.cursor.fetchall())
+
+    def get_time_partitions(self):
+        """Returns the time partitions of log_message as a list of
+        TimePartition tuples, ordered by time. A start or end of None means
+        the partition is unbounded in that direction. The default partition
+        is not included.
+        """
+        partitions = []
+        for name, bound, kind in self._get_partitions(TABLE):
+            match = _RANGE_BOUND_RE.search(bound)
+            if not match:
+                continue
+            partitions.append(
+                TimePartition(
+                    name,
+                    _parse_range_value(match.group('start')),
+                    _parse_range_value(match.group('end')),
+                    kind == 'p',
+                )
+            )
+        partitions.sort(key=lambda p: p.start or datetime.datetime.min)
+        return partitions
+
+    def get_priority_partitions(self, partition):
+        """Returns the sub-partitions of a time partition as a list of
+        PriorityPartition tuples. The priorities of the default
+        sub-partition are None, while those of the sub-partition for messages
+        without a priority are (None,).
+        """
+        subpartitions = []
+        for name, bound, _kind in self._get_partitions(partition):
+            match = _LIST_BOUND_RE.search(bound)
+            if match:
+                priorities = tuple(
+                    None if value.strip() == 'NULL' else int(value)
+                    for value in match.group('values').split(',')
+                )
+            else:
+                priorities = None
+            subpartitions.append(PriorityPartition(name, priorities))
+        return subpartitions
+
+    def _get_partitions(self, parent):
+        self.cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.relkind "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON (c.oid = i.inhrelid) "
+            "JOIN pg_class p ON (p.oid = i.inhparent) "
+            "JOIN pg_namespace n ON (n.oid = p.relnamespace) "
+            "WHERE n.nspname = %s AND p.relname = %s",
+            (SCHEMA, parent),
+        )
+        return self.cursor.fetchall()
+
+    def get_priority_groups(self):
+        """Groups the priorities with configured retention periods by
+        retention period.
+
+        :returns: A list of priority tuples, ordered by retention period.
+        """
+        groups = defaultdict(list)
+        for priority, days in sorted(self.retention.items()):
+            groups[days].append(priority)
+        return [tuple(priorities) for _days, priorities in sorted(groups.items())]
+
+    def get_retention(self, priorities=None):
+        """Returns the number of days to keep messages of any of the given
+        priorities, or None if they should be kept forever.
+
+        :param priorities: A sequence of priorities, or None to mean any
+                           priority. Messages without a priority are kept
+                           forever.
+        """
+        if priorities is None:
+            if any(priority not in self.retention for priority in PRIORITIES):
+                return None
+            priorities = self.retention.keys()
+        if not priorities or any(p not in self.retention for p in priorities):
+            return None
+        return max(self.retention[priority] for priority in priorities)
+
+    def ensure_partitions(self, now=None):
+        """Creates any missing time partitions for the current interval and
+        the next `premake` intervals.
+
+        :returns: A list of the names of the created partitions.
+        """
+        now = now or datetime.datetime.now()
+        step = INTERVALS[self.interval]
+        start = get_interval_start(now, self.interval)
+        end = start + step * (self.premake + 1)
+
+        created = []
+        existing = self.get_time_partitions()
+        for gap_start, gap_end in find_gaps(start, end, existing):
+            while gap_start < gap_end:
+                next_start = min(
+                    get_interval_start(gap_start, self.interval) + step, gap_end
+                )
+                created.append(self.create_partition(gap_start, next_start))
+                gap_start = next_start
+        return created
+
+    def create_partition(self, start, end):
+        """Creates a time partition for messages logged from start up to end,
+        sub-partitioned by priority.
+
+        The partition is populated with any matching messages from the default
+        partition before it is attached, so that those messages do not keep
+        it from being attached.
+
+        :returns: The name of the new partition.
+        """
+        name = '%s_%s' % (TABLE, start.strftime('%Y%m%d'))
+        _logger.info("creating log_message partition %s for %s - %s", name, start, end)
+        self._execute(
+            "CREATE TABLE {schema}.%s (LIKE {schema}.{table}) "
+            "PARTITION BY LIST (newpriority)" % name
+        )
+        for priorities in self.get_priority_groups():
+            self._execute(
+                "CREATE TABLE {schema}.%s_p%s PARTITION OF {schema}.%s "
+                "FOR VALUES IN (%s)"
+                % (
+                    name,
+                    '_'.join(str(p) for p in priorities),
+                    name,
+                    ', '.join(str(p) for p in priorities),
+                )
+            )
+        self._execute(
+            "CREATE TABLE {schema}.%s_pnull PARTITION OF {schema}.%s "
+            "FOR VALUES IN (NULL)" % (name, name)
+        )
+        self._execute(
+            "CREATE TABLE {schema}.%s_pdefault PARTITION OF {schema}.%s DEFAULT"
+            % (name, name)
+        )
+        self._execute(
+            "WITH moved AS ("
+            "  DELETE FROM {schema}.{default} WHERE time >= %%s AND time < %%s"
+            "  RETURNING *"
+            ") INSERT INTO {schema}.%s SELECT * FROM moved" % name,
+            (start, end),
+        )
+        self._execute(
+            "ALTER TABLE {schema}.{table} ATTACH PARTITION {schema}.%s "
+            "FOR VALUES FROM (%%s) TO (%%s)" % name,
+            (start, end),
+        )
+        return name
+
+    def expire(self, now=None):
+        """Drops all partitions that only hold expired messages, and deletes
+        expired messages from partitions that are not sub-partitioned by
+        priority.
+
+        As messages without a priority are never deleted, a time partition is
+        only dropped once its sub-partition for them is empty, and partitions
+        that are not sub-partitioned are only dropped once they are empty.
+
+        :returns: A list of the names of the dropped partitions.
+        """
+        now = now or datetime.datetime.now()
+        dropped = []
+        for partition in self.get_time_partitions():
+            if partition.end is None:
+                self.delete_expired_rows(partition.name, now)
+            elif not partition.subpartitioned:
+                self.delete_expired_rows(partition.name, now)
+                expired = self._has_expired(partition.end, None, now)
+                if expired and self._is_empty(partition.name):
+                    self.drop_partition(partition.name)
+                    dropped.append(partition.name)
+            else:
+                subpartitions = self.get_priority_partitions(partition.name)
+                expired = [
+                    sub.name
+                    for sub in subpartitions
+                    if self._has_expired(partition.end, sub.priorities, now)
+                ]
+                remaining = [sub for sub in subpartitions if sub.name not in expired]
+                if (
+                    subpartitions
+                    and self._has_expired(partition.end, None, now)
+                    and all(sub.priorities == (None,) for sub in remaining)
+                    and all(self._is_empty(sub.name) for sub in remaining)
+                ):
+                    self.drop_partition(partition.name)
+                    dropped.append(partition.name)
+                else:
+                    for name in expired:
+                        self.drop_partition(name, parent=partition.name)
+                    dropped.extend(expired)
+
+        self.delete_expired_rows(DEFAULT_PARTITION, now)
+        return dropped
+
+    def _has_expired(self, end, priorities, now):
+        days = self.get_retention(priorities)
+        return days is not None and end <= now - datetime.timedelta(days=days)
+
+    def _is_empty(self, name):
+        self._execute("SELECT EXISTS (SELECT 1 FROM {schema}.%s)" % name)
+        return not self.cursor.fetchone()[0]
+
+    def drop_partition(self, name, parent=TABLE):
+        """Detaches a partition from its parent table and drops it"""
+        _logger.info("dropping expired log_message partition %s", name)
+        self._execute(
+            "ALTER TABLE {schema}.%s DETACH PARTITION {schema}.%s" % (parent, name)
+        )
+        self._execute("DROP TABLE {schema}.%s" % name)
+
+    def delete_expired_rows(self, table=TABLE, now=None):
+        """Deletes expired messages from table, one priority at a time"""
+        now = now or datetime.datetime.now()
+        for priority, days in sorted(self.retention.items()):
+            self._execute(
+                "DELETE FROM {schema}.%s WHERE newpriority=%%s AND time < %%s" % table,
+                (priority, now - datetime.timedelta(days=days)),
+            )
+
+    def _execute(self, sql, args=None):
+        sql = sql.format(schema=SCHEMA, table=TABLE, default=DEFAULT_PARTITION)
+        self.cursor.execute(sql, args)
+
+
+def get_interval_start(timestamp, interval):
+    """Returns the start of the partition interval that timestamp falls in.
+    Weeks start on Mondays.
+    """
+    start = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == INTERVAL_WEEK:
+        start -= datetime.timedelta(days=start.weekday())
+    return start
+
+
+def find_gaps(start, end, partitions):
+    """Finds the time ranges between start and end that are not covered by
+    any of the given partitions.
+
+    :param partitions: A list of non-overlapping TimePartition tuples,
+                       ordered by time.
+    :returns: A list of (start, end) tuples.
+    """
+    gaps = []
+    for partition in partitions:
+        part_start = partition.start or datetime.datetime.min
+        part_end = partition.end or datetime.datetime.max
+        if part_end <= start or part_start >= end:
+            continue
+        if part_start > start:
+            gaps.append((start, part_start))
+        start = part_end
+    if start < end:
+        gaps.append((start, end))
+    return gaps
+
+
+def _parse_range_value(value):
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.datetime.fromisoformat(value.strip("'"))
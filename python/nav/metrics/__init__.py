@@ -31,6 +31,11 @@ port = 2003
 [graphiteweb]
 base=http://localhost:8000/
 format=png
+render_format=json
+render_parallelism=4
+render_timeout=60
+query_cache_max_ttl=3600
+metric_index_max_age=86400
 """
 
 
@@ -55,6 +55,24 @@ def send_metrics_to(metric_tuples, host, port=2003):
     :param port: The carbon backend UDP port
 
     """
+    _logger.debug("sending carbon metrics to [%s]:%s: %r", host, port, metric_tuples)
+    _send_packets(metrics_to_packets(metric_tuples), host, port)
+
+
+def send_lines_to(lines, host, port=2003):
+    """
+    Sends a list of already formatted metric lines to a carbon backend.
+
+    :param lines: A list of metric lines, as produced by metric_to_line()
+    :param host: IP address of the carbon backend
+    :param port: The carbon backend UDP port
+
+    """
+    _logger.debug("sending %d carbon metric lines to [%s]:%s", len(lines), host, port)
+    _send_packets(lines_to_packets(lines), host, port)
+
+
+def _send_packets(packets, host, port):
     # pylint: disable=W0601
     global carbon
     try:
@@ -63,9 +81,8 @@ def send_metrics_to(metric_tuples, host, port=2003):
         carbon = socket.socket(_socktype_from_addr(host), socket.SOCK_DGRAM)
         carbon.connect((host, port))
 
-    _logger.debug("sending carbon metrics to [%s]:%s: %r", host, port, metric_tuples)
     try:
-        for packet in metrics_to_packets(metric_tuples):
+        for packet in packets:
             carbon.send(packet)
     except socket.error as error:
         _handle_error(error, host, port)
@@ -120,18 +137,35 @@ def send_metrics(metric_tuples):
     return send_metrics_to(metric_tuples, host, port)
 
 
+def send_lines(lines):
+    """Sends a list of already formatted metric lines to the pre-configured
+    carbon backend.
+
+    :param lines: A list of metric lines, as produced by metric_to_line()
+
+    """
+    host = CONFIG.get("carbon", "host")
+    port = CONFIG.getint("carbon", "port")
+    return send_lines_to(lines, host, port)
+
+
 def _socktype_from_addr(addr):
     info = socket.getaddrinfo(addr, 0)
     socktype = info[0][0]
     return socktype
 
 
-def _metric_to_line(metric_tuple):
-    path, (timestamp, value) = metric_tuple
+def metric_to_line(path, timestamp, value):
+    """Formats a metric as a line of the Graphite/Carbon line protocol"""
     line = "%s %s %s\n" % (path, value, int(timestamp))
     return line.encode('utf-8')
 
 
+def _metric_to_line(metric_tuple):
+    path, (timestamp, value) = metric_tuple
+    return metric_to_line(path, timestamp, value)
+
+
 def metrics_to_packets(metric_tuples):
     """
     Converts a list of metric tuples to a series of Graphite/Carbon
@@ -140,13 +174,26 @@ def metrics_to_packets(metric_tuples):
     :param metric_tuples: A list of metric tuples in the form
                           [(path, (timestamp, value)), ...]
 
+    :return: A generator that yields a series of payload packets to send to a
+             Carbon backend.
+
+    """
+    return lines_to_packets(_metric_to_line(metric) for metric in metric_tuples)
+
+
+def lines_to_packets(lines):
+    """
+    Packs a series of formatted metric lines into Graphite/Carbon protocol
+    packets ready to transmit over the wire (UDP) to a Carbon backend.
+
+    :param lines: An iterable of metric lines, as produced by metric_to_line()
+
     :return: A generator that yields a series of payload packets to send to a
              Carbon backend.
 
     """
     output = bytearray()
-    for metric in metric_tuples:
-        line = _metric_to_line(metric)
+    for line in lines:
         if len(output) + len(line) > MAX_UDP_PAYLOAD:
             packet = bytes(output)
             yield packet
@@ -15,28 +15,88 @@
 # along with NAV. If not, see <http://www.gnu.org/licenses/>.
 #
 """Retrieval and calculations on raw numbers from Graphite metrics"""
-import codecs
 from datetime import datetime
-import json
 import logging
-from urllib.parse import urlencode, urljoin
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError, URLError
-
-from nav.metrics import CONFIG, errors
+import threading
+
+from nav.metrics import CONFIG
+from nav.metrics.render import (
+    GRAPHITE_TIME_FORMAT,
+    GraphiteRenderClient,
+    average,
+    maximum,
+)
+from nav.metrics.querycache import MetricQueryCache
 from nav.metrics.templates import (
     metric_path_for_packet_loss,
     metric_path_for_roundtrip_time,
 )
-from nav.util import chunks
 
 _logger = logging.getLogger(__name__)
 
 MAX_TARGETS_PER_REQUEST = 100
-GRAPHITE_TIME_FORMAT = "%H:%M_%Y%m%d"
 
+_client = None
+_client_settings = None
+_client_lock = threading.Lock()
+_query_cache = None
+
+
+def get_render_client():
+    """Returns a render client for the configured graphite-web instance,
+    shared by all threads, so that its connections can be reused.
+    """
+    global _client, _client_settings
+    settings = (
+        CONFIG.get("graphiteweb", "base"),
+        CONFIG.getint("graphiteweb", "render_parallelism"),
+        CONFIG.get("graphiteweb", "render_format"),
+        CONFIG.getint("graphiteweb", "render_timeout"),
+    )
+    with _client_lock:
+        if _client is None or _client_settings != settings:
+            base, parallelism, render_format, timeout = settings
+            try:
+                _client = GraphiteRenderClient(
+                    base, parallelism, render_format.strip().lower(), timeout
+                )
+            except ValueError as err:
+                _logger.error("%s, using json", err)
+                _client = GraphiteRenderClient(base, parallelism, timeout=timeout)
+            _client_settings = settings
+        return _client
 
-def get_metric_average(target, start="-5min", end="now", ignore_unknown=True):
+
+def get_query_cache():
+    """Returns the metric query cache shared by all threads, or None if query
+    caching has been disabled.
+    """
+    global _query_cache
+    max_ttl = CONFIG.getint("graphiteweb", "query_cache_max_ttl")
+    if max_ttl <= 0:
+        return None
+    with _client_lock:
+        if _query_cache is None or _query_cache.max_ttl != max_ttl:
+            timeout = CONFIG.getint("graphiteweb", "render_timeout")
+            _query_cache = MetricQueryCache(max_ttl=max_ttl, lock_timeout=timeout)
+        return _query_cache
+
+
+def _cached_query(kind, target, start, end, fetch):
+    """Returns the result of fetch, by way of the query cache if enabled"""
+    query_cache = get_query_cache()
+    if query_cache is None:
+        return fetch()
+    return query_cache.get(kind, target, start, end, fetch)
+
+
+def get_metric_average(
+    target,
+    start="-5min",
+    end="now",
+    ignore_unknown=True,
+    chunk_size=MAX_TARGETS_PER_REQUEST,
+):
     """Calculates the average value of a metric over a given period of time
 
     :param target: A metric path string or a list of multiple metric paths
@@ -45,54 +105,65 @@ def get_metric_average(target, start="-5min", end="now", ignore_unknown=True):
     :param ignore_unknown: Ignore unknown values when calculating the average.
                            Unless True, any unknown data in the series will
                            result in an average value of None.
+    :param chunk_size: The maximum number of metric paths to ask Graphite for
+                       in a single request. Requests are made concurrently.
     :returns: A dict of {target: average_value} items. Targets that weren't
               found in Graphite will not be present in the dict.
 
     """
+    if not target:
+        return {}
     start_time = datetime.now()
 
-    data = get_metric_data(target, start, end)
-    result = {}
-    for target in data:
-        dpoints = [
-            d[0] for d in target['datapoints'] if not (ignore_unknown and d[0] is None)
-        ]
-        if dpoints:
-            if None in dpoints:
-                avg = None
-            else:
-                avg = sum(dpoints) / len(dpoints)
-            result[target['target']] = avg
+    result = _cached_query(
+        'average' if ignore_unknown else 'average-unknown',
+        target,
+        start,
+        end,
+        lambda: get_render_client().aggregate(
+            target,
+            lambda values: average(values, ignore_unknown),
+            start,
+            end,
+            chunk_size=chunk_size,
+        ),
+    )
 
     _logger.debug(
         'Got metric average for %s targets in %s seconds',
-        len(data),
+        len(result),
         datetime.now() - start_time,
     )
     return result
 
 
-def get_metric_max(target, start="-5min", end="now"):
-    data = get_metric_data(target, start, end)
-    result = {}
-    for target in data:
-        dpoints = [d[0] for d in target['datapoints'] if d[0] is not None]
-        if dpoints:
-            if None in dpoints:
-                maximum = None
-            else:
-                maximum = max(dpoints)
-            result[target['target']] = maximum
-    return result
+def get_metric_max(
+    target, start="-5min", end="now", chunk_size=MAX_TARGETS_PER_REQUEST
+):
+    if not target:
+        return {}
+    return _cached_query(
+        'max',
+        target,
+        start,
+        end,
+        lambda: get_render_client().aggregate(
+            target, maximum, start, end, chunk_size=chunk_size
+        ),
+    )
 
 
-def get_metric_data(target, start="-5min", end="now"):
+def get_metric_data(
+    target, start="-5min", end="now", chunk_size=MAX_TARGETS_PER_REQUEST
+):
     """
     Retrieves raw datapoints from a graphite target for a given period of time.
 
     :param target: A metric path string or a list of multiple metric paths
     :param start: A start time specification that Graphite will accept.
     :param end: An end time specification that Graphite will accept.
+    :param chunk_size: The maximum number of metric paths to ask Graphite for
+                       in a single request. Requests are made concurrently.
 
     :returns: A raw, response from Graphite. Normally a list of dicts that
               represent the names and datapoints of each matched target,
@@ -104,49 +175,16 @@ def get_metric_data(target, start="-5min", end="now"):
     if not target:
         return []  # no point in wasting time on http requests for no data
 
-    base = CONFIG.get("graphiteweb", "base")
-    url = urljoin(base, "/render/")
-
-    # What does Graphite accept of formats? Lets check if the parameters are
-    # datetime objects and try to force a format then
-    if isinstance(start, datetime):
-        start = start.strftime(GRAPHITE_TIME_FORMAT)
-    if isinstance(end, datetime):
-        end = end.strftime(GRAPHITE_TIME_FORMAT)
-
-    query = {
-        'target': target,
-        'from': start,
-        'until': end,
-        'format': 'json',
-    }
-    query = urlencode(query, True)
-
     _logger.debug("get_metric_data%r", (target, start, end))
-    req = Request(url, data=query.encode('utf-8'))
-    try:
-        response = urlopen(req)
-        json_data = json.load(codecs.getreader('utf-8')(response))
-        _logger.debug("get_metric_data: returning %d results", len(json_data))
-        return json_data
-    except HTTPError as err:
-        _logger.error(
-            "Got a 500 error from graphite-web when fetching %s" "with data %s",
-            err.url,
-            query,
-        )
-        _logger.error("Graphite output: %s", err.fp.read())
-        raise errors.GraphiteUnreachableError("{0} is unreachable".format(base), err)
-    except URLError as err:
-        raise errors.GraphiteUnreachableError("{0} is unreachable".format(base), err)
-    except ValueError:
-        # response could not be decoded
-        return []
-    finally:
-        try:
-            response.close()
-        except NameError:
-            pass
+    data = _cached_query(
+        'data',
+        target,
+        start,
+        end,
+        lambda: get_render_client().render(target, start, end, chunk_size=chunk_size),
+    )
+    _logger.debug("get_metric_data: returning %d results", len(data))
+    return data
 
 
 DEFAULT_TIME_FRAMES = ('day', 'week', 'month')
@@ -201,9 +239,7 @@ def get_netboxes_availability(
 
 def populate_for_interval(result, targets, netboxes, start_time, end_time):
     """Populate results based on a time interval"""
-    avg = {}
-    for request in chunks(targets, MAX_TARGETS_PER_REQUEST):
-        avg.update(get_metric_average(request, start=start_time, end=end_time))
+    avg = get_metric_average(targets, start=start_time, end=end_time)
 
     for netbox in netboxes:
         root = result[netbox.id]
@@ -223,9 +259,7 @@ def populate_for_interval(result, targets, netboxes, start_time, end_time):
 def populate_for_time_frame(result, targets, netboxes, time_frames):
     """Populate results based on a list of time frames"""
     for time_frame in time_frames:
-        avg = {}
-        for request in chunks(targets, MAX_TARGETS_PER_REQUEST):
-            avg.update(get_metric_average(request, start="-1%s" % time_frame))
+        avg = get_metric_average(targets, start="-1%s" % time_frame)
 
         for netbox in netboxes:
             root = result[netbox.id]
@@ -25,6 +25,9 @@ TIMETICKS_IN_DAY = 100 * 3600 * 24
 TARGET_TOKENS = re.compile(r'[\w\-*?]+|[(){}\[\]]|,|\.')
 
 
+_SENSOR_PATTERN = re.compile(r'\.sensors\.')
+
+
 def get_sensor_meta(metric_path):
     """
     Returns meta information for drawing a Sensor metric graph annotated with
@@ -88,7 +91,7 @@ META_LOOKUPS = (
         re.compile(r'\.sysuptime$'),
         dict(transform="scale({id},%.20f)" % (1.0 / TIMETICKS_IN_DAY), unit="days"),
     ),
-    (re.compile(r'\.sensors\.'), get_sensor_meta),
+    (_SENSOR_PATTERN, get_sensor_meta),
     (re.compile(r'\.loadavg[0-9]+min$'), dict(unit="%")),
     (re.compile(r'_percent$'), dict(unit="%")),
     # Memory
@@ -150,6 +153,7 @@ class Graph(object):
                 self.add_target(target)
 
         if magic_targets:
+            _prefetch_subjects(magic_targets)
             for target in magic_targets:
                 self.add_magic_target(target)
 
@@ -208,6 +212,17 @@ class Graph(object):
         return target
 
 
+def _prefetch_subjects(targets):
+    """Looks up the NAV objects that the meta information of a list of
+    targets depends on in bulk, so that they need not be looked up one by one.
+    """
+    from nav.metrics.lookup import lookup_many
+
+    sensors = [target for target in targets if _SENSOR_PATTERN.search(target)]
+    if len(sensors) > 1:
+        lookup_many(sensors)
+
+
 def get_simple_graph_url(
     metric_paths,
     time_frame="1day",
@@ -0,0 +1,299 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""A local index of the names of all metrics known to Graphite.
+
+Walking the metric hierarchy through graphite-web's find API takes one HTTP
+request per node, which is slow for large installations. Instead, the names
+of all metrics can be downloaded from graphite-web's index API and stored in
+a file, one name per line, in sorted order.
+
+The file is never read into memory. Queries are answered by binary searches
+for the literal prefix of the query, reading only the lines that can match.
+Like graphite-web's find API, queries may contain the wildcards ``*`` and
+``?``, character classes like ``[0-9]`` and alternatives like ``{in,out}``.
+
+"""
+import logging
+import os
+import re
+import tempfile
+import time
+from urllib.parse import urljoin
+
+import requests
+
+from nav import buildconf
+from nav.metrics import CONFIG, errors
+from nav.metrics.render import iter_json_array
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_FILE = os.path.join(buildconf.localstatedir, 'metrics.index')
+WILDCARDS = re.compile(r'[*?\[{]')
+BRACES = re.compile(r'{([^{}]*)}')
+SEPARATOR = b'.'
+# the character sorting right after the separator
+AFTER_SEPARATOR = b'/'
+
+
+class MetricIndex(object):
+    """Queries a sorted file of metric names"""
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def find(self, query):
+        """Finds the nodes of the metric hierarchy matching query.
+
+        :param query: A metric path query, e.g. "nav.devices.*.cpu".
+        :returns: A list of dicts describing the matching nodes, sorted by
+                  their paths, like the tree format of graphite-web's find API.
+        """
+        nodes = {}
+        with open(self.filename, 'rb') as index:
+            reader = _IndexReader(index)
+            for pattern in expand_braces(query):
+                self._find_nodes(reader, pattern, nodes)
+
+        return [
+            {
+                'id': path,
+                'text': path.rsplit('.', 1)[-1],
+                'leaf': int(leaf),
+                'expandable': int(expandable),
+                'allowChildren': int(expandable),
+            }
+            for path, (leaf, expandable) in sorted(nodes.items())
+        ]
+
+    @staticmethod
+    def _find_nodes(reader, pattern, nodes):
+        depth = pattern.count('.') + 1
+        matcher = compile_pattern(pattern)
+        prefix = _literal_prefix(pattern).encode('utf-8')
+
+        position = reader.find(prefix)
+        while True:
+            line = reader.line_at(position)
+            if line is None or not line.startswith(prefix):
+                break
+            elements = line.split(SEPARATOR, depth)
+            if len(elements) < depth:
+                position = reader.next_line
+                continue
+
+            node = SEPARATOR.join(elements[:depth])
+            path = node.decode('utf-8')
+            if matcher(path):
+                leaf, expandable = nodes.get(path, (False, False))
+                if len(elements) == depth:
+                    leaf = True
+                else:
+                    expandable = True
+                nodes[path] = (leaf, expandable)
+
+            if len(elements) == depth:
+                position = reader.next_line
+            else:
+                # skip everything below this node
+                position = reader.find(node + AFTER_SEPARATOR)
+
+    def get_leaves_below(self, top, ignored=None):
+        """Returns a list of all leaf nodes below top.
+
+        :param ignored: A list of nodes whose leaves are left out.
+        """
+        prefix = top.encode('utf-8') + SEPARATOR
+        ignored = [node.encode('utf-8') for node in ignored or []]
+        leaves = []
+        with open(self.filename, 'rb') as index:
+            reader = _IndexReader(index)
+            position = reader.find(prefix)
+            while True:
+                line = reader.line_at(position)
+                if line is None or not line.startswith(prefix):
+                    break
+                ignore = next(
+                    (node for node in ignored if _is_at_or_below(line, node)),
+                    None,
+                )
+                if ignore:
+                    position = reader.find(ignore + AFTER_SEPARATOR)
+                else:
+                    leaves.append(line.decode('utf-8'))
+                    position = reader.next_line
+        return leaves
+
+
+class _IndexReader(object):
+    """Reads lines at byte offsets of a sorted file"""
+
+    def __init__(self, index):
+        self.index = index
+        self.size = os.fstat(index.fileno()).st_size
+        self.next_line = 0
+
+    def line_at(self, position):
+        """Returns the first line that starts at or after position, or None if
+        there is none. Sets next_line to the position of the following line.
+        """
+        if position:
+            self.index.seek(position - 1)
+            self.index.readline()
+        else:
+            self.index.seek(0)
+        line = self.index.readline()
+        self.next_line = self.index.tell()
+        if not line:
+            return None
+        return line.rstrip(b'\n')
+
+    def find(self, key):
+        """Returns the position of the first line that is not less than key"""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            line = self.line_at(middle)
+            if line is not None and line < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low:
+            self.index.seek(low - 1)
+            self.index.readline()
+            return self.index.tell()
+        return 0
+
+
+def _is_at_or_below(line, node):
+    return line.startswith(node) and line[len(node) : len(node) + 1] in (
+        b'',
+        SEPARATOR,
+    )
+
+
+def _literal_prefix(pattern):
+    match = WILDCARDS.search(pattern)
+    return pattern[: match.start()] if match else pattern
+
+
+def expand_braces(pattern):
+    """Expands the alternatives of a pattern into a list of patterns.
+
+    >>> expand_braces('a.{b,c}.{d,e}')
+    ['a.b.d', 'a.b.e', 'a.c.d', 'a.c.e']
+    """
+    match = BRACES.search(pattern)
+    if not match:
+        return [pattern]
+    head, tail = pattern[: match.start()], pattern[match.end() :]
+    expanded = []
+    for alternative in match.group(1).split(','):
+        for result in expand_braces(head + alternative + tail):
+            if result not in expanded:
+                expanded.append(result)
+    return expanded
+
+
+def compile_pattern(pattern):
+    """Compiles a brace-free metric path pattern into a function that tells
+    whether a metric path matches it.
+    """
+    if not WILDCARDS.search(pattern):
+        return pattern.__eq__
+    regex = r'\.'.join(_translate(node) for node in pattern.split('.'))
+    return re.compile(regex + r'\Z').match
+
+
+def _translate(node):
+    """Translates a node pattern to a regular expression that never matches
+    across node separators.
+    """
+    regex = []
+    index = 0
+    while index < len(node):
+        char = node[index]
+        end = node.find(']', index + 2) if char == '[' else -1
+        if char == '*':
+            regex.append('[^.]*')
+        elif char == '?':
+            regex.append('[^.]')
+        elif end > 0:
+            chars = node[index + 1 : end].replace('\\', '\\\\')
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            regex.append('[' + chars + ']')
+            index = end
+        else:
+            regex.append(re.escape(char))
+        index += 1
+    return ''.join(regex)
+
+
+def get_index_filename():
+    """Returns the configured file name of the metric index"""
+    return CONFIG.get('graphiteweb', 'metric_index', fallback='') or DEFAULT_INDEX_FILE
+
+
+def get_metric_index():
+    """Returns the metric index, or None if there is no sufficiently recent
+    index.
+    """
+    filename = get_index_filename()
+    max_age = CONFIG.getint('graphiteweb', 'metric_index_max_age')
+    try:
+        modified = os.stat(filename).st_mtime
+    except OSError:
+        return None
+    if max_age > 0 and modified < time.time() - max_age:
+        _logger.debug("metric index %s is too old to be used", filename)
+        return None
+    return MetricIndex(filename)
+
+
+def refresh_index(filename=None, timeout=None):
+    """Downloads the names of all metrics from graphite-web and replaces the
+    metric index file with them.
+
+    :returns: The number of metric names in the new index.
+    """
+    filename = filename or get_index_filename()
+    base = CONFIG.get('graphiteweb', 'base')
+    url = urljoin(base, '/metrics/index.json')
+    timeout = timeout or CONFIG.getint('graphiteweb', 'render_timeout')
+    try:
+        response = requests.get(url, stream=True, timeout=timeout)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        names = {name.encode('utf-8') for name in iter_json_array(response.raw)}
+    except requests.RequestException as err:
+        raise errors.GraphiteUnreachableError("{0} is unreachable".format(base), err)
+
+    names.discard(b'')
+    directory = os.path.dirname(filename) or '.'
+    handle, tmpname = tempfile.mkstemp(dir=directory, prefix='.metrics.index.')
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            for name in sorted(names):
+                if b'\n' not in name:
+                    output.write(name + b'\n')
+        os.chmod(tmpname, 0o644)
+        os.replace(tmpname, filename)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+    _logger.info("wrote %d metric names to %s", len(names), filename)
+    return len(names)
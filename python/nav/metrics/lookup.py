@@ -16,17 +16,22 @@
 #
 """Functions for reverse-mapping metric names to NAV objects"""
 
-from functools import lru_cache
+from collections import defaultdict
 import re
 
+from nav.metrics.names import escape_metric_name
 from nav.models.manage import Netbox, Interface, Prefix, Sensor
+from nav.util import LRUCache
 
 
-__all__ = ['reverses', 'lookup']
+__all__ = ['reverses', 'reverses_many', 'lookup', 'lookup_many']
 _reverse_handlers = []
+_bulk_handlers = {}
+
+CACHE_SIZE = 50000
+CACHE_TTL = 600  # seconds
 
 
-@lru_cache(maxsize=200)
 def lookup(metric):
     """
     Looks up a NAV object from a metric path.
@@ -37,10 +42,50 @@ def lookup(metric):
              nav.models package.
 
     """
-    for pattern, func in _reverse_handlers:
-        match = pattern.search(metric)
-        if match:
-            return func(**match.groupdict())
+    return lookup_many([metric])[metric]
+
+
+def lookup_many(metrics):
+    """
+    Looks up the NAV objects of a list of metric paths.
+
+    Metric paths are grouped by the reverse lookup function that handles
+    them, and each group is looked up using a single database query, where
+    possible. Results are cached for CACHE_TTL seconds.
+
+    :param metrics: A list of Graphite metric paths.
+    :return: A dict of {metric: object} items, where object is None for
+             metrics that could not be looked up.
+
+    """
+    result = {}
+    groups = defaultdict(list)
+    for metric in metrics:
+        if metric in result:
+            continue
+        try:
+            result[metric] = _cache.get(metric)
+            continue
+        except KeyError:
+            pass
+        for pattern, func in _reverse_handlers:
+            match = pattern.search(metric)
+            if match:
+                groups[func].append((metric, match.groupdict()))
+                break
+        else:
+            result[metric] = None
+
+    for func, items in groups.items():
+        if func in _bulk_handlers and len(items) > 1:
+            objects = _bulk_handlers[func]([kwargs for _metric, kwargs in items])
+        else:
+            objects = [func(**kwargs) for _metric, kwargs in items]
+        for (metric, _kwargs), obj in zip(items, objects):
+            result[metric] = obj
+            _cache.set(metric, obj)
+
+    return result
 
 
 def reverses(pattern):
@@ -57,6 +102,25 @@ def reverses(pattern):
     return _decorator
 
 
+def reverses_many(single):
+    """Decorator to register a function that does the work of the reverse
+    lookup function single for many metrics at once.
+
+    The decorated function is called with a list of the keyword argument
+    dicts single would have been called with, and must return a list of the
+    corresponding results.
+    """
+
+    def _decorator(func):
+        _bulk_handlers[single] = func
+        return func
+
+    return _decorator
+
+
+_cache = LRUCache(CACHE_SIZE, ttl=CACHE_TTL)
+
+
 ### Reverse lookup functions
 
 
@@ -69,6 +133,19 @@ def _reverse_interface(sysname, ifname):
     )
 
 
+@reverses_many(_reverse_interface)
+def _reverse_interfaces(items):
+    keys = [(item['sysname'], item['ifname']) for item in items]
+    by_ifname = _bulk_like_match(
+        Interface, keys, _INTERFACE_NAME_FIELDS, related=['netbox'], by_netbox=True
+    )
+    missing = [key for key in keys if not by_ifname.get(key)]
+    by_ifdescr = _bulk_like_match(
+        Interface, missing, _INTERFACE_DESCR_FIELDS, related=['netbox'], by_netbox=True
+    )
+    return [by_ifname.get(key) or by_ifdescr.get(key) for key in keys]
+
+
 @reverses(r'\.devices\.(?P<sysname>[^.]+)\.sensors\.(?P<name>[^\.]+)')
 def _reverse_sensor(sysname, name):
     return _single_like_match(
@@ -76,6 +153,15 @@ def _reverse_sensor(sysname, name):
     )
 
 
+@reverses_many(_reverse_sensor)
+def _reverse_sensors(items):
+    keys = [(item['sysname'], item['name']) for item in items]
+    sensors = _bulk_like_match(
+        Sensor, keys, _SENSOR_FIELDS, related=['netbox'], by_netbox=True
+    )
+    return [sensors.get(key) for key in keys]
+
+
 @reverses(r'\.devices\.(?P<sysname>[^.]+)\.cpu\.(?P<cpuname>[^.]+)')
 def _reverse_device_cpu(sysname, cpuname):
     netbox = _single_like_match(Netbox, sysname=sysname)
@@ -83,6 +169,19 @@ def _reverse_device_cpu(sysname, cpuname):
     return "%s: %s" % (sysname, cpuname)
 
 
+@reverses_many(_reverse_device_cpu)
+def _reverse_device_cpus(items):
+    netboxes = _bulk_match_netboxes(items)
+    return [
+        "%s: %s"
+        % (
+            getattr(netboxes.get(item['sysname']), 'sysname', item['sysname']),
+            item['cpuname'],
+        )
+        for item in items
+    ]
+
+
 @reverses(r'\.devices\.(?P<sysname>[^.]+)\.system\.')
 def _reverse_uptime(sysname):
     netbox = _single_like_match(Netbox, sysname=sysname)
@@ -92,16 +191,35 @@ def _reverse_uptime(sysname):
         return sysname
 
 
+@reverses_many(_reverse_uptime)
+def _reverse_uptimes(items):
+    netboxes = _bulk_match_netboxes(items)
+    return [netboxes.get(item['sysname']) or item['sysname'] for item in items]
+
+
 @reverses(r'\.devices\.(?P<sysname>[^.]+)$')
 def _reverse_device(sysname):
     return _single_like_match(Netbox, sysname=sysname)
 
 
+@reverses_many(_reverse_device)
+def _reverse_devices(items):
+    netboxes = _bulk_match_netboxes(items)
+    return [netboxes.get(item['sysname']) for item in items]
+
+
 @reverses(r'\.prefixes\.(?P<netaddr>[^.]+)')
 def _reverse_prefix(netaddr):
     return _single_like_match(Prefix, netaddr=netaddr)
 
 
+@reverses_many(_reverse_prefix)
+def _reverse_prefixes(items):
+    keys = [(item['netaddr'],) for item in items]
+    prefixes = _bulk_like_match(Prefix, keys, _PREFIX_FIELDS)
+    return [prefixes.get(key) for key in keys]
+
+
 ### Helper functions
 
 
@@ -116,3 +234,88 @@ def _single_like_match(model, related=None, **kwargs):
         qset = qset.select_related(*related)
     if len(qset) == 1:
         return qset[0]
+
+
+def _bulk_like_match(model, keys, fields, related=None, by_netbox=False):
+    """Bulk version of _single_like_match.
+
+    Finds the objects whose fields match any of the given values in a single
+    query, and maps them to the keys they match. As in _single_like_match,
+    keys that match more than one object are left out.
+
+    :param keys: A list of tuples of escaped field values to match.
+    :param fields: A list of (column, getter) tuples, one for each element of
+                   the keys, where getter gets the field value of an object.
+    :param by_netbox: If True, the first element of each key is the sysname of
+                      the object's netbox. The matching netboxes are looked up
+                      first, and only their objects are matched against the
+                      remaining fields.
+    :returns: A dict of {key: object} items.
+    """
+    if not keys:
+        return {}
+    qset = model.objects
+    first = 0
+    if by_netbox:
+        netbox_ids = _find_netbox_ids({key[0] for key in keys})
+        if not netbox_ids:
+            return {}
+        qset = qset.filter(netbox__in=netbox_ids)
+        first = 1
+    where = [
+        "{column}::TEXT LIKE ANY(%s)".format(column=column)
+        for column, _getter in fields[first:]
+    ]
+    params = [
+        sorted({key[index] for key in keys}) for index in range(first, len(fields))
+    ]
+    qset = qset.extra(where=where, params=params)
+    if related:
+        qset = qset.select_related(*related)
+
+    matches = defaultdict(list)
+    for obj in qset:
+        key = tuple(escape_metric_name(str(getter(obj))) for _column, getter in fields)
+        matches[key].append(obj)
+    wanted = set(keys)
+    return {
+        key: objs[0]
+        for key, objs in matches.items()
+        if key in wanted and len(objs) == 1
+    }
+
+
+def _find_netbox_ids(sysnames):
+    """Returns the ids of all netboxes whose escaped sysnames are among
+    sysnames.
+    """
+    netboxes = Netbox.objects.extra(
+        where=["sysname::TEXT LIKE ANY(%s)"], params=[sorted(sysnames)]
+    ).values_list('id', 'sysname')
+    return [
+        netboxid
+        for netboxid, sysname in netboxes
+        if escape_metric_name(sysname) in sysnames
+    ]
+
+
+def _bulk_match_netboxes(items):
+    keys = [(item['sysname'],) for item in items]
+    netboxes = _bulk_like_match(Netbox, keys, _NETBOX_FIELDS)
+    return {key[0]: netbox for key, netbox in netboxes.items()}
+
+
+_NETBOX_FIELDS = [('sysname', lambda netbox: netbox.sysname)]
+_INTERFACE_NAME_FIELDS = [
+    ('sysname', lambda ifc: ifc.netbox.sysname),
+    ('ifname', lambda ifc: ifc.ifname),
+]
+_INTERFACE_DESCR_FIELDS = [
+    ('sysname', lambda ifc: ifc.netbox.sysname),
+    ('ifdescr', lambda ifc: ifc.ifdescr),
+]
+_SENSOR_FIELDS = [
+    ('sysname', lambda sensor: sensor.netbox.sysname),
+    ('internal_name', lambda sensor: sensor.internal_name),
+]
+_PREFIX_FIELDS = [('netaddr', lambda prefix: prefix.net_address)]
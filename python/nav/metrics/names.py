@@ -19,12 +19,16 @@
 from collections import OrderedDict
 import itertools
 import json
+import logging
 from urllib.parse import urlencode, urljoin
 from urllib.request import Request, urlopen
 from urllib.error import URLError
 from nav.metrics import CONFIG, errors
+from nav.metrics.index import get_metric_index
 import string
 
+_logger = logging.getLogger(__name__)
+
 LEGAL_METRIC_CHARACTERS = string.ascii_letters + string.digits + "-_"
 
 
@@ -59,6 +63,13 @@ def join_series(names):
 
 def get_all_leaves_below(top, ignored=None):
     """Gets a list of all leaf nodes in the metric hierarchy below top"""
+    index = get_metric_index()
+    if index:
+        try:
+            return index.get_leaves_below(top, ignored)
+        except OSError as error:
+            _logger.warning("could not read metric index: %s", error)
+
     walker = nodewalk(top, ignored)
     paths = (leaves for (name, nonleaves, leaves) in walker)
     return list(itertools.chain(*paths))
@@ -126,6 +137,13 @@ def raw_metric_query(query):
     :returns: A list of matching metrics, each represented by a dict.
 
     """
+    index = get_metric_index()
+    if index:
+        try:
+            return index.find(query)
+        except OSError as error:
+            _logger.warning("could not read metric index: %s", error)
+
     base = CONFIG.get("graphiteweb", "base")
     url = urljoin(base, "/metrics/find")
     query = urlencode({'query': query})
@@ -0,0 +1,380 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""A short-lived cache of the results of metric queries to graphite-web.
+
+Results are stored in the Django cache, so that they are shared by all NAV
+processes, under a key made from the normalized targets, time window and
+aggregation of a query. A result is kept until Graphite can be expected to
+have new data for the queried window, which depends on the resolution of the
+archive Graphite will read the data from.
+
+Identical queries that are made while one is already in flight are
+coalesced: Within a process, the latecomers wait for the result of the first
+query. Across processes, a lock in the Django cache makes the latecomers
+wait for the result to appear in the cache.
+
+Hit and miss counters are sent to Carbon as running totals.
+
+"""
+import copy
+from datetime import datetime
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+from nav.metrics.carbon import send_metrics
+from nav.metrics.render import GRAPHITE_TIME_FORMAT
+from nav.metrics.templates import metric_path_for_metric_query_cache
+
+_logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'metrics'
+KEY_PREFIX = 'nav:metrics:query:'
+LOCK_SUFFIX = ':lock'
+COUNTER_PREFIX = 'nav:metrics:querycache:'
+COUNTERS = ('hits', 'misses', 'coalesced')
+DEFAULT_MAX_TTL = 3600  # seconds
+DEFAULT_LOCK_TIMEOUT = 60  # seconds
+POLL_INTERVAL = 0.1  # seconds
+STATS_INTERVAL = 60  # seconds
+
+# The resolution of the data Graphite returns, by how far back a query
+# reaches, as given by the retentions of NAV's default Carbon storage schemas.
+# Graphite reads all of a query from the finest archive that covers its start.
+RESOLUTIONS = (
+    (24 * 3600, 60),
+    (7 * 24 * 3600, 300),
+    (12 * 24 * 3600, 1800),
+    (50 * 24 * 3600, 2 * 3600),
+)
+COARSEST_RESOLUTION = 24 * 3600
+
+_UNITS = (
+    ('s', 1),
+    ('min', 60),
+    ('h', 3600),
+    ('d', 24 * 3600),
+    ('w', 7 * 24 * 3600),
+    ('mon', 30 * 24 * 3600),
+    ('m', 60),
+    ('y', 365 * 24 * 3600),
+)
+_OFFSET_RE = re.compile(r"^(?:now)?(?:(?P<sign>[+-])(?P<count>\d+)(?P<unit>[a-z]+))?$")
+_WHITESPACE_RE = re.compile(r"\s+")
+_UNQUOTED_WHITESPACE_RE = re.compile(r"""('[^']*'|"[^"]*")|\s+""")
+
+
+class MetricQueryCache(object):
+    """Caches query results in a Django cache, coalescing identical queries"""
+
+    def __init__(self, cache=None, max_ttl=DEFAULT_MAX_TTL, lock_timeout=None):
+        """
+        :param cache: A Django cache to store results in. Defaults to the
+                      Django cache named metrics, or the default cache if
+                      there is none by that name.
+        :param max_ttl: The maximum number of seconds to keep a result.
+        :param lock_timeout: The maximum number of seconds to wait for
+                             another process to finish an identical query.
+        """
+        self._cache = cache
+        self.max_ttl = max_ttl
+        self.lock_timeout = lock_timeout or DEFAULT_LOCK_TIMEOUT
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(COUNTERS, 0)
+        self._reported = dict(self._counts)
+        self._last_report = time.time()
+
+    @property
+    def cache(self):
+        """The Django cache results are stored in"""
+        if self._cache is not None:
+            return self._cache
+        # Django cache connections are thread local, and must be looked up
+        # by each thread
+        try:
+            return caches[CACHE_ALIAS]
+        except InvalidCacheBackendError:
+            return caches[DEFAULT_CACHE_ALIAS]
+
+    def get(self, kind, targets, start, end, fetch):
+        """Returns the cached result of a query, or the result of calling
+        fetch if it isn't cached.
+
+        :param kind: The kind of aggregation the query does.
+        :param targets: A target, or a list of targets.
+        :param start: The start of the time window, as given to Graphite.
+        :param end: The end of the time window, as given to Graphite.
+        :param fetch: A function that makes the query and returns its result.
+        """
+        key = make_key(kind, targets, start, end)
+        try:
+            result = self._get_cached(key)
+            if result is not None:
+                self._count('hits')
+                return result[0]
+
+            with self._lock:
+                flight = self._flights.get(key)
+                owner = flight is None
+                if owner:
+                    flight = self._flights[key] = _Flight()
+
+            if not owner:
+                self._count('coalesced')
+                return copy.deepcopy(flight.wait())
+
+            try:
+                result = self._fetch(key, start, end, fetch)
+            except BaseException as error:
+                flight.fail(error)
+                raise
+            else:
+                flight.succeed(result)
+                return result
+            finally:
+                with self._lock:
+                    del self._flights[key]
+        finally:
+            self._report_stats()
+
+    def _fetch(self, key, start, end, fetch):
+        # The lock is best-effort only: FileBasedCache.add() is not atomic, so
+        # two processes may occasionally both acquire it and make the same
+        # query. That only costs a redundant query, never a wrong result.
+        lock = key + LOCK_SUFFIX
+        locked = self._add(lock, os.getpid(), self.lock_timeout)
+        if not locked:
+            result = self._wait_for(key, lock)
+            if result is not None:
+                self._count('coalesced')
+                return result[0]
+            locked = self._add(lock, os.getpid(), self.lock_timeout)
+
+        self._count('misses')
+        try:
+            result = fetch()
+            ttl = get_ttl(start, end, max_ttl=self.max_ttl)
+            self._set(key, (result,), ttl)
+            return result
+        finally:
+            if locked:
+                self._delete(lock)
+
+    def _wait_for(self, key, lock):
+        """Waits for another process to cache the result of a query.
+
+        :returns: The cached result, or None if the other process gave up.
+        """
+        deadline = time.time() + self.lock_timeout
+        while time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+            result = self._get_cached(key)
+            if result is not None:
+                return result
+            if self._get_cached(lock) is None:
+                break
+        return self._get_cached(key)
+
+    def _get_cached(self, key):
+        try:
+            return self.cache.get(key)
+        except Exception as error:  # pylint: disable=broad-except
+            _logger.warning("could not read metric query cache: %s", error)
+            return None
+
+    def _set(self, key, value, ttl):
+        try:
+            self.cache.set(key, value, ttl)
+        except Exception as error:  # pylint: disable=broad-except
+            _logger.warning("could not write metric query cache: %s", error)
+
+    def _add(self, key, value, ttl):
+        try:
+            return self.cache.add(key, value, ttl)
+        except Exception as error:  # pylint: disable=broad-except
+            _logger.warning("could not lock metric query cache: %s", error)
+            return True
+
+    def _delete(self, key):
+        try:
+            self.cache.delete(key)
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    def _count(self, counter):
+        with self._lock:
+            self._counts[counter] += 1
+
+    def get_stats(self):
+        """Returns the number of hits, misses and coalesced queries counted by
+        this process.
+        """
+        with self._lock:
+            return dict(self._counts)
+
+    def _report_stats(self, now=None):
+        """Adds the counts of this process to the running totals shared by all
+        processes, and sends the totals to Carbon, at most once per
+        STATS_INTERVAL.
+        """
+        now = now or time.time()
+        with self._lock:
+            if now - self._last_report < STATS_INTERVAL:
+                return
+            self._last_report = now
+            counts = dict(self._counts)
+            deltas = {c: counts[c] - self._reported[c] for c in COUNTERS}
+            self._reported = counts
+
+        try:
+            for counter, delta in deltas.items():
+                if delta:
+                    self._increment(COUNTER_PREFIX + counter, delta)
+            totals = self.cache.get_many([COUNTER_PREFIX + c for c in COUNTERS])
+            send_metrics(
+                [
+                    (
+                        metric_path_for_metric_query_cache(counter),
+                        (now, totals.get(COUNTER_PREFIX + counter, 0)),
+                    )
+                    for counter in COUNTERS
+                ]
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            _logger.debug("could not report metric query cache stats: %s", error)
+
+    def _increment(self, key, delta):
+        try:
+            self.cache.incr(key, delta)
+        except ValueError:
+            if not self.cache.add(key, delta, None):
+                self.cache.incr(key, delta)
+
+
+class _Flight(object):
+    """A query in flight, which other threads can wait for the result of"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def succeed(self, result):
+        self._result = result
+        self._done.set()
+
+    def fail(self, error):
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+def make_key(kind, targets, start, end):
+    """Makes a cache key for a query from its normalized parameters.
+
+    Aggregations return a dict of values per target, so the order of their
+    targets doesn't matter. Raw data is returned as a list of series, in the
+    order of the targets, so the order of those targets is kept.
+    """
+    if isinstance(targets, str):
+        targets = [targets]
+    targets = [normalize_target(target) for target in targets]
+    if kind != 'data':
+        targets = sorted(set(targets))
+    query = (kind, targets, normalize_time(start), normalize_time(end))
+    digest = hashlib.sha1(repr(query).encode('utf-8')).hexdigest()
+    return KEY_PREFIX + digest
+
+
+def normalize_target(target):
+    """Removes all whitespace from a target, except within quoted arguments"""
+    return _UNQUOTED_WHITESPACE_RE.sub(lambda match: match.group(1) or '', target)
+
+
+def normalize_time(value):
+    """Normalizes a time specification, so that equivalent specifications
+    are equal.
+    """
+    if isinstance(value, datetime):
+        return value.strftime(GRAPHITE_TIME_FORMAT)
+    value = _WHITESPACE_RE.sub('', str(value)).lower()
+    return value or 'now'
+
+
+def parse_time(value, now):
+    """Parses a Graphite time specification.
+
+    :param now: The current time, as a UNIX timestamp.
+    :returns: A UNIX timestamp, or None if value could not be parsed.
+    """
+    if isinstance(value, datetime):
+        return time.mktime(value.timetuple())
+    value = normalize_time(value)
+    if value.isdigit():
+        return float(value)
+    try:
+        return time.mktime(time.strptime(value, GRAPHITE_TIME_FORMAT))
+    except ValueError:
+        pass
+
+    match = _OFFSET_RE.match(value)
+    if not match:
+        return None
+    if not match.group('sign'):
+        return now
+    for prefix, seconds in _UNITS:
+        if match.group('unit').startswith(prefix):
+            offset = int(match.group('count')) * seconds
+            return now - offset if match.group('sign') == '-' else now + offset
+    return None
+
+
+def get_resolution(span):
+    """Returns the expected resolution of data from a query reaching span
+    seconds back in time.
+    """
+    for reach, resolution in RESOLUTIONS:
+        if span <= reach:
+            return resolution
+    return COARSEST_RESOLUTION
+
+
+def get_ttl(start, end, now=None, max_ttl=DEFAULT_MAX_TTL):
+    """Returns the number of seconds a query result can be cached.
+
+    The result of a query whose window is still open is kept until the next
+    datapoint can be expected, while the result of one whose window has
+    closed is kept for max_ttl seconds.
+    """
+    now = now or time.time()
+    start = parse_time(start, now)
+    end = parse_time(end, now)
+    resolution = get_resolution(now - start if start is not None else 0)
+    if end is not None and end <= now - resolution:
+        return max_ttl
+    return max(1, min(max_ttl, resolution - int(now) % resolution))
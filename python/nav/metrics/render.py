@@ -0,0 +1,407 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""A client for the graphite-web render API.
+
+The client keeps HTTP connections to graphite-web alive between requests.
+Requests for many targets are split into chunks, which are fetched
+concurrently.
+
+Responses are decoded as streams, one series at a time, so that aggregates
+of many series can be calculated without keeping all their datapoints in
+memory at once. Besides JSON, graphite-web can encode its responses using
+msgpack (if the msgpack module is installed) or pickle, both of which are a
+lot cheaper to decode.
+
+"""
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import codecs
+from datetime import datetime
+import io
+import json
+import logging
+import pickle
+import time
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from nav.metrics import errors
+from nav.util import chunks
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_logger = logging.getLogger(__name__)
+
+FORMAT_JSON = 'json'
+FORMAT_MSGPACK = 'msgpack'
+FORMAT_PICKLE = 'pickle'
+FORMATS = (FORMAT_JSON, FORMAT_MSGPACK, FORMAT_PICKLE)
+
+DEFAULT_CHUNK_SIZE = 100
+DEFAULT_PARALLELISM = 4
+DEFAULT_TIMEOUT = 60  # seconds
+GRAPHITE_TIME_FORMAT = "%H:%M_%Y%m%d"
+READ_SIZE = 64 * 1024
+TIMINGS_KEPT = 100
+
+RequestTiming = namedtuple('RequestTiming', 'targets series bytes elapsed')
+
+
+class GraphiteRenderClient(object):
+    """Fetches series from the graphite-web render API"""
+
+    def __init__(
+        self,
+        base,
+        parallelism=DEFAULT_PARALLELISM,
+        render_format=FORMAT_JSON,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        """
+        :param base: The base URL of graphite-web.
+        :param parallelism: The maximum number of concurrent requests.
+        :param render_format: The format graphite-web should encode its
+                              responses in; json, msgpack or pickle.
+        :param timeout: The number of seconds to wait for graphite-web to
+                        respond.
+        """
+        if render_format not in FORMATS:
+            raise ValueError("unknown render format: %r" % render_format)
+        if render_format == FORMAT_MSGPACK and not msgpack:
+            _logger.warning("msgpack module is not installed, using json")
+            render_format = FORMAT_JSON
+        self.base = base
+        self.url = urljoin(base, "/render/")
+        self.parallelism = max(1, parallelism)
+        self.render_format = render_format
+        self.timeout = timeout
+        self.timings = deque(maxlen=TIMINGS_KEPT)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.parallelism)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def render(self, targets, start="-5min", end="now", chunk_size=DEFAULT_CHUNK_SIZE):
+        """Retrieves the datapoints of targets.
+
+        :param targets: A list of targets.
+        :param chunk_size: The maximum number of targets to request at a time.
+        :returns: A list of dicts that represent the names and datapoints of
+                  each matched target, like so::
+
+                    [{'target': 'x', 'datapoints': [(value, timestamp), ...]}]
+
+        """
+
+        def _render_chunk(chunk):
+            return [
+                {'target': target, 'datapoints': datapoints}
+                for target, datapoints in self._fetch(chunk, start, end, True)
+            ]
+
+        results = self._map_chunks(_render_chunk, targets, chunk_size)
+        return [series for result in results for series in result]
+
+    def aggregate(
+        self,
+        targets,
+        aggregator,
+        start="-5min",
+        end="now",
+        chunk_size=DEFAULT_CHUNK_SIZE,
+    ):
+        """Calculates an aggregate value of each of the series of targets,
+        without keeping more than one series of datapoints in memory per
+        request.
+
+        :param aggregator: A function that calculates the aggregate value of
+                           an iterable of datapoint values. It may return
+                           NO_VALUE to leave a series out of the result.
+        :param chunk_size: The maximum number of targets to request at a time.
+        :returns: A dict of {target: aggregate_value} items.
+        """
+
+        def _aggregate_chunk(chunk):
+            result = {}
+            for target, values in self._fetch(chunk, start, end):
+                value = aggregator(values)
+                if value is not NO_VALUE:
+                    result[target] = value
+            return result
+
+        result = {}
+        for values in self._map_chunks(_aggregate_chunk, targets, chunk_size):
+            result.update(values)
+        return result
+
+    def _map_chunks(self, func, targets, chunk_size):
+        """Calls func for each chunk of targets, concurrently, and returns a
+        list of the results.
+        """
+        if isinstance(targets, str):
+            targets = [targets]
+        requests_ = list(chunks(targets, chunk_size))
+        if len(requests_) <= 1:
+            return [func(chunk) for chunk in requests_]
+
+        workers = min(self.parallelism, len(requests_))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, requests_))
+
+    def _fetch(self, targets, start, end, datapoints=False):
+        """Requests a chunk of targets from graphite-web, and yields a
+        (target, values) tuple for each series in the response.
+
+        :param datapoints: If True, values are lists of (value, timestamp)
+                           tuples, otherwise iterables of values.
+        """
+        query = {
+            'target': list(targets),
+            'from': _format_time(start),
+            'until': _format_time(end),
+            'format': self.render_format,
+        }
+        _logger.debug("render request for %d targets", len(targets))
+        started = time.time()
+        try:
+            response = self.session.post(
+                self.url, data=query, stream=True, timeout=self.timeout
+            )
+            response.raise_for_status()
+        except requests.HTTPError as err:
+            _logger.error(
+                "Got a %s error from graphite-web when fetching %s with data %s",
+                err.response.status_code,
+                self.url,
+                query,
+            )
+            _logger.error("Graphite output: %s", err.response.text)
+            raise errors.GraphiteUnreachableError(
+                "{0} is unreachable".format(self.base), err
+            )
+        except requests.RequestException as err:
+            raise errors.GraphiteUnreachableError(
+                "{0} is unreachable".format(self.base), err
+            )
+
+        reader = _CountingReader(response.raw)
+        count = 0
+        try:
+            for target, values in _DECODERS[self.render_format](reader, datapoints):
+                count += 1
+                yield target, values
+        except ValueError:
+            # response could not be decoded
+            _logger.warning("could not decode %s response from graphite-web", query)
+        except requests.RequestException as err:
+            raise errors.GraphiteUnreachableError(
+                "{0} is unreachable".format(self.base), err
+            )
+        finally:
+            response.close()
+            elapsed = time.time() - started
+            self.timings.append(
+                RequestTiming(len(targets), count, reader.bytes, elapsed)
+            )
+            _logger.debug(
+                "render request for %d targets returned %d series (%d bytes) in "
+                "%.3f seconds",
+                len(targets),
+                count,
+                reader.bytes,
+                elapsed,
+            )
+
+
+class _NoValue(object):
+    def __repr__(self):
+        return 'NO_VALUE'
+
+
+NO_VALUE = _NoValue()
+
+
+def average(values, ignore_unknown=True):
+    """Aggregator that calculates the average of values.
+
+    :param ignore_unknown: Ignore unknown values when calculating the average.
+                           Unless True, any unknown data in the series will
+                           result in an average value of None.
+    """
+    total = count = 0
+    unknown = False
+    for value in values:
+        if value is None:
+            if ignore_unknown:
+                continue
+            unknown = True
+        else:
+            total += value
+        count += 1
+    if not count:
+        return NO_VALUE
+    return None if unknown else total / count
+
+
+def maximum(values):
+    """Aggregator that finds the maximum of the known values"""
+    known = [value for value in values if value is not None]
+    return max(known) if known else NO_VALUE
+
+
+def _format_time(value):
+    # Graphite will not accept ISO formatted timestamps
+    if isinstance(value, datetime):
+        return value.strftime(GRAPHITE_TIME_FORMAT)
+    return value
+
+
+class _CountingReader(io.RawIOBase):
+    """Wraps a urllib3 response, counting the bytes read from it"""
+
+    def __init__(self, raw):
+        super(_CountingReader, self).__init__()
+        self.raw = raw
+        self.raw.decode_content = True
+        self.bytes = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self.raw.read(size if size and size > 0 else None)
+        self.bytes += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _decode_json(reader, datapoints):
+    for series in iter_json_array(reader):
+        points = series.get('datapoints') or []
+        if datapoints:
+            yield series['target'], points
+        else:
+            yield series['target'], (point[0] for point in points)
+
+
+def iter_json_array(reader, read_size=READ_SIZE):
+    """Decodes the elements of a JSON array from a binary stream, one element
+    at a time.
+
+    :raises ValueError: if the stream does not contain a valid JSON array.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = 0
+    eof = False
+    started = False
+    size = read_size
+
+    while True:
+        # skip to the next element, reading more data as needed
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            data = reader.read(size)
+            eof = not data
+            buffer = buffer[position:] + text.decode(data, final=eof)
+            position = 0
+
+        if position >= len(buffer):
+            raise ValueError("premature end of JSON array")
+        if not started:
+            if buffer[position] != '[':
+                raise ValueError("expected a JSON array")
+            started = True
+            position += 1
+            continue
+        if buffer[position] == ']':
+            return
+
+        try:
+            element, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if eof:
+                raise
+            # the element is incomplete, read more, and more for each retry
+            data = reader.read(size)
+            eof = not data
+            buffer = buffer[position:] + text.decode(data, final=eof)
+            position = 0
+            size *= 2
+            continue
+        size = read_size
+        yield element
+
+
+def _decode_msgpack(reader, datapoints):
+    unpacker = msgpack.Unpacker(reader, raw=False)
+    try:
+        length = unpacker.read_array_header()
+    except (msgpack.OutOfData, msgpack.UnpackException) as err:
+        raise ValueError(err)
+    for _ in range(length):
+        try:
+            series = unpacker.unpack()
+        except (msgpack.OutOfData, msgpack.UnpackException) as err:
+            raise ValueError(err)
+        yield _from_series(series, datapoints)
+
+
+def _decode_pickle(reader, datapoints):
+    try:
+        data = _RestrictedUnpickler(reader).load()
+    except (pickle.UnpicklingError, EOFError) as err:
+        raise ValueError(err)
+    for series in data:
+        yield _from_series(series, datapoints)
+
+
+def _from_series(series, datapoints):
+    """Converts a series from a msgpack or pickle response"""
+    values = series['values']
+    if datapoints:
+        start, step = series['start'], series['step']
+        values = [(value, start + index * step) for index, value in enumerate(values)]
+    return series['name'], values
+
+
+class _RestrictedUnpickler(pickle.Unpickler):
+    """Unpickles plain data structures only, since a pickle can otherwise be
+    made to run arbitrary code.
+    """
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError("global '%s.%s' is forbidden" % (module, name))
+
+
+_DECODERS = {
+    FORMAT_JSON: _decode_json,
+    FORMAT_MSGPACK: _decode_msgpack,
+    FORMAT_PICKLE: _decode_pickle,
+}
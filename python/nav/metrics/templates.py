@@ -18,10 +18,14 @@
 Metric naming templates for various things that NAV sends/retrieves from
 Graphite.
 """
+
 from nav.metrics.names import escape_metric_name
+from nav.util import LRUCache
 
 # pylint: disable=C0111
 
+INTERFACE_PREFIX_CACHE_SIZE = 100000
+
 
 def metric_prefix_for_ipdevpoll_job(sysname, job_name):
     tmpl = "{device}.ipdevpoll.{job_name}"
@@ -30,6 +34,35 @@ def metric_prefix_for_ipdevpoll_job(sysname, job_name):
     )
 
 
+def metric_prefix_for_alertengine_dispatcher(sender):
+    tmpl = "nav.alertengine.dispatchers.{sender}"
+    return tmpl.format(sender=escape_metric_name(sender))
+
+
+def metric_prefix_for_smsd():
+    return "nav.smsd"
+
+
+def metric_prefix_for_smsd_dispatcher(dispatcher):
+    tmpl = "{prefix}.dispatchers.{dispatcher}"
+    return tmpl.format(
+        prefix=metric_prefix_for_smsd(), dispatcher=escape_metric_name(dispatcher)
+    )
+
+
+def metric_prefix_for_logengine():
+    return "nav.logengine"
+
+
+def metric_prefix_for_snmptrapd():
+    return "nav.snmptrapd"
+
+
+def metric_path_for_metric_query_cache(counter):
+    tmpl = "nav.metrics.querycache.{counter}"
+    return tmpl.format(counter=escape_metric_name(counter))
+
+
 def metric_path_for_bandwith(sysname, is_percent):
     tmpl = "{system}.bandwidth{percent}"
     return tmpl.format(
@@ -133,10 +166,26 @@ def metric_prefix_for_device(sysname):
 
 
 def metric_prefix_for_interface(sysname, ifname):
+    if hasattr(sysname, 'sysname'):
+        sysname = sysname.sysname
+    key = (sysname, ifname)
+    try:
+        return _interface_prefixes.get(key)
+    except KeyError:
+        pass
     tmpl = "{ports}.{ifname}"
-    return tmpl.format(
+    prefix = tmpl.format(
         ports=metric_prefix_for_ports(sysname), ifname=escape_metric_name(ifname)
     )
+    _interface_prefixes.set(key, prefix)
+    return prefix
+
+
+def forget_metric_prefix_for_interface(sysname, ifname):
+    """Removes the cached metric prefix of an interface, e.g. when it has been
+    renamed.
+    """
+    _interface_prefixes.discard((sysname, ifname))
 
 
 def metric_prefix_for_memory(sysname, memory_name):
@@ -184,3 +233,10 @@ def metric_path_for_multicast_usage(group, sysname):
         group=metric_prefix_for_multicast_group(group),
         sysname=escape_metric_name(sysname),
     )
+
+
+# Building a metric path means escaping each of its variable parts, which is
+# too costly to repeat for every datapoint of every interface. Since prefixes
+# are keyed by the names they are built from, a renamed interface simply gets a
+# new entry, while the stale one is eventually evicted.
+_interface_prefixes = LRUCache(INTERFACE_PREFIX_CACHE_SIZE)
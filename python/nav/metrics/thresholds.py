@@ -61,17 +61,13 @@ Alerting is outside of the scope of this module.
 
 """
 from datetime import timedelta
-from functools import partial
 import logging
+import operator
 import re
 
 from nav.metrics.data import get_metric_average
 from nav.metrics.graphs import get_metric_meta, extract_series_name
-
-
-# Pattern to extract the ID of a metric from a series name returned in a
-# Graphite render response.
-from nav.metrics.lookup import lookup
+from nav.metrics.lookup import lookup_many
 from nav.models.manage import Interface
 
 
@@ -135,10 +131,20 @@ class ThresholdEvaluator(object):
         """
         Retrieves actual values from Graphite based on the evaluators target.
         """
-        start = "-{0}".format(interval_to_graphite(self.period))
         averages = get_metric_average(
-            self.target, start=start, end='now', ignore_unknown=True
+            self.target, start=self.get_start(), end='now', ignore_unknown=True
         )
+        return self.set_values(averages)
+
+    def get_start(self):
+        """Returns the Graphite time specification of the start of the period"""
+        return "-{0}".format(interval_to_graphite(self.period))
+
+    def set_values(self, averages):
+        """
+        Sets the values to evaluate from a dict of averages retrieved from
+        Graphite, as returned by get_metric_average().
+        """
         _logger.debug(
             "retrieved %d values from graphite for %r, " "period %s: %r",
             len(averages),
@@ -152,6 +158,16 @@ class ThresholdEvaluator(object):
         )
         return self.result
 
+    def set_maxima(self, maxima):
+        """
+        Sets the maximum values of the retrieved metrics, as returned by
+        get_metric_maxima(), so that they needn't be looked up one by one when
+        evaluating relative expressions.
+        """
+        for metric, values in self.result.items():
+            if maxima.get(metric):
+                values['max'] = maxima[metric]
+
     def evaluate(self, expression, invert=False):
         """
         Evaluates expression for each of the retrieved values from the last
@@ -165,47 +181,47 @@ class ThresholdEvaluator(object):
         :returns: A list of (metric, current_value) tuples for metrics whose
                   last retrieved current value matches the expression.
         """
-        matcher = self._get_matcher(expression)
-        result = [
-            (metric, self.result[metric]['value'])
-            for metric in self.result.keys()
-            if bool(matcher(metric)) ^ bool(invert)
-        ]
-        return result
-
-    def _get_matcher(self, expression):
-        match = EXPRESSION_PATTERN.match(expression)
-        if not match:
-            raise InvalidExpressionError(expression)
-        value = float(match.group('value'))
-        percent = bool(match.group('percent'))
-        oper = match.group('operator')
-        if oper == '<':
-            matcher = partial(self._lt, value, percent)
+        compare, value, percent = parse_expression(expression)
+        metrics = list(self.result.keys())
+        values = [self.result[metric]['value'] for metric in metrics]
+        if percent:
+            currents = self._calculate_percentages(metrics, values)
         else:
-            matcher = partial(self._gt, value, percent)
-        return matcher
-
-    def _gt(self, value, percent, metric):
-        current = self._calculate_current(percent, metric)
-        if current is not None:
-            return current > value
-
-    def _lt(self, value, percent, metric):
-        current = self._calculate_current(percent, metric)
-        if current is not None:
-            return current < value
-
-    def _calculate_current(self, percent, metric):
-        if metric in self.result:
-            current = self.result[metric]['value']
-            if percent:
-                maximum = get_metric_maximum(metric)
-                if not maximum:
-                    return None  # cannot relatively match a maximum=0
-                self.result[metric]['max'] = maximum
-                current = (current / maximum) * 100.0
-            return current
+            currents = values
+        invert = bool(invert)
+        return [
+            (metric, metric_value)
+            for metric, metric_value, current in zip(metrics, values, currents)
+            if (current is not None and compare(current, value)) ^ invert
+        ]
+
+    def _calculate_percentages(self, metrics, values):
+        missing = [m for m in metrics if 'max' not in self.result[m]]
+        if missing:
+            self.set_maxima(get_metric_maxima(missing))
+        maxima = [self.result[metric].get('max') for metric in metrics]
+        return [
+            (value / maximum) * 100.0 if value is not None and maximum else None
+            for value, maximum in zip(values, maxima)
+        ]
+
+
+def parse_expression(expression):
+    """Parses a threshold expression.
+
+    :returns: A (compare, value, percent) tuple, where compare is a function
+              that compares a current value to the threshold value, and
+              percent tells whether the value is relative to the maximum value
+              of a metric.
+    :raises InvalidExpressionError: if the expression is invalid.
+    """
+    match = EXPRESSION_PATTERN.match(expression)
+    if not match:
+        raise InvalidExpressionError(expression)
+    value = float(match.group('value'))
+    percent = bool(match.group('percent'))
+    compare = operator.lt if match.group('operator') == '<' else operator.gt
+    return compare, value, percent
 
 
 def get_metric_maximum(metric):
@@ -213,15 +229,24 @@ def get_metric_maximum(metric):
     Returns the maximum value of a metric, if one can be determined.
     Otherwise returns None.
     """
-    obj = lookup(metric)
-    if isinstance(obj, Interface):
-        counter = metric.split('.')[-1]
-        if 'octets' in counter.lower():
-            # Making an unsafe assumption that interface traffic
-            # numbers are always retrieved in bits/s
-            maximum = obj.speed * MEGA
-            if maximum:
-                return maximum
+    return get_metric_maxima([metric]).get(metric)
+
+
+def get_metric_maxima(metrics):
+    """
+    Returns the maximum values of a list of metrics, where they can be
+    determined. The NAV objects of the metrics are looked up in bulk.
+
+    :returns: A dict of {metric: maximum} items.
+    """
+    # Making an unsafe assumption that interface traffic
+    # numbers are always retrieved in bits/s
+    octets = [m for m in metrics if 'octets' in m.split('.')[-1].lower()]
+    result = {}
+    for metric, obj in lookup_many(octets).items():
+        if isinstance(obj, Interface) and obj.speed:
+            result[metric] = obj.speed * MEGA
+    return result
 
 
 class InvalidExpressionError(Exception):
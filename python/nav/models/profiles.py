@@ -536,17 +536,20 @@ class AlertSender(models.Model):
         """Sends an alert via this medium."""
         if not self.supported:
             raise FatalDispatcherException("{} is not supported".format(self.name))
+        dispatcher = self.get_dispatcher()
+
+        # Delegate sending of message
+        return dispatcher.send(*args, **kwargs)
+
+    def get_dispatcher(self):
+        """Returns the shared dispatcher instance of this medium"""
         if self.handler not in self._handlers:
             dispatcher_class = self.load_dispatcher_class()
             dispatcher = dispatcher_class(
                 config=AlertSender.config.get(self.handler, {})
             )
-            self._handlers[self.handler] = dispatcher
-        else:
-            dispatcher = self._handlers[self.handler]
-
-        # Delegate sending of message
-        return dispatcher.send(*args, **kwargs)
+            self._handlers.setdefault(self.handler, dispatcher)
+        return self._handlers[self.handler]
 
     def load_dispatcher_class(self):
         # Get config
@@ -647,8 +650,14 @@ class AlertProfile(models.Model):
     def __str__(self):
         return self.name
 
-    def get_active_timeperiod(self):
-        """Gets the currently active timeperiod for this profile"""
+    def get_active_timeperiod(self, timeperiods=None, now=None):
+        """Gets the currently active timeperiod for this profile
+
+        :param timeperiods: An already fetched list of all time periods of this
+                            profile. If omitted, they are queried from the
+                            database.
+        :param now: The point in time to find the active time period for.
+        """
         # Could have been done with a ModelManager, but the logic
         # is somewhat tricky to do with the django ORM.
 
@@ -656,7 +665,7 @@ class AlertProfile(models.Model):
             'nav.alertengine.alertprofile.get_active_timeperiod'
         )
 
-        now = datetime.now()
+        now = now or datetime.now()
 
         # Limit our query to the correct type of time periods
         if now.isoweekday() in [6, 7]:
@@ -666,9 +675,17 @@ class AlertProfile(models.Model):
 
         # The following code should get the currently active timeperiod.
         active_timeperiod = None
-        timeperiods = list(
-            self.time_periods.filter(valid_during__in=valid_during).order_by('start')
-        )
+        if timeperiods is None:
+            timeperiods = list(
+                self.time_periods.filter(valid_during__in=valid_during).order_by(
+                    'start'
+                )
+            )
+        else:
+            timeperiods = sorted(
+                (p for p in timeperiods if p.valid_during in valid_during),
+                key=lambda p: p.start,
+            )
         # If the current time is before the start of the first time
         # period, the active time period is the last one (i.e. from
         # the day before)
@@ -0,0 +1,16 @@
+-- Replace the eventq notification rule with a trigger that includes the id of
+-- each new event as the notification payload, so that listeners can tell
+-- whether a notification refers to events they haven't seen yet.
+DROP RULE IF EXISTS eventq_notify ON eventq;
+
+CREATE OR REPLACE FUNCTION notify_new_event() RETURNS TRIGGER AS $$
+  BEGIN
+    PERFORM pg_notify('new_event', CAST(NEW.eventqid AS text));
+    RETURN NULL;
+  END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER trig_eventq_notify
+    AFTER INSERT ON eventq
+    FOR EACH ROW
+    EXECUTE PROCEDURE notify_new_event();
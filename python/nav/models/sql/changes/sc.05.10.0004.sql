@@ -0,0 +1,13 @@
+-- Notify listeners (i.e. alertengine) when new alerts are posted to the alert
+-- queue, so that they don't have to poll the queue for them.
+CREATE OR REPLACE FUNCTION notify_new_alert() RETURNS TRIGGER AS $$
+  BEGIN
+    PERFORM pg_notify('new_alert', '');
+    RETURN NULL;
+  END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER trig_alertq_notify
+    AFTER INSERT ON alertq
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE notify_new_alert();
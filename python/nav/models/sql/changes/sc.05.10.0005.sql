@@ -0,0 +1,18 @@
+-- Notify listeners (i.e. snmptrapd) when netbox management addresses or router
+-- port addresses change, so that they can reload their cached address maps.
+CREATE OR REPLACE FUNCTION notify_netbox_addresses_changed() RETURNS TRIGGER AS $$
+  BEGIN
+    PERFORM pg_notify('netbox_addresses_changed', '');
+    RETURN NULL;
+  END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER trig_netbox_addresses_changed
+    AFTER INSERT OR DELETE OR UPDATE OF ip, sysname, roomid ON netbox
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE notify_netbox_addresses_changed();
+
+CREATE TRIGGER trig_gwportprefix_addresses_changed
+    AFTER INSERT OR DELETE OR UPDATE OF gwip, interfaceid ON gwportprefix
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE notify_netbox_addresses_changed();
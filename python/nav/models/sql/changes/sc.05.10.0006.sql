@@ -0,0 +1,8 @@
+-- Keeps track of how far logengine has read its syslog file when following it,
+-- updated in the same transactions as the messages read from the file.
+CREATE TABLE logger.log_file_position (
+  filename VARCHAR PRIMARY KEY,
+  inode BIGINT NOT NULL,
+  position BIGINT NOT NULL,
+  updated TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now()
+);
@@ -0,0 +1,65 @@
+-- Turns logger.log_message into a table partitioned by time, so that logengine
+-- can enforce message retention by dropping whole partitions rather than by
+-- deleting hundreds of millions of rows.
+--
+-- The existing table becomes the legacy partition, holding every message
+-- logged before the migration.  Logengine keeps expiring the legacy partition
+-- by deleting rows, until all its messages have grown old enough for it to be
+-- dropped altogether.  New partitions are created by logengine as they are
+-- needed, with one sub-partition for each group of priorities that share the
+-- same retention period.  Messages that fall outside of all partitions, e.g.
+-- those with timestamps far in the future, go to the default partition.
+
+DROP VIEW logger.message_view;
+
+ALTER TABLE logger.log_message RENAME TO log_message_legacy;
+ALTER TABLE logger.log_message_legacy RENAME CONSTRAINT log_message_pkey TO log_message_legacy_pkey;
+ALTER INDEX logger.log_message_type_btree RENAME TO log_message_legacy_type_btree;
+ALTER INDEX logger.log_message_origin_btree RENAME TO log_message_legacy_origin_btree;
+ALTER INDEX logger.log_message_time_btree RENAME TO log_message_legacy_time_btree;
+ALTER INDEX logger.log_message_expiration_btree RENAME TO log_message_legacy_expiration_btree;
+-- The id sequence must outlive the legacy partition
+ALTER SEQUENCE logger.log_message_id_seq OWNED BY NONE;
+
+-- A partitioned table cannot have a primary key that does not include all the
+-- partitioning columns, so id is merely indexed.
+CREATE TABLE logger.log_message (
+  id INTEGER NOT NULL DEFAULT nextval('logger.log_message_id_seq'),
+  time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+  origin INTEGER NOT NULL REFERENCES logger.origin (origin) ON UPDATE CASCADE ON DELETE SET NULL,
+  newpriority INTEGER REFERENCES logger.priority (priority) ON UPDATE CASCADE ON DELETE SET NULL,
+  type INTEGER NOT NULL REFERENCES logger.log_message_type (type) ON UPDATE CASCADE ON DELETE SET NULL,
+  message VARCHAR
+) PARTITION BY RANGE (time);
+
+ALTER SEQUENCE logger.log_message_id_seq OWNED BY logger.log_message.id;
+
+CREATE TABLE logger.log_message_default PARTITION OF logger.log_message DEFAULT;
+
+-- Messages from the future must not keep new partitions from being created.
+-- New partitions are created at midnight boundaries, so the legacy partition
+-- ends at the first one after the migration.
+DO $$
+DECLARE
+  cutover TIMESTAMP WITHOUT TIME ZONE := date_trunc('day', LOCALTIMESTAMP) + interval '1 day';
+BEGIN
+  WITH moved AS (
+    DELETE FROM logger.log_message_legacy WHERE time >= cutover RETURNING *
+  )
+  INSERT INTO logger.log_message_default SELECT * FROM moved;
+
+  EXECUTE format(
+    'ALTER TABLE logger.log_message ATTACH PARTITION logger.log_message_legacy '
+    'FOR VALUES FROM (MINVALUE) TO (%L)', cutover);
+END $$;
+
+-- The legacy partition's matching indexes are attached rather than rebuilt
+CREATE INDEX log_message_id_btree ON logger.log_message USING btree (id);
+CREATE INDEX log_message_type_btree ON logger.log_message USING btree (type);
+CREATE INDEX log_message_origin_btree ON logger.log_message USING btree (origin);
+CREATE INDEX log_message_time_btree ON logger.log_message USING btree (time);
+CREATE INDEX log_message_expiration_btree ON logger.log_message USING btree (newpriority, time);
+
+CREATE VIEW logger.message_view AS
+SELECT origin,type,newpriority,category,time
+FROM logger.origin INNER JOIN logger.log_message USING (origin);
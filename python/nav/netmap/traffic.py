@@ -22,7 +22,6 @@ from nav.metrics.data import get_metric_average
 from nav.metrics.graphs import get_metric_meta
 from nav.metrics.templates import metric_path_for_interface
 from nav.models.manage import Interface
-from nav.util import chunks
 from nav.web.netmap.common import get_traffic_rgb, get_traffic_load_in_percent
 
 TRAFFIC_TIMEPERIOD = '-15min'
@@ -117,9 +116,9 @@ def get_traffic_for(interfaces):
         MAX_TARGETS_PER_REQUEST,
     )
 
-    data = {}
-    for request in chunks(targets, MAX_TARGETS_PER_REQUEST):
-        data.update(get_metric_average(request, start=TRAFFIC_TIMEPERIOD))
+    data = get_metric_average(
+        targets, start=TRAFFIC_TIMEPERIOD, chunk_size=MAX_TARGETS_PER_REQUEST
+    )
 
     _logger.debug("received %d metrics in response", len(data))
 
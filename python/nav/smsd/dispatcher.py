@@ -16,7 +16,20 @@
 #
 """Dispatch handling for smsd"""
 
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import threading
+import time
+
+# Number of worker threads used to send SMS to different recipients
+DEFAULT_WORKERS = 4
+# Number of SMS a single dispatcher may send concurrently, unless configured
+DEFAULT_CONCURRENCY = 1
+# A dispatcher backs off after this many consecutive failures...
+BACKOFF_THRESHOLD = 3
+# ...for an exponentially increasing period, starting at BACKOFF_BASE seconds
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
 
 
 class DispatcherError(Exception):
@@ -27,12 +40,79 @@ class PermanentDispatcherError(DispatcherError):
     """Thrown for permanent errors in dispatchers."""
 
 
+class DispatcherState(object):
+    """Keeps track of the concurrency, backoff state and statistics of a single
+    dispatcher.
+
+    Each dispatcher may be used by up to `concurrency` threads at the same
+    time. A dispatcher that fails repeatedly backs off for a while, during
+    which the next dispatcher in line is used instead, without affecting the
+    other dispatchers.
+    """
+
+    def __init__(self, name, dispatcher, concurrency=DEFAULT_CONCURRENCY):
+        self.name = name
+        self.dispatcher = dispatcher
+        self.slots = threading.BoundedSemaphore(max(1, concurrency))
+        self.failures = 0
+        self.backoff_until = 0
+        self.sent = 0
+        self.failed = 0
+        self.time_spent = 0.0
+        self._lock = threading.Lock()
+
+    def is_backing_off(self):
+        """Returns True if this dispatcher should not be used right now"""
+        return time.time() < self.backoff_until
+
+    def register_success(self, elapsed):
+        with self._lock:
+            self.failures = 0
+            self.backoff_until = 0
+            self.sent += 1
+            self.time_spent += elapsed
+
+    def register_failure(self, elapsed):
+        """Registers a failed dispatch, returning the number of seconds the
+        dispatcher backs off for as a consequence, if any.
+        """
+        with self._lock:
+            self.failures += 1
+            self.failed += 1
+            self.time_spent += elapsed
+            if self.failures < BACKOFF_THRESHOLD:
+                return 0
+            exponent = self.failures - BACKOFF_THRESHOLD
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2**exponent)
+            self.backoff_until = time.time() + delay
+            return delay
+
+    def pop_stats(self):
+        """Returns and resets the statistics of this dispatcher as a tuple of
+        (sent, failed, average dispatch time)
+        """
+        with self._lock:
+            attempts = self.sent + self.failed
+            stats = (
+                self.sent,
+                self.failed,
+                self.time_spent / attempts if attempts else 0.0,
+            )
+            self.sent = self.failed = 0
+            self.time_spent = 0.0
+            return stats
+
+
 class DispatcherHandler(object):
     """
     Handler for communication with the dispatchers.
 
     This layer makes it possible to use multiple dispatchers which works as
     failovers for each other.
+
+    SMS to different recipients can be sent concurrently using sendmany(). The
+    number of SMS each dispatcher may send at the same time is set by the
+    `concurrency` option in the dispatcher's configuration section.
     """
 
     def __init__(self, config):
@@ -43,6 +123,8 @@ class DispatcherHandler(object):
 
         exit_on_permanent_error = config['main']['exit_on_permanent_error']
         self.cull_dead_dispatcher = exit_on_permanent_error.lower() in ('yes', 'true')
+        self.workers = int(config['main'].get('workers', DEFAULT_WORKERS))
+        self._lock = threading.Lock()
 
         # Get dispatchers
         self.dispatchers = []
@@ -67,7 +149,12 @@ class DispatcherHandler(object):
                 try:
                     dispatcher_class = getattr(module, dispatcher)
                     instance = dispatcher_class(config[dispatcher])
-                    self.dispatchers.append((dispatcher, instance))
+                    concurrency = int(
+                        config[dispatcher].get('concurrency', DEFAULT_CONCURRENCY)
+                    )
+                    self.dispatchers.append(
+                        DispatcherState(dispatcher, instance, concurrency)
+                    )
                     self.logger.debug("Dispatcher loaded: %s", dispatcher)
                 except DispatcherError as error:
                     self.logger.warning("Failed to init %s: %s", dispatcher, error)
@@ -117,30 +204,41 @@ class DispatcherHandler(object):
 
         """
 
-        for i, (dispatchername, dispatcher) in enumerate(self.dispatchers):
+        for state in list(self.dispatchers):
+            dispatchername = state.name
+            if state.is_backing_off():
+                self.logger.debug("Skipping %s, it is backing off", dispatchername)
+                continue
 
+            start = time.time()
             try:
                 self.logger.debug("Trying %s...", dispatchername)
-                (sms, sent, ignored, result, smsid) = dispatcher.sendsms(phone, msgs)
+                with state.slots:
+                    (sms, sent, ignored, result, smsid) = state.dispatcher.sendsms(
+                        phone, msgs
+                    )
             except PermanentDispatcherError as error:
                 self.logger.error(
                     "%s reports a possibly permanent SMS dispatch failure: %s",
                     dispatchername,
                     error,
                 )
+                state.register_failure(time.time() - start)
                 if self.cull_dead_dispatcher:
                     self.logger.error(
                         "Removing permanently failed dispatcher %s", dispatchername
                     )
-                    del self.dispatchers[i]
+                    self._remove(state)
                 continue  # Skip to next dispatcher
             except DispatcherError as error:
                 self.logger.warning("%s failed to send SMS: %s", dispatchername, error)
+                self._register_failure(state, start)
                 continue  # Skip to next dispatcher
             except Exception as error:
                 self.logger.exception(
                     "Unknown dispatcher exception during send: %s", error
                 )
+                self._register_failure(state, start)
                 continue
 
             else:
@@ -148,9 +246,11 @@ class DispatcherHandler(object):
                     self.logger.warning(
                         "%s failed to send SMS: Returned false.", dispatchername
                     )
+                    self._register_failure(state, start)
                     continue  # Skip to next dispatcher
 
             # No exception and true result? Success!
+            state.register_success(time.time() - start)
             return (sms, sent, ignored, smsid)
 
         # Still running? All dispatchers failed permanently.
@@ -163,6 +263,57 @@ class DispatcherHandler(object):
         # Still running? All dispatchers failed!
         raise DispatcherError("All dispatchers failed to send SMS.")
 
+    def sendmany(self, usermsgs):
+        """Formats and sends SMS to several phone numbers concurrently.
+
+        :param usermsgs: a dict mapping phone numbers to lists of messages, as
+                         accepted by sendsms().
+
+        :returns: a dict mapping each phone number to either the return value
+                  of sendsms(), or the DispatcherError raised when sending to
+                  that number failed. A :exc:`PermanentDispatcherError` means
+                  all dispatchers have failed permanently; it is returned
+                  rather than raised, so that the results of the other sends
+                  are not lost.
+
+        """
+
+        def _send(phone):
+            try:
+                return phone, self.sendsms(phone, usermsgs[phone])
+            except DispatcherError as error:
+                return phone, error
+
+        if not usermsgs:
+            return {}
+        workers = max(1, min(self.workers, len(usermsgs)))
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='smsd'
+        ) as executor:
+            return dict(executor.map(_send, usermsgs))
+
+    def pop_stats(self):
+        """Returns and resets the dispatch statistics of each dispatcher, as a
+        dict mapping dispatcher names to (sent, failed, average dispatch time)
+        tuples.
+        """
+        return {state.name: state.pop_stats() for state in list(self.dispatchers)}
+
+    def _register_failure(self, state, start):
+        delay = state.register_failure(time.time() - start)
+        if delay:
+            self.logger.warning(
+                "%s has failed %d times in a row, backing off for %d seconds",
+                state.name,
+                state.failures,
+                delay,
+            )
+
+    def _remove(self, state):
+        with self._lock:
+            if state in self.dispatchers:
+                self.dispatchers.remove(state)
+
 
 class Dispatcher(object):
     """The SMS dispatcher mother class."""
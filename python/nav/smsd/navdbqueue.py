@@ -23,9 +23,12 @@ Generally, a phone number is a user and vice versa.
 
 """
 
+from collections import OrderedDict
 import logging
 import sys
 
+from psycopg2.extras import execute_values
+
 import nav.db
 
 
@@ -139,6 +142,39 @@ class NAVDBQueue(object):
 
         return result
 
+    def getallusermsgs(self, sent='N'):
+        """
+        Get the messages of all users which has given sent status (normally
+        unsent), using a single query.
+
+        Returns a tuple of two dictionaries. The first maps each phone number to
+        a list of messages, in the same format as returned by getusermsgs(). The
+        phone numbers are sorted. The second maps each message ID to the time
+        the message was queued.
+        """
+
+        dbconn = self._connect()
+        db = dbconn.cursor()
+
+        data = dict(sent=sent)
+        sql = """SELECT phone, id, msg, severity, time
+            FROM smsq
+            WHERE sent = %(sent)s
+            ORDER BY phone ASC, severity ASC, time ASC"""
+        db.execute(sql, data)
+        result = db.fetchall()
+        # Rollback so we don't have old open transactions which foobars the
+        # usage of now() in setsentstatuses()
+        dbconn.rollback()
+
+        usermsgs = OrderedDict()
+        queued = {}
+        for phone, identifier, msg, severity, time in result:
+            usermsgs.setdefault(phone, []).append((identifier, msg, severity))
+            queued[identifier] = time
+
+        return usermsgs, queued
+
     def getmsgs(self, sent='N'):
         """
         Get all messages with given sent status (normally unsent).
@@ -196,6 +232,40 @@ class NAVDBQueue(object):
 
         return db.rowcount
 
+    def setsentstatuses(self, statuses):
+        """
+        Set the sent status of several messages in a single update.
+
+        :param statuses: a list of (ID, sent status, smsid) tuples. Messages
+                         that are marked as sent or ignored get their time sent
+                         set as well, like in setsentstatus().
+
+        Returns number of messages changed.
+        """
+
+        if not statuses:
+            return 0
+
+        dbconn = self._connect()
+        db = dbconn.cursor()
+
+        sql = """UPDATE smsq
+            SET sent = status.sent, smsid = status.smsid,
+                timesent = CASE WHEN status.sent IN ('Y', 'I')
+                           THEN now() ELSE smsq.timesent END
+            FROM (VALUES %s) AS status (id, sent, smsid)
+            WHERE smsq.id = status.id"""
+        execute_values(
+            db,
+            sql,
+            [(identifier, sent, smsid) for identifier, sent, smsid in statuses],
+            template="(%s::integer, %s::char(1), %s::integer)",
+            page_size=len(statuses),
+        )
+        dbconn.commit()
+
+        return db.rowcount
+
     def inserttestmsgs(self, uid, phone, msg):
         """
         Insert test messages into the SMS queue for debugging purposes.
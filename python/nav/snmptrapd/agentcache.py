@@ -0,0 +1,186 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""In-memory mapping of trap agent addresses to NAV-monitored devices.
+
+All management addresses of netboxes, as well as all router port addresses
+from gwportprefix, are loaded into memory in one go, so that looking up the
+netbox of a trap agent doesn't require a database query per trap.
+
+The mapping is reloaded periodically, and whenever the NAV schema triggers
+notify `netbox_addresses_changed`, which happens when netbox or router port
+addresses are added, changed or removed.
+
+"""
+from collections import namedtuple
+from ipaddress import ip_address
+import logging
+import threading
+import time
+
+import psycopg2
+
+from nav.db import get_connection_string
+
+_logger = logging.getLogger(__name__)
+
+ADDRESSES_CHANGED_CHANNEL = 'netbox_addresses_changed'
+DEFAULT_MAX_AGE = 300  # seconds
+MIN_REFRESH_INTERVAL = 10  # seconds
+CHECK_INTERVAL = 1  # seconds
+
+AgentNetbox = namedtuple('Agent', 'netboxid sysname roomid')
+
+_agent_cache = None
+
+
+def get_agent_cache():
+    """Returns the process-wide AgentCache instance"""
+    global _agent_cache
+    if _agent_cache is None:
+        _agent_cache = AgentCache()
+    return _agent_cache
+
+
+class AgentCache(object):
+    """Maps trap agent addresses to AgentNetbox tuples.
+
+    Addresses that don't belong to any NAV-monitored device are negatively
+    cached, in the sense that they're only reported once per reload.
+    """
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE):
+        self.max_age = max_age
+        self.agents = {}
+        self.refreshed_at = None
+        self._unknown = set()
+        self._dirty = False
+        self._next_check = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def lookup(self, address):
+        """Returns the AgentNetbox of a trap agent address, or None if the
+        address does not belong to any NAV-monitored device.
+        """
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    if self._needs_refresh():
+                        self.refresh()
+                    self._next_check = now + CHECK_INTERVAL
+
+        key = _normalize(address)
+        agent = self.agents.get(key)
+        if agent is None and key not in self._unknown:
+            self._unknown.add(key)
+            _logger.warning(
+                "Unable to match trap agent %s to a NAV-monitored device", address
+            )
+        return agent
+
+    def refresh(self):
+        """Reloads all agent addresses from the database"""
+        start = time.time()
+        try:
+            conn = self._connect()
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT host(gwip), netboxid, sysname, roomid "
+                    "FROM gwportprefix "
+                    "JOIN interface USING (interfaceid) "
+                    "JOIN netbox USING (netboxid) "
+                    "UNION ALL "
+                    "SELECT host(ip), netboxid, sysname, roomid "
+                    "FROM netbox"
+                )
+                rows = cursor.fetchall()
+        except psycopg2.Error:
+            _logger.exception("Could not load trap agent addresses from database")
+            self._disconnect()
+            if self.refreshed_at is None:
+                raise
+            # keep serving the stale data until next refresh attempt
+            self.refreshed_at = time.monotonic()
+            return
+
+        # Management addresses win over router port addresses, by coming last
+        self.agents = {
+            _normalize(address): AgentNetbox(netboxid, sysname, roomid)
+            for address, netboxid, sysname, roomid in rows
+        }
+        self._unknown = set()
+        self._dirty = False
+        self.refreshed_at = time.monotonic()
+        _logger.debug(
+            "loaded %d trap agent addresses in %.3f seconds",
+            len(self.agents),
+            time.time() - start,
+        )
+
+    def _needs_refresh(self):
+        if self.refreshed_at is None:
+            return True
+        age = time.monotonic() - self.refreshed_at
+        if age > self.max_age:
+            return True
+        return age > MIN_REFRESH_INTERVAL and self._is_dirty()
+
+    def _is_dirty(self):
+        """Checks for change notifications from the database"""
+        if self._dirty or not self._conn:
+            return self._dirty
+        try:
+            self._conn.poll()
+        except psycopg2.Error:
+            _logger.warning("lost database connection while checking for changes")
+            self._disconnect()
+            self._dirty = True
+            return True
+
+        notifies = self._conn.notifies
+        if any(notify.channel == ADDRESSES_CHANGED_CHANNEL for notify in notifies):
+            _logger.debug("netbox addresses have changed")
+            self._dirty = True
+        del notifies[:]
+        return self._dirty
+
+    def _connect(self):
+        """Returns a dedicated autocommitting connection, listening for address
+        change notifications.
+        """
+        if self._conn is None or self._conn.closed:
+            conn = psycopg2.connect(get_connection_string(script_name='snmptrapd'))
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute('LISTEN %s' % ADDRESSES_CHANGED_CHANNEL)
+            self._conn = conn
+        return self._conn
+
+    def _disconnect(self):
+        if self._conn:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+        self._conn = None
+
+
+def _normalize(address):
+    try:
+        return str(ip_address(address))
+    except ValueError:
+        return address
@@ -0,0 +1,180 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Trap storm suppression tools for snmptrapd handler modules"""
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class StateCoalescer(object):
+    """Coalesces state changes reported for the same subject within a time
+    window.
+
+    The first state reported for a subject is passed on immediately, and opens
+    a window of `window` seconds. State changes reported within the window are
+    only counted. When the window closes, the flush function is called with
+    the final state and the number of state changes seen, but only if the
+    final state differs from the one that was passed on.
+    """
+
+    def __init__(self, window, flush):
+        """
+        :param window: The coalescing window, in seconds.
+        :param flush: A function to call with the arguments (subject, state,
+                      flaps, context) for each closed window whose final state
+                      needs to be passed on.
+        """
+        self.window = window
+        self.flush = flush
+        self._windows = {}
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, subject, state, context=None):
+        """Reports the state of a subject.
+
+        If the final state of a previous window for the same subject is being
+        flushed, this waits for the flush to finish, so that the reported state
+        cannot be passed on before the older, coalesced one.
+
+        :param context: Any value the flush function needs to act on the
+                        final state, replaced by each report.
+        :returns: True if this state should be passed on immediately, False if
+                  it was coalesced.
+        """
+        while True:
+            with self._lock:
+                flushing = self._flushing.get(subject)
+                if flushing is None:
+                    return self._add(subject, state, context)
+            flushing.wait()
+
+    def _add(self, subject, state, context):
+        window = self._windows.get(subject)
+        if window is None:
+            now = time.monotonic()
+            self._windows[subject] = _Window(now + self.window, state, context)
+            self._start_flusher()
+            return True
+        if state != window.state:
+            window.flaps += 1
+        window.state = state
+        window.context = context
+        return False
+
+    def suppressed(self, subject):
+        """Tells the coalescer that the state passed on for a subject was not
+        acted upon after all, so its final state should be flushed regardless.
+        """
+        with self._lock:
+            window = self._windows.get(subject)
+            if window:
+                window.passed_state = None
+
+    def flush_expired(self, now=None):
+        """Closes all expired windows, flushing their final states"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [
+                (subject, window)
+                for subject, window in self._windows.items()
+                if window.closes_at <= now
+            ]
+            for subject, _window in expired:
+                del self._windows[subject]
+            # windows whose final state was already passed on need no flushing
+            expired = [
+                (subject, window)
+                for subject, window in expired
+                if window.state != window.passed_state
+            ]
+            for subject, _window in expired:
+                self._flushing[subject] = threading.Event()
+
+        for subject, window in expired:
+            try:
+                self.flush(subject, window.state, window.flaps, window.context)
+            except Exception:  # pylint: disable=broad-except
+                _logger.exception("Unhandled exception when flushing %r", subject)
+            finally:
+                with self._lock:
+                    self._flushing.pop(subject).set()
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, name='coalescer', daemon=True
+            )
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        interval = min(1.0, self.window / 4.0)
+        while True:
+            time.sleep(interval)
+            self.flush_expired()
+
+
+class _Window(object):
+    __slots__ = ('closes_at', 'passed_state', 'state', 'flaps', 'context')
+
+    def __init__(self, closes_at, state, context):
+        self.closes_at = closes_at
+        self.passed_state = state
+        self.state = state
+        self.flaps = 0
+        self.context = context
+
+
+class TokenBucket(object):
+    """A token bucket rate limiter, which also keeps count of the number of
+    events it has suppressed since it last let an event through.
+    """
+
+    def __init__(self, rate, burst):
+        """
+        :param rate: The number of events to allow per second, on average.
+        :param burst: The number of events to allow in a single burst.
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = self.burst
+        self.suppressed = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self):
+        """Attempts to let an event through.
+
+        :returns: A tuple (allowed, suppressed). If allowed is True, suppressed
+                  is the number of events suppressed before this one. If
+                  allowed is False, suppressed is the number of events
+                  suppressed so far, including this one.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                suppressed, self.suppressed = self.suppressed, 0
+                return True, suppressed
+            self.suppressed += 1
+            return False, self.suppressed
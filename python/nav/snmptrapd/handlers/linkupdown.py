@@ -16,12 +16,22 @@
 """NAV snmptrapd handler plugin to handle LINKUP and LINKDOWN traps from
 network equipment.
 
+To survive trap storms from flapping ports or rebooting devices, link traps
+can optionally be coalesced per interface within a time window, so that only
+the first and the final state of the interface in each window are posted as
+linkState events. The number of linkState events posted per device can also
+be rate limited, in which case an info event is posted when the limit kicks
+in. See the [linkupdown] section of snmptrapd.conf.
+
 """
 import logging
+import threading
+
 import nav.errors
 
 from nav.db import getConnection
 from nav.event import Event
+from nav.snmptrapd.coalesce import StateCoalescer, TokenBucket
 
 _logger = logging.getLogger('nav.snmptrapd.linkupdown')
 
@@ -29,6 +39,14 @@ _logger = logging.getLogger('nav.snmptrapd.linkupdown')
 LINKDOWN = ".1.3.6.1.6.3.1.1.5.3"
 LINKUP = ".1.3.6.1.6.3.1.1.5.4"
 
+DEFAULT_EVENT_BURST = 20
+
+_coalescer = None
+_event_limit = None
+_buckets = {}
+_configured = False
+_config_lock = threading.Lock()
+
 
 def handleTrap(trap, config=None):
     """Handles LINKUP/LINKDOWN traps, discarding anything else"""
@@ -44,33 +62,130 @@ def handleTrap(trap, config=None):
     if not trap.netbox:
         _logger.error("Could not find agent %s in database", trap.agent)
         return False
+
+    _configure(config)
+    down = trap.snmpTrapOID == LINKDOWN
+    subject = (trap.netbox.netboxid, ifindex)
+    if _coalescer and not _coalescer.add(subject, down, trap.netbox):
+        _logger.debug(
+            "Coalesced link %s trap for ifindex %s on %s",
+            'down' if down else 'up',
+            ifindex,
+            trap.netbox.sysname,
+        )
+        return True
+
+    success = post_link_state(trap.netbox, ifindex, down)
+    if not success and _coalescer:
+        _coalescer.suppressed(subject)
+    return success
+
+
+def post_link_state(netbox, ifindex, down, flaps=None):
+    """Looks up an interface and posts a linkState event for it, unless the
+    linkState events of its netbox are being rate limited.
+
+    :param netbox: The AgentNetbox the interface belongs to.
+    :param flaps: The number of state changes coalesced into this one, if any.
+    :returns: True if an event was posted.
+    """
     (interfaceid, deviceid, modulename, ifname, ifalias) = get_interface_details(
-        trap.netbox.netboxid, ifindex
+        netbox.netboxid, ifindex
     )
     if not interfaceid:
         _logger.error(
             "Ignoring link trap from %s. Could not identify interface with ifindex=%s.",
-            trap.netbox.sysname,
+            netbox.sysname,
             ifindex,
         )
         return False
 
+    if not _allow_event(netbox):
+        return False
+
     # Check for traptype, post event on queue
-    down = trap.snmpTrapOID == LINKDOWN
     success = post_link_event(
-        down, trap.netbox.netboxid, deviceid, interfaceid, modulename, ifname, ifalias
+        down,
+        netbox.netboxid,
+        deviceid,
+        interfaceid,
+        modulename,
+        ifname,
+        ifalias,
+        flaps=flaps,
     )
     if success:
         _logger.info(
-            "Interface %s (%s) on %s is %s.",
+            "Interface %s (%s) on %s is %s.%s",
             ifname,
             ifalias,
-            trap.netbox.sysname,
+            netbox.sysname,
             'down' if down else 'up',
+            " (%d state changes coalesced)" % flaps if flaps else "",
         )
     return success
 
 
+def _configure(config):
+    """Sets up trap coalescing and event rate limiting from config, once"""
+    global _coalescer, _event_limit, _configured
+    if _configured:
+        return
+    with _config_lock:
+        if _configured:
+            return
+        window = config.getfloat('linkupdown', 'coalesce_window', fallback=0)
+        if window > 0:
+            _logger.info("coalescing link traps within %s second windows", window)
+            _coalescer = StateCoalescer(window, _flush_link_state)
+        rate = config.getfloat('linkupdown', 'event_rate', fallback=0)
+        if rate > 0:
+            burst = config.getint(
+                'linkupdown', 'event_burst', fallback=DEFAULT_EVENT_BURST
+            )
+            _event_limit = (rate, burst)
+        _configured = True
+
+
+def _flush_link_state(subject, down, flaps, netbox):
+    """Posts the final link state of a coalescing window"""
+    _netboxid, ifindex = subject
+    try:
+        post_link_state(netbox, ifindex, down, flaps=flaps)
+    finally:
+        # Avoid idling in transaction in the coalescer's thread
+        getConnection('default').rollback()
+
+
+def _allow_event(netbox):
+    """Applies the event rate limit of a netbox, if any, posting an info event
+    when suppression kicks in.
+    """
+    if not _event_limit:
+        return True
+    with _config_lock:
+        bucket = _buckets.get(netbox.netboxid)
+        if bucket is None:
+            bucket = _buckets[netbox.netboxid] = TokenBucket(*_event_limit)
+
+    allowed, suppressed = bucket.consume()
+    if allowed:
+        if suppressed:
+            _logger.warning(
+                "Resuming linkState events for %s, %d events were suppressed",
+                netbox.sysname,
+                suppressed,
+            )
+        return True
+
+    if suppressed == 1:
+        _logger.warning(
+            "Too many linkState events for %s, suppressing events", netbox.sysname
+        )
+        post_suppression_event(netbox, bucket.rate)
+    return False
+
+
 def get_ifindex_from_trap(trap, config):
     """Gets the interface index from the trap's varbinds"""
     port_oid = config.get('linkupdown', 'portOID')
@@ -105,7 +220,9 @@ def get_interface_details(netboxid, ifindex):
     return (None, None, None, None, None)
 
 
-def post_link_event(down, netboxid, deviceid, interfaceid, modulename, ifname, ifalias):
+def post_link_event(
+    down, netboxid, deviceid, interfaceid, modulename, ifname, ifalias, flaps=None
+):
     """Posts a linkState event on the event qeueue"""
     state = 's' if down else 'e'
 
@@ -122,6 +239,32 @@ def post_link_event(down, netboxid, deviceid, interfaceid, modulename, ifname, i
     event['module'] = modulename or ''
     event['interface'] = ifname or ''
     event['ifalias'] = ifalias or ''
+    if flaps:
+        event['flaps'] = str(flaps)
+
+    try:
+        event.post()
+    except nav.errors.GeneralException:
+        _logger.exception("Unexpected exception while posting event")
+        return False
+    else:
+        return True
+
+
+def post_suppression_event(netbox, rate):
+    """Posts an info event telling that linkState events from a netbox are
+    being suppressed.
+    """
+    event = Event(
+        source="snmptrapd",
+        target="eventEngine",
+        netboxid=netbox.netboxid,
+        eventtypeid="info",
+        state='x',
+    )
+    event['alerttype'] = 'linkStateSuppressed'
+    event['sysname'] = netbox.sysname
+    event['rate'] = str(rate)
 
     try:
         event.post()
@@ -157,6 +300,12 @@ def verify_event_type():
     'Link inactive'
     WHERE NOT EXISTS (
     SELECT * FROM alerttype WHERE alerttype = 'linkDown'));
+
+    INSERT INTO alertType (
+    SELECT nextval('alerttype_alerttypeid_seq'), 'info', 'linkStateSuppressed',
+    'Link state events suppressed during trap storm'
+    WHERE NOT EXISTS (
+    SELECT * FROM alerttype WHERE alerttype = 'linkStateSuppressed'));
     """
 
     queries = sql.split(';')
@@ -0,0 +1,199 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""A pool of worker threads to handle received traps.
+
+Received traps are put on queues by the trap listener, and handled by a pool
+of worker threads, so that handler modules waiting for the database do not
+keep the listener from reading new traps off the network. Each worker has its
+own queue, and all traps from the same agent are put on the same queue, so
+that they are handled in the order they were received (a linkDown trap must
+never overtake the linkUp trap that preceded it). The queues share a single
+bound on the number of queued traps, so that a storm of traps from a single
+agent may use all of it. When the bound is reached, new traps are dropped and
+counted, rather than left to overflow the operating system's socket buffers
+without a trace.
+
+"""
+import logging
+import queue
+import threading
+import time
+
+from nav.metrics.carbon import send_metrics
+from nav.metrics.templates import metric_prefix_for_snmptrapd
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 10000
+METRICS_INTERVAL = 60  # seconds
+
+_STOP = object()
+
+
+class TrapStats(object):
+    """Thread safe trap counters"""
+
+    def __init__(self):
+        self.received = 0
+        self.dropped = 0
+        self.handled = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, received=0, dropped=0, handled=0, errors=0):
+        with self._lock:
+            self.received += received
+            self.dropped += dropped
+            self.handled += handled
+            self.errors += errors
+
+    def pop(self):
+        """Returns and resets the counters as a tuple of
+        (received, dropped, handled, errors)
+        """
+        with self._lock:
+            counts = (self.received, self.dropped, self.handled, self.errors)
+            self.received = self.dropped = self.handled = self.errors = 0
+            return counts
+
+
+class TrapHandlerPool(object):
+    """Queues traps and hands them to a handler function in worker threads.
+
+    The handler function may return the number of errors that occurred while
+    handling a trap, so they can be counted.
+    """
+
+    def __init__(
+        self,
+        handler,
+        workers=DEFAULT_WORKERS,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        metrics_interval=METRICS_INTERVAL,
+    ):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.queues = [queue.Queue() for _ in range(self.workers)]
+        self.depth = 0
+        self._depth_lock = threading.Lock()
+        self.metrics_interval = metrics_interval
+        self.stats = TrapStats()
+        self._threads = []
+        self._stopped = threading.Event()
+        self._reported_at = time.time()
+
+    def start(self):
+        """Starts the worker and metrics reporting threads"""
+        self._stopped.clear()
+        for number, work_queue in enumerate(self.queues):
+            thread = threading.Thread(
+                target=self._work,
+                args=(work_queue,),
+                name='trapworker-{}'.format(number),
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        if self.metrics_interval:
+            reporter = threading.Thread(
+                target=self._report_periodically, name='trapmetrics', daemon=True
+            )
+            reporter.start()
+        _logger.debug("started %d trap handler workers", self.workers)
+
+    def stop(self, timeout=5):
+        """Stops the workers once they have handled the traps currently in their
+        queues, waiting at most timeout seconds for them to finish.
+        """
+        self._stopped.set()
+        for work_queue in self.queues:
+            work_queue.put(_STOP)
+        deadline = time.time() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.time()))
+        self._threads = []
+
+    def submit(self, trap):
+        """Puts a trap on the queue of the worker handling its agent, or drops
+        it if queue_size traps are already queued. Dropped traps are counted,
+        and logged by report().
+
+        :returns: True if the trap was queued, False if it was dropped.
+        """
+        with self._depth_lock:
+            if self.queue_size and self.depth >= self.queue_size:
+                self.stats.add(received=1, dropped=1)
+                return False
+            self.depth += 1
+        work_queue = self.queues[hash(getattr(trap, 'agent', None)) % self.workers]
+        work_queue.put(trap)
+        self.stats.add(received=1)
+        return True
+
+    def _work(self, work_queue):
+        while True:
+            trap = work_queue.get()
+            if trap is _STOP:
+                break
+            with self._depth_lock:
+                self.depth -= 1
+            try:
+                errors = self.handler(trap)
+            except Exception:  # pylint: disable=broad-except
+                _logger.exception("Unhandled exception when handling trap")
+                errors = 1
+            self.stats.add(handled=1, errors=errors or 0)
+
+    def _report_periodically(self):
+        while not self._stopped.wait(self.metrics_interval):
+            try:
+                self.report()
+            except Exception:  # pylint: disable=broad-except
+                _logger.exception("could not send trap metrics")
+
+    def report(self):
+        """Logs and sends trap statistics to Graphite"""
+        now = time.time()
+        elapsed = now - self._reported_at
+        self._reported_at = now
+        received, dropped, handled, errors = self.stats.pop()
+        depth = self.depth
+        rate = received / elapsed if elapsed > 0 else 0
+
+        log = _logger.warning if dropped else _logger.debug
+        log(
+            "received %d traps (%.1f/s), dropped %d, handled %d, %d handler errors,"
+            " queue depth %d",
+            received,
+            rate,
+            dropped,
+            handled,
+            errors,
+            depth,
+        )
+        prefix = metric_prefix_for_snmptrapd()
+        send_metrics(
+            [
+                (prefix + '.traps.received', (now, received)),
+                (prefix + '.traps.rate', (now, rate)),
+                (prefix + '.traps.dropped', (now, dropped)),
+                (prefix + '.traps.handled', (now, handled)),
+                (prefix + '.traps.errors', (now, errors)),
+                (prefix + '.queue.depth', (now, depth)),
+            ]
+        )
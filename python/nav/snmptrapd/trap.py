@@ -15,15 +15,8 @@
 #
 """Trap related data structures."""
 import string
-import logging
-from collections import namedtuple
 
-from nav.db import getConnection
-
-_logger = logging.getLogger(__name__)
-
-
-AgentNetbox = namedtuple('Agent', 'netboxid sysname roomid')
+from nav.snmptrapd.agentcache import AgentNetbox, get_agent_cache
 
 
 class SNMPTrap(object):
@@ -62,24 +55,7 @@ class SNMPTrap(object):
 
     def _lookup_agent(self):
         """Attempts to look up the corresponding netbox of this trap"""
-        conn = getConnection('snmptrapd')
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT DISTINCT netboxid, sysname, roomid "
-            "FROM netbox "
-            "LEFT JOIN interface USING (netboxid) "
-            "LEFT JOIN gwportprefix USING (interfaceid) "
-            "WHERE %s IN (ip, gwip) ",
-            (self.agent,),
-        )
-
-        if cur.rowcount < 1:
-            _logger.warning(
-                "Unable to match trap agent %s to a NAV-monitored device", self.agent
-            )
-            return None
-
-        return AgentNetbox(*cur.fetchone())
+        return get_agent_cache().lookup(self.agent)
 
     @property
     def netbox(self):
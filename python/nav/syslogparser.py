@@ -0,0 +1,274 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Parsing of Cisco syslog lines, as collected by logengine.
+
+Each line is matched by a single regular expression, which covers both lines
+that carry a timestamp from the originating device and lines that only carry
+the syslog server's timestamp. Message types and origin categories are cached,
+as they are repeated across a great many lines.
+
+Large backlogs of lines can be parsed by a ParserPool, which spreads the work
+over a number of worker processes.
+
+"""
+from collections import deque, namedtuple
+import datetime
+import logging
+import multiprocessing
+import re
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 2000
+MAX_CACHE_SIZE = 10000
+
+ParsedMessage = namedtuple(
+    'ParsedMessage',
+    'time origin category type facility priorityid mnemonic description',
+)
+
+_MONTHS = {}
+for _number, _name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun')
+    + ('jul', 'aug', 'sep', 'oct', 'nov', 'dec'),
+    start=1,
+):
+    for _variant in (_name, _name.title(), _name.upper()):
+        _MONTHS[_variant] = _number
+
+_SYSLOG_RE = re.compile(
+    r"""
+    ^
+    (?:
+    # Lines with a timestamp from the origin
+    (?P<servmonth>\w+) \s+ (?P<servday>\d+) \s+      # server month and date
+    (?P<servhour>\d+) \: (?P<servmin>\d+) : \d+ \W+  # server hour/min/second
+    (?P<origin>\S+)                                  # origin
+    \W+ (?:(\d{4}) | .*?) \s+ \W*                    # year/msg counter/garbage
+    (?P<month>\w+) \s+ (?P<day>\d+) \s+              # origin month and date
+    ((?P<year>\d{4}) \s+ )?                          # origin year, if present
+    (?P<hour>\d+) : (?P<min>\d+) : (?P<second>\d+)   # origin hour/minute/second
+    .* %                                             # eat chars until % appears
+    (?P<type>[^:]+) :                                # message type
+    \s* (?P<description>.*)                          # message (lstripped)
+    |
+    # Lines where there is no timestamp from the origin
+    (?P<month2>\w+) \s+ (?P<day2>\d+) \s+            # server month and date
+    ((?P<year2>\d{4}) \s+ )?                         # server year, if present
+    (?P<hour2>\d+) : (?P<min2>\d+) : (?P<second2>\d+)  # server time
+    \s*
+    (?P<origin2>\S+)                                 # origin
+    .* %                                             # eat chars until % appears
+    (?P<type2>[a-zA-Z0-9\-_]+) :                     # message type
+    \s* (?P<description2>.*)                         # message (lstripped)
+    )
+    $
+    """,
+    re.VERBOSE,
+)
+_FIELDS = ('month', 'day', 'year', 'hour', 'min', 'second', 'origin', 'type')
+_TYPICAL_FIELDS = _FIELDS + ('description',)
+_NOT_SO_TYPICAL_FIELDS = tuple(field + '2' for field in _TYPICAL_FIELDS)
+
+_PRIORITY_RE = re.compile(r"^(.*)-(\d*)-(.*)$")
+_CATEGORY_RE = re.compile(r"\W(gw|sw|gsw|fw|ts)\W")
+_TYPE_RE = re.compile(r"\w+-\d+-?\S*:")
+
+
+class SyslogParser(object):
+    """Parses Cisco syslog lines into ParsedMessage tuples"""
+
+    def __init__(self, now=None):
+        """
+        :param now: The current time, used to guess the year of messages that
+                    carry no year. Defaults to the time of instantiation.
+        """
+        now = now or datetime.datetime.now()
+        self.year = now.year
+        self.in_january = now.month == 1
+        self._types = {}
+        self._categories = {}
+
+    def parse(self, line):
+        """Parses a syslog line.
+
+        :returns: A ParsedMessage, None if the line is not a Cisco syslog
+                  message, or False if it looks like one, but could not be
+                  parsed.
+        """
+        match = _SYSLOG_RE.match(line) if '%' in line else None
+        if match:
+            if match.lastgroup == 'description':
+                fields = match.group(*_TYPICAL_FIELDS)
+            else:
+                fields = match.group(*_NOT_SO_TYPICAL_FIELDS)
+            message = self._make_message(*fields)
+            if message:
+                return message
+
+        if _TYPE_RE.search(line):
+            return False
+        return None
+
+    def parse_safely(self, line):
+        """Parses a syslog line like parse(), but flags the line as unparseable
+        instead of raising an exception if parsing fails unexpectedly.
+        """
+        try:
+            return self.parse(line)
+        except Exception:  # pylint: disable=broad-except
+            _logger.exception("Unhandled exception during message parse: %s", line)
+            return False
+
+    def parse_many(self, lines):
+        """Parses a sequence of lines, returning a list of parse results"""
+        return [self.parse_safely(line) for line in lines]
+
+    def _make_message(
+        self, month, day, year, hour, minute, second, origin, msgtype, description
+    ):
+        month = _MONTHS.get(month) or _MONTHS.get(month.lower())
+        if not month:
+            return None
+        if year:
+            year = int(year)
+        elif month == 12 and self.in_january:
+            year = self.year - 1
+        else:
+            year = self.year
+        try:
+            timestamp = datetime.datetime(
+                year, month, int(day), int(hour), int(minute), int(second)
+            )
+        except (ValueError, OverflowError):
+            return None
+
+        priority = self._parse_type(msgtype)
+        if not priority:
+            return None
+        facility, priorityid, mnemonic = priority
+        return ParsedMessage(
+            timestamp,
+            origin,
+            self._find_category(origin),
+            msgtype,
+            facility,
+            priorityid,
+            mnemonic,
+            description,
+        )
+
+    def _parse_type(self, msgtype):
+        try:
+            return self._types[msgtype]
+        except KeyError:
+            pass
+        match = _PRIORITY_RE.match(msgtype)
+        result = None
+        if match and match.group(1) and match.group(2):
+            result = (match.group(1), int(match.group(2)), match.group(3))
+        _cache(self._types, msgtype, result)
+        return result
+
+    def _find_category(self, origin):
+        try:
+            return self._categories[origin]
+        except KeyError:
+            pass
+        match = _CATEGORY_RE.search(origin)
+        category = match.group(1) if match else "rest"
+        _cache(self._categories, origin, category)
+        return category
+
+
+def _cache(cache, key, value):
+    if len(cache) >= MAX_CACHE_SIZE:
+        cache.clear()
+    cache[key] = value
+
+
+class ParserPool(object):
+    """Parses lines in a pool of worker processes, preserving their order.
+
+    Lines are sent to the workers in chunks, and only a limited number of
+    chunks are in flight at any time, so that a huge backlog is not read into
+    memory all at once.
+    """
+
+    def __init__(self, processes, chunk_size=DEFAULT_CHUNK_SIZE, now=None):
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.now = now or datetime.datetime.now()
+        self._pool = None
+
+    def __enter__(self):
+        # Workers are forked from a fresh server process, as forking a process
+        # with running threads could leave the workers deadlocked
+        context = multiprocessing.get_context('forkserver')
+        self._pool = context.Pool(
+            self.processes, initializer=_init_worker, initargs=(self.now,)
+        )
+        return self
+
+    def __exit__(self, *_exc_info):
+        self._pool.terminate()
+        self._pool.join()
+        self._pool = None
+
+    def parse(self, items, line_of=None):
+        """Parses the lines of a sequence of items.
+
+        :param items: An iterable of lines, or of items that contain lines.
+        :param line_of: A function to get the line of an item, if the items
+                        aren't lines themselves.
+        :returns: A generator of (item, parse result) tuples, in the order of
+                  the items.
+        """
+        in_flight = deque()
+        for chunk in _chunks(items, self.chunk_size):
+            lines = [line_of(item) for item in chunk] if line_of else chunk
+            in_flight.append((chunk, self._pool.apply_async(_parse_chunk, (lines,))))
+            if len(in_flight) > self.processes * 2:
+                yield from _collect(*in_flight.popleft())
+        while in_flight:
+            yield from _collect(*in_flight.popleft())
+
+
+_worker_parser = None
+
+
+def _init_worker(now):
+    global _worker_parser
+    _worker_parser = SyslogParser(now)
+
+
+def _parse_chunk(lines):
+    return _worker_parser.parse_many(lines)
+
+
+def _collect(chunk, result):
+    return zip(chunk, result.get())
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -20,6 +20,7 @@
 import logging
 from optparse import OptionParser
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 import django
 from django.db import transaction
@@ -30,7 +31,10 @@ from nav.models.fields import INFINITY
 from nav.models.manage import Netbox, Interface, Sensor
 from nav.models.thresholds import ThresholdRule
 from nav.models.event import EventQueue as Event, AlertHistory
-from nav.metrics.lookup import lookup
+from nav.metrics import CONFIG
+from nav.metrics.data import get_metric_average
+from nav.metrics.lookup import lookup, lookup_many
+from nav.metrics.thresholds import get_metric_maxima
 
 LOG_FILE = 'thresholdmon.log'
 
@@ -70,30 +74,107 @@ def scan():
     alerts = get_unresolved_threshold_alerts()
 
     _logger.info("evaluating %d rules", len(rules))
-    for rule in rules:
-        evaluate_rule(rule, alerts)
+    evaluators = get_values([(rule, rule.get_evaluator()) for rule in rules])
+    get_maxima(evaluators)
+    for rule, evaluator in evaluators:
+        evaluate_rule(rule, alerts, evaluator)
     _logger.info("done")
 
 
 # pylint: disable=W0703
-def evaluate_rule(rule, alerts):
+def get_values(rules):
+    """
+    Retrieves the values of a list of (rule, evaluator) tuples from Graphite.
+
+    Rules with identical targets and periods share one query, and queries are
+    made concurrently.
+
+    :returns: The (rule, evaluator) tuples whose values were retrieved.
+    """
+    queries = defaultdict(list)
+    for rule, evaluator in rules:
+        queries[(evaluator.target, evaluator.get_start())].append((rule, evaluator))
+    _logger.debug("querying %d distinct targets", len(queries))
+
+    def _query(query):
+        target, start = query
+        return get_metric_average(target, start=start, end='now', ignore_unknown=True)
+
+    workers = max(1, CONFIG.getint('graphiteweb', 'render_parallelism'))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {query: executor.submit(_query, query) for query in queries}
+
+    result = []
+    for query, future in futures.items():
+        for rule, evaluator in queries[query]:
+            try:
+                averages = future.result()
+            except Exception:
+                _logger.exception(
+                    "Unhandled exception while getting values for rule: %r", rule
+                )
+                continue
+            evaluator.set_values(averages)
+            if not evaluator.result:
+                _logger.warning(
+                    "did not find any matching values for rule %r %s",
+                    rule.target,
+                    rule.alert,
+                )
+            result.append((rule, evaluator))
+    return result
+
+
+def get_maxima(rules):
+    """
+    Looks up the maximum values of all metrics of a list of (rule, evaluator)
+    tuples whose rules have relative thresholds, in bulk.
+    """
+    relative = [
+        evaluator
+        for rule, evaluator in rules
+        if any(
+            expression and expression.strip().endswith('%')
+            for expression in (rule.alert, rule.clear)
+        )
+    ]
+    metrics = {metric for evaluator in relative for metric in evaluator.result}
+    if not metrics:
+        return
+    _logger.debug("looking up maximum values of %d metrics", len(metrics))
+    try:
+        maxima = get_metric_maxima(metrics)
+    except Exception:
+        _logger.exception("Unhandled exception while looking up maximum values")
+        return
+    for evaluator in relative:
+        evaluator.set_maxima(maxima)
+
+
+def evaluate_rule(rule, alerts, evaluator=None):
     """
     Evaluates the current status of a single rule and posts events if
     necessary.
+
+    :param evaluator: The rule's evaluator, if its values have already been
+                      retrieved.
     """
     _logger.debug("evaluating rule %r", rule)
 
-    evaluator = rule.get_evaluator()
-    try:
-        if not evaluator.get_values():
-            _logger.warning(
-                "did not find any matching values for rule %r %s",
-                rule.target,
-                rule.alert,
+    if evaluator is None:
+        evaluator = rule.get_evaluator()
+        try:
+            if not evaluator.get_values():
+                _logger.warning(
+                    "did not find any matching values for rule %r %s",
+                    rule.target,
+                    rule.alert,
+                )
+        except Exception:
+            _logger.exception(
+                "Unhandled exception while getting values for rule: %r", rule
             )
-    except Exception:
-        _logger.exception("Unhandled exception while getting values for rule: %r", rule)
-        return
+            return
 
     # post new exceed events
     try:
@@ -102,6 +183,10 @@ def evaluate_rule(rule, alerts):
         _logger.exception("Unhandled exception while evaluating rule alert: %r", rule)
         return
 
+    # look up the subjects of any new events in bulk
+    lookup_many(
+        [metric for metric, _ in exceeded if metric not in alerts.get(rule.id, {})]
+    )
     for metric, value in exceeded:
         alert = alerts.get(rule.id, {}).get(metric, None)
         _logger.info(
@@ -124,6 +209,7 @@ def evaluate_rule(rule, alerts):
             )
             return
 
+        lookup_many([metric for metric, _ in cleared if metric in clearable])
         for metric, value in cleared:
             if metric in clearable:
                 _logger.info("cleared: %s %s (=%s)", metric, rule.clear, value)
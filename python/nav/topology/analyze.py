@@ -39,12 +39,17 @@ Port nodes can have outgoing edges to other Port nodes, or to Netbox nodes
 """
 # pylint: disable=R0903
 
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from itertools import chain
 import logging
 
 import networkx as nx
-from nav.models.manage import AdjacencyCandidate, InterfaceAggregate, InterfaceStack
+from nav.models.manage import (
+    AdjacencyCandidate,
+    Interface,
+    InterfaceAggregate,
+    InterfaceStack,
+)
 
 _logger = logging.getLogger(__name__)
 
@@ -312,6 +317,47 @@ class AdjacencyReducer(AdjacencyAnalyzer):
 
 # Graph builder functions
 
+Candidate = namedtuple(
+    'Candidate',
+    'netbox_id sysname interface_id ifname admin_up '
+    'to_netbox_id to_sysname to_interface_id to_interface_netbox_id '
+    'to_interface_sysname to_ifname source',
+)
+
+
+def get_candidates():
+    """Returns a list of all rows of the adjacency_candidate table, as
+    Candidate tuples.
+
+    Only the columns needed to build a candidate graph are loaded, without
+    instantiating any Django model objects.
+    """
+    rows = AdjacencyCandidate.objects.values_list(
+        'netbox_id',
+        'netbox__sysname',
+        'interface_id',
+        'interface__ifname',
+        'interface__ifadminstatus',
+        'to_netbox_id',
+        'to_netbox__sysname',
+        'to_interface_id',
+        'to_interface__netbox_id',
+        'to_interface__netbox__sysname',
+        'to_interface__ifname',
+        'source',
+    )
+    return [
+        Candidate(
+            netbox_id,
+            sysname,
+            interface_id,
+            ifname,
+            adminstatus == Interface.ADM_UP,
+            *rest,
+        )
+        for netbox_id, sysname, interface_id, ifname, adminstatus, *rest in rows
+    ]
+
 
 def build_candidate_graph_from_db():
     """Builds and returns a DiGraph conforming to the requirements of an
@@ -319,24 +365,33 @@ def build_candidate_graph_from_db():
     table.
 
     """
-    acs = AdjacencyCandidate.objects.select_related(
-        'netbox', 'interface', 'to_netbox', 'to_interface'
-    )
+    return build_candidate_graph(get_candidates())
+
 
+def build_candidate_graph(candidates):
+    """Builds and returns a DiGraph conforming to the requirements of an
+    AdjacencyAnalyzer from a list of Candidate tuples.
+
+    """
     graph = nx.MultiDiGraph(name="network adjacency candidates")
 
-    for cand in acs:
-        if not cand.interface.is_admin_up():
+    for cand in candidates:
+        if not cand.admin_up:
             continue  # ignore data from disabled interfaces
-        if cand.to_interface:
-            dest_node = interface_to_port(cand.to_interface)
+        if cand.to_interface_id:
+            dest_node = _make_port(
+                cand.to_interface_netbox_id,
+                cand.to_interface_id,
+                cand.to_interface_sysname,
+                cand.to_ifname,
+            )
         else:
-            dest_node = Box(cand.to_netbox.id)
-            dest_node.name = cand.to_netbox.sysname
+            dest_node = Box(cand.to_netbox_id)
+            dest_node.name = cand.to_sysname
 
-        port = interface_to_port(cand.interface)
-        netbox = Box(cand.netbox.id)
-        netbox.name = cand.netbox.sysname
+        port = _make_port(cand.netbox_id, cand.interface_id, cand.sysname, cand.ifname)
+        netbox = Box(cand.netbox_id)
+        netbox.name = cand.sysname
 
         graph.add_edge(port, dest_node, cand.source)
         graph.add_edge(netbox, port)
@@ -344,6 +399,28 @@ def build_candidate_graph_from_db():
     return graph
 
 
+def get_affected_subgraph(graph, netboxes):
+    """Returns a copy of the connected components of a candidate graph that
+    contain any of the given netboxes or their ports.
+
+    Since the reduction of one connected component of a candidate graph never
+    depends on any other component, the reduced subgraph yields the same
+    topology for these netboxes as a reduction of the entire graph would.
+
+    :param netboxes: A set of netbox ids.
+    """
+    nodes = set()
+    for component in nx.weakly_connected_components(graph):
+        if any(node_netbox(node) in netboxes for node in component):
+            nodes.update(component)
+    return graph.subgraph(nodes).copy()
+
+
+def node_netbox(node):
+    """Returns the netbox id of a Box or Port node"""
+    return node[0] if isinstance(node, Port) else int(node)
+
+
 def get_aggregate_mapping(include_stacks=False):
     """Returns a dictionary describing each aggregator and its aggregated
     ports
@@ -385,6 +462,12 @@ def _get_aggregates():
 
 
 def interface_to_port(interface):
-    port = Port((interface.netbox.id, interface.id))
-    port.name = "{ifc.netbox.sysname} ({ifc.ifname})".format(ifc=interface)
+    return _make_port(
+        interface.netbox.id, interface.id, interface.netbox.sysname, interface.ifname
+    )
+
+
+def _make_port(netbox_id, interface_id, sysname, ifname):
+    port = Port((netbox_id, interface_id))
+    port.name = "{sysname} ({ifname})".format(sysname=sysname, ifname=ifname)
     return port
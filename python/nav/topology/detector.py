@@ -21,6 +21,7 @@ from functools import wraps
 import inspect
 import logging
 import sys
+import time
 import atexit
 
 from django.db.models import Q
@@ -30,12 +31,16 @@ from nav import buildconf
 from nav import daemon
 from nav.debug import log_stacktrace, log_last_django_query
 from nav.logs import init_generic_logging
-from nav.topology.layer2 import update_layer2_topology
+from nav.topology.layer2 import get_unapplied_netboxes, update_layer2_topology
 from nav.topology.analyze import (
     AdjacencyReducer,
-    build_candidate_graph_from_db,
+    build_candidate_graph,
+    get_affected_subgraph,
     get_aggregate_mapping,
+    get_candidates,
+    node_netbox,
 )
+from nav.topology.incremental import CandidateState, DEFAULT_FULL_INTERVAL
 from nav.topology.vlan import VlanGraphAnalyzer, VlanTopologyUpdater
 
 from nav.models.manage import Vlan, Prefix
@@ -61,7 +66,7 @@ def main():
         # protect against multiple invocations of long-running jobs
         verify_singleton()
     if options.l2:
-        do_layer2_detection()
+        do_layer2_detection(options.incremental, options.full_interval)
     if options.vlan:
         if options.include_vlans:
             vlans = [int(v) for v in options.include_vlans]
@@ -86,6 +91,20 @@ def make_option_parser():
     )
     parser.add_argument("--l2", action="store_true", help="Detect physical topology")
     parser.add_argument("--vlan", action="store_true", help="Detect vlan subtopologies")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only redetect the physical topology of devices whose adjacency "
+        "candidates have changed since the last run",
+    )
+    parser.add_argument(
+        "--full-interval",
+        type=float,
+        default=DEFAULT_FULL_INTERVAL,
+        metavar="HOURS",
+        help="Do a full physical topology detection anyway if the last one is "
+        "older than this (default: %(default)s)",
+    )
     parser.add_argument(
         "-i",
         dest="include_vlans",
@@ -117,14 +136,50 @@ def with_exception_logging(func):
 
 
 @with_exception_logging
-def do_layer2_detection():
-    """Detect and update layer 2 topology"""
-    candidates = build_candidate_graph_from_db()
+def do_layer2_detection(incremental=False, full_interval=DEFAULT_FULL_INTERVAL):
+    """Detect and update layer 2 topology
+
+    :param incremental: If True, only the parts of the network where
+                        adjacency candidates have changed since the last run
+                        are redetected, unless a full detection is due.
+    :param full_interval: The maximum number of hours between full
+                          detections in incremental mode.
+    """
+    candidates = get_candidates()
+    graph = build_candidate_graph(candidates)
     aggregates = get_aggregate_mapping(include_stacks=True)
-    reducer = AdjacencyReducer(candidates, aggregates)
+    previous = CandidateState.load()
+    state = CandidateState.from_candidates(candidates, previous.full_run, aggregates)
+
+    netboxes = None
+    if incremental and not previous.is_full_run_due(full_interval):
+        netboxes = state.get_affected_netboxes(previous)
+        graph = get_affected_subgraph(graph, netboxes)
+        netboxes.update(node_netbox(node) for node in graph)
+        _logger.info(
+            "redetecting topology of %d netboxes affected by changed candidates",
+            len(netboxes),
+        )
+    else:
+        state.full_run = time.time()
+
+    reducer = AdjacencyReducer(graph, aggregates)
     reducer.reduce()
     links = reducer.get_single_edges_from_ports()
-    update_layer2_topology(links)
+    changed = update_layer2_topology(links, netboxes)
+    state.pending = get_unapplied_netboxes(links)
+    if state.pending:
+        _logger.info(
+            "topology of %d netboxes could not be updated, will retry next run",
+            len(state.pending),
+        )
+    try:
+        state.save()
+    except OSError as error:
+        _logger.warning("could not save topology detection state: %s", error)
+    _logger.info("topology changed for %d interfaces", changed)
+    if changed:
+        notify_topology_changed()
 
 
 @with_exception_logging
@@ -137,6 +192,15 @@ def do_vlan_detection(vlans):
     ifc_vlan_map = analyzer.add_access_port_vlans()
     update = VlanTopologyUpdater(ifc_vlan_map)
     update()
+    notify_topology_changed()
+
+
+def notify_topology_changed():
+    """Notifies listening processes (i.e. eventengine) that the topology may
+    have changed.
+    """
+    cursor = django.db.connection.cursor()
+    cursor.execute('NOTIFY topology_changed')
 
 
 @with_exception_logging
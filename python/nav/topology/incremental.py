@@ -0,0 +1,175 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Change detection for incremental layer 2 topology detection.
+
+The adjacency candidates and port aggregates of each netbox are summarized as
+a digest, which is saved to a state file along with the set of netboxes each
+netbox has candidates pointing to. By comparing the current digests to those
+saved by the previous run, the netboxes whose candidates have changed can be
+found, and only the parts of the candidate graph they are part of need to be
+reduced again.
+
+Netboxes whose detected links could not be written to the database (e.g.
+because they were down) are also saved, so that they are redetected by the
+next run.
+
+"""
+from collections import defaultdict
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from nav import buildconf
+
+_logger = logging.getLogger(__name__)
+
+STATE_FILE = os.path.join(buildconf.localstatedir, 'navtopology.state')
+STATE_VERSION = 2
+DEFAULT_FULL_INTERVAL = 24  # hours
+
+
+class CandidateState(object):
+    """The adjacency candidates of each netbox, as seen by a topology run"""
+
+    def __init__(self, digests=None, neighbors=None, full_run=None, pending=None):
+        """
+        :param digests: A dict of {netboxid: digest} items.
+        :param neighbors: A dict of {netboxid: set(netboxid, ...)} items.
+        :param full_run: The UNIX timestamp of the last full topology run.
+        :param pending: A set of netboxids whose detected topology has yet to
+                        be written to the database.
+        """
+        self.digests = digests or {}
+        self.neighbors = neighbors or {}
+        self.full_run = full_run
+        self.pending = pending or set()
+
+    @classmethod
+    def from_candidates(cls, candidates, full_run=None, aggregates=None):
+        """Summarizes a list of Candidate tuples.
+
+        :param aggregates: The aggregate mapping the candidates are reduced
+                           with, as returned by
+                           nav.topology.analyze.get_aggregate_mapping().
+        """
+        rows = defaultdict(list)
+        aggregated = defaultdict(list)
+        for aggregator, ports in (aggregates or {}).items():
+            aggregated[aggregator[0]].append(
+                (aggregator[1], sorted(port[1] for port in ports))
+            )
+        neighbors = defaultdict(set)
+        for cand in candidates:
+            rows[cand.netbox_id].append(
+                (
+                    cand.interface_id,
+                    cand.admin_up,
+                    cand.to_netbox_id,
+                    cand.to_interface_id,
+                    cand.source,
+                )
+            )
+            neighbors[cand.netbox_id].add(cand.to_netbox_id)
+            if cand.to_interface_netbox_id:
+                neighbors[cand.netbox_id].add(cand.to_interface_netbox_id)
+
+        digests = {
+            netbox: _digest((sorted(rows[netbox]), sorted(aggregated[netbox])))
+            for netbox in set(rows).union(aggregated)
+        }
+        return cls(digests, dict(neighbors), full_run)
+
+    def get_changed_netboxes(self, previous):
+        """Returns the set of netboxes whose candidates differ between
+        previous and this state.
+        """
+        netboxes = set(self.digests).union(previous.digests)
+        return {
+            netbox
+            for netbox in netboxes
+            if self.digests.get(netbox) != previous.digests.get(netbox)
+        }
+
+    def get_affected_netboxes(self, previous):
+        """Returns the set of netboxes whose topology may have changed since
+        previous: The netboxes whose candidates have changed or whose topology
+        was still pending, and the netboxes they had or have candidates
+        pointing to.
+        """
+        changed = self.get_changed_netboxes(previous) | previous.pending
+        affected = set(changed)
+        for netbox in changed:
+            affected.update(self.neighbors.get(netbox, ()))
+            affected.update(previous.neighbors.get(netbox, ()))
+        return affected
+
+    def is_full_run_due(self, interval=DEFAULT_FULL_INTERVAL, now=None):
+        """Returns True if the last full run is more than interval hours ago"""
+        if not self.full_run:
+            return True
+        now = now or time.time()
+        return now - self.full_run >= interval * 3600
+
+    @classmethod
+    def load(cls, filename=STATE_FILE):
+        """Loads a saved state, or returns an empty state if none can be
+        loaded.
+        """
+        try:
+            with open(filename, 'r') as statefile:
+                data = json.load(statefile)
+            if data.get('version') != STATE_VERSION:
+                raise ValueError("unknown version %r" % data.get('version'))
+            return cls(
+                {int(k): v for k, v in data['digests'].items()},
+                {int(k): set(v) for k, v in data['neighbors'].items()},
+                data['full_run'],
+                set(data['pending']),
+            )
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as error:
+            _logger.warning("ignoring unreadable state file %s: %s", filename, error)
+            return cls()
+
+    def save(self, filename=STATE_FILE):
+        """Saves this state, atomically replacing any previously saved state"""
+        data = {
+            'version': STATE_VERSION,
+            'full_run': self.full_run,
+            'pending': sorted(self.pending),
+            'digests': self.digests,
+            'neighbors': {
+                netbox: sorted(neighbors)
+                for netbox, neighbors in self.neighbors.items()
+            },
+        }
+        directory = os.path.dirname(filename) or '.'
+        handle, tmpname = tempfile.mkstemp(dir=directory, prefix='.navtopology.')
+        try:
+            with os.fdopen(handle, 'w') as output:
+                json.dump(data, output)
+            os.replace(tmpname, filename)
+        except BaseException:
+            os.unlink(tmpname)
+            raise
+
+
+def _digest(values):
+    return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
@@ -22,56 +22,101 @@ from django.db.models import Q
 from nav.topology.analyze import Port
 
 from nav.models.manage import Interface, Netbox
+from nav.util import chunks
 
 
 _logger = logging.getLogger(__name__)
 
+UPDATE_CHUNK_SIZE = 1000
+
 
 @transaction.atomic()
-def update_layer2_topology(links):
+def update_layer2_topology(links, netboxes=None):
     """Updates the layer 2 topology in the NAV database.
 
+    Only the interfaces whose topology information differs from the detected
+    links are written to.
+
     :param links: a list of edges from an adjacency graph
+    :param netboxes: a set of netbox ids. If given, the links are assumed to
+                     describe the complete topology of these netboxes only,
+                     and topology information is cleared only from their
+                     interfaces.
+    :returns: the number of interfaces whose topology information changed
 
     """
-    for source, dest in links:
-        _update_interface_topology(source, dest)
+    changed = _update_interface_topology(links)
 
     touched_ifc_ids = [source[1] for source, _dest in links]
-    _clear_topology_for_nontouched(touched_ifc_ids)
-    _clear_topology_for_mismatched_state_links()
+    changed += _clear_topology_for_nontouched(touched_ifc_ids, netboxes)
+    changed += _clear_topology_for_mismatched_state_links()
+    return changed
 
 
-def _update_interface_topology(source_node, dest_node):
-    """Updates topology information for the source_node Interface.
+def _update_interface_topology(links):
+    """Updates topology information for the source Interface of each link.
 
-    The interface's topology will _only_ be updated if its netbox is up, it is
+    An interface's topology will _only_ be updated if its netbox is up, it is
     administratively up, is not missing, and its current topology information
     differs from what we want to set it to.
 
     """
-    _netboxid, interfaceid = source_node
-    ifc = Interface.objects.filter(
-        id=interfaceid,
-        ifadminstatus=Interface.ADM_UP,
-        netbox__up=Netbox.UP_UP,
-        gone_since__isnull=True,
-    )
-
-    if isinstance(dest_node, Port):
-        kwargs = {'to_netbox': int(dest_node[0]), 'to_interface': int(dest_node[1])}
-    else:
-        kwargs = {'to_netbox': int(dest_node), 'to_interface': None}
-
-    ifc = ifc.exclude(**kwargs)
-    ifc.update(**kwargs)
-
-
-def _clear_topology_for_nontouched(touched_ifc_ids):
+    wanted = {}
+    for source_node, dest_node in links:
+        _netboxid, interfaceid = source_node
+        if isinstance(dest_node, Port):
+            wanted[interfaceid] = (int(dest_node[0]), int(dest_node[1]))
+        else:
+            wanted[interfaceid] = (int(dest_node), None)
+
+    changed = 0
+    for ids in chunks(wanted, UPDATE_CHUNK_SIZE):
+        current = Interface.objects.filter(
+            id__in=ids,
+            ifadminstatus=Interface.ADM_UP,
+            netbox__up=Netbox.UP_UP,
+            gone_since__isnull=True,
+        ).values_list('id', 'to_netbox_id', 'to_interface_id')
+        for interfaceid, to_netbox, to_interface in current:
+            if wanted[interfaceid] != (to_netbox, to_interface):
+                to_netbox, to_interface = wanted[interfaceid]
+                Interface.objects.filter(id=interfaceid).update(
+                    to_netbox=to_netbox, to_interface=to_interface
+                )
+                changed += 1
+    if changed:
+        _logger.debug("updated topology of %d interfaces", changed)
+    return changed
+
+
+def get_unapplied_netboxes(links):
+    """Returns the ids of the netboxes that have links whose source interface
+    update_layer2_topology() will not update, because the netbox is not up or
+    the interface has gone missing.
+
+    Administratively disabled interfaces are not included, as they aren't
+    supposed to have any topology.
+    """
+    ifc_ids = [source[1] for source, _dest in links]
+    unapplied = set()
+    for ids in chunks(ifc_ids, UPDATE_CHUNK_SIZE):
+        skipped = (
+            Interface.objects.filter(id__in=ids, ifadminstatus=Interface.ADM_UP)
+            .filter(~Q(netbox__up=Netbox.UP_UP) | Q(gone_since__isnull=False))
+            .values_list('netbox_id', flat=True)
+            .distinct()
+        )
+        unapplied.update(skipped)
+    return unapplied
+
+
+def _clear_topology_for_nontouched(touched_ifc_ids, netboxes=None):
     """Clears topology information for all interfaces that are administratively
     up, except for those in the touched_ifc_ids list and those who currently
     have no associated topology information.
 
+    If netboxes is given, only the interfaces of those netboxes are cleared.
+
     """
     up_or_disabled = Q(ifoperstatus=Interface.OPER_UP) | Q(
         ifadminstatus=Interface.ADM_DOWN
@@ -79,9 +124,11 @@ def _clear_topology_for_nontouched(touched_ifc_ids):
     up_or_disabled_ifcs = Interface.objects.filter(
         up_or_disabled, netbox__up=Netbox.UP_UP
     )
+    if netboxes is not None:
+        up_or_disabled_ifcs = up_or_disabled_ifcs.filter(netbox__in=netboxes)
     nontouched_ifcs = up_or_disabled_ifcs.exclude(id__in=touched_ifc_ids)
     clearable_ifcs = nontouched_ifcs.exclude(to_netbox__isnull=True)
-    clearable_ifcs.update(to_netbox=None, to_interface=None)
+    return clearable_ifcs.update(to_netbox=None, to_interface=None)
 
 
 def _clear_topology_for_mismatched_state_links():
@@ -99,4 +146,4 @@ def _clear_topology_for_mismatched_state_links():
     count = mismatched.count()
     if count > 0:
         _logger.debug("deleting stale topology for %d operDown interfaces", count)
-    mismatched.update(to_netbox=None, to_interface=None)
+    return mismatched.update(to_netbox=None, to_interface=None)
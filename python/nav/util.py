@@ -20,8 +20,11 @@ import re
 import stat
 import socket
 import datetime
+import threading
+import time
 import uuid
 import hashlib
+from collections import OrderedDict
 from functools import wraps
 from importlib.resources import as_file, files as resource_files
 from itertools import chain, tee, groupby, islice
@@ -415,6 +418,61 @@ def synchronized(lock):
     return _decorator
 
 
+class LRUCache(object):
+    """A bounded, thread safe cache that evicts its least recently used
+    entries, and whose entries optionally expire.
+    """
+
+    def __init__(self, size, ttl=None):
+        """
+        :param size: The maximum number of entries to keep.
+        :param ttl: The number of seconds an entry is valid for. If None,
+                    entries only leave the cache by being evicted or
+                    discarded.
+        """
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value for key.
+
+        :raises KeyError: if there is no current value for key.
+        """
+        with self._lock:
+            expires, value = self._entries[key]
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                raise KeyError(key)
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Caches value for key, evicting the least recently used entries if
+        the cache grows too large.
+        """
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        """Removes the entry for key, if there is one"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Removes all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
 def parse_interval(string):
     """Parses a string for simple time interval definitions and returns a
     number of seconds represented.
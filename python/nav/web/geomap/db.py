@@ -29,7 +29,7 @@ Based on datacollector.py from the old Java-applet based Netmap.
 import logging
 
 from django.core.cache import cache
-from urllib.error import HTTPError
+from requests import HTTPError
 
 import nav
 from nav.config import NAV_CONFIG
@@ -43,7 +43,6 @@ from nav.metrics.templates import (
     metric_path_for_cpu_utilization,
 )
 from nav.web.geomap.utils import lazy_dict, subdict, is_nan
-from nav.util import chunks
 
 _logger = logging.getLogger(__name__)
 
@@ -443,9 +442,7 @@ def get_multiple_link_load(items, time_interval):
     _logger.debug(
         "getting %s graphite traffic targets in chunks", len(target_map.keys())
     )
-    data = {}
-    for chunk in chunks(target_map.keys(), METRIC_CHUNK_SIZE):
-        data.update(_get_metric_average(chunk, time_interval))
+    data = _get_metric_average(list(target_map.keys()), time_interval)
 
     for key, value in data.items():
         properties = target_map.get(key, None)
@@ -526,9 +523,7 @@ def get_multiple_cpu_load(items, time_interval):
         )
 
     _logger.debug("getting %s graphite cpu targets in chunks", len(targets))
-    data = {}
-    for chunk in chunks(targets, METRIC_CHUNK_SIZE):
-        data.update(_get_metric_average(chunk, time_interval))
+    data = _get_metric_average(targets, time_interval)
 
     for key, value in data.items():
         for sysname, netbox in target_map.items():
@@ -541,7 +536,10 @@ def get_multiple_cpu_load(items, time_interval):
 def _get_metric_average(targets, time_interval):
     try:
         data = get_metric_average(
-            targets, start=time_interval['start'], end=time_interval['end']
+            targets,
+            start=time_interval['start'],
+            end=time_interval['end'],
+            chunk_size=METRIC_CHUNK_SIZE,
         )
         _logger.debug(
             "graphite returned %s metrics from %s targets", len(data), len(targets)
@@ -555,5 +553,5 @@ def _get_metric_average(targets, time_interval):
             err,
         )
         if isinstance(err.cause, HTTPError):
-            _logger.debug("error cause: %s", err.cause.read())
+            _logger.debug("error cause: %s", err.cause.response.text)
         return {}
@@ -16,14 +16,17 @@
 #
 """Contains the modules used for statistics generation"""
 
+from datetime import datetime
+import heapq
 import logging
 from operator import itemgetter
+import time
 
 from urllib.parse import urlencode
 from django.urls import reverse
 
 from nav.metrics.data import get_metric_average, get_metric_max, get_metric_data
-from nav.metrics.lookup import lookup
+from nav.metrics.lookup import lookup_many
 
 _logger = logging.getLogger(__name__)
 
@@ -49,19 +52,24 @@ class Stat(object):
         self.data = None
         self.graph_url = None
         self.display_data = None
+        self.collected = None
+        self.collect_duration = None
 
     def collect(self):
         """Collect data"""
+        started = time.time()
         self.data = self.get_sorted_data()
         if self.data:
             self.metric_lookups = self.get_metric_lookups()
             self.graph_url = self.get_graph_url()
             self.display_data = self.get_display_data()
+        self.collected = datetime.now()
+        self.collect_duration = time.time() - started
 
     def get_sorted_data(self):
-        """Returns the sorted version of the data"""
+        """Returns the sorted version of the top rows of the data"""
         data = self.get_data()
-        return self.sort_by_value(data)
+        return self.sort_by_value(data, self.rows)
 
     def get_data(self):
         """Gets the relevant data for this statistics"""
@@ -77,7 +85,7 @@ class Stat(object):
 
     def get_metric_lookups(self):
         """Return a mapping of metric -> object"""
-        return {x: lookup(x) for x in self.get_graph_metrics()}
+        return lookup_many(self.get_graph_metrics())
 
     def get_graph_url(self):
         """Gets the graph url to display the statistics as a graph"""
@@ -137,8 +145,12 @@ class Stat(object):
         return upscaled
 
     @staticmethod
-    def sort_by_value(data):
-        """Sort dictionary by value"""
+    def sort_by_value(data, rows=None):
+        """Sort dictionary by value, keeping only the first rows items if
+        rows is given
+        """
+        if rows:
+            return heapq.nlargest(rows, data.items(), key=itemgetter(1))
         return sorted(data.items(), key=itemgetter(1), reverse=True)
 
     @staticmethod
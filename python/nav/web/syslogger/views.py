@@ -29,7 +29,7 @@ from nav.config import NAV_CONFIG, find_config_file
 
 from nav.django.utils import get_account
 
-from nav.models.logger import LogMessage
+from nav.models.logger import LogMessage, Priority
 from nav.models.logger import ErrorError
 from nav.web.syslogger.forms import LoggerGroupSearchForm
 from nav.web.utils import create_title
@@ -78,7 +78,12 @@ def _build_context(request):
                 if not isinstance(form.cleaned_data['priority'], list):
                     priority_keyword = [form.cleaned_data['priority']]
 
-                results = results.filter(newpriority__keyword__in=priority_keyword)
+                # filter on priority numbers rather than joined keywords, so that
+                # the database can prune log_message partitions by priority
+                priority_ids = Priority.objects.filter(
+                    keyword__in=priority_keyword
+                ).values_list('priority', flat=True)
+                results = results.filter(newpriority__in=list(priority_ids))
 
             if form.cleaned_data.get('mnemonic', None):
                 message_type_mnemonic = form.cleaned_data['mnemonic']
@@ -1,8 +1,84 @@
-from nav.models.profiles import AlertSender
+from datetime import datetime
+
+import pytest
+
+from nav.models.event import AlertQueue, Subsystem
+from nav.models.profiles import AlertSender, Expression, Filter, MatchField, Operator
 from nav.alertengine.dispatchers import Dispatcher
+from nav.alertengine.filters import FilterEvaluator
+from nav.alertengine.subscriptions import get_configuration_fingerprint
 
 
 def test_all_handlers_should_be_loadable():
     for sender in AlertSender.objects.filter(supported=True):
         dispatcher = sender.load_dispatcher_class()
         assert issubclass(dispatcher, Dispatcher)
+
+
+@pytest.mark.parametrize(
+    "value_id,operator,value",
+    [
+        ('netbox.sysname', Operator.EQUALS, 'localhost.example.org'),
+        ('netbox.sysname', Operator.NOT_EQUAL, 'localhost.example.org'),
+        ('netbox.sysname', Operator.STARTSWITH, 'LOCALHOST'),
+        ('netbox.sysname', Operator.ENDSWITH, '.example.com'),
+        ('netbox.sysname', Operator.CONTAINS, 'host.EX'),
+        ('netbox.sysname', Operator.REGEXP, '^local.*org$'),
+        ('netbox.sysname', Operator.REGEXP, '^localhost[[:punct:]]example'),
+        ('netbox.sysname', Operator.REGEXP, '^local[[:alpha:]]+:]'),
+        ('netbox.sysname', Operator.WILDCARD, 'LOCAL%.example._rg'),
+        ('netbox.sysname', Operator.IN, 'foo|localhost.example.org'),
+        ('netbox.ip', Operator.EQUALS, '127.0.0.1'),
+        ('netbox.ip', Operator.NOT_EQUAL, '127.0.0.1'),
+        ('netbox.ip', Operator.IN, '10.0.0.0/8|127.0.0.0/8'),
+        ('netbox.ip', Operator.CONTAINS, '127.0.0.2'),
+        ('netbox.ip', Operator.WILDCARD, '127.%'),
+        ('cat.catid', Operator.EQUALS, 'SRV'),
+        ('cat.catid', Operator.IN, 'GW|GSW'),
+        ('alertq.severity', Operator.GREATER_EQ, '3'),
+        ('alertq.severity', Operator.LESS, '3'),
+        ('room.roomid', Operator.EQUALS, 'myroom'),
+        ('location.locationid', Operator.IN, 'mylocation'),
+        ('org.orgid', Operator.NOT_EQUAL, 'myorg'),
+        ('eventtype.eventtypeid', Operator.EQUALS, 'boxState'),
+        ('alerttype.alerttype', Operator.EQUALS, 'boxDown'),
+        ('netboxgroup.netboxgroupid', Operator.EQUALS, 'AD'),
+    ],
+)
+def test_compiled_filter_should_agree_with_sql_filter(
+    alert, admin_account, value_id, operator, value
+):
+    filtr = Filter(name='test filter', owner=admin_account)
+    filtr.save()
+    Expression(
+        filter=filtr,
+        match_field=MatchField.objects.filter(value_id=value_id).first(),
+        operator=operator,
+        value=value,
+    ).save()
+
+    assert FilterEvaluator().verify(filtr, alert) == filtr.verify(alert)
+
+
+def test_configuration_fingerprint_should_change_when_filter_is_added(
+    db, admin_account
+):
+    before = get_configuration_fingerprint()
+    Filter(name='test filter', owner=admin_account).save()
+    assert get_configuration_fingerprint() != before
+
+
+@pytest.fixture
+def alert(db, localhost):
+    alert = AlertQueue(
+        source=Subsystem.objects.first(),
+        netbox=localhost,
+        event_type_id='boxState',
+        time=datetime.now(),
+        value=1,
+        severity=3,
+    )
+    alert.save()
+    yield alert
+    if alert.pk:
+        alert.delete()
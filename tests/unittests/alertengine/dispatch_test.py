@@ -0,0 +1,106 @@
+from contextlib import ExitStack
+
+from mock import Mock, patch
+import pytest
+
+from nav.alertengine import dispatch
+from nav.models.profiles import AlertSender
+
+EMAIL = AlertSender(id=1, name='Email', handler='email')
+SLACK = AlertSender(id=3, name='Slack', handler='slack')
+
+
+class TestDispatch:
+    def test_should_return_result_for_every_sent_notification(self, senders):
+        queued = [_queued_alert(1, EMAIL), _queued_alert(2, SLACK, sent=False)]
+        results = dispatch.dispatch(queued, config={})
+        assert results == {1: True, 2: False}
+
+    def test_should_report_sent_notification_ids_even_when_removed(self, senders):
+        queued_alert = _queued_alert(1, EMAIL)
+        queued_alert.send.side_effect = lambda: setattr(queued_alert, 'id', None)
+        assert 1 in dispatch.dispatch([queued_alert], config={})
+
+    def test_should_back_off_after_temporary_failure(self, senders):
+        queued = [_queued_alert(i, EMAIL, sent=False) for i in range(1, 5)]
+        config = {'email': {'concurrency': '1'}}
+        results = dispatch.dispatch(queued, config=config)
+
+        assert results == {1: False}
+        assert dispatch._channels[EMAIL.id].is_backing_off()
+        assert dispatch._channels[EMAIL.id].stats.deferred == 3
+
+    def test_should_keep_backing_off_in_next_run(self, senders):
+        dispatch.dispatch([_queued_alert(1, EMAIL, sent=False)], config={})
+        queued_alert = _queued_alert(2, EMAIL)
+        assert dispatch.dispatch([queued_alert], config={}) == {}
+        queued_alert.send.assert_not_called()
+
+    def test_should_not_back_off_after_fatal_failure(self, senders):
+        queued_alert = _queued_alert(1, EMAIL, sent=False)
+        queued_alert.pk = None
+        dispatch.dispatch([queued_alert], config={})
+        assert not dispatch._channels[EMAIL.id].is_backing_off()
+
+    def test_should_not_dispatch_to_blacklisted_sender(self, senders):
+        senders[SLACK.id] = AlertSender(
+            id=SLACK.id, name='Slack', handler='slack', blacklisted_reason='broken'
+        )
+        queued = [_queued_alert(1, EMAIL), _queued_alert(2, SLACK)]
+        assert dispatch.dispatch(queued, config={}) == {1: True}
+
+    def test_should_stop_dispatch_when_sender_is_blacklisted(self, senders):
+        queued = [_queued_alert(i, SLACK, sent=False) for i in range(1, 4)]
+        for queued_alert in queued:
+            address = queued_alert.subscription.alert_address
+            address.type.blacklisted_reason = 'broken'
+        config = {'slack': {'concurrency': '1'}}
+        assert dispatch.dispatch(queued, config=config) == {1: False}
+        assert not dispatch._channels[SLACK.id].is_backing_off()
+
+
+class TestInterleaveDrainers:
+    def test_should_give_every_channel_a_drainer_first(self):
+        email = Mock(concurrency=2, queue=[1, 2, 3])
+        slack = Mock(concurrency=1, queue=[1])
+        assert dispatch._interleave_drainers([email, slack]) == [email, slack, email]
+
+    def test_should_not_start_more_drainers_than_items(self):
+        email = Mock(concurrency=4, queue=[1])
+        assert dispatch._interleave_drainers([email]) == [email]
+
+
+class TestRateLimiter:
+    def test_should_space_out_events(self):
+        limiter = dispatch.RateLimiter(10)
+        with patch('time.monotonic', return_value=100.0), patch('time.sleep') as sleep:
+            limiter.wait()
+            limiter.wait()
+        sleep.assert_called_once_with(pytest.approx(0.1))
+
+
+@pytest.fixture
+def senders():
+    senders = {EMAIL.id: EMAIL, SLACK.id: SLACK}
+    patches = [
+        patch.object(dispatch, '_channels', {}),
+        patch.object(dispatch.AlertSender.objects, 'in_bulk', return_value=senders),
+        patch.object(dispatch, 'send_metrics'),
+        patch.object(dispatch, '_close_dispatcher'),
+        patch.object(dispatch, 'connection'),
+    ]
+    with ExitStack() as stack:
+        for patcher in patches:
+            stack.enter_context(patcher)
+        yield senders
+
+
+def _queued_alert(queued_alert_id, sender, sent=True):
+    address = Mock(type_id=sender.id, type=Mock(blacklisted_reason=''))
+    queued_alert = Mock(
+        id=queued_alert_id,
+        pk=queued_alert_id,
+        subscription=Mock(alert_address=address),
+    )
+    queued_alert.send.return_value = sent
+    return queued_alert
@@ -0,0 +1,202 @@
+from mock import Mock
+import pytest
+
+from nav.alertengine.filters import (
+    AlertSnapshot,
+    FilterEvaluator,
+    UncompilableFilter,
+    _compile_expression,
+    _like_to_regexp,
+    get_constraints,
+)
+from nav.models.profiles import MatchField, Operator
+
+
+class TestLikeToRegexp:
+    @pytest.mark.parametrize(
+        "pattern,value",
+        [
+            ("foo%", "foo-sw.example.org"),
+            ("%sw%", "foo-sw.example.org"),
+            ("f_o", "foo"),
+            ("100\\%", "100%"),
+            ("a.b", "a.b"),
+        ],
+    )
+    def test_should_match(self, pattern, value):
+        assert _like_to_regexp(pattern).match(value)
+
+    @pytest.mark.parametrize(
+        "pattern,value",
+        [
+            ("foo", "foo-sw"),
+            ("f_o", "fooo"),
+            ("100\\%", "1000"),
+            ("a.b", "axb"),
+        ],
+    )
+    def test_should_not_match(self, pattern, value):
+        assert not _like_to_regexp(pattern).match(value)
+
+
+class TestCompiledExpressions:
+    def test_equals_should_match_exact_sysname(self, alert):
+        test = _compiled('netbox.sysname', Operator.EQUALS, 'foo-sw.example.org')
+        assert test(AlertSnapshot(alert))
+
+    def test_equals_should_be_case_sensitive(self, alert):
+        test = _compiled('netbox.sysname', Operator.EQUALS, 'FOO-SW.example.org')
+        assert not test(AlertSnapshot(alert))
+
+    def test_startswith_should_be_case_insensitive(self, alert):
+        test = _compiled('netbox.sysname', Operator.STARTSWITH, 'FOO-')
+        assert test(AlertSnapshot(alert))
+
+    def test_in_should_match_any_value(self, alert):
+        test = _compiled('cat.catid', Operator.IN, 'GSW|SW')
+        assert test(AlertSnapshot(alert))
+
+    def test_not_equal_should_match_missing_netbox(self, alert):
+        alert.netbox = None
+        test = _compiled('netbox.sysname', Operator.NOT_EQUAL, 'foo-sw.example.org')
+        assert test(AlertSnapshot(alert))
+
+    def test_equals_should_not_match_missing_netbox(self, alert):
+        alert.netbox = None
+        test = _compiled('netbox.sysname', Operator.EQUALS, 'foo-sw.example.org')
+        assert not test(AlertSnapshot(alert))
+
+    def test_greater_should_compare_severity_numerically(self, alert):
+        test = _compiled('alertq.severity', Operator.GREATER, '10')
+        assert not test(AlertSnapshot(alert))
+
+    @pytest.mark.parametrize(
+        "value_id,pattern",
+        [
+            ('type.typename', 'catalyst'),
+            ('netbox.sysname', '^sw[[:digit:]]+'),
+            ('netbox.ip', '^10\\.'),
+        ],
+    )
+    def test_regexp_should_be_uncompilable(self, value_id, pattern):
+        with pytest.raises(UncompilableFilter):
+            _compiled(value_id, Operator.REGEXP, pattern)
+
+    def test_ip_in_should_match_address_within_prefix(self, alert):
+        test = _compiled('netbox.ip', Operator.IN, '192.168.0.0/16|10.0.0.0/8')
+        assert test(AlertSnapshot(alert))
+
+    def test_ip_contains_should_not_match_other_address(self, alert):
+        test = _compiled('netbox.ip', Operator.CONTAINS, '10.0.0.2')
+        assert not test(AlertSnapshot(alert))
+
+    def test_ip_greater_should_be_uncompilable(self):
+        with pytest.raises(UncompilableFilter):
+            _compiled('netbox.ip', Operator.GREATER, '10.0.0.1')
+
+    def test_multivalued_relation_should_be_uncompilable(self):
+        with pytest.raises(UncompilableFilter):
+            _compiled('netboxgroup.netboxgroupid', Operator.EQUALS, 'AD')
+
+    def test_ordering_strings_should_be_uncompilable(self):
+        with pytest.raises(UncompilableFilter):
+            _compiled('netbox.sysname', Operator.LESS, 'foo')
+
+    def test_invalid_regexp_should_be_uncompilable(self):
+        with pytest.raises(UncompilableFilter):
+            _compiled('netbox.sysname', Operator.REGEXP, '(foo')
+
+    def test_invalid_integer_should_be_uncompilable(self):
+        with pytest.raises(UncompilableFilter):
+            _compiled('alertq.severity', Operator.EQUALS, 'high')
+
+
+class TestGetConstraints:
+    def test_should_return_allowed_values(self):
+        filtr = _filter(('eventtype.eventtypeid', Operator.IN, 'boxState|info'))
+        assert get_constraints(filtr) == {
+            'eventtype.eventtypeid': frozenset(['boxState', 'info'])
+        }
+
+    def test_should_intersect_severity_ranges(self):
+        filtr = _filter(
+            ('alertq.severity', Operator.GREATER, '2'),
+            ('alertq.severity', Operator.LESS_EQ, '4'),
+        )
+        assert get_constraints(filtr) == {'alertq.severity': (3, 4)}
+
+    def test_should_ignore_non_discriminating_expressions(self):
+        filtr = _filter(
+            ('netbox.sysname', Operator.ENDSWITH, '.example.org'),
+            ('netboxgroup.netboxgroupid', Operator.EQUALS, 'AD'),
+        )
+        assert get_constraints(filtr) == {}
+
+
+class TestFilterEvaluator:
+    def test_should_fall_back_to_sql_for_uncompilable_filter(self, alert):
+        filtr = _filter(('netboxgroup.netboxgroupid', Operator.EQUALS, 'AD'))
+        filtr.verify.return_value = True
+        evaluator = FilterEvaluator()
+
+        assert evaluator.verify(filtr, alert)
+        filtr.verify.assert_called_once_with(alert)
+        assert evaluator.sql_checks == 1
+
+    def test_should_compile_filter_only_once(self, alert):
+        filtr = _filter(('netbox.sysname', Operator.ENDSWITH, '.example.org'))
+        evaluator = FilterEvaluator()
+
+        assert evaluator.verify(filtr, alert)
+        assert evaluator.verify(filtr, alert)
+        assert filtr.expressions.select_related.call_count == 1
+        assert evaluator.compiled_checks == 2
+        filtr.verify.assert_not_called()
+
+    def test_all_expressions_should_match(self, alert):
+        filtr = _filter(
+            ('netbox.sysname', Operator.ENDSWITH, '.example.org'),
+            ('alertq.severity', Operator.LESS, '3'),
+        )
+        assert not FilterEvaluator().verify(filtr, alert)
+
+    def test_later_expression_should_replace_earlier_for_same_lookup(self, alert):
+        filtr = _filter(
+            ('netbox.sysname', Operator.EQUALS, 'bar-sw.example.org'),
+            ('netbox.sysname', Operator.EQUALS, 'foo-sw.example.org'),
+        )
+        assert FilterEvaluator().verify(filtr, alert)
+
+
+@pytest.fixture
+def alert():
+    netbox = Mock(
+        sysname='foo-sw.example.org',
+        ip='10.0.0.1',
+        category_id='SW',
+        room=Mock(location_id='mylocation'),
+        type=Mock(vendor_id='cisco'),
+    )
+    netbox.type.name = 'Catalyst-2950'
+    return Mock(id=42, netbox=netbox, severity=3, event_type_id='boxState')
+
+
+def _match_field(value_id):
+    data_type = MatchField.IP if value_id == 'netbox.ip' else MatchField.STRING
+    return MatchField(name=value_id, value_id=value_id, data_type=data_type)
+
+
+def _expression(value_id, operator, value):
+    return Mock(match_field=_match_field(value_id), operator=operator, value=value)
+
+
+def _compiled(value_id, operator, value):
+    return _compile_expression(_expression(value_id, operator, value))
+
+
+def _filter(*expressions):
+    filtr = Mock(id=id(expressions))
+    filtr.expressions.select_related.return_value = [
+        _expression(*args) for args in expressions
+    ]
+    return filtr
@@ -0,0 +1,65 @@
+from collections import namedtuple
+
+from mock import Mock, patch
+import pytest
+
+from nav.alertengine import listener
+from nav.alertengine.listener import AlertQueueListener, NEW_ALERT_CHANNEL
+
+Notify = namedtuple('Notify', 'pid channel payload')
+
+
+class TestAlertQueueListener:
+    def test_should_listen_only_once_per_connection(self, conn):
+        alert_listener = AlertQueueListener()
+        alert_listener.listen()
+        alert_listener.listen()
+        cursor = listener.connection.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_called_once_with('LISTEN new_alert')
+
+    def test_should_time_out_without_notifications(self, conn):
+        assert not AlertQueueListener().wait(10)
+
+    def test_should_return_immediately_on_pending_notification(self, conn):
+        conn.notifies.append(Notify(1, NEW_ALERT_CHANNEL, ''))
+        with patch('select.select') as select:
+            assert AlertQueueListener(debounce=0).wait(10)
+        select.assert_not_called()
+        assert not conn.notifies
+
+    def test_should_wake_up_on_notification(self, conn):
+        conn.poll.side_effect = _deliver_once(conn)
+        assert AlertQueueListener(debounce=0).wait(10)
+
+    def test_should_relisten_after_reconnect(self, conn):
+        alert_listener = AlertQueueListener()
+        alert_listener.listen()
+        listener.connection.connection = _connection()
+        alert_listener.listen()
+        cursor = listener.connection.cursor.return_value.__enter__.return_value
+        assert cursor.execute.call_count == 2
+
+
+@pytest.fixture
+def conn():
+    conn = _connection()
+    with patch.object(listener, 'connection') as connection, patch('select.select'):
+        connection.connection = conn
+        yield conn
+
+
+def _connection():
+    conn = Mock()
+    conn.notifies = []
+    return conn
+
+
+def _deliver_once(conn):
+    calls = []
+
+    def _poll():
+        calls.append(1)
+        if len(calls) == 2:
+            conn.notifies.append(Notify(1, NEW_ALERT_CHANNEL, ''))
+
+    return _poll
@@ -0,0 +1,42 @@
+from mock import Mock, patch
+import pytest
+import requests
+
+from nav.alertengine.dispatchers import DispatcherException
+from nav.alertengine.dispatchers.slack_dispatcher import Slack
+
+URL = 'https://hooks.example.org/services/x'
+
+
+class TestSlack:
+    def test_should_post_with_configured_timeout(self, session):
+        Slack(config={'timeout': '2.5'}).send(Mock(address=URL), _alert())
+        assert session.post.call_args[1]['timeout'] == 2.5
+
+    def test_should_back_off_after_timeout(self, session):
+        session.post.side_effect = requests.Timeout("read timed out")
+        slack = Slack(config={})
+        with pytest.raises(DispatcherException):
+            slack.send(Mock(address=URL), _alert())
+        session.post.reset_mock()
+
+        with pytest.raises(DispatcherException):
+            slack.send(Mock(address=URL), _alert())
+        session.post.assert_not_called()
+
+
+@pytest.fixture
+def session():
+    session = Mock()
+    session.post.return_value.status_code = 200
+    with (
+        patch.object(Slack, '_get_session', return_value=session),
+        patch.dict(Slack._failures, clear=True),
+    ):
+        yield session
+
+
+def _alert():
+    alert = Mock()
+    alert.messages.get.return_value.message = "foo-sw is down"
+    return alert
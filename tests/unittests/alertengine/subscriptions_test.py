@@ -0,0 +1,118 @@
+from mock import Mock
+import pytest
+
+from nav.alertengine.filters import AlertSnapshot
+from nav.alertengine.subscriptions import SubscriptionIndex, get_triggers
+from nav.models.profiles import MatchField, Operator
+
+
+class TestSubscriptionIndex:
+    def test_should_find_filter_by_event_type(self, index):
+        assert 1 in index.get_candidate_filters(_snapshot(event_type_id='boxState'))
+
+    def test_should_not_find_filter_for_other_event_type(self, index):
+        assert 1 not in index.get_candidate_filters(_snapshot(event_type_id='info'))
+
+    def test_should_find_filter_by_severity_range(self, index):
+        assert 2 in index.get_candidate_filters(_snapshot(severity=4))
+
+    def test_should_not_find_filter_outside_severity_range(self, index):
+        assert 2 not in index.get_candidate_filters(_snapshot(severity=2))
+
+    def test_should_always_find_unindexed_filter(self, index):
+        assert 3 in index.get_candidate_filters(_snapshot())
+
+    def test_should_prefer_event_type_over_category(self, index):
+        candidates = index.get_candidate_filters(
+            _snapshot(event_type_id='thresholdState', category_id='GW')
+        )
+        assert 4 in candidates
+
+    def test_should_use_effective_expression_only(self, index):
+        candidates = index.get_candidate_filters(_snapshot(event_type_id='info'))
+        assert 5 in candidates
+
+
+class TestGetActiveSubscriptions:
+    def test_should_return_subscriptions_of_active_time_period(self):
+        index = SubscriptionIndex()
+        subscriptions = [Mock()]
+        profile = Mock()
+        profile.get_active_timeperiod.return_value = Mock(id=10)
+        index.accounts.append(
+            Mock(
+                account='foo',
+                profile=profile,
+                subscriptions={10: subscriptions, 11: [Mock()]},
+                permissions=(),
+            )
+        )
+        assert index.get_active_subscriptions() == [('foo', subscriptions, ())]
+
+    def test_should_skip_account_without_active_time_period(self):
+        index = SubscriptionIndex()
+        profile = Mock()
+        profile.get_active_timeperiod.return_value = None
+        index.accounts.append(Mock(profile=profile))
+        assert index.get_active_subscriptions() == []
+
+
+class TestGetTriggers:
+    def test_should_return_positive_inclusive_filters(self):
+        contents = [
+            Mock(include=True, positive=True, filter_id=1),
+            Mock(include=False, positive=True, filter_id=2),
+        ]
+        assert get_triggers(contents) == {1}
+
+    def test_should_return_none_for_negated_inclusive_filter(self):
+        contents = [
+            Mock(include=True, positive=True, filter_id=1),
+            Mock(include=True, positive=False, filter_id=2),
+        ]
+        assert get_triggers(contents) is None
+
+
+@pytest.fixture
+def index():
+    index = SubscriptionIndex()
+    for filtr in (
+        _filter(1, ('eventtype.eventtypeid', Operator.IN, 'boxState|moduleState')),
+        _filter(2, ('alertq.severity', Operator.GREATER_EQ, '3')),
+        _filter(3, ('netbox.sysname', Operator.ENDSWITH, '.example.org')),
+        _filter(
+            4,
+            ('cat.catid', Operator.EQUALS, 'SW'),
+            ('eventtype.eventtypeid', Operator.EQUALS, 'thresholdState'),
+        ),
+        _filter(
+            5,
+            ('eventtype.eventtypeid', Operator.EQUALS, 'boxState'),
+            ('eventtype.eventtypeid', Operator.EQUALS, 'info'),
+        ),
+    ):
+        index.add_filter(filtr)
+    return index
+
+
+def _snapshot(**attrs):
+    netbox = Mock(category_id=attrs.pop('category_id', 'SW'))
+    alert = Mock(id=1, netbox=netbox, event_type_id=None, severity=3)
+    for attr, value in attrs.items():
+        setattr(alert, attr, value)
+    return AlertSnapshot(alert)
+
+
+def _filter(filter_id, *expressions):
+    filtr = Mock(id=filter_id)
+    filtr.expressions.select_related.return_value = [
+        Mock(
+            match_field=MatchField(
+                name=value_id, value_id=value_id, data_type=MatchField.STRING
+            ),
+            operator=operator,
+            value=value,
+        )
+        for value_id, operator, value in expressions
+    ]
+    return filtr
@@ -1,8 +1,20 @@
 from unittest import TestCase
 import datetime
+import os
+import time
+
+from django.template import engines
+from mock import Mock, patch
+import pytest
+
 from nav.models.event import EventQueue as Event, Subsystem, EventType
 from nav.models.manage import Netbox, Device
-from nav.eventengine.alerts import AlertGenerator
+from nav.eventengine.alerts import (
+    AlertGenerator,
+    TemplateDetails,
+    TemplateRegistry,
+    _render_template,
+)
 
 
 class MockedAlertGenerator(AlertGenerator):
@@ -65,3 +77,94 @@ class AlertHistoryFromEventTests(AlertFromEventBase):
         self.event.state = self.event.STATE_END
         alert = MockedAlertGenerator(self.event)
         self.assertTrue(alert.make_alert_history() is None)
+
+
+class TestTemplateRegistry:
+    def test_should_find_templates_for_alert_type(self, template_dir):
+        registry = TemplateRegistry(str(template_dir))
+        details = registry.get_list_of_templates_for('boxState', 'boxDown')
+
+        assert sorted(details) == [
+            TemplateDetails('boxState/boxDown-email.txt', 'email', 'en'),
+            TemplateDetails('boxState/boxDown-sms.no.txt', 'sms', 'no'),
+        ]
+
+    def test_should_find_new_templates_when_directory_changes(self, template_dir):
+        registry = TemplateRegistry(str(template_dir))
+        assert not registry.get_list_of_templates_for('boxState', 'boxUp')
+
+        (template_dir / 'boxState' / 'boxUp-email.txt').write_text("up")
+        _bump_mtime(template_dir / 'boxState')
+
+        assert registry.get_list_of_templates_for('boxState', 'boxUp')
+
+    def test_should_return_empty_list_for_unknown_event_type(self, template_dir):
+        registry = TemplateRegistry(str(template_dir))
+        assert registry.get_list_of_templates_for('fooState', 'fooDown') == []
+
+    def test_should_reuse_compiled_template(self, template_dir):
+        registry = TemplateRegistry(str(template_dir))
+        name = 'boxState/boxDown-email.txt'
+
+        assert registry.get_template(name) is registry.get_template(name)
+
+    def test_should_recompile_modified_template(self, template_dir):
+        registry = TemplateRegistry(str(template_dir))
+        name = 'boxState/boxDown-email.txt'
+        first = registry.get_template(name)
+
+        (template_dir / name).write_text("{{ sysname }} is really down")
+        _bump_mtime(template_dir / name)
+
+        assert registry.get_template(name) is not first
+
+    def test_should_only_dump_context_when_used(self, template_dir):
+        registry = TemplateRegistry(str(template_dir))
+        details = TemplateDetails('boxState/boxDown-email.txt', 'email', 'en')
+        alert = MockedAlertGenerator(Mock(varmap={'sysname': 'foo-sw'}))
+
+        with patch('nav.eventengine.alerts.pformat') as pformat:
+            _, output = _render_template(details, alert, registry=registry)
+
+        assert output == "foo-sw is down"
+        pformat.assert_not_called()
+
+    def test_benchmark_alert_rendering(self, template_dir):
+        registry = TemplateRegistry(str(template_dir))
+        details = registry.get_list_of_templates_for('boxState', 'boxDown')
+        alert = MockedAlertGenerator(Mock(varmap={'sysname': 'foo-sw'}))
+        engine = engines['django']
+        count = 2000
+
+        outputs = set()
+        with patch.object(
+            engine, 'from_string', wraps=engine.from_string
+        ) as from_string:
+            start = time.time()
+            for _ in range(count):
+                for template in details:
+                    outputs.add(_render_template(template, alert, registry=registry))
+            elapsed = time.time() - start
+
+        print(
+            "rendered {} alerts in {:.3f}s ({:.0f} alerts/s)".format(
+                count, elapsed, count / elapsed
+            )
+        )
+        assert {output for _, output in outputs} == {"foo-sw is down", "foo-sw er nede"}
+        assert from_string.call_count == len(details)
+
+
+def _bump_mtime(path):
+    stat = os.stat(str(path))
+    os.utime(str(path), (stat.st_atime, stat.st_mtime + 10))
+
+
+@pytest.fixture
+def template_dir(tmp_path):
+    directory = tmp_path / 'boxState'
+    directory.mkdir()
+    (directory / 'boxDown-email.txt').write_text("{{ sysname }} is down")
+    (directory / 'boxDown-sms.no.txt').write_text("{{ sysname }} er nede")
+    (directory / 'README').write_text("not a template")
+    return tmp_path
@@ -0,0 +1,116 @@
+from collections import namedtuple
+
+from mock import Mock, patch
+import pytest
+
+from nav.eventengine import engine as engine_module
+from nav.eventengine.engine import EventEngine
+
+Notify = namedtuple("Notify", "pid channel payload")
+
+
+class TestEventNotifications:
+    def test_when_payload_id_is_unseen_it_should_return_true(self, engine):
+        notifies = [Notify(1, 'new_event', '42'), Notify(1, 'new_event', '43')]
+        assert engine._refers_to_unseen_events(notifies)
+
+    def test_when_payload_ids_are_seen_it_should_return_false(self, engine):
+        notifies = [Notify(1, 'new_event', '10'), Notify(1, 'new_event', '41')]
+        assert not engine._refers_to_unseen_events(notifies)
+
+    def test_when_payload_is_empty_it_should_return_true(self, engine):
+        assert engine._refers_to_unseen_events([Notify(1, 'new_event', '')])
+
+
+class TestEventBatches:
+    def test_should_load_new_events_in_batches(self, engine, queue):
+        queue.extend(_events(range(42, 53)))
+        engine.BATCH_SIZE = 5
+        engine.load_new_events()
+
+        batches = [
+            [event.id for event in call[0][0]]
+            for call in engine._handle_event_batch.call_args_list
+        ]
+        assert batches == [
+            [42, 43, 44, 45, 46],
+            [47, 48, 49, 50, 51],
+            [52],
+        ]
+        assert engine._last_event_id == 52
+
+    def test_should_not_reload_seen_events(self, engine, queue):
+        queue.extend(_events(range(40, 45)))
+        engine.load_new_events()
+        engine.load_new_events()
+
+        batches = [
+            [event.id for event in call[0][0]]
+            for call in engine._handle_event_batch.call_args_list
+        ]
+        assert batches == [[42, 43, 44]]
+
+    def test_should_load_missed_events_that_are_not_held(self, engine, queue):
+        queue.extend(_events([30, 35, 41, 50]))
+        engine._unfinished = {35}
+        engine.load_missed_events()
+
+        events = engine._handle_event_batch.call_args[0][0]
+        assert [event.id for event in events] == [30, 41]
+
+    def test_should_forget_disposed_held_events(self, engine, queue):
+        queue.extend(_events([35]))
+        engine._unfinished = {30, 35}
+        engine.load_missed_events()
+
+        assert engine._unfinished == {35}
+        engine._handle_event_batch.assert_not_called()
+
+
+class FakeQuerySet(list):
+    """A minimal stand-in for an Event queryset"""
+
+    _LOOKUPS = {
+        'id__gt': lambda event, value: event.id > value,
+        'id__lte': lambda event, value: event.id <= value,
+        'id__in': lambda event, value: event.id in value,
+        'target': lambda event, value: event.target == value,
+    }
+
+    def filter(self, **kwargs):
+        return FakeQuerySet(
+            event
+            for event in self
+            if all(self._LOOKUPS[key](event, value) for key, value in kwargs.items())
+        )
+
+    def exclude(self, **kwargs):
+        excluded = self.filter(**kwargs)
+        return FakeQuerySet(event for event in self if event not in excluded)
+
+    def order_by(self, field):
+        return FakeQuerySet(sorted(self, key=lambda event: getattr(event, field)))
+
+    def values_list(self, field, flat=False):
+        return [getattr(event, field) for event in self]
+
+
+def _events(ids):
+    return [Mock(id=event_id, target='eventEngine') for event_id in ids]
+
+
+@pytest.fixture
+def queue():
+    events = FakeQuerySet()
+    with patch.object(engine_module, 'Event') as event_model:
+        event_model.objects = events
+        yield events
+
+
+@pytest.fixture
+def engine():
+    engine = EventEngine()
+    engine._last_event_id = 41
+    engine._handle_event_batch = Mock()
+    engine._log_task_queue = Mock()
+    return engine
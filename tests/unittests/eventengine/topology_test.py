@@ -0,0 +1,99 @@
+import networkx
+import pytest
+
+from nav.eventengine import topology
+from nav.models.manage import Netbox
+
+
+class TestGetPathsToNetboxes:
+    def test_when_intermediate_switch_is_down_it_should_not_find_path(
+        self, netboxes, vlan_graph
+    ):
+        router, switch, box1, box2 = netboxes
+        switch.up = Netbox.UP_DOWN
+        box1.up = box2.up = Netbox.UP_DOWN
+
+        result = topology.get_paths_to_netboxes(10, router, [switch, box1, box2])
+
+        assert result == {switch: True, box1: False, box2: False}
+
+    def test_when_only_boxes_are_down_it_should_find_paths(self, netboxes, vlan_graph):
+        router, switch, box1, box2 = netboxes
+        box1.up = box2.up = Netbox.UP_DOWN
+
+        result = topology.get_paths_to_netboxes(10, router, [box1, box2])
+
+        assert result == {box1: True, box2: True}
+
+    def test_when_box_is_not_in_graph_it_should_default_to_reachable(
+        self, netboxes, vlan_graph
+    ):
+        router = netboxes[0]
+        stranger = Netbox(id=5, sysname='stranger', up=Netbox.UP_DOWN)
+
+        result = topology.get_paths_to_netboxes(10, router, [stranger])
+
+        assert result == {stranger: True}
+
+    def test_when_router_is_down_it_should_find_no_paths(self, netboxes, vlan_graph):
+        router, switch, box1, box2 = netboxes
+        router.up = box1.up = Netbox.UP_DOWN
+
+        result = topology.get_paths_to_netboxes(10, router, [box1])
+
+        assert result == {box1: False}
+
+
+class TestReachabilityVerdicts:
+    def test_should_reuse_verdicts_for_pending_netboxes(self, monkeypatch, netboxes):
+        calls = []
+
+        def _fake_reachable(boxes):
+            calls.append(set(boxes))
+            return {box: True for box in boxes}
+
+        monkeypatch.setattr(topology, 'netboxes_appear_reachable', _fake_reachable)
+        topology.forget_reachability()
+        _, _, box1, box2 = netboxes
+
+        assert topology.netbox_appears_reachable_among(box1, [box1, box2])
+        assert topology.netbox_appears_reachable_among(box2, [box1, box2])
+        assert calls == [{box1, box2}]
+
+    def test_should_recompute_verdicts_after_forgetting(self, monkeypatch, netboxes):
+        calls = []
+
+        def _fake_reachable(boxes):
+            calls.append(set(boxes))
+            return {box: True for box in boxes}
+
+        monkeypatch.setattr(topology, 'netboxes_appear_reachable', _fake_reachable)
+        topology.forget_reachability()
+        box1 = netboxes[2]
+
+        topology.netbox_appears_reachable_among(box1, [])
+        topology.forget_reachability()
+        topology.netbox_appears_reachable_among(box1, [])
+        assert len(calls) == 2
+
+
+@pytest.fixture
+def netboxes():
+    return [
+        Netbox(id=1, sysname='router', up=Netbox.UP_UP),
+        Netbox(id=2, sysname='switch', up=Netbox.UP_UP),
+        Netbox(id=3, sysname='box1', up=Netbox.UP_UP),
+        Netbox(id=4, sysname='box2', up=Netbox.UP_UP),
+    ]
+
+
+@pytest.fixture
+def vlan_graph(monkeypatch, netboxes):
+    """Patches the VLAN graph lookup to return router - switch - (box1, box2)"""
+    router, switch, box1, box2 = netboxes
+    graph = networkx.MultiGraph()
+    graph.add_edge(router, switch)
+    graph.add_edge(switch, box1)
+    graph.add_edge(switch, box2)
+    monkeypatch.setattr(topology, 'get_graph_for_vlan', lambda vlan: graph.copy())
+    return graph
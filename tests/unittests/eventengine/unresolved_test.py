@@ -0,0 +1,112 @@
+import datetime
+
+import pytest
+
+from nav.eventengine import unresolved
+from nav.models.event import AlertHistory, EventQueue as Event, EventType
+from nav.models.fields import INFINITY
+from nav.models.manage import Netbox
+
+
+class TestRefreshUnresolvedMap:
+    def test_when_alert_is_open_it_should_be_added(self, netbox, empty_map):
+        alert = make_alert(1, netbox, end_time=INFINITY)
+        unresolved.refresh(alert)
+
+        assert unresolved.refers_to_unresolved_alert(make_event(netbox)) is alert
+
+    def test_when_alert_is_resolved_it_should_be_removed(self, netbox, empty_map):
+        alert = make_alert(1, netbox, end_time=INFINITY)
+        unresolved.refresh(alert)
+        alert.end_time = datetime.datetime.now()
+        unresolved.refresh(alert)
+
+        assert not unresolved.refers_to_unresolved_alert(make_event(netbox))
+
+    def test_when_other_alert_is_resolved_it_should_not_remove_current_one(
+        self, netbox, empty_map
+    ):
+        current = make_alert(2, netbox, end_time=INFINITY)
+        unresolved.refresh(current)
+        unresolved.refresh(make_alert(1, netbox, end_time=datetime.datetime.now()))
+
+        assert unresolved.refers_to_unresolved_alert(make_event(netbox)) is current
+
+    def test_when_alert_is_stateless_it_should_not_be_added(self, netbox, empty_map):
+        unresolved.refresh(make_alert(1, netbox, end_time=None))
+
+        assert not unresolved.get_map()
+
+
+class TestMaintenanceIndex:
+    def test_when_maintenance_starts_netbox_should_be_on_maintenance(
+        self, netbox, empty_map
+    ):
+        unresolved.refresh(make_maintenance_alert(1, netbox, end_time=INFINITY))
+
+        assert unresolved.is_on_maintenance(netbox.id)
+
+    def test_when_maintenance_ends_netbox_should_be_off_maintenance(
+        self, netbox, empty_map
+    ):
+        alert = make_maintenance_alert(1, netbox, end_time=INFINITY)
+        unresolved.refresh(alert)
+        alert.end_time = datetime.datetime.now()
+        unresolved.refresh(alert)
+
+        assert not unresolved.is_on_maintenance(netbox.id)
+
+    def test_when_service_is_on_maintenance_netbox_should_be_on_maintenance(
+        self, netbox, empty_map
+    ):
+        unresolved.refresh(
+            make_maintenance_alert(1, netbox, end_time=INFINITY, subid='10')
+        )
+
+        assert unresolved.is_on_maintenance(netbox.id)
+        assert unresolved.is_on_maintenance(netbox.id, subid=10)
+        assert not unresolved.is_on_maintenance(netbox.id, subid=11)
+
+    def test_when_other_alert_is_open_netbox_should_be_off_maintenance(
+        self, netbox, empty_map
+    ):
+        unresolved.refresh(make_alert(1, netbox, end_time=INFINITY))
+
+        assert not unresolved.is_on_maintenance(netbox.id)
+
+
+def make_maintenance_alert(alert_id, netbox, end_time, subid=''):
+    return make_alert(
+        alert_id, netbox, end_time, subid=subid, event_type='maintenanceState'
+    )
+
+
+def make_alert(alert_id, netbox, end_time, subid='', event_type='boxState'):
+    return AlertHistory(
+        id=alert_id,
+        netbox=netbox,
+        subid=subid,
+        event_type=EventType(id=event_type),
+        start_time=datetime.datetime.now(),
+        end_time=end_time,
+    )
+
+
+def make_event(netbox):
+    return Event(
+        netbox=netbox,
+        subid='',
+        event_type=EventType(id='boxState'),
+        state=Event.STATE_START,
+    )
+
+
+@pytest.fixture
+def netbox():
+    return Netbox(id=42, sysname='example-sw.example.org')
+
+
+@pytest.fixture
+def empty_map(monkeypatch):
+    monkeypatch.setattr(unresolved, '_unresolved_alerts_map', {})
+    monkeypatch.setattr(unresolved, '_maintenance_index', {})
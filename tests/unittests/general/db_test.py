@@ -0,0 +1,42 @@
+import threading
+
+from mock import Mock, patch
+import pytest
+
+from nav import db
+
+
+class TestThreadLocalConnections:
+    def test_should_share_connection_between_threads_by_default(self, connect):
+        assert _get_in_thread() is db.getConnection('default')
+
+    def test_should_give_each_thread_its_own_connection(self, connect):
+        db.use_thread_local_connections()
+        assert _get_in_thread() is not db.getConnection('default')
+
+    def test_should_close_connections_of_all_threads(self, connect):
+        db.use_thread_local_connections()
+        conn = _get_in_thread()
+        db.closeConnections()
+        conn.close.assert_called_once_with()
+
+
+@pytest.fixture
+def connect():
+    params = ('localhost', 5432, 'nav', 'nav', 'secret')
+    with (
+        patch.object(db, '_connection_cache', db.nav.ObjectCache()),
+        patch.object(db, '_thread_caches', None),
+        patch.object(db, '_other_caches', []),
+        patch.object(db, 'get_connection_parameters', return_value=params),
+        patch.object(db.psycopg2, 'connect', side_effect=lambda *a: Mock()),
+    ):
+        yield
+
+
+def _get_in_thread():
+    result = []
+    thread = threading.Thread(target=lambda: result.append(db.getConnection('default')))
+    thread.start()
+    thread.join()
+    return result[0]
@@ -1,4 +1,6 @@
+import csv
 import datetime
+import io
 import pytest
 from mock import Mock
 from unittest import TestCase
@@ -167,3 +169,121 @@ non_conforming_lines = [
 def test_non_conforming_lines(line):
     msg = logengine.create_message(line)
     assert msg is None, "line shouldn't be parseable: %s" % line
+
+
+class TestLogFileFollower:
+    def test_should_read_all_lines_on_first_read(self, tmp_path):
+        logfile = _write(tmp_path / 'cisco.log', 'foo\nbar\n')
+        assert _read(logfile) == ['foo\n', 'bar\n']
+
+    def test_should_continue_where_previous_read_ended(self, tmp_path):
+        logfile = _write(tmp_path / 'cisco.log', 'foo\n')
+        follower = logengine.LogFileFollower(str(logfile), 'utf-8')
+        list(follower.read_lines())
+        _write(logfile, 'bar\n', mode='a')
+        assert _read(logfile, follower.position) == ['bar\n']
+
+    def test_should_leave_incomplete_line_for_next_read(self, tmp_path):
+        logfile = _write(tmp_path / 'cisco.log', 'foo\nba')
+        follower = logengine.LogFileFollower(str(logfile), 'utf-8')
+        assert [line for line, _ in follower.read_lines()] == ['foo\n']
+        _write(logfile, 'r\n', mode='a')
+        assert _read(logfile, follower.position) == ['bar\n']
+
+    def test_should_read_truncated_file_from_start(self, tmp_path):
+        logfile = _write(tmp_path / 'cisco.log', 'foo\nbar\n')
+        follower = logengine.LogFileFollower(str(logfile), 'utf-8')
+        list(follower.read_lines())
+        _write(logfile, 'baz\n')
+        assert _read(logfile, follower.position) == ['baz\n']
+
+    def test_should_finish_rotated_file_first(self, tmp_path):
+        logfile = _write(tmp_path / 'cisco.log', 'foo\n')
+        follower = logengine.LogFileFollower(str(logfile), 'utf-8')
+        list(follower.read_lines())
+        _write(logfile, 'bar\n', mode='a')
+        logfile.rename(tmp_path / 'cisco.log.1')
+        _write(logfile, 'baz\n')
+        assert _read(logfile, follower.position) == ['bar\n', 'baz\n']
+
+    def test_should_report_unread_bytes_as_backlog(self, tmp_path):
+        logfile = _write(tmp_path / 'cisco.log', 'foo\n')
+        follower = logengine.LogFileFollower(str(logfile), 'utf-8')
+        list(follower.read_lines())
+        _write(logfile, 'bar\n', mode='a')
+        assert follower.get_backlog() == 4
+
+
+class TestMessageBatch:
+    def test_should_copy_parsed_messages_in_one_go(self, loglines):
+        database = _database()
+        batch = logengine.MessageBatch(database, {}, {}, {}, {}, {}, {})
+        for line in loglines:
+            batch.add(line)
+        batch.flush()
+
+        assert database.copy_expert.call_count == 1
+        assert batch.inserted == len(loglines)
+        assert not batch.rows
+
+    def test_should_write_valid_csv(self, loglines):
+        copied = []
+        database = _database()
+        database.copy_expert.side_effect = lambda sql, f: copied.append(f.read())
+        batch = logengine.MessageBatch(database, {}, {}, {}, {}, {}, {})
+        batch.add(loglines[0])
+        batch.flush()
+
+        row = next(csv.reader(io.StringIO(copied[0])))
+        assert row[2] == '5'
+        assert row[4] == (
+            'Line protocol on Interface GigabitEthernet1/0/29, changed state to up'
+        )
+
+    def test_should_cache_new_origins(self, loglines):
+        database = _database()
+        batch = logengine.MessageBatch(database, {}, {}, {}, {}, {}, {})
+        for line in loglines:
+            batch.add(line)
+        origin_inserts = [
+            call
+            for call in database.execute.call_args_list
+            if call[0][0].startswith("INSERT INTO origin")
+        ]
+        assert len(origin_inserts) == 3
+
+    def test_should_put_lines_with_oversized_numbers_in_error_log(self, loglines):
+        line = loglines[0].replace(
+            'Oct 28 13:15:05', 'Oct 99999999999999999999 13:15:05'
+        )
+        database = _database()
+        batch = logengine.MessageBatch(database, {}, {}, {}, {}, {}, {})
+        for item, message in logengine.parse_lines(batch.parser, [line, loglines[1]]):
+            batch.add_parsed(item, message)
+
+        assert batch.errors == [line]
+        assert len(batch.rows) == 1
+
+    def test_should_be_full_at_batch_size(self, loglines):
+        batch = logengine.MessageBatch(_database(), {}, {}, {}, {}, {}, {}, 2)
+        batch.add(loglines[0])
+        assert not batch.is_full()
+        batch.add(loglines[1])
+        assert batch.is_full()
+
+
+def _write(path, text, mode='w'):
+    with open(path, mode) as logfile:
+        logfile.write(text)
+    return path
+
+
+def _read(path, position=None):
+    follower = logengine.LogFileFollower(str(path), 'utf-8', position)
+    return [line for line, _position in follower.read_lines()]
+
+
+def _database():
+    database = Mock()
+    database.fetchone.side_effect = lambda: [random.randint(1, 10000)]
+    return database
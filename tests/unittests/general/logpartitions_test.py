@@ -0,0 +1,217 @@
+from datetime import datetime, timedelta
+
+from mock import Mock
+import pytest
+
+from nav.logpartitions import (
+    LogPartitionManager,
+    PriorityPartition,
+    TimePartition,
+    find_gaps,
+    get_interval_start,
+)
+
+RETENTION = {0: 730, 1: 730, 2: 90, 3: 90, 4: 90, 5: 30, 6: 30, 7: 1}
+NOW = datetime(2026, 3, 18, 12, 30)  # a Wednesday
+
+
+class TestIntervalStart:
+    def test_day_should_start_at_midnight(self):
+        assert get_interval_start(NOW, 'day') == datetime(2026, 3, 18)
+
+    def test_week_should_start_on_monday(self):
+        assert get_interval_start(NOW, 'week') == datetime(2026, 3, 16)
+
+
+class TestFindGaps:
+    def test_should_find_whole_range_without_partitions(self):
+        assert find_gaps(datetime(2026, 1, 1), datetime(2026, 1, 8), []) == [
+            (datetime(2026, 1, 1), datetime(2026, 1, 8))
+        ]
+
+    def test_should_skip_covered_ranges(self):
+        partitions = [
+            TimePartition('legacy', None, datetime(2026, 1, 3), False),
+            TimePartition('p', datetime(2026, 1, 4), datetime(2026, 1, 5), True),
+        ]
+        assert find_gaps(datetime(2026, 1, 1), datetime(2026, 1, 8), partitions) == [
+            (datetime(2026, 1, 3), datetime(2026, 1, 4)),
+            (datetime(2026, 1, 5), datetime(2026, 1, 8)),
+        ]
+
+
+class TestLogPartitionManager:
+    def test_should_group_priorities_by_retention(self):
+        manager = LogPartitionManager(Mock(), RETENTION)
+        assert manager.get_priority_groups() == [(7,), (5, 6), (2, 3, 4), (0, 1)]
+
+    def test_should_keep_unconfigured_priorities_forever(self):
+        manager = LogPartitionManager(Mock(), {7: 1})
+        assert manager.get_retention((7,)) == 1
+        assert manager.get_retention(None) is None
+
+    def test_should_parse_partition_bounds(self):
+        manager = _manager(
+            [
+                (
+                    'log_message_20260316',
+                    "FOR VALUES FROM ('2026-03-16 00:00:00') TO ('2026-03-23 00:00:00')",
+                    'p',
+                ),
+                (
+                    'log_message_legacy',
+                    "FOR VALUES FROM (MINVALUE) TO ('2026-03-16 00:00:00')",
+                    'r',
+                ),
+                ('log_message_default', 'DEFAULT', 'r'),
+            ]
+        )
+        assert manager.get_time_partitions() == [
+            TimePartition('log_message_legacy', None, datetime(2026, 3, 16), False),
+            TimePartition(
+                'log_message_20260316',
+                datetime(2026, 3, 16),
+                datetime(2026, 3, 23),
+                True,
+            ),
+        ]
+
+    def test_should_parse_priority_bounds(self):
+        manager = _manager(
+            [
+                ('p_p2_3_4', 'FOR VALUES IN (2, 3, 4)', 'r'),
+                ('p_pnull', 'FOR VALUES IN (NULL)', 'r'),
+                ('p_pdefault', 'DEFAULT', 'r'),
+            ]
+        )
+        subpartitions = manager.get_priority_partitions('p')
+        assert [s.priorities for s in subpartitions] == [(2, 3, 4), (None,), None]
+
+    def test_should_create_aligned_partitions_after_legacy_partition(self):
+        manager = LogPartitionManager(Mock(), RETENTION, premake=1)
+        manager.get_time_partitions = Mock(
+            return_value=[TimePartition('legacy', None, datetime(2026, 3, 18), False)]
+        )
+        manager.create_partition = Mock(side_effect=lambda start, end: start)
+        manager.ensure_partitions(NOW)
+        assert manager.create_partition.call_args_list == [
+            ((datetime(2026, 3, 18), datetime(2026, 3, 23)),),
+            ((datetime(2026, 3, 23), datetime(2026, 3, 30)),),
+        ]
+
+    def test_should_create_priority_subpartitions(self):
+        cursor = Mock()
+        manager = LogPartitionManager(cursor, {7: 1, 5: 30, 6: 30})
+        name = manager.create_partition(datetime(2026, 3, 16), datetime(2026, 3, 23))
+        assert name == 'log_message_20260316'
+        statements = [call[0][0] for call in cursor.execute.call_args_list]
+        assert any(
+            'log_message_20260316_p7 PARTITION OF' in sql and 'IN (7)' in sql
+            for sql in statements
+        )
+        assert any('IN (5, 6)' in sql for sql in statements)
+        assert any(
+            '_pnull PARTITION OF' in sql and 'IN (NULL)' in sql for sql in statements
+        )
+        assert any('_pdefault PARTITION OF' in sql for sql in statements)
+        assert 'ATTACH PARTITION' in statements[-1]
+
+    def test_should_drop_only_expired_subpartitions(self):
+        manager = LogPartitionManager(Mock(), RETENTION)
+        start = NOW - timedelta(days=10)
+        manager.get_time_partitions = Mock(
+            return_value=[TimePartition('p', start, start + timedelta(days=7), True)]
+        )
+        manager.get_priority_partitions = Mock(
+            return_value=_subpartitions('p', manager.get_priority_groups())
+        )
+        manager.drop_partition = Mock()
+        manager.delete_expired_rows = Mock()
+
+        assert manager.expire(NOW) == ['p_p7']
+        manager.drop_partition.assert_called_once_with('p_p7', parent='p')
+
+    def test_should_drop_time_partition_when_all_subpartitions_expire(self):
+        manager = _expiring_manager(NOW - timedelta(days=800), empty=True)
+        assert manager.expire(NOW) == ['p']
+        manager.drop_partition.assert_called_once_with('p')
+
+    def test_should_keep_messages_without_priority(self):
+        manager = _expiring_manager(NOW - timedelta(days=800), empty=False)
+        dropped = manager.expire(NOW)
+        assert 'p' not in dropped
+        assert 'p_pnull' not in dropped
+        assert 'p_pdefault' in dropped
+
+    def test_should_keep_legacy_partition_with_messages_without_priority(self):
+        cursor = Mock()
+        cursor.fetchone.return_value = (True,)
+        manager = LogPartitionManager(cursor, RETENTION)
+        end = NOW - timedelta(days=800)
+        manager.get_time_partitions = Mock(
+            return_value=[TimePartition('legacy', datetime(2000, 1, 1), end, False)]
+        )
+        manager.drop_partition = Mock()
+        manager.delete_expired_rows = Mock()
+
+        assert manager.expire(NOW) == []
+        manager.delete_expired_rows.assert_any_call('legacy', NOW)
+
+    def test_should_delete_rows_from_unexpired_legacy_partition(self):
+        manager = LogPartitionManager(Mock(), RETENTION)
+        manager.get_time_partitions = Mock(
+            return_value=[TimePartition('legacy', None, NOW, False)]
+        )
+        manager.drop_partition = Mock()
+        manager.delete_expired_rows = Mock()
+
+        assert manager.expire(NOW) == []
+        manager.delete_expired_rows.assert_any_call('legacy', NOW)
+        manager.drop_partition.assert_not_called()
+
+    def test_should_delete_expired_rows_per_priority(self):
+        cursor = Mock()
+        manager = LogPartitionManager(cursor, {5: 30, 7: 1})
+        manager.delete_expired_rows('log_message', NOW)
+        assert cursor.execute.call_count == 2
+        sql, args = cursor.execute.call_args[0]
+        assert sql.startswith('DELETE FROM logger.log_message WHERE')
+        assert args == (7, NOW - timedelta(days=1))
+
+    def test_should_refuse_invalid_interval(self):
+        with pytest.raises(ValueError):
+            LogPartitionManager(Mock(), RETENTION, interval='month')
+
+
+def _manager(rows):
+    cursor = Mock()
+    cursor.fetchall.return_value = rows
+    return LogPartitionManager(cursor, RETENTION)
+
+
+def _expiring_manager(start, empty):
+    """Returns a manager of a single time partition starting at start, whose
+    sub-partition for messages without a priority is empty or not
+    """
+    cursor = Mock()
+    cursor.fetchone.return_value = (not empty,)
+    manager = LogPartitionManager(cursor, RETENTION)
+    manager.get_time_partitions = Mock(
+        return_value=[TimePartition('p', start, start + timedelta(days=7), True)]
+    )
+    manager.get_priority_partitions = Mock(
+        return_value=_subpartitions('p', manager.get_priority_groups())
+    )
+    manager.drop_partition = Mock()
+    manager.delete_expired_rows = Mock()
+    return manager
+
+
+def _subpartitions(parent, groups):
+    subpartitions = [
+        PriorityPartition('%s_p%s' % (parent, '_'.join(map(str, group))), group)
+        for group in groups
+    ]
+    subpartitions.append(PriorityPartition(parent + '_pnull', (None,)))
+    subpartitions.append(PriorityPartition(parent + '_pdefault', None))
+    return subpartitions
@@ -0,0 +1,155 @@
+import datetime
+import time
+
+from functools import partial
+
+from mock import Mock, patch
+import pytest
+
+from nav import syslogparser
+from nav.syslogparser import ParsedMessage, ParserPool, SyslogParser
+
+NOW = datetime.datetime(2026, 10, 29, 12, 0)
+
+# A sample of real-world syslog lines, as received from Cisco and Juniper
+# devices.  Juniper lines carry no Cisco message type, and are ignored.
+CORPUS = """
+Oct 28 13:15:06 10.0.42.103 1030: Oct 28 13:15:05.310 CEST: %LINEPROTO-5-UPDOWN: Line protocol on Interface GigabitEthernet1/0/29, changed state to up
+Oct 28 13:15:28 10.0.80.11 877630: Oct 28 13:15:27.383 CEST: %SEC-6-IPACCESSLOGP: list hpc-v2 denied udp 87.202.31.111(59646) (TenGigabitEthernet3/3 0022.bd37.c800) -> 128.39.62.195(45134), 1 packet
+Oct 28 13:15:28 10.0.42.103 1035: Oct 28 13:15:27.388 CEST: %EC-5-CANNOT_BUNDLE2: Gi1/0/29 is not compatible with Gi1/0/30 and will be suspended (speed of Gi1/0/29 is 1000M, Gi1/0/30 is 100M)
+Oct 28 13:15:52 10.0.128.13 71781: *Oct 28 2010 12:08:49 CET: %MV64340_ETHERNET-5-LATECOLLISION: GigabitEthernet0/1, late collision error
+Mar 25 10:54:25 somedevice 72: AP:000b.adc0.ffee: *Mar 25 10:15:51.666: %LINK-3-UPDOWN: Interface Dot11Radio0, changed state to up
+Feb 16 11:55:08 10.0.1.15 22877425: Feb 16 11:55:09.436 MET: %HA_EM-6-LOG: on_high_cpu: CPU utilization is over 80%:
+Nov 13 11:21:02 10.0.1.15 : %ASA-3-321007: System is low on free memory blocks of size 8192 (0 CNT out of 250 MAX)
+Oct 28 13:16:01 uninett-gsw.example.org 5512: Oct 28 13:16:00.998 CEST: %SYS-5-CONFIG_I: Configured from console by admin on vty0 (10.0.0.5)
+Oct 28 13:16:02 ex-sw1.example.org 981: Oct 28 13:16:02: %DOT1X-5-FAIL: Authentication failed for client (0011.2233.4455) on Interface Gi1/0/7
+Oct 28 13:16:09 10.0.42.103 1044: Oct 28 13:16:08.100 CEST: %SW_MATM-4-MACFLAP_NOTIF: Host 0050.56a1.0b2c in vlan 10 is flapping between port Gi1/0/1 and port Gi1/0/2
+Oct 28 13:16:11 10.0.42.104 17: Oct 28 13:16:11 UTC: %SISF-6-ENTRY_CHANGED: Entry changed A=FE80::10F1:F7E9:6EDF:2129 V=204 I=Gi0/8 P=0005 M=
+Oct 28 13:16:12 mx960-1.example.org mgd[4321]: UI_COMMIT: User 'admin' requested 'commit' operation (comment: none)
+Oct 28 13:16:12 mx960-1.example.org /kernel: KERN_ARP_ADDR_CHANGE: arp info overwritten for 10.0.0.1 from 00:11:22:33:44:55 to 00:11:22:33:44:66
+Oct 28 13:16:13 ex4300-1.example.org mib2d[1876]: SNMP_TRAP_LINK_DOWN: ifIndex 528, ifAdminStatus up(1), ifOperStatus down(2), ifName ge-0/0/3
+Oct 28 13:16:14 srx-1.example.org RT_FLOW: RT_FLOW_SESSION_CREATE: session created 10.0.0.2/51234->192.0.2.10/443 junos-https
+Dec 20 16:23:37 10.0.3.15 2605010: CPU utilization for five seconds: 86%/14%; one minute: 33%; five minutes: 31%
+Jan 29 10:21:26 10.0.129.61 %LINK-W-Down:  e30
+""".strip().split(
+    "\n"
+)
+
+
+class TestSyslogParser:
+    def test_should_parse_origin_timestamp(self):
+        message = SyslogParser(NOW).parse(CORPUS[0])
+        assert message == ParsedMessage(
+            datetime.datetime(2026, 10, 28, 13, 15, 5),
+            '10.0.42.103',
+            'rest',
+            'LINEPROTO-5-UPDOWN',
+            'LINEPROTO',
+            5,
+            'UPDOWN',
+            'Line protocol on Interface GigabitEthernet1/0/29, changed state to up',
+        )
+
+    def test_should_parse_origin_year(self):
+        message = SyslogParser(NOW).parse(CORPUS[3])
+        assert message.time == datetime.datetime(2010, 10, 28, 12, 8, 49)
+
+    def test_should_parse_server_timestamp_when_origin_has_none(self):
+        message = SyslogParser(NOW).parse(CORPUS[6])
+        assert message.time == datetime.datetime(2026, 11, 13, 11, 21, 2)
+        assert (message.facility, message.priorityid, message.mnemonic) == (
+            'ASA',
+            3,
+            '321007',
+        )
+
+    def test_should_find_category_of_origin(self):
+        message = SyslogParser(NOW).parse(CORPUS[7])
+        assert message.category == 'gsw'
+
+    def test_should_put_december_messages_in_previous_year_in_january(self):
+        parser = SyslogParser(datetime.datetime(2027, 1, 1, 0, 5))
+        message = parser.parse(CORPUS[0].replace('Oct', 'Dec'))
+        assert message.time.year == 2026
+
+    def test_should_ignore_juniper_lines(self):
+        parser = SyslogParser(NOW)
+        assert [parser.parse(line) for line in CORPUS[11:15]] == [None] * 4
+
+    def test_should_flag_unparseable_cisco_lines(self):
+        assert (
+            SyslogParser(NOW).parse("pr 18 05:12:59: %SISF-6-ENTRY_CHANGED: x") is False
+        )
+
+    def test_should_ignore_lines_without_message_type(self):
+        parser = SyslogParser(NOW)
+        assert parser.parse(CORPUS[15]) is None
+        assert parser.parse(CORPUS[16]) is None
+
+    def test_should_reject_invalid_dates(self):
+        assert not SyslogParser(NOW).parse(CORPUS[0].replace('Oct 28', 'Feb 30'))
+
+    def test_should_flag_lines_with_oversized_numbers(self):
+        line = CORPUS[0].replace('Oct 28 13:15:05', 'Oct 99999999999999999999 13:15:05')
+        assert SyslogParser(NOW).parse(line) is False
+
+    def test_should_flag_lines_that_break_the_parser(self):
+        parser = SyslogParser(NOW)
+        parser._parse_type = None
+        assert parser.parse_safely(CORPUS[0]) is False
+
+
+class TestParserPool:
+    def test_should_parse_in_order(self):
+        parser = SyslogParser(NOW)
+        with ParserPool(2, chunk_size=3, now=NOW) as pool:
+            results = list(pool.parse(CORPUS))
+        assert results == [(line, parser.parse(line)) for line in CORPUS]
+
+    def test_should_flag_lines_with_oversized_numbers(self):
+        line = CORPUS[0].replace('Oct 28 13:15:05', 'Oct 99999999999999999999 13:15:05')
+        with ParserPool(2, chunk_size=1, now=NOW) as pool:
+            results = list(pool.parse([line, CORPUS[0]]))
+        assert [message for _line, message in results] == [
+            False,
+            SyslogParser(NOW).parse(CORPUS[0]),
+        ]
+
+    def test_workers_should_flag_lines_that_break_the_parser(self):
+        parser = SyslogParser(NOW)
+        broken = Mock(wraps=parser)
+        broken.parse.side_effect = [RuntimeError("boom"), parser.parse(CORPUS[1])]
+        broken.parse_safely = partial(SyslogParser.parse_safely, broken)
+        broken.parse_many = partial(SyslogParser.parse_many, broken)
+        with patch.object(syslogparser, '_worker_parser', broken):
+            assert syslogparser._parse_chunk(CORPUS[:2]) == [
+                False,
+                parser.parse(CORPUS[1]),
+            ]
+
+    def test_should_pass_items_through(self):
+        items = [(line, number) for number, line in enumerate(CORPUS)]
+        with ParserPool(2, chunk_size=4, now=NOW) as pool:
+            results = list(pool.parse(items, line_of=lambda item: item[0]))
+        assert [item for item, _message in results] == items
+
+
+@pytest.mark.parametrize("processes", [1, 4])
+def test_benchmark_parsing(processes):
+    lines = CORPUS * 5000
+    parser = SyslogParser()
+
+    start = time.time()
+    if processes > 1:
+        with ParserPool(processes) as pool:
+            parsed = sum(1 for _line, message in pool.parse(lines) if message)
+    else:
+        parsed = sum(1 for message in parser.parse_many(lines) if message)
+    elapsed = time.time() - start
+
+    assert parsed == 11 * 5000
+    print(
+        "parsed {} lines in {:.3f}s in {} process(es) ({:.0f} lines/s)".format(
+            len(lines), elapsed, processes, len(lines) / elapsed
+        )
+    )
@@ -15,7 +15,7 @@
 import pytest
 
 from nav import util
-from nav.util import IPRange, first_true
+from nav.util import IPRange, LRUCache, first_true
 from IPy import IP
 
 
@@ -160,3 +160,30 @@ class TestFirstTrue(object):
     def test_first_true_should_parse_predicate_correctly(self):
         elems = ["foo", "bar", "baz", "frobnicate"]
         assert first_true(elems, pred=lambda x: x == "baz") == "baz"
+
+
+class TestLRUCache(object):
+    def test_should_evict_least_recently_used_entries(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        with pytest.raises(KeyError):
+            cache.get('b')
+        assert cache.get('a') == 1
+        assert len(cache) == 2
+
+    def test_should_expire_entries(self):
+        cache = LRUCache(2, ttl=-1)
+        cache.set('a', 1)
+        with pytest.raises(KeyError):
+            cache.get('a')
+        assert len(cache) == 0
+
+    def test_should_discard_entries(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.discard('a')
+        cache.discard('b')
+        assert len(cache) == 0
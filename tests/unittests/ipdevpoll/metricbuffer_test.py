@@ -0,0 +1,79 @@
+from mock import patch
+import pytest
+from twisted.internet import task
+
+from nav.ipdevpoll.metricbuffer import MetricBuffer
+from nav.metrics.carbon import lines_to_packets, metrics_to_packets
+
+
+@pytest.fixture
+def send_lines():
+    with patch('nav.ipdevpoll.metricbuffer.send_lines') as send_lines:
+        yield send_lines
+
+
+@pytest.fixture
+def metric_buffer():
+    clock = task.Clock()
+    metric_buffer = MetricBuffer(flush_interval=500, flush_size=1024)
+    metric_buffer.loop.clock = clock
+    with patch('nav.ipdevpoll.metricbuffer.reactor'):
+        yield metric_buffer, clock
+    if metric_buffer.loop.running:
+        metric_buffer.loop.stop()
+
+
+class TestMetricBuffer:
+    def test_should_flush_at_interval(self, metric_buffer, send_lines):
+        metric_buffer, clock = metric_buffer
+        metric_buffer.add([('a.b', (60, 1))])
+        metric_buffer.add([('a.c', (60, 2))])
+        send_lines.assert_not_called()
+
+        clock.advance(0.5)
+        send_lines.assert_called_once_with([b'a.b 1 60\n', b'a.c 2 60\n'])
+
+    def test_should_flush_when_full(self, metric_buffer, send_lines):
+        metric_buffer, _clock = metric_buffer
+        metric_buffer.add(('metric.%d' % i, (60, i)) for i in range(100))
+        send_lines.assert_called_once()
+        assert 0 < metric_buffer.size < metric_buffer.flush_size
+
+    def test_should_keep_last_value_of_duplicate_metrics(
+        self, metric_buffer, send_lines
+    ):
+        metric_buffer, _clock = metric_buffer
+        metric_buffer.add([('a.b', (60.2, 1)), ('a.c', (60, 2))])
+        metric_buffer.add([('a.b', (60.7, 3))])
+        metric_buffer.flush()
+        send_lines.assert_called_once_with([b'a.b 3 60\n', b'a.c 2 60\n'])
+        assert metric_buffer.deduplicated == 1
+
+    def test_should_send_immediately_without_flush_interval(self, send_lines):
+        metric_buffer = MetricBuffer(flush_interval=0)
+        metric_buffer.add([('a.b', (60, 1))])
+        send_lines.assert_called_once_with([b'a.b 1 60\n'])
+
+    def test_should_not_send_empty_buffer(self, metric_buffer, send_lines):
+        metric_buffer, _clock = metric_buffer
+        metric_buffer.flush()
+        send_lines.assert_not_called()
+
+    def test_buffered_lines_should_be_packed_like_metrics(
+        self, metric_buffer, send_lines
+    ):
+        metric_buffer, _clock = metric_buffer
+        metrics = [('metric.%d' % i, (60, i * 0.5)) for i in range(50)]
+        metric_buffer.add(metrics)
+        metric_buffer.flush()
+        lines = send_lines.call_args[0][0]
+        assert list(lines_to_packets(lines)) == list(metrics_to_packets(metrics))
+
+    def test_should_flush_each_time_buffer_fills_up(self, send_lines):
+        metric_buffer = MetricBuffer(flush_interval=500, flush_size=100)
+        metric_buffer.add(('metric.%d' % i, (60, i)) for i in range(20))
+        assert send_lines.call_count > 1
+        assert all(len(call[0][0]) <= 9 for call in send_lines.call_args_list)
+        metric_buffer.flush()
+        sent = [line for call in send_lines.call_args_list for line in call[0][0]]
+        assert sent == [b'metric.%d %d 60\n' % (i, i) for i in range(20)]
@@ -0,0 +1,22 @@
+from mock import Mock
+
+from nav.ipdevpoll.plugins.statports import StatPorts
+from nav.metrics.templates import metric_path_for_interface
+
+
+class TestStatPortsMetrics:
+    def test_should_make_template_paths_for_all_netboxes(self):
+        plugin = StatPorts(Mock(sysname='sw1'), Mock(), Mock())
+        stats = {
+            1: {'ifName': 'ge-0/0/1', 'ifDescr': 'x', 'ifInOctets': 10},
+            2: {'ifName': '', 'ifDescr': 'Vlan 2', 'ifHCOutOctets': 20},
+        }
+        metrics = list(plugin._make_metrics(stats, ['sw1', 'sw2'], timestamp=60))
+        assert metrics == [
+            (metric_path_for_interface(netbox, ifname, counter), (60, value))
+            for ifname, counter, value in [
+                ('ge-0/0/1', 'ifInOctets', 10),
+                ('Vlan 2', 'ifOutOctets', 20),
+            ]
+            for netbox in ['sw1', 'sw2']
+        ]
@@ -1,11 +1,17 @@
 import pytest
-from mock import patch
+from mock import Mock, patch
 from io import BytesIO
 
 from nav.metrics.errors import GraphiteUnreachableError
 from nav.metrics.data import get_metric_data
 
 
+@pytest.fixture(autouse=True)
+def no_query_cache():
+    with patch('nav.metrics.data.get_query_cache', return_value=None):
+        yield
+
+
 def test_get_metric_data_without_target_should_return_empty_list():
     assert get_metric_data(None) == []
 
@@ -14,12 +20,14 @@ def test_get_metric_data_with_no_graphite_server_should_fail():
     target = "nav.devices.example-sw_example_org.ports.1.ifInOctets"
     with patch('nav.metrics.data.CONFIG') as config:
         config.get.return_value = 'http://localhost:65042/'
+        config.getint.return_value = 1
         with pytest.raises(GraphiteUnreachableError):
             get_metric_data(target)
 
 
 def test_get_metric_data_can_parse_response():
     target = "nav.devices.example-sw_example_org.ports.1.ifInOctets"
-    with patch('nav.metrics.data.urlopen') as urlopen:
-        urlopen.return_value = BytesIO(b'[1]')
-        assert get_metric_data(target) == [1]
+    response = Mock(raw=BytesIO(b'[{"target": "x", "datapoints": [[1, 2]]}]'))
+    with patch('requests.Session.post') as post:
+        post.return_value = response
+        assert get_metric_data(target) == [{'target': 'x', 'datapoints': [[1, 2]]}]
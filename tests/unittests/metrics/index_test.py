@@ -0,0 +1,188 @@
+from io import BytesIO
+import json
+import time
+
+from mock import Mock, patch
+import pytest
+
+from nav.metrics import names
+from nav.metrics.index import (
+    MetricIndex,
+    compile_pattern,
+    expand_braces,
+    get_metric_index,
+    refresh_index,
+)
+
+METRICS = [
+    'nav.devices.gw_example_org.cpu.cpu1.loadavg1min',
+    'nav.devices.gw_example_org.cpu.cpu1.loadavg5min',
+    'nav.devices.gw_example_org.ports.Gi1_1.ifInOctets',
+    'nav.devices.gw_example_org.ports.Gi1_1.ifOutOctets',
+    'nav.devices.gw_example_org.ports.Gi1_10.ifInOctets',
+    'nav.devices.gw_example_org.sensors.temp1',
+    'nav.devices.gw_example_org.system.sysuptime',
+    'nav.devices.gw-2_example_org.system.sysuptime',
+    'nav.devices.sw_example_org.ports.Gi1_1.ifInOctets',
+    'nav.devices.sw_example_org.system',
+    'nav.devices.sw_example_org.system.sysuptime',
+    'nav.prefixes.10_0_0_0_24.ip_count',
+    'carbon.agents.a.cpuUsage',
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    filename = tmp_path / 'metrics.index'
+    filename.write_bytes(b''.join(m.encode() + b'\n' for m in sorted(METRICS)))
+    return MetricIndex(str(filename))
+
+
+class TestFind:
+    def test_should_find_children(self, index):
+        assert _ids(index.find('nav.devices.gw_example_org.*')) == [
+            'nav.devices.gw_example_org.cpu',
+            'nav.devices.gw_example_org.ports',
+            'nav.devices.gw_example_org.sensors',
+            'nav.devices.gw_example_org.system',
+        ]
+
+    def test_should_flag_leaves_and_branches(self, index):
+        nodes = index.find('nav.devices.*.{system,sensors}')
+        assert [(n['id'], n['leaf'], n['expandable']) for n in nodes] == [
+            ('nav.devices.gw-2_example_org.system', 0, 1),
+            ('nav.devices.gw_example_org.sensors', 0, 1),
+            ('nav.devices.gw_example_org.system', 0, 1),
+            ('nav.devices.sw_example_org.system', 1, 1),
+        ]
+
+    def test_should_match_globs_within_nodes(self, index):
+        assert _ids(index.find('nav.devices.gw*.ports.Gi1_?.if*Octets')) == [
+            'nav.devices.gw_example_org.ports.Gi1_1.ifInOctets',
+            'nav.devices.gw_example_org.ports.Gi1_1.ifOutOctets',
+        ]
+
+    def test_should_match_character_classes(self, index):
+        assert _ids(index.find('nav.devices.[gs]w_example_org.ports.*.ifInOctets')) == [
+            'nav.devices.gw_example_org.ports.Gi1_1.ifInOctets',
+            'nav.devices.gw_example_org.ports.Gi1_10.ifInOctets',
+            'nav.devices.sw_example_org.ports.Gi1_1.ifInOctets',
+        ]
+
+    def test_should_find_exact_path(self, index):
+        nodes = index.find('nav.devices.gw_example_org.sensors.temp1')
+        assert nodes == [
+            {
+                'id': 'nav.devices.gw_example_org.sensors.temp1',
+                'text': 'temp1',
+                'leaf': 1,
+                'expandable': 0,
+                'allowChildren': 0,
+            }
+        ]
+
+    def test_should_find_nothing_for_unknown_prefix(self, index):
+        assert index.find('nav.nothing.*') == []
+
+    def test_should_find_top_level_nodes(self, index):
+        assert _ids(index.find('*')) == ['carbon', 'nav']
+
+
+class TestLeavesBelow:
+    def test_should_get_all_leaves(self, index):
+        assert index.get_leaves_below('nav.devices.sw_example_org') == [
+            'nav.devices.sw_example_org.ports.Gi1_1.ifInOctets',
+            'nav.devices.sw_example_org.system',
+            'nav.devices.sw_example_org.system.sysuptime',
+        ]
+
+    def test_should_leave_out_ignored_nodes(self, index):
+        leaves = index.get_leaves_below(
+            'nav.devices.gw_example_org',
+            [
+                'nav.devices.gw_example_org.ports',
+                'nav.devices.gw_example_org.sensors',
+            ],
+        )
+        assert leaves == [
+            'nav.devices.gw_example_org.cpu.cpu1.loadavg1min',
+            'nav.devices.gw_example_org.cpu.cpu1.loadavg5min',
+            'nav.devices.gw_example_org.system.sysuptime',
+        ]
+
+
+class TestPatterns:
+    def test_should_expand_nested_alternatives(self):
+        assert expand_braces('a.{b,c}.{d,e}') == ['a.b.d', 'a.b.e', 'a.c.d', 'a.c.e']
+
+    def test_wildcards_should_not_match_across_nodes(self):
+        assert not compile_pattern('a.*')('a.b.c')
+        assert compile_pattern('a.*.c')('a.b.c')
+
+    def test_should_negate_character_classes(self):
+        assert not compile_pattern('a.[!b]')('a.b')
+        assert compile_pattern('a.[!b]')('a.c')
+
+
+class TestIndexConfiguration:
+    def test_should_ignore_missing_index(self, tmp_path):
+        with _config(str(tmp_path / 'missing'), 0):
+            assert get_metric_index() is None
+
+    def test_should_ignore_stale_index(self, index):
+        with (
+            _config(index.filename, 60),
+            patch('nav.metrics.index.time.time', return_value=time.time() + 3600),
+        ):
+            assert get_metric_index() is None
+
+    def test_names_should_be_queried_from_index(self, index):
+        with _config(index.filename, 0):
+            assert _ids(names.raw_metric_query('nav.prefixes.*')) == [
+                'nav.prefixes.10_0_0_0_24'
+            ]
+            assert names.get_all_leaves_below('nav.prefixes') == [
+                'nav.prefixes.10_0_0_0_24.ip_count'
+            ]
+
+
+def test_refresh_should_write_sorted_index(tmp_path):
+    filename = str(tmp_path / 'metrics.index')
+    response = Mock(raw=BytesIO(json.dumps(METRICS + METRICS[:2]).encode()))
+    with patch('nav.metrics.index.requests.get', return_value=response):
+        assert refresh_index(filename) == len(METRICS)
+    with open(filename, 'rb') as index:
+        assert index.read().decode().splitlines() == sorted(METRICS)
+
+
+def test_find_should_skip_over_subtrees_of_matched_nodes(tmp_path):
+    filename = tmp_path / 'metrics.index'
+    metrics = sorted(
+        'nav.devices.sw{:02d}_example_org.ports.Gi1_{}.{}'.format(box, port, counter)
+        for box in range(20)
+        for port in range(5)
+        for counter in ('ifInOctets', 'ifOutOctets', 'ifInErrors')
+    )
+    filename.write_text(''.join(m + '\n' for m in metrics))
+    index = MetricIndex(str(filename))
+
+    children = index.find('nav.devices.*')
+    ports = index.find('nav.devices.sw10_example_org.ports.*.if{In,Out}Octets')
+    leaves = index.get_leaves_below('nav.devices.sw19_example_org')
+
+    assert _ids(children) == [
+        'nav.devices.sw{:02d}_example_org'.format(box) for box in range(20)
+    ]
+    assert len(ports) == 10 and all(port['leaf'] for port in ports)
+    assert leaves == [m for m in metrics if m.startswith('nav.devices.sw19_')]
+
+
+def _ids(nodes):
+    return [node['id'] for node in nodes]
+
+
+def _config(filename, max_age):
+    config = Mock()
+    config.get.return_value = filename
+    config.getint.return_value = max_age
+    return patch('nav.metrics.index.CONFIG', config)
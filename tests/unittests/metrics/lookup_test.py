@@ -0,0 +1,129 @@
+import re
+
+from mock import Mock, patch
+import pytest
+
+from nav.metrics import lookup as lookup_module
+from nav.metrics.lookup import lookup, lookup_many
+from nav.models.manage import Interface, Netbox, Sensor
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    lookup_module._cache.clear()
+    yield
+    lookup_module._cache.clear()
+
+
+class TestLookupMany:
+    def test_should_look_up_each_kind_of_metric_in_one_query(self):
+        netbox = Netbox(id=1, sysname='sw.example.org')
+        interfaces = [
+            Interface(netbox=netbox, ifname='Gi1/1', ifdescr='GigabitEthernet1/1'),
+            Interface(netbox=netbox, ifname='Gi1/2', ifdescr='GigabitEthernet1/2'),
+        ]
+        sensor = Sensor(netbox=netbox, internal_name='temp1')
+        metrics = [
+            'nav.devices.sw_example_org.ports.Gi1_1.ifInOctets',
+            'nav.devices.sw_example_org.ports.Gi1_2.ifInOctets',
+            'nav.devices.sw_example_org.ports.Gi1_2.ifOutOctets',
+            'nav.devices.sw_example_org.sensors.temp1',
+            'nav.devices.sw_example_org.sensors.temp2',
+            'nav.unknown.metric',
+        ]
+
+        with (
+            patch.object(Netbox, 'objects') as netbox_objects,
+            patch.object(Interface, 'objects') as ifc_objects,
+            patch.object(Sensor, 'objects') as sensor_objects,
+        ):
+            _has_netboxes(netbox_objects, [netbox])
+            _returns(ifc_objects, interfaces)
+            _returns(sensor_objects, [sensor])
+            result = lookup_many(metrics)
+
+        assert result == {
+            metrics[0]: interfaces[0],
+            metrics[1]: interfaces[1],
+            metrics[2]: interfaces[1],
+            metrics[3]: sensor,
+            metrics[4]: None,
+            metrics[5]: None,
+        }
+        assert ifc_objects.filter.return_value.extra.call_count == 1
+        assert sensor_objects.filter.return_value.extra.call_count == 1
+        ifc_objects.filter.assert_called_once_with(netbox__in=[1])
+        where = ifc_objects.filter.return_value.extra.call_args[1]['where']
+        assert where == ['ifname::TEXT LIKE ANY(%s)']
+
+    def test_should_only_match_interfaces_on_matching_netboxes(self):
+        netboxes = [Netbox(id=1, sysname='sw1'), Netbox(id=2, sysname='sw_')]
+        with (
+            patch.object(Netbox, 'objects') as netbox_objects,
+            patch.object(Interface, 'objects') as ifc_objects,
+        ):
+            _has_netboxes(netbox_objects, netboxes)
+            _returns(ifc_objects, [])
+            lookup_many(
+                [
+                    'nav.devices.sw1.ports.Gi1_1.ifInOctets',
+                    'nav.devices.sw1.ports.Gi1_2.ifInOctets',
+                ]
+            )
+        assert ifc_objects.filter.call_args_list[0][1] == {'netbox__in': [1]}
+
+    def test_should_not_match_interfaces_without_matching_netboxes(self):
+        with (
+            patch.object(Netbox, 'objects') as netbox_objects,
+            patch.object(Interface, 'objects') as ifc_objects,
+        ):
+            _has_netboxes(netbox_objects, [])
+            metrics = [
+                'nav.devices.sw1.ports.Gi1_1.ifInOctets',
+                'nav.devices.sw1.ports.Gi1_2.ifInOctets',
+            ]
+            result = lookup_many(metrics)
+        assert result == dict.fromkeys(metrics)
+        ifc_objects.filter.assert_not_called()
+
+    def test_should_fall_back_to_ifdescr(self):
+        netbox = Netbox(id=1, sysname='sw')
+        by_descr = Interface(netbox=netbox, ifname='x', ifdescr='Port 1')
+        with (
+            patch.object(Netbox, 'objects') as netbox_objects,
+            patch.object(Interface, 'objects') as objects,
+        ):
+            _has_netboxes(netbox_objects, [netbox])
+            objects.filter.return_value.extra.return_value.select_related.side_effect = [
+                [],
+                [by_descr],
+            ]
+            result = lookup_many(
+                ['nav.devices.sw.ports.Port_1.ifInOctets', 'nav.devices.sw.ports.y.z']
+            )
+        assert result['nav.devices.sw.ports.Port_1.ifInOctets'] is by_descr
+
+    def test_should_ignore_ambiguous_matches(self):
+        netboxes = [Netbox(id=1, sysname='a.b'), Netbox(id=2, sysname='a_b')]
+        with patch.object(Netbox, 'objects') as objects:
+            objects.extra.return_value = netboxes
+            result = lookup_many(['nav.devices.a_b', 'nav.devices.c'])
+        assert result == {'nav.devices.a_b': None, 'nav.devices.c': None}
+
+    def test_should_cache_results(self):
+        reverse = Mock(return_value='netbox')
+        handlers = [(re.compile(r'\.devices\.(?P<sysname>[^.]+)$'), reverse)]
+        with patch.object(lookup_module, '_reverse_handlers', handlers):
+            assert lookup('nav.devices.sw') == 'netbox'
+            assert lookup('nav.devices.sw') == 'netbox'
+        reverse.assert_called_once_with(sysname='sw')
+
+
+def _returns(objects, result):
+    objects.filter.return_value.extra.return_value.select_related.return_value = result
+
+
+def _has_netboxes(objects, netboxes):
+    objects.extra.return_value.values_list.return_value = [
+        (netbox.id, netbox.sysname) for netbox in netboxes
+    ]
@@ -0,0 +1,199 @@
+from datetime import datetime
+import threading
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from mock import Mock, patch
+import pytest
+
+from nav.metrics import querycache
+from nav.metrics.errors import GraphiteUnreachableError
+from nav.metrics.querycache import (
+    MetricQueryCache,
+    get_ttl,
+    make_key,
+    parse_time,
+)
+
+NOW = time.mktime(datetime(2026, 10, 19, 12, 0, 30).timetuple())
+
+
+@pytest.fixture
+def cache():
+    cache = LocMemCache('querycache-test', {})
+    yield cache
+    cache.clear()
+
+
+class TestMakeKey:
+    def test_should_ignore_target_order_and_whitespace(self):
+        assert make_key('average', ['b', 'sum(a, c)'], '-5min', 'now') == make_key(
+            'average', ['sum(a,c)', 'b'], ' -5MIN', ''
+        )
+
+    def test_should_keep_target_order_of_data_queries(self):
+        assert make_key('data', ['a', 'b'], '-5min', 'now') != make_key(
+            'data', ['b', 'a'], '-5min', 'now'
+        )
+
+    def test_should_keep_whitespace_within_quotes(self):
+        assert make_key('data', "alias(x, 'In octets')", '-5min', 'now') != make_key(
+            'data', "alias(x,'Inoctets')", '-5min', 'now'
+        )
+        assert make_key('data', "alias(x, 'In octets')", '-5min', 'now') == make_key(
+            'data', "alias( x,'In octets' )", '-5min', 'now'
+        )
+
+    def test_should_distinguish_aggregations(self):
+        assert make_key('average', 'a', '-5min', 'now') != make_key(
+            'max', 'a', '-5min', 'now'
+        )
+
+    def test_should_equal_datetime_and_graphite_time(self):
+        assert make_key('data', 'a', datetime(2026, 10, 1, 8, 30), 'now') == make_key(
+            'data', 'a', '08:30_20261001', 'now'
+        )
+
+
+class TestParseTime:
+    @pytest.mark.parametrize(
+        "value,offset",
+        [
+            ('now', 0),
+            ('-5min', -300),
+            ('-1day', -86400),
+            ('now-2h', -7200),
+            ('-1w', -7 * 86400),
+            ('-1month', -30 * 86400),
+        ],
+    )
+    def test_should_parse_relative_times(self, value, offset):
+        assert parse_time(value, NOW) == NOW + offset
+
+    def test_should_parse_absolute_times(self):
+        assert parse_time('12:00_20261019', NOW) == NOW - 30
+
+    def test_should_not_parse_garbage(self):
+        assert parse_time('yesterday', NOW) is None
+
+
+class TestGetTtl:
+    def test_should_expire_at_next_minute_for_recent_data(self):
+        assert get_ttl('-5min', 'now', now=NOW) == 30
+
+    def test_should_expire_at_next_coarser_datapoint_for_older_data(self):
+        assert get_ttl('-1week', 'now', now=NOW) == 270
+
+    def test_should_keep_closed_windows_longer(self):
+        start = datetime(2026, 10, 1)
+        end = datetime(2026, 10, 2)
+        assert get_ttl(start, end, now=NOW, max_ttl=3600) == 3600
+
+
+class TestMetricQueryCache:
+    def test_should_cache_results(self, cache):
+        query_cache = MetricQueryCache(cache)
+        fetch = Mock(return_value={'a': 1.0})
+        for _ in range(3):
+            assert query_cache.get('average', ['a'], '-5min', 'now', fetch) == {
+                'a': 1.0
+            }
+        assert fetch.call_count == 1
+        assert query_cache.get_stats() == {'hits': 2, 'misses': 1, 'coalesced': 0}
+
+    def test_should_cache_empty_results(self, cache):
+        query_cache = MetricQueryCache(cache)
+        fetch = Mock(return_value={})
+        query_cache.get('average', ['a'], '-5min', 'now', fetch)
+        query_cache.get('average', ['a'], '-5min', 'now', fetch)
+        assert fetch.call_count == 1
+
+    def test_should_not_cache_errors(self, cache):
+        query_cache = MetricQueryCache(cache)
+        fetch = Mock(side_effect=[GraphiteUnreachableError("down"), {'a': 1.0}])
+        with pytest.raises(GraphiteUnreachableError):
+            query_cache.get('max', ['a'], '-5min', 'now', fetch)
+        assert query_cache.get('max', ['a'], '-5min', 'now', fetch) == {'a': 1.0}
+
+    def test_should_coalesce_identical_queries_in_flight(self, cache):
+        query_cache = MetricQueryCache(cache)
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return {'a': 1.0}
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    query_cache.get('average', ['a'], '-5min', 'now', fetch)
+                )
+            )
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        _wait_until(lambda: query_cache._flights)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert results == [{'a': 1.0}] * 10
+
+    def test_should_wait_for_other_process_holding_lock(self, cache):
+        query_cache = MetricQueryCache(cache, lock_timeout=5)
+        key = make_key('average', ['a'], '-5min', 'now')
+        cache.add(key + querycache.LOCK_SUFFIX, 42)
+        fetch = Mock(return_value={'a': 2.0})
+
+        timer = threading.Timer(0.2, lambda: cache.set(key, ({'a': 1.0},)))
+        timer.start()
+        assert query_cache.get('average', ['a'], '-5min', 'now', fetch) == {'a': 1.0}
+        fetch.assert_not_called()
+
+    def test_should_fetch_if_other_process_gives_up(self, cache):
+        query_cache = MetricQueryCache(cache, lock_timeout=5)
+        lock = make_key('average', ['a'], '-5min', 'now') + querycache.LOCK_SUFFIX
+        cache.add(lock, 42)
+        fetch = Mock(return_value={'a': 2.0})
+
+        timer = threading.Timer(0.2, lambda: cache.delete(lock))
+        timer.start()
+        assert query_cache.get('average', ['a'], '-5min', 'now', fetch) == {'a': 2.0}
+
+    def test_should_send_running_totals(self, cache):
+        query_cache = MetricQueryCache(cache)
+        fetch = Mock(return_value={})
+        query_cache.get('average', ['a'], '-5min', 'now', fetch)
+        query_cache.get('average', ['a'], '-5min', 'now', fetch)
+        with patch('nav.metrics.querycache.send_metrics') as send_metrics:
+            query_cache._report_stats(now=time.time() + querycache.STATS_INTERVAL)
+            query_cache._report_stats(now=time.time() + 3 * querycache.STATS_INTERVAL)
+        sent = [dict(call[0][0]) for call in send_metrics.call_args_list]
+        assert [metrics['nav.metrics.querycache.hits'][1] for metrics in sent] == [
+            1,
+            1,
+        ]
+
+
+def _wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_metrics_cache_should_not_share_location_with_other_caches():
+    from django.conf import settings
+
+    metrics = settings.CACHES[querycache.CACHE_ALIAS]
+    others = [
+        cache['LOCATION']
+        for alias, cache in settings.CACHES.items()
+        if alias != querycache.CACHE_ALIAS
+    ]
+    assert metrics['LOCATION'] not in others
+    assert metrics['OPTIONS']['MAX_ENTRIES'] > 300
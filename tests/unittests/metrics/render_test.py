@@ -0,0 +1,129 @@
+from io import BytesIO
+import json
+import pickle
+import threading
+
+from mock import Mock, patch
+import pytest
+import requests
+
+from nav.metrics.errors import GraphiteUnreachableError
+from nav.metrics.render import (
+    NO_VALUE,
+    GraphiteRenderClient,
+    average,
+    iter_json_array,
+    maximum,
+)
+
+SERIES = [
+    {'target': 'a', 'datapoints': [[1.0, 60], [None, 120], [3.0, 180]]},
+    {'target': 'bæ', 'datapoints': [[None, 60]]},
+    {'target': 'c', 'datapoints': []},
+]
+
+
+class TestIterJsonArray:
+    @pytest.mark.parametrize("read_size", [1, 7, 64 * 1024])
+    def test_should_decode_elements_regardless_of_read_size(self, read_size):
+        data = json.dumps(SERIES, ensure_ascii=False).encode('utf-8')
+        assert list(iter_json_array(BytesIO(data), read_size)) == SERIES
+
+    def test_should_decode_empty_array(self):
+        assert list(iter_json_array(BytesIO(b' [ ] '))) == []
+
+    def test_should_fail_on_truncated_array(self):
+        data = json.dumps(SERIES).encode('utf-8')[:-10]
+        with pytest.raises(ValueError):
+            list(iter_json_array(BytesIO(data), 16))
+
+    def test_should_fail_on_non_array(self):
+        with pytest.raises(ValueError):
+            list(iter_json_array(BytesIO(b'{"target": "a"}')))
+
+
+class TestAggregators:
+    def test_average_should_ignore_unknown_values(self):
+        assert average([1.0, None, 3.0]) == 2.0
+
+    def test_average_should_be_unknown_if_any_value_is(self):
+        assert average([1.0, None, 3.0], ignore_unknown=False) is None
+
+    def test_average_of_unknown_values_should_be_left_out(self):
+        assert average([None, None]) is NO_VALUE
+
+    def test_maximum_should_ignore_unknown_values(self):
+        assert maximum([1.0, None, 3.0]) == 3.0
+        assert maximum([None]) is NO_VALUE
+
+
+class TestGraphiteRenderClient:
+    def test_should_aggregate_json_series(self):
+        client = _client(json.dumps(SERIES).encode('utf-8'))
+        assert client.aggregate(['a', 'b', 'c'], average) == {'a': 2.0}
+
+    def test_should_render_pickled_series(self):
+        data = pickle.dumps(
+            [{'name': 'a', 'start': 60, 'end': 180, 'step': 60, 'values': [1.0, None]}]
+        )
+        client = _client(data, render_format='pickle')
+        assert client.render(['a']) == [
+            {'target': 'a', 'datapoints': [(1.0, 60), (None, 120)]}
+        ]
+
+    def test_should_refuse_to_unpickle_objects(self):
+        client = _client(pickle.dumps([threading.Lock]), render_format='pickle')
+        assert client.render(['a']) == []
+
+    def test_should_fall_back_to_json_without_msgpack(self):
+        with patch('nav.metrics.render.msgpack', None):
+            client = GraphiteRenderClient('http://graphite/', render_format='msgpack')
+        assert client.render_format == 'json'
+
+    def test_should_decode_msgpack_series(self):
+        msgpack = pytest.importorskip('msgpack')
+        data = msgpack.packb(
+            [{'name': 'a', 'start': 60, 'end': 180, 'step': 60, 'values': [4, 2]}]
+        )
+        client = _client(data, render_format='msgpack')
+        assert client.aggregate(['a'], maximum) == {'a': 4}
+
+    def test_should_fetch_chunks_concurrently(self):
+        client = GraphiteRenderClient('http://graphite/', parallelism=3)
+        barrier = threading.Barrier(3, timeout=5)
+
+        def _fetch(chunk, start, end, datapoints=False):
+            barrier.wait()
+            return [(target, [1.0]) for target in chunk]
+
+        with patch.object(client, '_fetch', side_effect=_fetch):
+            result = client.aggregate(['a', 'b', 'c'], average, chunk_size=1)
+        assert result == {'a': 1.0, 'b': 1.0, 'c': 1.0}
+
+    def test_should_record_request_timings(self):
+        client = _client(json.dumps(SERIES).encode('utf-8'))
+        client.render(['a', 'b', 'c'])
+        timing = client.timings[-1]
+        assert (timing.targets, timing.series) == (3, 3)
+        assert timing.bytes > 0
+
+    def test_should_raise_unreachable_error_on_connection_failure(self):
+        client = GraphiteRenderClient('http://graphite/')
+        with patch.object(client.session, 'post') as post:
+            post.side_effect = requests.ConnectionError("refused")
+            with pytest.raises(GraphiteUnreachableError):
+                client.render(['a'])
+
+    def test_should_raise_unreachable_error_on_server_error(self):
+        client = GraphiteRenderClient('http://graphite/')
+        response = Mock(text='oops', status_code=500)
+        response.raise_for_status.side_effect = requests.HTTPError(response=response)
+        with patch.object(client.session, 'post', return_value=response):
+            with pytest.raises(GraphiteUnreachableError):
+                client.render(['a'])
+
+
+def _client(data, render_format='json'):
+    client = GraphiteRenderClient('http://graphite/', render_format=render_format)
+    client.session.post = Mock(side_effect=lambda *args, **kw: Mock(raw=BytesIO(data)))
+    return client
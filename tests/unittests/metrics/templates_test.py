@@ -0,0 +1,60 @@
+from mock import Mock, patch
+import pytest
+
+from nav.metrics import templates
+from nav.metrics.templates import (
+    forget_metric_prefix_for_interface,
+    metric_path_for_interface,
+    metric_prefix_for_interface,
+)
+from nav.util import LRUCache
+
+
+@pytest.fixture(autouse=True)
+def prefix_cache():
+    cache = LRUCache(3)
+    with patch.object(templates, '_interface_prefixes', cache):
+        yield cache
+
+
+class TestMetricPrefixForInterface:
+    def test_should_escape_names(self):
+        assert (
+            metric_prefix_for_interface('sw1.example.org', 'Gi1/0.1')
+            == 'nav.devices.sw1_example_org.ports.Gi1_0_1'
+        )
+
+    def test_should_accept_netbox_objects(self):
+        netbox = Mock(sysname='sw1.example.org')
+        assert metric_prefix_for_interface(netbox, 'Gi1/1') == (
+            metric_prefix_for_interface('sw1.example.org', 'Gi1/1')
+        )
+
+    def test_path_should_extend_prefix(self):
+        assert metric_path_for_interface('sw1', 'Gi1/1', 'ifInOctets') == (
+            metric_prefix_for_interface('sw1', 'Gi1/1') + '.ifInOctets'
+        )
+
+    def test_should_cache_prefixes(self, prefix_cache):
+        with patch.object(
+            templates, 'escape_metric_name', wraps=templates.escape_metric_name
+        ) as escape:
+            metric_prefix_for_interface('sw1', 'Gi1/1')
+            calls = escape.call_count
+            metric_prefix_for_interface('sw1', 'Gi1/1')
+            assert escape.call_count == calls
+        assert len(prefix_cache) == 1
+
+    def test_should_evict_least_recently_used_prefixes(self, prefix_cache):
+        for ifname in ('a', 'b', 'c'):
+            metric_prefix_for_interface('sw1', ifname)
+        metric_prefix_for_interface('sw1', 'a')
+        metric_prefix_for_interface('sw1', 'd')
+        assert len(prefix_cache) == 3
+        with pytest.raises(KeyError):
+            prefix_cache.get(('sw1', 'b'))
+
+    def test_should_forget_renamed_interface(self, prefix_cache):
+        metric_prefix_for_interface('sw1', 'Gi1/1')
+        forget_metric_prefix_for_interface('sw1', 'Gi1/1')
+        assert len(prefix_cache) == 0
@@ -1,6 +1,14 @@
 """Unit tests for nav.metrics.thresholds"""
 
-from nav.metrics.thresholds import ThresholdEvaluator
+from mock import patch
+import pytest
+
+from nav.metrics.thresholds import (
+    InvalidExpressionError,
+    ThresholdEvaluator,
+    get_metric_maxima,
+)
+from nav.models.manage import Interface
 
 
 class TestThatThresholdEvaluator:
@@ -23,3 +31,54 @@ class TestThatThresholdEvaluator:
         }
 
         assert ('data.zero', 0.0) in t.evaluate('>-120')
+
+    def test_evaluates_relative_expression_against_maxima(self):
+        t = ThresholdEvaluator('data.*')
+        t.result = {
+            'data.busy': {'value': 95.0},
+            'data.idle': {'value': 5.0},
+            'data.unknown': {'value': 50.0},
+        }
+        t.set_maxima({'data.busy': 100.0, 'data.idle': 100.0})
+
+        assert t.evaluate('>90%') == [('data.busy', 95.0)]
+        assert t.evaluate('>90%', invert=True) == [
+            ('data.idle', 5.0),
+            ('data.unknown', 50.0),
+        ]
+
+    def test_rejects_invalid_expression(self):
+        with pytest.raises(InvalidExpressionError):
+            ThresholdEvaluator('data.*').evaluate('=90')
+
+
+class TestGetMetricMaxima:
+    def test_should_find_speeds_of_interface_octet_counters(self):
+        metrics = [
+            'nav.devices.sw_example_org.ports.Gi1_1.ifInOctets',
+            'nav.devices.sw_example_org.ports.Gi1_2.ifInOctets',
+            'nav.devices.sw_example_org.ports.Gi1_1.ifInErrors',
+        ]
+        with patch('nav.metrics.thresholds.lookup_many') as lookup_many:
+            lookup_many.return_value = {
+                metrics[0]: Interface(speed=1000),
+                metrics[1]: Interface(speed=0),
+            }
+            maxima = get_metric_maxima(metrics)
+
+        lookup_many.assert_called_once_with(metrics[:2])
+        assert maxima == {metrics[0]: 1e9}
+
+
+def test_relative_evaluation_should_compare_all_series_to_their_maxima():
+    t = ThresholdEvaluator('data.*', raw=True)
+    t.result = {'data.{}.ifInOctets'.format(i): {'value': float(i)} for i in range(100)}
+    t.set_maxima({metric: 100.0 for metric in t.result})
+
+    exceeded = t.evaluate('>90%')
+    cleared = t.evaluate('<80%')
+
+    assert sorted(metric for metric, _value in exceeded) == sorted(
+        'data.{}.ifInOctets'.format(i) for i in range(91, 100)
+    )
+    assert len(cleared) == 80
@@ -56,6 +56,43 @@ class TestDispatcherHandler(object):
         with pytest.raises(dispatcher.DispatcherError):
             handler.sendsms('unhandled', [])
 
+    def test_sendmany_should_return_result_for_each_phone(self):
+        handler = FakeDispatcherHandler(self.config)
+        results = handler.sendmany({'fakenumber': [], 'failure': []})
+        assert results['fakenumber'] == (None, 1, 0, 1)
+        assert isinstance(results['failure'], dispatcher.DispatcherError)
+
+    def test_sendmany_should_return_permanent_errors_with_other_results(self):
+        handler = FakeDispatcherHandler(self.config)
+        handler.workers = 1  # send in order
+        results = handler.sendmany({'fakenumber': [], 'permanent': []})
+        assert results['fakenumber'] == (None, 1, 0, 1)
+        assert isinstance(results['permanent'], dispatcher.PermanentDispatcherError)
+
+    def test_should_back_off_after_repeated_failures(self):
+        handler = FakeDispatcherHandler(self.config)
+        for _ in range(dispatcher.BACKOFF_THRESHOLD):
+            with pytest.raises(dispatcher.DispatcherError):
+                handler.sendsms('failure', [])
+        assert handler.dispatchers[0].is_backing_off()
+        with pytest.raises(dispatcher.DispatcherError):
+            handler.sendsms('fakenumber', [])
+
+    def test_should_not_back_off_after_single_failure(self):
+        handler = FakeDispatcherHandler(self.config)
+        with pytest.raises(dispatcher.DispatcherError):
+            handler.sendsms('failure', [])
+        assert handler.sendsms('fakenumber', [])
+
+    def test_pop_stats_should_reset_stats(self):
+        handler = FakeDispatcherHandler(self.config)
+        handler.sendsms('fakenumber', [])
+        with pytest.raises(dispatcher.DispatcherError):
+            handler.sendsms('failure', [])
+        sent, failed, _ = handler.pop_stats()['FakeDispatcher']
+        assert (sent, failed) == (1, 1)
+        assert handler.pop_stats()['FakeDispatcher'][:2] == (0, 0)
+
 
 class FakeDispatcherHandler(dispatcher.DispatcherHandler):
     def importbyname(self, name):
@@ -74,6 +111,8 @@ class FakeDispatcher(object):
         print("got phone %r and msgs %r" % (phone, msgs))
         if phone == 'failure':
             raise dispatcher.DispatcherError('FakeDispatcher failed')
+        elif phone == 'permanent':
+            raise dispatcher.PermanentDispatcherError('FakeDispatcher died')
         elif phone == 'unhandled':
             raise Exception('This exception should be unknown')
         return (None, 1, 0, 1, 1)
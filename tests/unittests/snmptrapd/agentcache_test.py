@@ -0,0 +1,84 @@
+from collections import namedtuple
+
+from mock import MagicMock, patch
+import pytest
+
+from nav.snmptrapd import agentcache
+from nav.snmptrapd.agentcache import AgentCache, AgentNetbox
+
+Notify = namedtuple('Notify', 'pid channel payload')
+
+ROWS = [
+    ('10.0.1.1', 2, 'gw.example.org', 'myroom'),
+    ('10.0.0.1', 1, 'switch.example.org', 'myroom'),
+    ('2001:db8::1', 1, 'switch.example.org', 'myroom'),
+    ('10.0.1.1', 3, 'other.example.org', 'otherroom'),
+]
+
+
+class TestAgentCache:
+    def test_should_find_agent_by_address(self, conn):
+        cache = AgentCache()
+        assert cache.lookup('10.0.0.1') == AgentNetbox(
+            1, 'switch.example.org', 'myroom'
+        )
+
+    def test_should_find_agent_by_non_normalized_ipv6_address(self, conn):
+        assert AgentCache().lookup('2001:0db8:0::1').netboxid == 1
+
+    def test_should_prefer_management_address(self, conn):
+        assert AgentCache().lookup('10.0.1.1').netboxid == 3
+
+    def test_should_return_none_for_unknown_agent(self, conn):
+        assert AgentCache().lookup('192.0.2.1') is None
+
+    def test_should_query_database_only_once(self, conn):
+        cache = AgentCache()
+        for _ in range(10):
+            cache.lookup('10.0.0.1')
+            cache.lookup('192.0.2.1')
+        assert _cursor(conn).execute.call_count == 2  # LISTEN + SELECT
+
+    def test_should_refresh_when_too_old(self, conn):
+        cache = AgentCache(max_age=60)
+        cache.lookup('10.0.0.1')
+        _expire(cache, 61)
+        cache.lookup('10.0.0.1')
+        assert _cursor(conn).fetchall.call_count == 2
+
+    def test_should_refresh_on_notification(self, conn):
+        cache = AgentCache()
+        cache.lookup('10.0.0.1')
+        conn.notifies.append(Notify(1, agentcache.ADDRESSES_CHANGED_CHANNEL, ''))
+        _expire(cache, agentcache.MIN_REFRESH_INTERVAL + 1)
+        cache.lookup('10.0.0.1')
+        assert _cursor(conn).fetchall.call_count == 2
+        assert not conn.notifies
+
+    def test_should_not_refresh_without_notification(self, conn):
+        cache = AgentCache()
+        cache.lookup('10.0.0.1')
+        _expire(cache, agentcache.MIN_REFRESH_INTERVAL + 1)
+        cache.lookup('10.0.0.1')
+        assert _cursor(conn).fetchall.call_count == 1
+
+
+@pytest.fixture
+def conn():
+    conn = MagicMock(closed=False)
+    conn.notifies = []
+    _cursor(conn).fetchall.return_value = ROWS
+    with (
+        patch.object(agentcache.psycopg2, 'connect', return_value=conn),
+        patch.object(agentcache, 'get_connection_string'),
+    ):
+        yield conn
+
+
+def _cursor(conn):
+    return conn.cursor.return_value.__enter__.return_value
+
+
+def _expire(cache, seconds):
+    cache.refreshed_at -= seconds
+    cache._next_check = 0
@@ -0,0 +1,108 @@
+import threading
+
+from mock import Mock, patch
+import pytest
+
+from nav.snmptrapd.coalesce import StateCoalescer, TokenBucket
+
+
+class TestStateCoalescer:
+    def test_should_pass_on_first_state(self, coalescer):
+        assert coalescer.add('port', 'down')
+
+    def test_should_coalesce_states_within_window(self, coalescer):
+        coalescer.add('port', 'down')
+        assert not coalescer.add('port', 'up')
+        assert not coalescer.add('port', 'down')
+
+    def test_should_not_coalesce_other_subjects(self, coalescer):
+        coalescer.add('port', 'down')
+        assert coalescer.add('otherport', 'down')
+
+    def test_should_flush_changed_final_state_with_flap_count(self, coalescer):
+        coalescer.add('port', 'down')
+        coalescer.add('port', 'up')
+        coalescer.add('port', 'down')
+        coalescer.add('port', 'up', 'ctx')
+        coalescer.flush_expired(now=float('inf'))
+        coalescer.flush.assert_called_once_with('port', 'up', 3, 'ctx')
+
+    def test_should_not_flush_unchanged_final_state(self, coalescer):
+        coalescer.add('port', 'down')
+        coalescer.add('port', 'up')
+        coalescer.add('port', 'down')
+        coalescer.flush_expired(now=float('inf'))
+        coalescer.flush.assert_not_called()
+
+    def test_should_flush_final_state_when_first_state_was_suppressed(self, coalescer):
+        coalescer.add('port', 'down')
+        coalescer.suppressed('port')
+        coalescer.flush_expired(now=float('inf'))
+        coalescer.flush.assert_called_once_with('port', 'down', 0, None)
+
+    def test_should_not_flush_open_windows(self, coalescer):
+        coalescer.add('port', 'down')
+        coalescer.add('port', 'up')
+        coalescer.flush_expired(now=0)
+        coalescer.flush.assert_not_called()
+
+    def test_should_open_new_window_after_flush(self, coalescer):
+        coalescer.add('port', 'down')
+        coalescer.flush_expired(now=float('inf'))
+        assert coalescer.add('port', 'up')
+
+    def test_should_not_pass_on_new_state_before_pending_flush(self, coalescer):
+        posted = []
+        flushing = threading.Event()
+        release = threading.Event()
+
+        def flush(subject, state, flaps, context):
+            flushing.set()
+            release.wait(5)
+            posted.append(state)
+
+        def trap():
+            if coalescer.add('port', 'down'):
+                posted.append('down')
+
+        coalescer.flush = flush
+        coalescer.add('port', 'down')
+        coalescer.add('port', 'up')
+        flusher = threading.Thread(
+            target=coalescer.flush_expired, kwargs={'now': float('inf')}
+        )
+        flusher.start()
+        assert flushing.wait(5)
+        worker = threading.Thread(target=trap)
+        worker.start()
+        worker.join(0.2)
+        assert worker.is_alive()
+
+        release.set()
+        flusher.join(5)
+        worker.join(5)
+        assert posted == ['up', 'down']
+
+
+class TestTokenBucket:
+    def test_should_allow_burst(self):
+        bucket = TokenBucket(rate=1, burst=3)
+        with patch('time.monotonic', return_value=bucket._updated):
+            assert [bucket.consume()[0] for _ in range(4)] == [True] * 3 + [False]
+
+    def test_should_count_suppressed_events(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        now = bucket._updated
+        with patch('time.monotonic', return_value=now):
+            bucket.consume()
+            assert bucket.consume() == (False, 1)
+            assert bucket.consume() == (False, 2)
+        with patch('time.monotonic', return_value=now + 1):
+            assert bucket.consume() == (True, 2)
+
+
+@pytest.fixture
+def coalescer():
+    coalescer = StateCoalescer(60, Mock())
+    coalescer._start_flusher = Mock()
+    return coalescer
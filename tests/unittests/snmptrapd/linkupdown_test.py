@@ -0,0 +1,74 @@
+from configparser import ConfigParser
+
+from mock import Mock, patch
+import pytest
+
+from nav.snmptrapd.agentcache import AgentNetbox
+from nav.snmptrapd.handlers import linkupdown
+
+NETBOX = AgentNetbox(1, 'switch.example.org', 'myroom')
+PORT_OID = '.1.3.6.1.2.1.2.2.1.1'
+DETAILS = (10, 20, 'module1', 'Gi1/0/1', 'uplink')
+
+
+class TestLinkUpDownCoalescing:
+    def test_should_post_first_trap_immediately(self, handler):
+        assert linkupdown.handleTrap(_trap(linkupdown.LINKDOWN), config=handler)
+        assert linkupdown.post_link_event.call_count == 1
+
+    def test_should_coalesce_flapping_traps(self, handler):
+        for oid in [linkupdown.LINKDOWN, linkupdown.LINKUP] * 50:
+            linkupdown.handleTrap(_trap(oid), config=handler)
+        assert linkupdown.post_link_event.call_count == 1
+        assert linkupdown.get_interface_details.call_count == 1
+
+    def test_should_post_net_transition_with_flap_count(self, handler):
+        for oid in [linkupdown.LINKDOWN, linkupdown.LINKUP, linkupdown.LINKDOWN]:
+            linkupdown.handleTrap(_trap(oid), config=handler)
+        linkupdown.handleTrap(_trap(linkupdown.LINKUP), config=handler)
+        linkupdown._coalescer.flush_expired(now=float('inf'))
+
+        last_call = linkupdown.post_link_event.call_args
+        assert last_call[0][0] is False  # up
+        assert last_call[1]['flaps'] == 3
+
+
+class TestLinkUpDownRateLimit:
+    def test_should_post_suppression_event_once(self, handler):
+        handler.set('linkupdown', 'coalesce_window', '0')
+        handler.set('linkupdown', 'event_rate', '0.001')
+        handler.set('linkupdown', 'event_burst', '2')
+        for _ in range(5):
+            linkupdown.handleTrap(_trap(linkupdown.LINKDOWN), config=handler)
+        assert linkupdown.post_link_event.call_count == 2
+        linkupdown.post_suppression_event.assert_called_once_with(NETBOX, 0.001)
+
+
+@pytest.fixture
+def handler():
+    config = ConfigParser()
+    config.read_dict({'linkupdown': {'portOID': PORT_OID, 'coalesce_window': '60'}})
+    with (
+        patch.multiple(
+            linkupdown,
+            _coalescer=None,
+            _event_limit=None,
+            _buckets={},
+            _configured=False,
+            get_interface_details=Mock(return_value=DETAILS),
+            post_link_event=Mock(return_value=True),
+            post_suppression_event=Mock(return_value=True),
+            getConnection=Mock(),
+        ),
+        patch.object(linkupdown.StateCoalescer, '_start_flusher'),
+    ):
+        yield config
+
+
+def _trap(oid):
+    return Mock(
+        snmpTrapOID=oid,
+        netbox=NETBOX,
+        agent='10.0.0.1',
+        varbinds={PORT_OID + '.10101': '10101'},
+    )
@@ -0,0 +1,84 @@
+import threading
+
+from mock import Mock, patch
+
+from nav.snmptrapd import pool
+from nav.snmptrapd.pool import TrapHandlerPool
+
+
+class TestTrapHandlerPool:
+    def test_should_hand_traps_to_handler(self):
+        handled = []
+        trap_pool = TrapHandlerPool(handled.append, workers=2, metrics_interval=0)
+        trap_pool.start()
+        for trap in range(10):
+            trap_pool.submit(trap)
+        trap_pool.stop()
+        assert sorted(handled) == list(range(10))
+
+    def test_should_drop_traps_when_queue_is_full(self):
+        trap_pool = TrapHandlerPool(Mock(), workers=1, queue_size=2)
+        assert trap_pool.submit(Mock())
+        assert trap_pool.submit(Mock())
+        assert not trap_pool.submit(Mock())
+        assert trap_pool.stats.pop()[:2] == (3, 1)
+
+    def test_should_let_a_single_agent_use_the_whole_queue(self):
+        trap_pool = TrapHandlerPool(Mock(), workers=4, queue_size=10)
+        assert all(trap_pool.submit(Mock(agent='10.0.0.1')) for _ in range(10))
+        assert not trap_pool.submit(Mock(agent='10.0.0.2'))
+
+    def test_should_handle_traps_from_same_agent_in_order(self):
+        handled = []
+        trap_pool = TrapHandlerPool(handled.append, workers=4, metrics_interval=0)
+        traps = [Mock(agent='10.0.0.%d' % (i % 3), number=i) for i in range(300)]
+        trap_pool.start()
+        for trap in traps:
+            trap_pool.submit(trap)
+        trap_pool.stop()
+        assert len(handled) == len(traps)
+        for agent in ('10.0.0.0', '10.0.0.1', '10.0.0.2'):
+            numbers = [trap.number for trap in handled if trap.agent == agent]
+            assert numbers == sorted(numbers)
+
+    def test_should_not_log_each_dropped_trap(self):
+        trap_pool = TrapHandlerPool(Mock(), workers=1, queue_size=1)
+        with patch.object(pool, '_logger') as logger:
+            for _ in range(10):
+                trap_pool.submit(Mock())
+        assert not logger.warning.called
+        assert trap_pool.stats.pop()[:2] == (10, 9)
+
+    def test_should_count_handler_errors(self):
+        def _handler(trap):
+            if trap == 'crash':
+                raise Exception("boom")
+            return 2 if trap == 'fail' else 0
+
+        trap_pool = TrapHandlerPool(_handler, workers=1, metrics_interval=0)
+        trap_pool.start()
+        for trap in ('crash', 'fail', 'ok'):
+            trap_pool.submit(trap)
+        trap_pool.stop()
+        assert trap_pool.stats.pop() == (3, 0, 3, 3)
+
+    def test_should_not_block_receiver_while_handler_is_busy(self):
+        release = threading.Event()
+        trap_pool = TrapHandlerPool(
+            lambda trap: release.wait(), workers=1, metrics_interval=0
+        )
+        trap_pool.start()
+        try:
+            assert all(trap_pool.submit(trap) for trap in range(100))
+        finally:
+            release.set()
+            trap_pool.stop()
+
+    def test_should_report_queue_depth(self):
+        trap_pool = TrapHandlerPool(Mock())
+        trap_pool.submit(Mock())
+        with patch.object(pool, 'send_metrics') as send_metrics:
+            trap_pool.report()
+        metrics = dict(send_metrics.call_args[0][0])
+        assert metrics['nav.snmptrapd.queue.depth'][1] == 1
+        assert metrics['nav.snmptrapd.traps.received'][1] == 1
@@ -1,8 +1,49 @@
-from mock import patch
-from nav.thresholdmon import _add_subject_details
+from mock import Mock, patch
+
+from nav.metrics.thresholds import ThresholdEvaluator
+from nav.thresholdmon import _add_subject_details, get_maxima, get_values
 
 
 def test_non_model_subject_should_not_crash():
     varmap = {}
     with patch("nav.thresholdmon.lookup", return_value="bar"):
         _add_subject_details(None, 'foo', varmap)
+
+
+def test_rules_with_identical_targets_should_share_one_query():
+    rules = [
+        (Mock(id=1, target='a.*', alert='>1'), _evaluator('a.*')),
+        (Mock(id=2, target='a.*', alert='>2'), _evaluator('a.*')),
+        (Mock(id=3, target='b.*', alert='>1'), _evaluator('b.*')),
+    ]
+    with patch("nav.thresholdmon.get_metric_average") as get_metric_average:
+        get_metric_average.side_effect = lambda target, **_kw: {target[0]: 1.0}
+        result = get_values(rules)
+
+    assert get_metric_average.call_count == 2
+    assert [evaluator.result for _rule, evaluator in result] == [
+        {'a': {'value': 1.0}},
+        {'a': {'value': 1.0}},
+        {'b': {'value': 1.0}},
+    ]
+
+
+def test_maxima_should_be_looked_up_once_for_relative_rules():
+    relative = _evaluator('a.*')
+    relative.result = {'a.ifInOctets': {'value': 50.0}}
+    absolute = _evaluator('b.*')
+    absolute.result = {'b.ifInOctets': {'value': 50.0}}
+    rules = [
+        (Mock(alert='>90%', clear='<80%'), relative),
+        (Mock(alert='>90', clear=None), absolute),
+    ]
+    with patch("nav.thresholdmon.get_metric_maxima") as get_metric_maxima:
+        get_metric_maxima.return_value = {'a.ifInOctets': 100.0}
+        get_maxima(rules)
+
+    get_metric_maxima.assert_called_once_with({'a.ifInOctets'})
+    assert relative.evaluate('>40%') == [('a.ifInOctets', 50.0)]
+
+
+def _evaluator(target):
+    return ThresholdEvaluator(target, raw=True)
@@ -0,0 +1,190 @@
+import time
+
+from mock import Mock, patch
+import pytest
+
+from nav.topology import detector
+from nav.topology.analyze import (
+    AdjacencyReducer,
+    Candidate,
+    Port,
+    build_candidate_graph,
+    get_affected_subgraph,
+    node_netbox,
+)
+from nav.topology.incremental import CandidateState
+
+
+def cand(netbox, ifc, to_netbox, to_ifc=None, source='lldp', admin_up=True):
+    """Makes a candidate from netbox/ifc to to_netbox/to_ifc, where interface
+    ids are unique per netbox
+    """
+    return Candidate(
+        netbox,
+        'sw%d' % netbox,
+        netbox * 100 + ifc,
+        'if%d' % ifc,
+        admin_up,
+        to_netbox,
+        'sw%d' % to_netbox,
+        to_netbox * 100 + to_ifc if to_ifc else None,
+        to_netbox if to_ifc else None,
+        'sw%d' % to_netbox if to_ifc else None,
+        'if%d' % to_ifc if to_ifc else None,
+        source,
+    )
+
+
+# Two separate islands: 1-2-3 and 4-5
+CANDIDATES = [
+    cand(1, 1, 2, 1),
+    cand(2, 1, 1, 1),
+    cand(2, 2, 3, source='cam'),
+    cand(3, 1, 2, source='cam'),
+    cand(4, 1, 5, 1),
+    cand(5, 1, 4, 1),
+]
+
+
+class TestBuildCandidateGraph:
+    def test_should_name_nodes(self):
+        graph = build_candidate_graph(CANDIDATES[:1])
+        assert sorted(str(node) for node in graph) == [
+            'sw1',
+            'sw1 (if1)',
+            'sw2 (if1)',
+        ]
+
+    def test_should_ignore_disabled_interfaces(self):
+        graph = build_candidate_graph([cand(1, 1, 2, 1, admin_up=False)])
+        assert len(graph) == 0
+
+
+class TestGetAffectedSubgraph:
+    def test_should_only_include_affected_components(self):
+        graph = build_candidate_graph(CANDIDATES)
+        subgraph = get_affected_subgraph(graph, {3})
+        assert {node_netbox(node) for node in subgraph} == {1, 2, 3}
+
+    def test_reduction_should_equal_full_reduction(self):
+        graph = build_candidate_graph(CANDIDATES)
+        full = _reduce(build_candidate_graph(CANDIDATES))
+        partial = _reduce(get_affected_subgraph(graph, {4}))
+        assert partial
+        assert partial == {
+            (source, dest) for source, dest in full if node_netbox(source) in {4, 5}
+        }
+
+
+class TestCandidateState:
+    def test_should_find_changed_netboxes(self):
+        previous = CandidateState.from_candidates(CANDIDATES)
+        current = CandidateState.from_candidates(
+            CANDIDATES[:2] + [cand(2, 2, 3, source='lldp')] + CANDIDATES[3:5]
+        )
+        assert current.get_changed_netboxes(previous) == {2, 5}
+
+    def test_should_include_old_and_new_neighbors_in_affected_netboxes(self):
+        previous = CandidateState.from_candidates([cand(1, 1, 2, 1)])
+        current = CandidateState.from_candidates([cand(1, 1, 3, 1)])
+        assert current.get_affected_netboxes(previous) == {1, 2, 3}
+
+    def test_unchanged_candidates_should_affect_nothing(self):
+        previous = CandidateState.from_candidates(CANDIDATES)
+        current = CandidateState.from_candidates(list(reversed(CANDIDATES)))
+        assert current.get_affected_netboxes(previous) == set()
+
+    def test_should_include_pending_netboxes_in_affected_netboxes(self):
+        previous = CandidateState.from_candidates(CANDIDATES)
+        previous.pending = {4}
+        current = CandidateState.from_candidates(CANDIDATES)
+        assert current.get_affected_netboxes(previous) == {4, 5}
+
+    def test_should_find_netboxes_with_changed_aggregates(self):
+        aggregator = Port((2, 210))
+        previous = CandidateState.from_candidates(
+            CANDIDATES, aggregates={aggregator: {Port((2, 201))}}
+        )
+        current = CandidateState.from_candidates(
+            CANDIDATES, aggregates={aggregator: {Port((2, 201)), Port((2, 202))}}
+        )
+        assert current.get_changed_netboxes(previous) == {2}
+
+    @pytest.mark.parametrize(
+        "full_run,due", [(None, True), (1000, True), (90000, False)]
+    )
+    def test_full_run_should_be_due_after_interval(self, full_run, due):
+        state = CandidateState(full_run=full_run)
+        assert state.is_full_run_due(24, now=1000 + 24 * 3600) is due
+
+    def test_should_save_and_load_state(self, tmp_path):
+        filename = str(tmp_path / 'navtopology.state')
+        state = CandidateState.from_candidates(CANDIDATES, full_run=1234.5)
+        state.pending = {3}
+        state.save(filename)
+        loaded = CandidateState.load(filename)
+        assert loaded.digests == state.digests
+        assert loaded.neighbors == state.neighbors
+        assert loaded.full_run == 1234.5
+        assert loaded.pending == {3}
+
+    def test_should_load_empty_state_from_bad_file(self, tmp_path):
+        filename = tmp_path / 'navtopology.state'
+        filename.write_text('garbage')
+        assert CandidateState.load(str(filename)).digests == {}
+
+    def test_should_load_empty_state_from_missing_file(self, tmp_path):
+        assert CandidateState.load(str(tmp_path / 'missing')).full_run is None
+
+
+class TestIncrementalLayer2Detection:
+    def test_should_save_netboxes_whose_links_were_not_applied(self, run):
+        saved, _update = run(CandidateState(full_run=time.time()), unapplied={4})
+        assert saved.pending == {4}
+
+    def test_should_redetect_pending_netboxes(self, run):
+        previous = CandidateState.from_candidates(CANDIDATES, time.time())
+        previous.pending = {4}
+        _saved, update = run(previous)
+        assert update.call_args[0][1] == {4, 5}
+
+    def test_should_redetect_netboxes_with_changed_aggregates(self, run):
+        previous = CandidateState.from_candidates(CANDIDATES, time.time())
+        aggregates = {Port((4, 410)): {Port((4, 401))}}
+        _saved, update = run(previous, aggregates=aggregates)
+        assert update.call_args[0][1] == {4, 5}
+
+
+@pytest.fixture
+def run():
+    """Runs an incremental layer 2 detection of CANDIDATES after a previous
+    run that saved the previous state, returning the saved state and the mocked
+    update_layer2_topology function.
+    """
+
+    def _run(previous, unapplied=(), aggregates=None):
+        saved = []
+        update = Mock(return_value=0)
+        with (
+            patch.object(detector, 'get_candidates', return_value=CANDIDATES),
+            patch.object(
+                detector, 'get_aggregate_mapping', return_value=aggregates or {}
+            ),
+            patch.object(CandidateState, 'load', return_value=previous),
+            patch.object(CandidateState, 'save', autospec=True) as save,
+            patch.object(detector, 'update_layer2_topology', update),
+            patch.object(
+                detector, 'get_unapplied_netboxes', return_value=set(unapplied)
+            ),
+        ):
+            save.side_effect = saved.append
+            detector.do_layer2_detection(incremental=True)
+        return saved[0], update
+
+    return _run
+
+
+def _reduce(graph):
+    reducer = AdjacencyReducer(graph)
+    reducer.reduce()
+    return set(reducer.get_single_edges_from_ports())
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from mock import patch
+
+from nav.web.sortedstats.statmodules import Stat
+
+
+class TestSortByValue:
+    def test_should_sort_in_descending_order(self):
+        data = {'a': 1.0, 'b': 3.0, 'c': 2.0}
+        assert Stat.sort_by_value(data) == [('b', 3.0), ('c', 2.0), ('a', 1.0)]
+
+    def test_should_keep_only_top_rows(self):
+        data = {str(i): float(i) for i in range(1000)}
+        assert Stat.sort_by_value(data, 3) == [
+            ('999', 999.0),
+            ('998', 998.0),
+            ('997', 997.0),
+        ]
+
+
+class TestCollect:
+    def test_should_record_when_and_how_fast_data_was_collected(self):
+        stat = Stat(rows=2)
+        with patch.object(Stat, 'get_data', return_value={}):
+            stat.collect()
+        assert isinstance(stat.collected, datetime)
+        assert stat.collect_duration >= 0